@@ -1,11 +1,17 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 
+from domain.prune_profile import PruneProfile
+
 
 @dataclass
 class FileData:
     relative_path: str
     content: bytes
+    executable: bool = False
+    # Set for symlinks (content is empty) and empty directories
+    link_target: Optional[str] = None
+    is_directory: bool = False
 
 
 @dataclass
@@ -15,6 +21,8 @@ class CacheRequest:
     lockfile_content: bytes
     manifest_content: bytes
     custom_args: Optional[List[str]] = None
+    # Files to strip from the bundle served; the unpruned tree is cached as well
+    prune_profile: Optional[PruneProfile] = None
 
 
 @dataclass
@@ -22,10 +30,17 @@ class CacheResponse:
     bundle_hash: str
     download_url: str
     is_cache_hit: bool
+    # Seconds spent per phase (lookup, install, store, prune, zip)
+    timings: Dict[str, float] = field(default_factory=dict)
 
 
 @dataclass
 class InstallationResult:
     success: bool
     files: List[FileData]
-    error_message: Optional[str] = None
\ No newline at end of file
+    error_message: Optional[str] = None
+    # "offline" when every package came from the local cache, "online" otherwise
+    install_mode: Optional[str] = None
+    # The install ran past its deadline; killed: part of its process group had to be SIGKILLed
+    timed_out: bool = False
+    killed: bool = False
\ No newline at end of file
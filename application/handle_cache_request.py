@@ -1,15 +1,29 @@
 import tempfile
 import shutil
 import os
+import errno
+import logging
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from domain.dependency_set import DependencySet, DependencyFile
-from domain.installer import InstallerFactory
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash, calculate_index_hash
+from domain.index_entry import entry_blob_hash, parse_entry
+from domain.installer import InstallerFactory, DependencyInstaller, collect_tree, is_production_only
+from domain.npm_lockfile import lockfile_in_sync
+from domain.package_similarity import lockfile_packages
 from infrastructure.file_system_cache_repository import FileSystemCacheRepository
 from infrastructure.docker_utils import DockerUtils
+from infrastructure.bundle_builder import BundleBuilder, ZIP_BUILD_MODES
+from infrastructure.package_manager_cache import PackageManagerCache
+from infrastructure.npm_assembler import NpmTreeAssembler, AssemblyUnsupported, MissingTarballs, MIN_NPM_MAJOR
+from infrastructure.bundle_similarity_index import BundleSimilarityIndex
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
 from application.dtos import CacheRequest, CacheResponse, FileData, InstallationResult
 
+logger = logging.getLogger(__name__)
+
 
 class HandleCacheRequest:
     """Orchestrates the cache request handling process."""
@@ -20,27 +34,64 @@ class HandleCacheRequest:
         installer_factory: InstallerFactory,
         docker_utils: Optional[DockerUtils],
         supported_versions: Dict[str, List[Dict[str, str]]],
-        use_docker_on_version_mismatch: bool = False
+        use_docker_on_version_mismatch: bool = False,
+        bundle_builder: Optional[BundleBuilder] = None,
+        zip_build_mode: str = "sync",
+        metrics: Optional[MetricsRegistry] = None,
+        package_cache: Optional[PackageManagerCache] = None,
+        npm_assembler: Optional[NpmTreeAssembler] = None,
+        similarity_index: Optional[BundleSimilarityIndex] = None
     ):
+        if zip_build_mode not in ZIP_BUILD_MODES:
+            raise ValueError(f"Invalid zip build mode: {zip_build_mode}")
+        if zip_build_mode != "sync" and bundle_builder is None:
+            raise ValueError(f"zip build mode '{zip_build_mode}' requires a bundle builder")
+        
         self.cache_repository = cache_repository
         self.installer_factory = installer_factory
         self.docker_utils = docker_utils
         self.supported_versions = supported_versions
         self.use_docker_on_version_mismatch = use_docker_on_version_mismatch
+        self.bundle_builder = bundle_builder
+        self.zip_build_mode = zip_build_mode
+        self.metrics = metrics or default_metrics
+        self.package_cache = package_cache
+        self.npm_assembler = npm_assembler
+        self.similarity_index = similarity_index
     
     def handle(self, request: CacheRequest) -> CacheResponse:
         """Process a cache request and return the response."""
+        timings: Dict[str, float] = {}
+        phase_started = time.perf_counter()
+        
         # Calculate request hash (based on manifest, lockfile, and versions)
         request_hash = self._calculate_bundle_hash(request)
         
+        # A pruned variant is cached under its own key
+        bundle_hash = request_hash
+        if request.prune_profile is not None:
+            bundle_hash = request.prune_profile.variant_hash(request_hash)
+        
         # Check if we have an index for this request (cache hit)
-        index_data = self.cache_repository.get_index(request_hash)
-        if index_data and self.cache_repository.has_bundle(request_hash):
+        index_data = self.cache_repository.get_index(bundle_hash)
+        if index_data and self._is_bundle_ready(bundle_hash):
+            self._record_phase(timings, "lookup", phase_started)
+            self.metrics.increment("cache_request.hit")
             return CacheResponse(
-                bundle_hash=request_hash,
-                download_url=f"/download/{request_hash}.zip",
-                is_cache_hit=True
+                bundle_hash=bundle_hash,
+                download_url=f"/download/{bundle_hash}.zip",
+                is_cache_hit=True,
+                timings=timings
             )
+        self._record_phase(timings, "lookup", phase_started)
+        self.metrics.increment("cache_request.miss")
+        phase_started = time.perf_counter()
+        
+        if request.prune_profile is not None:
+            # With the unpruned tree cached, only the pruning is left to do
+            index_data = self.cache_repository.get_index(request_hash)
+            if index_data is not None:
+                return self._finish_request(request, request_hash, index_data, timings)
         
         # Cache miss - determine installation method
         installation_method = self._determine_installation_method(
@@ -48,18 +99,41 @@ class HandleCacheRequest:
             request.versions
         )
         
+        # A lockfile whose tarballs are all cached is assembled without running npm
+        index_data = self._assemble(request) if installation_method == 'native' else None
+        if index_data is not None:
+            self._record_phase(timings, "install", phase_started)
+            self.metrics.increment(f"install.{request.manager}.assembled")
+            phase_started = time.perf_counter()
+            manager_version = self._get_manager_version(
+                request.manager, self._get_version_kwargs(request.manager, request.versions)
+            )
+            self._save_bundle_index(request.manager, manager_version, index_data, request_hash)
+            self._index_similarity(request, request.lockfile_content, request_hash)
+            self._record_phase(timings, "store", phase_started)
+            return self._finish_request(request, request_hash, index_data, timings)
+        
         # Install dependencies
         if installation_method == 'docker':
             installation_result = self._install_with_docker(request)
         else:
             installation_result = self._install_natively(request)
         
+        if installation_result.timed_out:
+            self.metrics.increment(f"install.{request.manager}.timeout")
+        if installation_result.killed:
+            self.metrics.increment(f"install.{request.manager}.killed")
         if not installation_result.success:
             raise RuntimeError(f"Installation failed: {installation_result.error_message}")
+        self._record_phase(timings, "install", phase_started)
+        if installation_result.install_mode:
+            # Offline vs online install counts show how often the lockfile fast path is taken
+            self.metrics.increment(f"install.{request.manager}.{installation_result.install_mode}")
+        phase_started = time.perf_counter()
         
         # Create dependency set with installed files
         dep_files = [
-            DependencyFile(file.relative_path, file.content)
+            DependencyFile(file.relative_path, file.content, file.executable, file.link_target, file.is_directory)
             for file in installation_result.files
         ]
         
@@ -70,14 +144,115 @@ class HandleCacheRequest:
         )
         
         # Store in cache using the request hash
-        self._store_dependency_set(dependency_set, request_hash)
+        index_data = self._store_dependency_set(dependency_set, request_hash)
+        lockfile_content = self._installed_lockfile(request, installation_result)
+        self._save_package_subtrees(request, lockfile_content, index_data)
+        self._index_similarity(request, lockfile_content, request_hash)
+        self._record_phase(timings, "store", phase_started)
+        return self._finish_request(request, request_hash, index_data, timings)
+    
+    def _finish_request(self, request: CacheRequest, request_hash: str, index_data: Dict[str, str],
+                        timings: Dict[str, float]) -> CacheResponse:
+        """Prune the indexed tree if the request asks for it, then finish the bundle served."""
+        if request.prune_profile is not None:
+            phase_started = time.perf_counter()
+            request_hash = self._save_pruned_variant(request, request_hash, index_data)
+            self._record_phase(timings, "prune", phase_started)
+        return self._finish_bundle(request_hash, timings)
+    
+    def _save_pruned_variant(self, request: CacheRequest, request_hash: str, index_data: Dict[str, str]) -> str:
+        """Index the request's prune profile variant of a tree and return its hash."""
+        profile = request.prune_profile
+        pruned = profile.prune(index_data)
+        variant_hash = profile.variant_hash(request_hash)
+        manager_version = self._get_manager_version(
+            request.manager, self._get_version_kwargs(request.manager, request.versions)
+        )
+        self._save_bundle_index(request.manager, manager_version, pruned, variant_hash)
+        
+        removed = [value for path, value in index_data.items() if path not in pruned]
+        bytes_saved = sum(
+            self._blob_size(blob_hash) or 0
+            for blob_hash in map(entry_blob_hash, removed) if blob_hash is not None
+        )
+        self.metrics.increment(f"prune.{request.manager}.{profile.name}.files_removed", len(removed))
+        self.metrics.increment(f"prune.{request.manager}.{profile.name}.bytes_saved", bytes_saved)
+        logger.info("Pruned %d files (%d bytes) from bundle %s with profile %s",
+                    len(removed), bytes_saved, request_hash, profile.name)
+        return variant_hash
+    
+    def _blob_size(self, blob_hash: str) -> Optional[int]:
+        # Only local blob storage can tell sizes without downloading
+        blob_storage = getattr(self.cache_repository, "blob_storage", None)
+        return blob_storage.blob_size(blob_hash) if blob_storage is not None else None
+    
+    def _finish_bundle(self, request_hash: str, timings: Dict[str, float]) -> CacheResponse:
+        """Build or schedule the archive of a freshly indexed bundle and answer the miss."""
+        phase_started = time.perf_counter()
+        
+        # Blobs and index are durable: the bundle is ready once its ZIP is
+        # built now (sync), queued (background) or left to the first download (lazy).
+        # An identical tree may already have its archive built
+        if not self.cache_repository.has_bundle(request_hash):
+            if self.zip_build_mode == "sync":
+                self.cache_repository.generate_bundle_zip(request_hash)
+                self._record_phase(timings, "zip", phase_started)
+            elif self.zip_build_mode == "background":
+                self.bundle_builder.schedule(request_hash)
         
         return CacheResponse(
             bundle_hash=request_hash,
             download_url=f"/download/{request_hash}.zip",
-            is_cache_hit=False
+            is_cache_hit=False,
+            timings=timings
         )
     
+    def _is_bundle_ready(self, bundle_hash: str) -> bool:
+        """Whether an indexed bundle can be served without reinstalling."""
+        if self.cache_repository.has_bundle(bundle_hash):
+            return True
+        
+        if self.zip_build_mode == "sync":
+            # An evicted or lost ZIP is rebuilt from the blobs, far cheaper than an install
+            return self._rebuild_archive(bundle_hash)
+        if self.zip_build_mode == "background":
+            # Re-queue builds lost to a restart; no-op if one is in flight
+            self.bundle_builder.schedule(bundle_hash)
+        return True
+    
+    def _rebuild_archive(self, bundle_hash: str) -> bool:
+        """Build the ZIP of an indexed bundle now; False if the blobs cannot produce it."""
+        try:
+            if self.bundle_builder is not None:
+                # Shares the build with any download of the same bundle waiting for it
+                zip_path = self.bundle_builder.ensure_built(bundle_hash)
+            else:
+                zip_path = self.cache_repository.generate_bundle_zip(bundle_hash)
+        except Exception as e:
+            logger.warning("Could not rebuild the archive of bundle %s, reinstalling: %s", bundle_hash, e)
+            return False
+        if zip_path is None:
+            return False
+        self.metrics.increment("cache_request.rebuilt")
+        return True
+    
+    def _record_phase(self, timings: Dict[str, float], phase: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        timings[phase] = elapsed
+        self.metrics.observe(f"cache_request.{phase}", elapsed)
+    
+    @staticmethod
+    def _hashed_install_args(request: CacheRequest) -> List[str]:
+        """
+        The custom arguments that change the installed tree.
+
+        npm always installs with NODE_ENV=production, which already leaves dev
+        dependencies out, so asking for that explicitly shares the plain request's bundle.
+        """
+        if is_production_only(request.manager, request.custom_args):
+            return []
+        return list(request.custom_args or [])
+    
     def _calculate_bundle_hash(self, request: CacheRequest) -> str:
         """Calculate the bundle hash from the request."""
         # Create dependency files from request
@@ -105,6 +280,7 @@ class HandleCacheRequest:
         dep_set = DependencySet(
             manager=request.manager,
             files=files,
+            install_args=self._hashed_install_args(request),
             **self._get_version_kwargs(request.manager, request.versions)
         )
         
@@ -218,14 +394,151 @@ class HandleCacheRequest:
             if request.lockfile_content:
                 (temp_dir / installer.lockfile_name).write_bytes(request.lockfile_content)
             
-            # Install
-            result = installer.install(str(temp_dir))
+            seeded = self._seed_workspace(request, installer, temp_dir)
             
-            return result
+            # Install, reusing the downloads of earlier installs
+            with self._package_cache_session(request.manager) as cache_dir:
+                return installer.install(str(temp_dir), cache_dir=str(cache_dir) if cache_dir else None, seeded=seeded)
             
         finally:
             shutil.rmtree(temp_dir, ignore_errors=True)
     
+    def _assemble(self, request: CacheRequest) -> Optional[Dict[str, str]]:
+        """The bundle index assembled from the lockfile, or None to run the installer."""
+        if (self.npm_assembler is None or self.package_cache is None or request.manager != 'npm'
+                or not request.lockfile_content):
+            return None
+        if request.custom_args and not is_production_only(request.manager, request.custom_args):
+            # Assembly already leaves dev dependencies out, like NODE_ENV=production installs
+            return None
+        try:
+            npm_major = int(str(request.versions.get('npm', '')).split('.')[0])
+        except ValueError:
+            return None
+        if npm_major < MIN_NPM_MAJOR:
+            return None
+        
+        with self._package_cache_session(request.manager) as cache_dir:
+            try:
+                try:
+                    return self.npm_assembler.assemble(request.manifest_content, request.lockfile_content, cache_dir)
+                except MissingTarballs as e:
+                    # Every other package comes from cached subtrees: fetch only the new ones
+                    installer = self.installer_factory.create_installer(
+                        request.manager, request.versions, request.custom_args
+                    )
+                    if not installer.cache_packages(e.specs, str(cache_dir)):
+                        raise
+                    self.metrics.increment("npm_assembler.packages_fetched", len(e.specs))
+                    return self.npm_assembler.assemble(request.manifest_content, request.lockfile_content, cache_dir)
+            except AssemblyUnsupported as e:
+                logger.info("Installing with npm, the lockfile cannot be assembled: %s", e)
+                return None
+    
+    def _installed_lockfile(self, request: CacheRequest, installation_result: InstallationResult) -> Optional[bytes]:
+        """The lockfile the tree was installed from: the request's, or the one npm install generated."""
+        if request.lockfile_content:
+            return request.lockfile_content
+        if request.manager == 'npm':
+            for file in installation_result.files:
+                if file.relative_path == 'package-lock.json':
+                    return file.content
+        return None
+    
+    def _save_package_subtrees(self, request: CacheRequest, lockfile_content: Optional[bytes],
+                               index_data: Dict[str, str]) -> None:
+        """Cache the package subtrees of an npm-installed tree for later composition."""
+        if self.npm_assembler is None or request.manager != 'npm' or request.custom_args or not lockfile_content:
+            return
+        self.npm_assembler.save_package_subtrees(lockfile_content, index_data)
+    
+    def _index_similarity(self, request: CacheRequest, lockfile_content: Optional[bytes], bundle_hash: str) -> None:
+        """Make the bundle findable as a seed for similar lockfiles."""
+        if self.similarity_index is None or not lockfile_content:
+            return
+        packages = lockfile_packages(request.manager, lockfile_content)
+        if packages:
+            self.similarity_index.add(bundle_hash, request.manager, packages)
+    
+    def _seed_workspace(self, request: CacheRequest, installer: DependencyInstaller, work_dir: Path) -> bool:
+        """
+        Start the install from the most similar cached tree instead of an empty
+        directory, so the installer only fetches and writes what differs.
+        
+        Files are hardlinked from the blob store, except those the manager
+        rewrites in place, which are copied.
+        """
+        if self.similarity_index is None or not request.lockfile_content:
+            return False
+        if request.manager == 'npm' and not lockfile_in_sync(request.manifest_content, request.lockfile_content):
+            # Seeding makes npm install instead of npm ci, which would resolve a stale lockfile anew
+            return False
+        packages = lockfile_packages(request.manager, request.lockfile_content)
+        if not packages:
+            return False
+        
+        for bundle_hash, similarity in self.similarity_index.nearest(request.manager, packages):
+            index_data = self.cache_repository.get_index(bundle_hash)
+            if index_data is None:
+                self.similarity_index.remove(bundle_hash)
+                continue
+            if self._materialize(index_data, work_dir / installer.output_folder_name, installer.rewritten_paths):
+                logger.info("Seeded %s install from bundle %s (%.0f%% similar)", request.manager, bundle_hash, similarity * 100)
+                self.metrics.increment(f"seed.{request.manager}")
+                return True
+        return False
+    
+    def _materialize(self, index_data: Dict[str, str], target: Path, rewritten_paths: Tuple[str, ...]) -> bool:
+        """Recreate an indexed tree under target; False (and nothing left behind) if a blob is missing."""
+        link = True
+        try:
+            for relative_path, value in index_data.items():
+                if '..' in Path(relative_path).parts:
+                    continue
+                rewritten = any(
+                    relative_path.startswith(path) if path.endswith('/') else relative_path == path
+                    for path in rewritten_paths
+                )
+                entry = parse_entry(value)
+                if '/' not in relative_path and not rewritten and entry.is_file:
+                    # Loose top-level files (e.g. a generated lockfile) are not the manager's to clean up
+                    continue
+                destination = target / relative_path
+                if entry.is_directory:
+                    destination.mkdir(parents=True, exist_ok=True)
+                    continue
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                if entry.is_symlink:
+                    os.symlink(entry.link_target, destination)
+                    continue
+                blob_path = self.cache_repository.get_blob_path(entry.blob_hash)
+                if entry.executable:
+                    # Blobs are shared read-only; an executable gets its own copy to chmod
+                    shutil.copyfile(blob_path, destination)
+                    os.chmod(destination, entry.mode)
+                    continue
+                if link and not rewritten:
+                    try:
+                        os.link(blob_path, destination)
+                        continue
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:
+                            raise
+                        # The workspace is on another filesystem than the cache
+                        link = False
+                shutil.copyfile(blob_path, destination)
+        except OSError as e:
+            logger.warning("Could not seed the workspace: %s", e)
+            shutil.rmtree(target, ignore_errors=True)
+            return False
+        return True
+    
+    def _package_cache_session(self, manager: str):
+        """Hold the shared download cache of the manager for one install, if one is configured."""
+        if self.package_cache is None:
+            return nullcontext(None)
+        return self.package_cache.use(manager)
+    
     def _install_with_docker(self, request: CacheRequest) -> InstallationResult:
         """Install dependencies using Docker."""
         if not self.docker_utils:
@@ -262,51 +575,56 @@ class HandleCacheRequest:
             shutil.rmtree(temp_dir, ignore_errors=True)
     
     def _collect_files(self, directory: Path) -> List[FileData]:
-        """Collect all files from a directory."""
-        files = []
-        
-        if not directory.exists():
-            return files
-        
-        for root, _, filenames in os.walk(directory):
-            for filename in filenames:
-                file_path = Path(root) / filename
-                relative_path = str(file_path.relative_to(directory))
-                content = file_path.read_bytes()
-                files.append(FileData(relative_path, content))
-        
-        return files
+        """Collect all files, symlinks and empty directories from a directory."""
+        return collect_tree(directory)
     
-    def _store_dependency_set(self, dependency_set: DependencySet, bundle_hash: str) -> None:
-        """Store the dependency set in the cache repository using the provided bundle hash."""
-        import hashlib
-        from domain.hash_constants import HASH_ALGORITHM
-        
-        # Store blobs and save index with the provided bundle hash
+    def _store_dependency_set(self, dependency_set: DependencySet, bundle_hash: str) -> Dict[str, str]:
+        """Store the dependency set in the cache repository, aliased by the provided bundle hash, and return its index."""
         index_data = {}
+        blobs: Dict[str, bytes] = {}
         for file in dependency_set.files:
-            # Calculate file hash
-            hasher = hashlib.new(HASH_ALGORITHM)
-            hasher.update(file.content)
-            file_hash = hasher.hexdigest()
-            
-            self.cache_repository.store_blob(file_hash, file.content)
-            index_data[file.relative_path] = file_hash
+            if not file.has_blob:
+                index_data[file.relative_path] = file.index_value()
+                continue
+            file_hash = calculate_file_hash(file.content)
+            blobs[file_hash] = file.content
+            index_data[file.relative_path] = file.index_value(file_hash)
+        self._store_blobs(blobs)
         
         # Extract manager version info
-        manager = dependency_set.manager
+        manager_version = self._get_manager_version(dependency_set.manager, {
+            'node_version': dependency_set.node_version,
+            'npm_version': dependency_set.npm_version,
+            'php_version': dependency_set.php_version
+        })
+        self._save_bundle_index(dependency_set.manager, manager_version, index_data, bundle_hash)
+        return index_data
+    
+    def _store_blobs(self, blobs: Dict[str, bytes]) -> None:
+        """Store blobs not stored yet, in one batch where the repository supports it (S3)."""
+        missing_blobs = getattr(self.cache_repository, "missing_blobs", None)
+        store_blobs = getattr(self.cache_repository, "store_blobs", None)
+        if missing_blobs is None or store_blobs is None:
+            for blob_hash, content in blobs.items():
+                self.cache_repository.store_blob(blob_hash, content)
+            return
+        missing = missing_blobs(blobs)
+        store_blobs({blob_hash: blobs[blob_hash] for blob_hash in missing}, missing=missing)
+    
+    def _get_manager_version(self, manager: str, version_kwargs: Dict[str, Optional[str]]) -> str:
+        """Manager version component of the index filename."""
         if manager == "npm":
-            node_ver = dependency_set.node_version
-            npm_ver = dependency_set.npm_version
-            manager_version = f"{node_ver}_{npm_ver}" if node_ver and npm_ver else "unknown"
+            node_ver = version_kwargs.get('node_version')
+            npm_ver = version_kwargs.get('npm_version')
+            return f"{node_ver}_{npm_ver}" if node_ver and npm_ver else "unknown"
         elif manager == "composer":
-            php_ver = dependency_set.php_version
-            manager_version = php_ver if php_ver else "unknown"
-        else:
-            manager_version = "unknown"
-        
-        # Save index with the provided bundle hash
-        self.cache_repository.save_index(bundle_hash, manager, manager_version, index_data)
-        
-        # Generate the bundle ZIP file
-        self.cache_repository.generate_bundle_zip(bundle_hash)
\ No newline at end of file
+            php_ver = version_kwargs.get('php_version')
+            return php_ver if php_ver else "unknown"
+        return "unknown"
+    
+    def _save_bundle_index(self, manager: str, manager_version: str, index_data: Dict[str, str], bundle_hash: str) -> None:
+        # Save the index under its content hash and alias the request hash to it,
+        # so requests resolving to the same tree share one index and its archives
+        content_hash = calculate_index_hash(index_data)
+        self.cache_repository.save_index(content_hash, manager, manager_version, index_data)
+        self.cache_repository.save_alias(bundle_hash, content_hash)
\ No newline at end of file
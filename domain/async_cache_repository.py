@@ -0,0 +1,93 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional
+from pathlib import Path
+
+
+class AsyncCacheRepository(ABC):
+    """
+    Asynchronous counterpart of CacheRepository for the async API layer.
+
+    Methods are awaited instead of blocking the event loop, so one worker
+    can interleave many lookups and downloads. Streaming methods return
+    async iterators that read a chunk at a time.
+    """
+
+    @abstractmethod
+    async def get_index(self, bundle_hash: str) -> Optional[Dict[str, str]]:
+        """
+        Retrieve the index for a given bundle hash.
+
+        Returns:
+            Dictionary mapping paths to hashes, or None if not found
+        """
+        pass
+
+    @abstractmethod
+    async def save_index(self, bundle_hash: str, manager: str, manager_version: str, index_data: Dict[str, str]) -> None:
+        """Save the index data under <bundle_hash>.<manager>.<manager_version>.index."""
+        pass
+
+    @abstractmethod
+    async def save_alias(self, request_hash: str, content_hash: str) -> None:
+        """Point a request hash at the content hash of the bundle it resolved to."""
+        pass
+
+    @abstractmethod
+    async def resolve_bundle_hash(self, bundle_hash: str) -> str:
+        """Return the content hash a request hash aliases, or bundle_hash itself."""
+        pass
+
+    @abstractmethod
+    async def has_bundle(self, bundle_hash: str) -> bool:
+        """Check if a bundle's ZIP exists in the cache."""
+        pass
+
+    @abstractmethod
+    async def get_blob(self, blob_hash: str) -> Optional[bytes]:
+        """Retrieve a file blob by its hash, or None if not found."""
+        pass
+
+    @abstractmethod
+    async def store_blob(self, blob_hash: str, content: bytes) -> None:
+        """Store a file blob with its hash."""
+        pass
+
+    @abstractmethod
+    async def blob_size(self, blob_hash: str) -> Optional[int]:
+        """Size in bytes of a blob, or None if it is not stored."""
+        pass
+
+    @abstractmethod
+    async def iter_blob(self, blob_hash: str) -> Optional[AsyncIterator[bytes]]:
+        """
+        Stream a blob's content.
+
+        Returns:
+            Async iterator over the blob's chunks, or None if it is not stored
+        """
+        pass
+
+    @abstractmethod
+    async def generate_bundle_zip(self, bundle_hash: str) -> Optional[Path]:
+        """
+        Generate a bundle's ZIP from its stored blobs.
+
+        Returns:
+            Path to the ZIP, or None if the bundle has no index
+        """
+        pass
+
+    @abstractmethod
+    async def get_bundle_zip_path(self, bundle_hash: str) -> Optional[Path]:
+        """Path to the bundle's ZIP, or None if it is not generated yet."""
+        pass
+
+    @abstractmethod
+    async def stream_bundle_zip(self, bundle_hash: str) -> Optional[AsyncIterator[bytes]]:
+        """
+        Stream a bundle's generated ZIP.
+
+        Returns:
+            Async iterator over the ZIP's chunks, or None if it is not generated yet
+        """
+        pass
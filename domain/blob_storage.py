@@ -1,6 +1,6 @@
 import hashlib
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 from .hash_constants import HASH_ALGORITHM, BLOCK_SIZE
 
 
@@ -53,6 +53,28 @@ class BlobStorage:
                     dst.write(chunk)
         return file_hash
     
+    def blob_size(self, file_hash: str) -> Optional[int]:
+        """
+        Size in bytes of the blob with file_hash, or None if it is not stored.
+        """
+        path = self.objects_dir / file_hash[0:2] / file_hash[2:4] / file_hash
+        try:
+            return path.stat().st_size
+        except OSError:
+            return None
+    
+    def iter_blob(self, file_hash: str, chunk_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+        """
+        Yields the content of the blob with file_hash in chunks.
+        """
+        path = self.objects_dir / file_hash[0:2] / file_hash[2:4] / file_hash
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    
     def read_blob(self, file_hash: str) -> bytes:
         """
         Returns the content of the blob with file_hash.
@@ -0,0 +1,167 @@
+"""Bundle archive formats and HTTP content negotiation."""
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+DEDUP_MARKER = ".dedup"
+
+
+@dataclass(frozen=True)
+class BundleFormat:
+    """An archive format a bundle can be served in."""
+    name: str
+    media_type: str
+    extension: str
+    compression: Optional[str] = None  # None, "gzip" or "zstd" for tar formats
+    hardlinks: bool = False  # Duplicate blobs written once, later paths as hardlinks
+
+    @property
+    def is_tar(self) -> bool:
+        return self.name != "zip"
+
+    def deduplicated(self) -> "BundleFormat":
+        """
+        Variant that stores each distinct blob once and emits hardlink entries
+        for every later path with the same hash. Cached under its own extension.
+
+        Raises:
+            ValueError: If the format cannot carry hardlinks (ZIP)
+        """
+        if not self.is_tar:
+            raise ValueError(f"Format {self.name} does not support hardlink deduplication")
+        if self.hardlinks:
+            return self
+        return replace(self, hardlinks=True, extension=f"{DEDUP_MARKER}{self.extension}")
+
+
+ZIP = BundleFormat("zip", "application/zip", ".zip")
+TAR = BundleFormat("tar", "application/x-tar", ".tar")
+TAR_GZIP = BundleFormat("tar+gzip", "application/gzip", ".tar.gz", "gzip")
+TAR_ZSTD = BundleFormat("tar+zstd", "application/zstd", ".tar.zst", "zstd")
+
+# Server preference order, used to break ties in Accept headers
+BUNDLE_FORMATS: Dict[str, BundleFormat] = {
+    fmt.name: fmt for fmt in (ZIP, TAR_ZSTD, TAR_GZIP, TAR)
+}
+
+FORMAT_ALIASES = {
+    "zip": "zip",
+    "tar": "tar",
+    "tar+gzip": "tar+gzip",
+    "tar.gz": "tar+gzip",
+    "tgz": "tar+gzip",
+    "gzip": "tar+gzip",
+    "tar+zstd": "tar+zstd",
+    "tar.zst": "tar+zstd",
+    "zstd": "tar+zstd",
+}
+
+MEDIA_TYPE_ALIASES = {
+    "application/zip": "zip",
+    "application/x-tar": "tar",
+    "application/gzip": "tar+gzip",
+    "application/x-gzip": "tar+gzip",
+    "application/x-gtar": "tar+gzip",
+    "application/zstd": "tar+zstd",
+    "application/x-zstd": "tar+zstd",
+}
+
+
+def is_format_available(fmt: BundleFormat) -> bool:
+    """Whether the server can produce this format (zstd needs `zstandard`)."""
+    return fmt.compression != "zstd" or zstandard is not None
+
+
+def available_formats() -> List[BundleFormat]:
+    return [fmt for fmt in BUNDLE_FORMATS.values() if is_format_available(fmt)]
+
+
+def split_format_extension(name: str) -> Tuple[str, Optional[BundleFormat]]:
+    """
+    Split a known archive extension off a download name.
+
+    Returns:
+        (bundle_hash, format) where format is None if no extension matched
+    """
+    # Longest extensions first so ".tar.gz" wins over ".gz"-less ".tar"
+    for fmt in sorted(BUNDLE_FORMATS.values(), key=lambda f: len(f.extension), reverse=True):
+        if name.endswith(fmt.extension):
+            base = name[:-len(fmt.extension)]
+            if fmt.is_tar and base.endswith(DEDUP_MARKER):
+                return base[:-len(DEDUP_MARKER)], fmt.deduplicated()
+            return base, fmt
+    return name, None
+
+
+def negotiate_format(accept: Optional[str] = None, requested: Optional[str] = None) -> Optional[BundleFormat]:
+    """
+    Pick the bundle format for a download.
+
+    An explicit `requested` format (query parameter) wins over the Accept
+    header. Without either, ZIP is served for backward compatibility.
+
+    Args:
+        accept: Value of the HTTP Accept header
+        requested: Format name or alias from the query string
+
+    Returns:
+        The chosen BundleFormat, or None if nothing acceptable is available
+
+    Raises:
+        ValueError: If `requested` is not a known format
+    """
+    if requested:
+        name = FORMAT_ALIASES.get(requested.strip().lower())
+        if not name:
+            raise ValueError(f"Unknown bundle format: {requested}")
+        fmt = BUNDLE_FORMATS[name]
+        return fmt if is_format_available(fmt) else None
+
+    if not accept or not accept.strip():
+        return ZIP
+
+    candidates = []
+    for position, (media_type, quality) in enumerate(_parse_accept(accept)):
+        if quality <= 0:
+            continue
+        if media_type in ("*/*", "application/*"):
+            names = [fmt.name for fmt in available_formats()]
+        else:
+            name = MEDIA_TYPE_ALIASES.get(media_type)
+            names = [name] if name else []
+        for name in names:
+            fmt = BUNDLE_FORMATS[name]
+            if is_format_available(fmt):
+                # Wildcards rank below explicit types of equal quality
+                specificity = 0 if "*" in media_type else 1
+                candidates.append((-quality, -specificity, position, fmt))
+
+    if not candidates:
+        return None
+
+    candidates.sort(key=lambda c: c[:3])
+    return candidates[0][3]
+
+
+def _parse_accept(accept: str) -> List[Tuple[str, float]]:
+    entries = []
+    for part in accept.split(","):
+        pieces = [p.strip() for p in part.split(";")]
+        media_type = pieces[0].lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        entries.append((media_type, quality))
+    return entries
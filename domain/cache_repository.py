@@ -63,6 +63,34 @@ class CacheRepository(ABC):
         """
         pass
     
+    @abstractmethod
+    def save_alias(self, request_hash: str, content_hash: str) -> None:
+        """
+        Make a request hash an alias of a content-addressed bundle.
+        
+        Lookups by the request hash must then resolve to content_hash, so that
+        requests producing identical trees share one index and one set of
+        built archives.
+        
+        Args:
+            request_hash: Hash computed from the request (manifest, lockfile, versions)
+            content_hash: Hash computed from the bundle's sorted index
+        """
+        pass
+    
+    @abstractmethod
+    def resolve_bundle_hash(self, bundle_hash: str) -> str:
+        """
+        Resolve a request hash to the content hash it aliases.
+        
+        Args:
+            bundle_hash: A request hash or a content hash
+            
+        Returns:
+            The aliased content hash, or bundle_hash if it is not an alias
+        """
+        pass
+    
     @abstractmethod
     def has_bundle(self, bundle_hash: str) -> bool:
         """
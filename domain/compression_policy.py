@@ -0,0 +1,180 @@
+"""Per-file compression policy for bundle archives."""
+import zlib
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, Optional, Any
+
+
+# Formats whose payload is already entropy-coded; deflating them again
+# burns CPU for a few bytes at best.
+ALREADY_COMPRESSED_EXTENSIONS = frozenset({
+    ".7z", ".avif", ".br", ".bz2", ".eot", ".gif", ".gz", ".heic", ".jar",
+    ".jpeg", ".jpg", ".lz", ".lz4", ".lzma", ".mp3", ".mp4", ".ogg", ".otf",
+    ".phar", ".png", ".rar", ".tgz", ".war", ".webm", ".webp", ".whl",
+    ".woff", ".woff2", ".xz", ".zip", ".zst",
+})
+
+DEFAULT_COMPRESSION_LEVEL = 6
+MIN_COMPRESS_SIZE = 64  # Below this the deflate framing outweighs any savings
+PROBE_SAMPLE_SIZE = 16 * 1024
+PROBE_MIN_SAVINGS = 0.05  # Store if a fast probe saves less than 5%
+REUSED_LABEL = "reused"
+
+
+@dataclass(frozen=True)
+class CompressionDecision:
+    """How a single archive entry should be written."""
+    compress_type: int
+    compress_level: Optional[int]
+    reason: str
+
+    @property
+    def label(self) -> str:
+        if self.compress_type == zipfile.ZIP_STORED:
+            return f"stored:{self.reason}"
+        return f"deflate:{self.compress_level}"
+
+
+@dataclass
+class CompressionChoiceStats:
+    """Accumulated cost and effect of one kind of compression decision."""
+    files: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    cpu_seconds: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.input_bytes - self.output_bytes
+
+
+@dataclass
+class CompressionStats:
+    """Per-decision statistics for one or more bundle builds."""
+    choices: Dict[str, CompressionChoiceStats] = field(default_factory=dict)
+
+    def record(self, decision: CompressionDecision, input_bytes: int, output_bytes: int, cpu_seconds: float) -> None:
+        choice = self.choices.setdefault(decision.label, CompressionChoiceStats())
+        choice.files += 1
+        choice.input_bytes += input_bytes
+        choice.output_bytes += output_bytes
+        choice.cpu_seconds += cpu_seconds
+
+    def record_reuse(self, input_bytes: int, output_bytes: int, cpu_seconds: float) -> None:
+        """Record an entry raw-copied from an existing archive instead of compressed."""
+        choice = self.choices.setdefault(REUSED_LABEL, CompressionChoiceStats())
+        choice.files += 1
+        choice.input_bytes += input_bytes
+        choice.output_bytes += output_bytes
+        choice.cpu_seconds += cpu_seconds
+
+    def merge(self, other: "CompressionStats") -> None:
+        for label, theirs in other.choices.items():
+            ours = self.choices.setdefault(label, CompressionChoiceStats())
+            ours.files += theirs.files
+            ours.input_bytes += theirs.input_bytes
+            ours.output_bytes += theirs.output_bytes
+            ours.cpu_seconds += theirs.cpu_seconds
+
+    @property
+    def bytes_saved(self) -> int:
+        return sum(choice.bytes_saved for choice in self.choices.values())
+
+    @property
+    def cpu_seconds(self) -> float:
+        return sum(choice.cpu_seconds for choice in self.choices.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            label: {
+                "files": choice.files,
+                "input_bytes": choice.input_bytes,
+                "output_bytes": choice.output_bytes,
+                "bytes_saved": choice.bytes_saved,
+                "cpu_seconds": round(choice.cpu_seconds, 6),
+            }
+            for label, choice in sorted(self.choices.items())
+        }
+
+
+class CompressionPolicy:
+    """
+    Chooses STORED or DEFLATED (at a per-manager level) for each bundle entry.
+
+    Files are stored uncompressed when their extension marks them as already
+    compressed, when they are too small for deflate to pay off, or when a
+    level-1 probe over a sample of the content saves less than min_savings.
+    """
+
+    def __init__(
+        self,
+        default_level: int = DEFAULT_COMPRESSION_LEVEL,
+        manager_levels: Optional[Dict[str, int]] = None,
+        min_size: int = MIN_COMPRESS_SIZE,
+        sample_size: int = PROBE_SAMPLE_SIZE,
+        min_savings: float = PROBE_MIN_SAVINGS,
+        stored_extensions: Iterable[str] = ALREADY_COMPRESSED_EXTENSIONS
+    ):
+        for level in [default_level, *(manager_levels or {}).values()]:
+            if not 0 <= level <= 9:
+                raise ValueError(f"Invalid compression level: {level}")
+        self.default_level = default_level
+        self.manager_levels = dict(manager_levels or {})
+        self.min_size = min_size
+        self.sample_size = sample_size
+        self.min_savings = min_savings
+        self.stored_extensions = frozenset(ext.lower() for ext in stored_extensions)
+
+    def level_for(self, manager: Optional[str]) -> int:
+        """Deflate level configured for the manager, or the default level."""
+        if manager and manager in self.manager_levels:
+            return self.manager_levels[manager]
+        return self.default_level
+
+    def reuse_key(self, rel_path: str, manager: Optional[str] = None) -> str:
+        """
+        Everything besides the content that decide() depends on.
+
+        Two entries with the same content and reuse key get the same decision,
+        so one can be raw-copied from an archive holding the other.
+        """
+        level = self.level_for(manager)
+        if level == 0:
+            return "level0"
+        if PurePosixPath(rel_path).suffix.lower() in self.stored_extensions:
+            return "extension"
+        return f"auto:{level}:{self.min_size}:{self.sample_size}:{self.min_savings}"
+
+    def decide(self, rel_path: str, content: bytes, manager: Optional[str] = None) -> CompressionDecision:
+        """
+        Decide how to write one entry.
+
+        Args:
+            rel_path: Path of the entry inside the archive
+            content: Entry content
+            manager: Package manager the bundle belongs to
+
+        Returns:
+            The CompressionDecision for this entry
+        """
+        level = self.level_for(manager)
+        if level == 0:
+            return CompressionDecision(zipfile.ZIP_STORED, None, "level0")
+
+        if PurePosixPath(rel_path).suffix.lower() in self.stored_extensions:
+            return CompressionDecision(zipfile.ZIP_STORED, None, "extension")
+
+        if len(content) < self.min_size:
+            return CompressionDecision(zipfile.ZIP_STORED, None, "tiny")
+
+        if not self._probe_is_compressible(content):
+            return CompressionDecision(zipfile.ZIP_STORED, None, "incompressible")
+
+        return CompressionDecision(zipfile.ZIP_DEFLATED, level, "deflate")
+
+    def _probe_is_compressible(self, content: bytes) -> bool:
+        """Compress a sample at level 1 and check it shrinks enough."""
+        sample = content[:self.sample_size]
+        compressed = zlib.compress(sample, 1)
+        return len(compressed) <= len(sample) * (1 - self.min_savings)
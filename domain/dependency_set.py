@@ -4,13 +4,26 @@ import hashlib
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, field
 from .hash_constants import HASH_ALGORITHM, BLOCK_SIZE
+from .index_entry import IndexEntry
 
 
 @dataclass
 class DependencyFile:
-    """Represents a single file in a dependency set."""
+    """Represents a single file, symlink or empty directory in a dependency set."""
     relative_path: str
     content: bytes
+    executable: bool = False
+    link_target: Optional[str] = None
+    is_directory: bool = False
+
+    @property
+    def has_blob(self) -> bool:
+        """Whether the content is stored; links and empty directories live in the index alone."""
+        return self.link_target is None and not self.is_directory
+
+    def index_value(self, blob_hash: Optional[str] = None) -> str:
+        """The index entry of this file, given the hash its content is stored under."""
+        return IndexEntry(blob_hash, self.executable, self.link_target, self.is_directory).encode()
 
 
 @dataclass
@@ -21,6 +34,8 @@ class DependencySet:
     node_version: Optional[str] = None
     npm_version: Optional[str] = None
     php_version: Optional[str] = None
+    # Custom package manager arguments; they change what gets installed
+    install_args: List[str] = field(default_factory=list)
     
     def calculate_bundle_hash(self) -> str:
         """
@@ -29,6 +44,7 @@ class DependencySet:
         The hash includes:
         - Manager name
         - Version information
+        - Custom install arguments, if any
         - Sorted file paths and their content hashes
         """
         hasher = hashlib.new(HASH_ALGORITHM)
@@ -50,6 +66,13 @@ class DependencySet:
             hasher.update(f"php:{self.php_version}".encode('utf-8'))
             hasher.update(b'\x00')
         
+        # Only when present, so requests without arguments keep their hashes
+        if self.install_args:
+            hasher.update("args:".encode('utf-8'))
+            for arg in self.install_args:
+                hasher.update(arg.encode('utf-8'))
+                hasher.update(b'\x00')
+        
         # Sort files by path for deterministic hashing
         sorted_files = sorted(self.files, key=lambda f: f.relative_path)
         
@@ -94,4 +117,28 @@ def calculate_file_hash(file_content: bytes) -> str:
     for i in range(0, len(file_content), BLOCK_SIZE):
         hasher.update(file_content[i:i + BLOCK_SIZE])
     
+    return hasher.hexdigest()
+
+
+def calculate_index_hash(index_data: Dict[str, str]) -> str:
+    """
+    Calculate the content hash of a bundle from its index.
+    
+    Two installs that produce byte-identical trees get the same hash
+    regardless of which request produced them.
+    
+    Args:
+        index_data: Dictionary mapping relative paths to file hashes
+        
+    Returns:
+        The hexadecimal hash string
+    """
+    hasher = hashlib.new(HASH_ALGORITHM)
+    
+    for relative_path in sorted(index_data):
+        hasher.update(relative_path.encode('utf-8'))
+        hasher.update(b'\x00')
+        hasher.update(str(index_data[relative_path]).encode('utf-8'))
+        hasher.update(b'\x00')
+    
     return hasher.hexdigest()
\ No newline at end of file
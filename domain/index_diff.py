@@ -0,0 +1,60 @@
+"""Differences between two bundle indexes, used for delta bundles."""
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+# Entry carrying the delta metadata inside a delta archive
+DELTA_MANIFEST_PATH = ".dep_cache_proxy-delta.json"
+
+
+@dataclass
+class IndexDiff:
+    """Files to write and paths to remove to turn one bundle into another."""
+    added: Dict[str, str] = field(default_factory=dict)
+    changed: Dict[str, str] = field(default_factory=dict)
+    deleted: List[str] = field(default_factory=list)
+
+    @property
+    def upserts(self) -> Dict[str, str]:
+        """Paths whose content must be written, mapped to their new hashes."""
+        merged = dict(self.added)
+        merged.update(self.changed)
+        return dict(sorted(merged.items()))
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.deleted)
+
+
+def diff_indexes(base: Dict[str, str], target: Dict[str, str]) -> IndexDiff:
+    """
+    Compare two indexes.
+
+    Args:
+        base: Index the client already has
+        target: Index the client wants
+
+    Returns:
+        IndexDiff with added, changed and deleted paths
+    """
+    diff = IndexDiff()
+    for path, file_hash in target.items():
+        base_hash = base.get(path)
+        if base_hash is None:
+            diff.added[path] = file_hash
+        elif base_hash != file_hash:
+            diff.changed[path] = file_hash
+    diff.deleted = sorted(path for path in base if path not in target)
+    return diff
+
+
+def build_delta_manifest(base_hash: str, target_hash: str, diff: IndexDiff) -> bytes:
+    """Serialize the manifest a client needs to apply a delta in place."""
+    manifest = {
+        "base": base_hash,
+        "target": target_hash,
+        "added": sorted(diff.added),
+        "changed": sorted(diff.changed),
+        "deleted": diff.deleted,
+    }
+    return json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
@@ -0,0 +1,96 @@
+"""Index entry values: blob hashes plus the modes, symlinks and empty directories of a tree."""
+import stat
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Values of an index (relative path -> value):
+#   "<hash>"            regular file, mode 0644
+#   "<hash>:755"        executable file
+#   "symlink:<target>"  symbolic link, target relative to the link's directory
+#   "dir:"              empty directory
+# Blob hashes are hex, so a plain hash never collides with the other forms.
+EXECUTABLE_SUFFIX = ":755"
+SYMLINK_PREFIX = "symlink:"
+DIRECTORY_ENTRY = "dir:"
+
+# Permissions are normalized like git does: executable for anyone or not at all
+FILE_MODE = 0o644
+EXECUTABLE_MODE = 0o755
+DIRECTORY_MODE = 0o755
+SYMLINK_MODE = 0o777
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    """One decoded index value."""
+    blob_hash: Optional[str] = None
+    executable: bool = False
+    link_target: Optional[str] = None
+    is_directory: bool = False
+
+    @property
+    def is_file(self) -> bool:
+        return self.blob_hash is not None
+
+    @property
+    def is_symlink(self) -> bool:
+        return self.link_target is not None
+
+    @property
+    def mode(self) -> int:
+        """Permission bits the entry is extracted with."""
+        if self.is_symlink:
+            return SYMLINK_MODE
+        if self.is_directory or self.executable:
+            return EXECUTABLE_MODE
+        return FILE_MODE
+
+    @property
+    def st_mode(self) -> int:
+        """File type and permission bits, as stat() reports them."""
+        if self.is_symlink:
+            return stat.S_IFLNK | SYMLINK_MODE
+        if self.is_directory:
+            return stat.S_IFDIR | DIRECTORY_MODE
+        return stat.S_IFREG | self.mode
+
+    def encode(self) -> str:
+        if self.is_symlink:
+            return SYMLINK_PREFIX + self.link_target
+        if self.is_directory:
+            return DIRECTORY_ENTRY
+        return self.blob_hash + (EXECUTABLE_SUFFIX if self.executable else "")
+
+
+def parse_entry(value: str) -> IndexEntry:
+    """Decode an index value; anything else is taken for a plain blob hash."""
+    if value.startswith(SYMLINK_PREFIX):
+        return IndexEntry(link_target=value[len(SYMLINK_PREFIX):])
+    if value == DIRECTORY_ENTRY:
+        return IndexEntry(is_directory=True)
+    if value.endswith(EXECUTABLE_SUFFIX):
+        return IndexEntry(blob_hash=value[:-len(EXECUTABLE_SUFFIX)], executable=True)
+    return IndexEntry(blob_hash=value)
+
+
+def file_entry(blob_hash: str, executable: bool = False) -> str:
+    return IndexEntry(blob_hash=blob_hash, executable=executable).encode()
+
+
+def symlink_entry(target: str) -> str:
+    return IndexEntry(link_target=target).encode()
+
+
+def is_executable_mode(mode: int) -> bool:
+    """Whether a file with these stat() mode bits is stored as executable."""
+    return bool(mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
+
+
+def entry_blob_hash(value: str) -> Optional[str]:
+    """The blob an index value refers to, None for links and directories."""
+    return parse_entry(value).blob_hash
+
+
+def index_blob_hashes(index_data: Dict[str, str]) -> List[str]:
+    """Blob hashes referenced by an index, one per file entry."""
+    return [blob_hash for blob_hash in map(entry_blob_hash, index_data.values()) if blob_hash is not None]
@@ -0,0 +1,177 @@
+"""Package manager commands run under a deadline, with output streamed to bounded logs."""
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+
+# Seconds an install may run before its process group is terminated
+DEFAULT_INSTALL_TIMEOUTS: Dict[str, float] = {"npm": 600.0, "composer": 900.0}
+# Seconds between SIGTERM and SIGKILL once the deadline has passed
+KILL_GRACE_SECONDS = 10.0
+# Bytes kept on disk per stream; the rest is counted but not written
+LOG_MAX_BYTES = 4 * 1024 * 1024
+# Bytes of the end of each stream kept in memory for error messages
+TAIL_BYTES = 8 * 1024
+# Most recent commands whose logs are kept in the log directory
+MAX_LOGGED_COMMANDS = 100
+
+_READ_SIZE = 64 * 1024
+
+
+@dataclass
+class CommandResult:
+    """Outcome of a command; stdout and stderr hold only the end of each stream."""
+    returncode: int
+    stdout: str
+    stderr: str
+    # The deadline passed and the process group was terminated
+    timed_out: bool = False
+    # Part of the group ignored SIGTERM or outlived the command, and had to be killed
+    killed: bool = False
+    log_paths: List[Path] = field(default_factory=list)
+
+
+class _StreamLog:
+    """Drains one pipe into a size-capped log file and an in-memory tail."""
+
+    def __init__(self, pipe: BinaryIO, log_path: Optional[Path]):
+        self.pipe = pipe
+        self.log_path = log_path
+        self.tail = bytearray()
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self) -> None:
+        written = 0
+        log = open(self.log_path, "wb") if self.log_path else None
+        try:
+            while chunk := self.pipe.read1(_READ_SIZE):
+                self.tail += chunk
+                del self.tail[:-TAIL_BYTES]
+                if log is None:
+                    continue
+                kept = chunk[:max(LOG_MAX_BYTES - written, 0)]
+                log.write(kept)
+                written += len(kept)
+                self.dropped += len(chunk) - len(kept)
+            if log is not None and self.dropped:
+                log.write(f"\n[{self.dropped} more bytes not logged]\n".encode())
+        finally:
+            self.pipe.close()
+            if log is not None:
+                log.close()
+
+    def text(self) -> str:
+        return self.tail.decode("utf-8", errors="replace")
+
+
+def run_install_command(
+    cmd: List[str],
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    log_dir: Optional[Path] = None,
+    log_name: str = "install"
+) -> CommandResult:
+    """
+    Run cmd in its own process group and wait for it at most timeout seconds.
+
+    Past the deadline the whole group (npm and anything it spawned) gets
+    SIGTERM, then SIGKILL after KILL_GRACE_SECONDS. Output is never
+    buffered whole: each stream goes to <log_dir>/<log_name>.<id>.<stream>.log,
+    capped at LOG_MAX_BYTES, and only its last TAIL_BYTES are returned.
+
+    Args:
+        cmd: Command and arguments
+        cwd: Working directory
+        env: Environment, or None to inherit this process's
+        timeout: Deadline in seconds; None or 0 waits indefinitely
+        log_dir: Directory for the logs, or None to keep only the tails
+        log_name: Prefix of the log file names, e.g. the manager
+    """
+    log_paths: List[Path] = []
+    if log_dir is not None:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        _prune_logs(log_dir)
+        run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        log_paths = [log_dir / f"{log_name}.{run_id}.{stream}.log" for stream in ("stdout", "stderr")]
+
+    process = subprocess.Popen(
+        cmd, cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+    )
+    stdout = _StreamLog(process.stdout, log_paths[0] if log_paths else None)
+    stderr = _StreamLog(process.stderr, log_paths[1] if log_paths else None)
+
+    timed_out = killed = False
+    try:
+        try:
+            process.wait(timeout=timeout or None)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            killed = _terminate_group(process)
+        # Children left running after the leader exited still hold the pipes
+        grace_end = time.monotonic() + KILL_GRACE_SECONDS
+        for log in (stdout, stderr):
+            log.thread.join(max(grace_end - time.monotonic(), 0))
+        if stdout.thread.is_alive() or stderr.thread.is_alive():
+            _signal_group(process, signal.SIGKILL)
+            killed = True
+            for log in (stdout, stderr):
+                log.thread.join()
+    finally:
+        if process.poll() is None:
+            # Interrupted while waiting: never leave an install running unattended
+            _signal_group(process, signal.SIGKILL)
+            process.wait()
+
+    return CommandResult(
+        returncode=process.returncode,
+        stdout=stdout.text(),
+        stderr=stderr.text(),
+        timed_out=timed_out,
+        killed=killed,
+        log_paths=log_paths
+    )
+
+
+def _terminate_group(process: subprocess.Popen) -> bool:
+    """SIGTERM the process group, then SIGKILL it if the leader outlives the grace period; True if killed."""
+    _signal_group(process, signal.SIGTERM)
+    try:
+        process.wait(timeout=KILL_GRACE_SECONDS)
+        return False
+    except subprocess.TimeoutExpired:
+        _signal_group(process, signal.SIGKILL)
+        process.wait()
+        return True
+
+
+def _signal_group(process: subprocess.Popen, sig: int) -> None:
+    try:
+        # The leader's pid is the group id: it was started in a new session
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _prune_logs(log_dir: Path) -> None:
+    """Delete all but the logs of the most recent MAX_LOGGED_COMMANDS - 1 commands."""
+    logs = [path for path in log_dir.iterdir() if path.name.endswith(".log")]
+    # Names are <name>.<timestamp>-<id>.<stream>.log: group both streams of a command
+    runs: Dict[str, List[Path]] = {}
+    for path in logs:
+        runs.setdefault(path.name.rsplit(".", 2)[0], []).append(path)
+    stale = sorted(runs, key=lambda run: run.partition(".")[2])[:-(MAX_LOGGED_COMMANDS - 1) or None]
+    for run in stale:
+        for path in runs[run]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,122 @@
+"""Reading package-lock.json v2/v3 and checking its packages against npm's cache."""
+import base64
+import binascii
+import json
+import posixpath
+from pathlib import Path
+from typing import Any, List, Optional
+
+# Algorithms cacache stores content under, strongest first
+CACACHE_ALGORITHMS = ("sha512", "sha384", "sha256", "sha1")
+
+# Dependency maps of the root entry that npm ci checks against package.json
+ROOT_DEPENDENCY_FIELDS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies")
+
+# npm's record of the installed tree, relative to node_modules
+HIDDEN_LOCKFILE = ".package-lock.json"
+
+
+def lockfile_integrities(lockfile_content: bytes) -> Optional[List[str]]:
+    """
+    The integrity strings of every package an install of the lockfile fetches.
+
+    Returns:
+        The integrities, or None if the lockfile is not v2/v3 or has a package
+        without one (git and file dependencies), so its tarballs cannot be
+        checked up front
+    """
+    try:
+        lockfile = json.loads(lockfile_content)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(lockfile, dict):
+        return None
+    version = lockfile.get("lockfileVersion", 1)
+    if not isinstance(version, int) or version < 2:
+        return None
+    packages = lockfile.get("packages")
+    if not isinstance(packages, dict):
+        return None
+
+    integrities = []
+    for path, package in packages.items():
+        if not isinstance(package, dict):
+            return None
+        # The root project, workspace links and dependencies shipped inside another tarball
+        if not path or package.get("link") or package.get("inBundle"):
+            continue
+        integrity = package.get("integrity")
+        if not integrity:
+            return None
+        integrities.append(integrity)
+    return integrities
+
+
+def cacache_content_path(cache_dir: Path, integrity: str) -> Optional[Path]:
+    """
+    Where npm's content-addressed cache keeps the tarball with this integrity.
+
+    cacache stores content under the strongest algorithm of the integrity
+    string: <cache>/_cacache/content-v2/<algo>/<hex[0:2]>/<hex[2:4]>/<hex[4:]>.
+    """
+    digests = {}
+    for entry in integrity.split():
+        algorithm, _, digest = entry.partition("-")
+        digests.setdefault(algorithm, digest.split("?", 1)[0])
+    for algorithm in CACACHE_ALGORITHMS:
+        if algorithm in digests:
+            try:
+                hex_digest = base64.b64decode(digests[algorithm], validate=True).hex()
+            except (binascii.Error, ValueError):
+                return None
+            return cache_dir / "_cacache" / "content-v2" / algorithm / hex_digest[:2] / hex_digest[2:4] / hex_digest[4:]
+    return None
+
+
+def all_packages_cached(lockfile_content: bytes, cache_dir: Path) -> bool:
+    """Whether npm can install the lockfile from cache_dir without any network access."""
+    integrities = lockfile_integrities(lockfile_content)
+    if integrities is None:
+        return False
+    for integrity in integrities:
+        content_path = cacache_content_path(cache_dir, integrity)
+        if content_path is None or not content_path.is_file():
+            return False
+    return True
+
+
+def lockfile_in_sync(manifest_content: bytes, lockfile_content: bytes) -> bool:
+    """
+    Whether a v2/v3 lockfile's root entry declares exactly the package.json
+    dependencies, name and version.
+
+    npm ci refuses lockfiles out of sync with package.json; this stricter
+    check leaves any doubt (and workspaces) to npm itself.
+    """
+    try:
+        manifest = json.loads(manifest_content)
+        lockfile = json.loads(lockfile_content)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    if not isinstance(manifest, dict) or not isinstance(lockfile, dict):
+        return False
+    packages = lockfile.get("packages")
+    root = packages.get("", {}) if isinstance(packages, dict) else None
+    if not isinstance(root, dict):
+        return False
+    if manifest.get("workspaces") or root.get("workspaces"):
+        return False
+    for field in ROOT_DEPENDENCY_FIELDS:
+        if (manifest.get(field) or {}) != (root.get(field) or {}):
+            return False
+    return all(manifest[field] == lockfile.get(field) for field in ("name", "version") if field in manifest)
+
+
+def bin_dir(key: str) -> str:
+    """The .bin directory, relative to node_modules, that npm links a package's bins into."""
+    return (key.rpartition("node_modules/")[0] + "node_modules/.bin")[len("node_modules/"):]
+
+
+def bin_command(name: Any) -> str:
+    """A bin name as npm-normalize-package-bin links it: a bare command name."""
+    return posixpath.basename(posixpath.normpath("/" + str(name)))
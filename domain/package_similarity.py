@@ -0,0 +1,96 @@
+"""MinHash signatures of lockfile package sets, for finding similar dependency trees."""
+import hashlib
+import json
+import random
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: trees sharing ~50% of their packages collide in some band
+# about 2 times in 3, those sharing 90% almost always
+LSH_BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures are persisted and must stay comparable across restarts
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def lockfile_packages(manager: str, lockfile_content: bytes) -> Optional[Set[str]]:
+    """
+    The name@version of every package a lockfile pins.
+
+    Returns:
+        The package set, or None if the lockfile cannot be read
+    """
+    try:
+        lockfile = json.loads(lockfile_content)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(lockfile, dict):
+        return None
+
+    packages: Set[str] = set()
+    if manager == "npm":
+        if isinstance(lockfile.get("packages"), dict):
+            for key, package in lockfile["packages"].items():
+                if key and isinstance(package, dict) and package.get("version"):
+                    name = package.get("name") or key.rpartition("node_modules/")[2]
+                    packages.add(f"{name}@{package['version']}")
+        else:
+            _add_npm_v1_dependencies(lockfile.get("dependencies"), packages)
+    elif manager == "composer":
+        for section in ("packages", "packages-dev"):
+            for package in lockfile.get(section) or []:
+                if isinstance(package, dict) and package.get("name"):
+                    packages.add(f"{package['name']}@{package.get('version')}")
+    else:
+        return None
+    return packages
+
+
+def _add_npm_v1_dependencies(dependencies: Any, packages: Set[str]) -> None:
+    if not isinstance(dependencies, dict):
+        return
+    for name, dependency in dependencies.items():
+        if isinstance(dependency, dict):
+            packages.add(f"{name}@{dependency.get('version')}")
+            _add_npm_v1_dependencies(dependency.get("dependencies"), packages)
+
+
+def minhash_signature(items: Iterable[str]) -> List[int]:
+    """MinHash of a set: per permutation, the minimum of its hashes over the items."""
+    signature = [_MAX_HASH] * NUM_PERMUTATIONS
+    for item in items:
+        value = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        for i, (a, b) in enumerate(_PERMUTATIONS):
+            permuted = ((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH
+            if permuted < signature[i]:
+                signature[i] = permuted
+    return signature
+
+
+def estimate_similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERMUTATIONS
+
+
+def lsh_buckets(signature: List[int]) -> List[str]:
+    """One bucket key per band; similar sets share at least one with high probability."""
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    return [
+        hashlib.blake2b(encode_signature(signature[band * rows:(band + 1) * rows]), digest_size=8).hexdigest()
+        for band in range(LSH_BANDS)
+    ]
+
+
+def encode_signature(signature: List[int]) -> bytes:
+    return struct.pack(f">{len(signature)}I", *signature)
+
+
+def decode_signature(data: bytes) -> List[int]:
+    return list(struct.unpack(f">{len(data) // 4}I", data))
@@ -0,0 +1,157 @@
+"""Prune profiles: rules that strip files deploy targets never use from a bundle."""
+import fnmatch
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .hash_constants import HASH_ALGORITHM
+from .index_entry import DIRECTORY_ENTRY
+
+# Profile name that selects the unpruned bundle, e.g. to override an API key default
+NO_PRUNING = "none"
+
+# Files never pruned, whatever the profile: manifests and licenses
+PROTECTED_PATTERNS = (
+    "package.json", "composer.json", "LICENSE*", "LICENCE*", "COPYING*", "NOTICE*",
+    "license*", "licence*",
+)
+
+_DOCS = ("README*", "readme*", "CHANGELOG*", "changelog*", "HISTORY*", "CHANGES*", "UPGRADE*", "*.md", "*.markdown")
+
+# Built-in profiles per manager. Unanchored patterns match a file or directory
+# name at any depth of a package; patterns with a slash are anchored at the
+# package root; a trailing slash only matches directories.
+BUILTIN_PRUNE_PROFILES: Dict[str, Dict[str, Dict[str, Tuple[str, ...]]]] = {
+    "npm": {
+        "docs": {"remove": _DOCS + ("docs/",), "keep": ()},
+        "slim": {
+            "remove": _DOCS + (
+                "docs/", "test/", "tests/", "__tests__/", "*.test.js", "*.spec.js",
+                "*.map", "*.ts", "*.mts", "*.cts", "*.tsx", ".github/",
+            ),
+            # Type declarations are what TypeScript consumers compile against
+            "keep": ("*.d.ts", "*.d.mts", "*.d.cts"),
+        },
+    },
+    "composer": {
+        "docs": {"remove": _DOCS + ("/doc/", "/docs/"), "keep": ()},
+        "slim": {
+            # Anchored: a PSR-4 namespace directory named Tests can be runtime code
+            "remove": _DOCS + (
+                "/doc/", "/docs/", "/test/", "/tests/", "/Tests/", "/phpunit.xml*", "/.github/",
+            ),
+            "keep": (),
+        },
+    },
+}
+
+
+@dataclass(frozen=True)
+class PruneProfile:
+    """A named set of remove/keep patterns for one package manager's bundles."""
+    manager: str
+    name: str
+    remove: Tuple[str, ...]
+    keep: Tuple[str, ...] = ()
+
+    @property
+    def fingerprint(self) -> str:
+        """Changes whenever the rules do, so edited profiles get fresh cache keys."""
+        hasher = hashlib.new(HASH_ALGORITHM)
+        hasher.update(json.dumps([self.manager, self.name, list(self.remove), list(self.keep)]).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def variant_hash(self, bundle_hash: str) -> str:
+        """The cache key of this profile's variant of a bundle."""
+        hasher = hashlib.new(HASH_ALGORITHM)
+        hasher.update(f"{bundle_hash}\x00prune\x00{self.fingerprint}".encode('utf-8'))
+        return hasher.hexdigest()
+
+    def prune(self, index_data: Dict[str, str]) -> Dict[str, str]:
+        """The index without the files (and empty directories) this profile removes."""
+        return {
+            path: value for path, value in index_data.items()
+            # An empty directory entry is matched like a file inside it would be
+            if not self.removes(path + "/" if value == DIRECTORY_ENTRY else path)
+        }
+
+    def removes(self, path: str) -> bool:
+        """Whether a bundle path (relative to node_modules or vendor) is pruned."""
+        inner = _package_relative_path(self.manager, path)
+        if not inner:
+            # Outside any package: bin links, autoloaders, the hidden lockfile
+            return False
+        parts = inner.split("/")
+        if any(fnmatch.fnmatchcase(parts[-1], pattern) for pattern in PROTECTED_PATTERNS):
+            return False
+        if any(_matches(pattern, parts) for pattern in self.keep):
+            return False
+        return any(_matches(pattern, parts) for pattern in self.remove)
+
+
+def load_prune_profiles(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, PruneProfile]]:
+    """
+    The built-in profiles, plus or replaced by those in overrides.
+
+    Args:
+        overrides: {manager: {profile: {"remove": [...], "keep": [...]}}}
+
+    Raises:
+        ValueError: If overrides are malformed or use the reserved name
+    """
+    profiles: Dict[str, Dict[str, PruneProfile]] = {}
+    for source in (BUILTIN_PRUNE_PROFILES, overrides or {}):
+        if not isinstance(source, dict):
+            raise ValueError("Prune profiles must map managers to profiles")
+        for manager, manager_profiles in source.items():
+            if not isinstance(manager_profiles, dict):
+                raise ValueError(f"Prune profiles for {manager} must map names to rules")
+            for name, rules in manager_profiles.items():
+                if name == NO_PRUNING:
+                    raise ValueError(f"'{NO_PRUNING}' is reserved for unpruned bundles")
+                if not isinstance(rules, dict) or not _is_pattern_list(rules.get("remove")) \
+                        or not _is_pattern_list(rules.get("keep", ())):
+                    raise ValueError(f"Prune profile {manager}/{name} needs a 'remove' list of patterns")
+                profiles.setdefault(manager, {})[name] = PruneProfile(
+                    manager, name, tuple(rules["remove"]), tuple(rules.get("keep", ()))
+                )
+    return profiles
+
+
+def _is_pattern_list(value: Any) -> bool:
+    return isinstance(value, (list, tuple)) and all(isinstance(item, str) and item.strip("/") for item in value)
+
+
+def _package_relative_path(manager: str, path: str) -> str:
+    """The part of a bundle path inside its package, or '' for paths outside any package."""
+    parts = path.split("/")
+    if manager == "npm":
+        # Walk a/node_modules/@s/b/node_modules/c/... down to the innermost package
+        start = 0
+        while True:
+            end = start + (2 if parts[start].startswith("@") else 1)
+            if parts[start].startswith(".") or end >= len(parts):
+                return ""
+            if parts[end] == "node_modules" and end + 1 < len(parts):
+                start = end + 1
+                continue
+            return "/".join(parts[end:])
+    # composer: vendor/<vendor>/<package>/...
+    if len(parts) <= 2 or parts[0] in ("composer", "bin"):
+        return ""
+    return "/".join(parts[2:])
+
+
+def _matches(pattern: str, parts: Iterable[str]) -> bool:
+    parts = list(parts)
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # A file pattern may match the file itself; a directory pattern only its parents
+    candidates = parts[:-1] if directory_only else parts
+    if "/" not in pattern:
+        return any(fnmatch.fnmatchcase(part, pattern) for part in candidates)
+    anchored = pattern.lstrip("/").split("/")
+    if len(anchored) > len(candidates):
+        return False
+    return all(fnmatch.fnmatchcase(part, expected) for part, expected in zip(candidates, anchored))
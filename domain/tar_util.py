@@ -0,0 +1,214 @@
+"""Streaming tar archive writer for bundles built from blob storage."""
+import gzip
+import tarfile
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .blob_storage import BlobStorage
+from .index_entry import entry_blob_hash, parse_entry
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink:
+    """Write-only file object that buffers bytes until drained."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _ArchiveStream:
+    """Optional compression layer in front of a _ChunkSink."""
+
+    def __init__(self, compression: Optional[str], level: Optional[int] = None):
+        self.sink = _ChunkSink()
+        if compression is None:
+            self._writer = self.sink
+        elif compression == "gzip":
+            self._writer = gzip.GzipFile(
+                fileobj=self.sink, mode="wb",
+                compresslevel=GZIP_LEVEL if level is None else level, mtime=0
+            )
+        elif compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstd compression requires the 'zstandard' package")
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL if level is None else level)
+            self._writer = compressor.stream_writer(self.sink, closefd=False)
+        else:
+            raise ValueError(f"Unsupported tar compression: {compression}")
+
+    def write(self, data: bytes) -> None:
+        self._writer.write(data)
+
+    def close(self) -> None:
+        if self._writer is not self.sink:
+            self._writer.close()
+
+
+@dataclass(frozen=True)
+class DuplicationStats:
+    """How much of a bundle is repeated content."""
+    total_files: int
+    unique_files: int
+    total_bytes: int
+    unique_bytes: int
+
+    @property
+    def reduction_ratio(self) -> float:
+        """Fraction of payload bytes removed by writing each blob once."""
+        if not self.total_bytes:
+            return 0.0
+        return 1 - self.unique_bytes / self.total_bytes
+
+
+class TarUtil:
+    """Utility class for streaming tar archives from blob storage."""
+
+    @staticmethod
+    def iter_tar_from_blobs(
+        index_data: Dict[str, str],
+        blob_storage: BlobStorage,
+        compression: Optional[str] = None,
+        level: Optional[int] = None,
+        hardlinks: bool = False
+    ) -> Iterator[bytes]:
+        """
+        Yields a tar archive of index_data chunk by chunk, reading each blob
+        from blob_storage as it goes, so the archive never sits in memory.
+        Entries are sorted by path with a fixed mode and mtime, so the same
+        index always yields the same bytes. Executables keep mode 0755;
+        symlinks and empty directories are written as native tar entries.
+
+        Args:
+            index_data: Dictionary mapping relative paths to index entry values
+            blob_storage: BlobStorage instance to read blobs from
+            compression: None for plain tar, "gzip" or "zstd"
+            level: Compression level (defaults depend on the codec)
+            hardlinks: Write each distinct blob once; later paths with the
+                same hash and mode become hardlink entries to the first path
+
+        Yields:
+            Successive chunks of the (compressed) tar stream
+
+        Raises:
+            OSError: If a blob cannot be read
+        """
+        stream = _ArchiveStream(compression, level)
+        written = 0
+        # A hardlink shares its target's mode, so links are keyed by both
+        first_path_by_file: Dict[Tuple[str, bool], str] = {}
+
+        for rel_path, value in sorted(index_data.items()):
+            entry = parse_entry(value)
+            info = tarfile.TarInfo(rel_path)
+            info.mode = entry.mode
+            info.mtime = 0
+
+            if not entry.is_file:
+                if entry.is_symlink:
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = entry.link_target
+                else:
+                    info.type = tarfile.DIRTYPE
+                header = info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+                stream.write(header)
+                written += len(header)
+                continue
+
+            file_key = (entry.blob_hash, entry.executable)
+            if hardlinks and file_key in first_path_by_file:
+                info.type = tarfile.LNKTYPE
+                info.linkname = first_path_by_file[file_key]
+                header = info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+                stream.write(header)
+                written += len(header)
+                continue
+            first_path_by_file[file_key] = rel_path
+
+            blob_path = blob_storage.get_blob_path(entry.blob_hash)
+            info.size = blob_path.stat().st_size
+            header = info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+            stream.write(header)
+            written += len(header)
+
+            with open(blob_path, "rb") as blob:
+                while True:
+                    chunk = blob.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    stream.write(chunk)
+                    written += len(chunk)
+                    data = stream.sink.drain()
+                    if data:
+                        yield data
+
+            padding = -info.size % tarfile.BLOCKSIZE
+            if padding:
+                stream.write(tarfile.NUL * padding)
+                written += padding
+
+            data = stream.sink.drain()
+            if data:
+                yield data
+
+        # End-of-archive marker, then pad to a full record like tarfile does
+        trailer = tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+        written += len(trailer)
+        trailer += tarfile.NUL * (-written % tarfile.RECORDSIZE)
+        stream.write(trailer)
+        stream.close()
+
+        data = stream.sink.drain()
+        if data:
+            yield data
+
+    @staticmethod
+    def duplication_stats(index_data: Dict[str, str], blob_storage: BlobStorage) -> DuplicationStats:
+        """
+        Measure how many payload bytes a hardlink-deduplicated archive saves.
+
+        Args:
+            index_data: Dictionary mapping relative paths to index entry values
+            blob_storage: BlobStorage instance used to size blobs
+
+        Returns:
+            DuplicationStats for the index's files (links and directories carry no payload)
+        """
+        sizes: Dict[str, int] = {}
+        total_bytes = 0
+        total_files = 0
+        for file_hash in map(entry_blob_hash, index_data.values()):
+            if file_hash is None:
+                continue
+            if file_hash not in sizes:
+                sizes[file_hash] = blob_storage.get_blob_path(file_hash).stat().st_size
+            total_bytes += sizes[file_hash]
+            total_files += 1
+
+        return DuplicationStats(
+            total_files=total_files,
+            unique_files=len(sizes),
+            total_bytes=total_bytes,
+            unique_bytes=sum(sizes.values())
+        )
@@ -0,0 +1,168 @@
+"""Catalog of compressed members in built bundle ZIPs, for raw-copy reuse."""
+import json
+import os
+import struct
+import threading
+import uuid
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+MEMBERS_SUFFIX = ".members"
+
+# Local file header: signature .. filename length, extra length (see zipfile.structFileHeader)
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_LOCAL_HEADER_COMPRESS_TYPE = 4
+_LOCAL_HEADER_CRC = 7
+_LOCAL_HEADER_NAME_LENGTH = 10
+
+
+@dataclass(frozen=True)
+class ZipMember:
+    """Location and parameters of one compressed entry inside a ZIP."""
+    archive: Path
+    header_offset: int
+    data_offset: int
+    compress_type: int
+    compress_size: int
+    file_size: int
+    crc: int
+
+    def iter_raw(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Yield the member's compressed bytes.
+
+        The local header at header_offset is checked first, so an archive
+        rewritten since the member was recorded is never copied from.
+
+        Raises:
+            OSError: If the archive is gone, shorter than recorded, or no
+                longer holds the member where it was recorded
+        """
+        with open(self.archive, "rb") as f:
+            f.seek(self.header_offset)
+            if not self._matches_header(f.read(_LOCAL_HEADER.size)):
+                raise OSError(f"Member at {self.header_offset} of {self.archive} no longer matches its local header")
+            f.seek(self.data_offset)
+            remaining = self.compress_size
+            while remaining:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise OSError(f"Truncated member in {self.archive}")
+                remaining -= len(chunk)
+                yield chunk
+
+    def _matches_header(self, data: bytes) -> bool:
+        """Whether data is a local file header of this member, sizes and CRC included."""
+        if len(data) != _LOCAL_HEADER.size:
+            return False
+        header = _LOCAL_HEADER.unpack(data)
+        name_length, extra_length = header[_LOCAL_HEADER_NAME_LENGTH:]
+        return (
+            header[0] == _LOCAL_HEADER_SIGNATURE
+            and header[_LOCAL_HEADER_COMPRESS_TYPE] == self.compress_type
+            and header[_LOCAL_HEADER_CRC:_LOCAL_HEADER_NAME_LENGTH] == (self.crc, self.compress_size, self.file_size)
+            and self.header_offset + _LOCAL_HEADER.size + name_length + extra_length == self.data_offset
+        )
+
+
+def read_members(zip_path: Path) -> Dict[str, ZipMember]:
+    """
+    Map each entry name of a ZIP to its ZipMember.
+
+    Raises:
+        OSError: If the ZIP cannot be read
+        zipfile.BadZipFile: If it is not a valid ZIP
+    """
+    members: Dict[str, ZipMember] = {}
+    with open(zip_path, "rb") as f, zipfile.ZipFile(f) as zf:
+        for info in zf.infolist():
+            f.seek(info.header_offset)
+            header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            name_length, extra_length = header[_LOCAL_HEADER_NAME_LENGTH:]
+            members[info.filename] = ZipMember(
+                archive=zip_path,
+                header_offset=info.header_offset,
+                data_offset=info.header_offset + _LOCAL_HEADER.size + name_length + extra_length,
+                compress_type=info.compress_type,
+                compress_size=info.compress_size,
+                file_size=info.file_size,
+                crc=info.CRC,
+            )
+    return members
+
+
+class ZipMemberCatalog:
+    """
+    Finds already-compressed copies of a blob in built bundle ZIPs.
+
+    Members are keyed by blob hash plus the compression policy's reuse key,
+    so a copied member is byte-identical to what compressing the blob again
+    would produce. Each ZIP's members are persisted next to it as
+    `<zip>.members` and loaded lazily from the bundles directory.
+    """
+
+    def __init__(self, bundles_dir: Path):
+        self.bundles_dir = bundles_dir
+        self._lock = threading.Lock()
+        self._members: Optional[Dict[Tuple[str, str], ZipMember]] = None
+
+    def lookup(self, blob_hash: str, reuse_key: str) -> Optional[ZipMember]:
+        """Return a member holding blob_hash compressed under reuse_key, if any."""
+        with self._lock:
+            members = self._load()
+            member = members.get((blob_hash, reuse_key))
+            if member is not None and not member.archive.exists():
+                self._forget_archive(member.archive)
+                return None
+            return member
+
+    def record(self, zip_path: Path, entries: Dict[Tuple[str, str], ZipMember]) -> None:
+        """Persist and register the members of a newly built ZIP."""
+        sidecar = zip_path.with_name(zip_path.name + MEMBERS_SUFFIX)
+        tmp_path = sidecar.with_name(f"{sidecar.name}.{uuid.uuid4().hex}.tmp")
+        payload = {
+            f"{blob_hash}:{reuse_key}": [
+                member.header_offset, member.data_offset, member.compress_type,
+                member.compress_size, member.file_size, member.crc,
+            ]
+            for (blob_hash, reuse_key), member in sorted(entries.items())
+        }
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f, sort_keys=True)
+        os.replace(tmp_path, sidecar)
+
+        with self._lock:
+            if self._members is not None:
+                self._members.update(entries)
+
+    def forget(self, zip_path: Path) -> None:
+        """Drop a removed ZIP's members and their sidecar."""
+        zip_path.with_name(zip_path.name + MEMBERS_SUFFIX).unlink(missing_ok=True)
+        with self._lock:
+            if self._members is not None:
+                self._forget_archive(zip_path)
+
+    def _forget_archive(self, zip_path: Path) -> None:
+        for key in [key for key, member in self._members.items() if member.archive == zip_path]:
+            del self._members[key]
+
+    def _load(self) -> Dict[Tuple[str, str], ZipMember]:
+        if self._members is None:
+            self._members = {}
+            for sidecar in self.bundles_dir.rglob(f"*.zip{MEMBERS_SUFFIX}"):
+                archive = sidecar.with_name(sidecar.name[:-len(MEMBERS_SUFFIX)])
+                try:
+                    with open(sidecar) as f:
+                        payload = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                for key, fields in payload.items():
+                    # Sidecars written before header offsets were recorded cannot be verified
+                    if len(fields) != 6:
+                        continue
+                    blob_hash, reuse_key = key.split(":", 1)
+                    self._members[(blob_hash, reuse_key)] = ZipMember(archive, *fields)
+        return self._members
@@ -1,38 +1,189 @@
 """ZIP utility for creating ZIP files from blob storage."""
+import time
 import zipfile
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 from .blob_storage import BlobStorage
+from .compression_policy import CompressionPolicy, CompressionStats
+from .index_entry import parse_entry
+from .zip_members import ZipMember, ZipMemberCatalog
+
+# Fixed entry metadata, so the same index always yields the same bytes
+ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ENTRY_MODE = 0o100644
+UNIX_CREATE_SYSTEM = 3
+# MS-DOS directory attribute, set alongside the Unix mode for directory entries
+MSDOS_DIRECTORY = 0x10
+# Private ZipFile/ZipInfo members raw copies write through (CPython 3.8+); copies fall back without them
+RAW_COPY_ZIPFILE_ATTRS = ("_lock", "_writecheck", "_didModify", "start_dir", "fp", "filelist", "NameToInfo")
+RAW_COPY_ZIPINFO_ATTRS = ("FileHeader",)
 
 
 class ZipUtil:
     """Utility class for creating ZIP files from blob storage."""
-    
+
     @staticmethod
     def create_zip_from_blobs(
-        zip_path: Path, 
-        index_data: Dict[str, str], 
-        blob_storage: BlobStorage
-    ) -> None:
+        zip_path: Path,
+        index_data: Dict[str, str],
+        blob_storage: BlobStorage,
+        policy: Optional[CompressionPolicy] = None,
+        manager: Optional[str] = None,
+        extra_files: Optional[Dict[str, bytes]] = None,
+        reuse: Optional[ZipMemberCatalog] = None
+    ) -> CompressionStats:
         """
         Creates a ZIP at zip_path. For each (relative_path, file_hash)
         in index_data, read the blob via blob_storage.read_blob(file_hash)
         and add it to the ZIP with arcname=relative_path.
-        
+
+        Output is reproducible: entries are written in sorted path order with
+        a fixed timestamp and permissions, and compression is chosen from the
+        content alone, so equal inputs produce byte-identical archives.
+
+        Executables keep mode 0755. Symlinks are written as Unix symlink
+        entries holding the target, and empty directories as directory
+        entries, which unzip and other Unix extractors recreate as such.
+
         Args:
             zip_path: Path where the ZIP file should be created
-            index_data: Dictionary mapping relative paths to file hashes
+            index_data: Dictionary mapping relative paths to index entry values
             blob_storage: BlobStorage instance to read blobs from
-            
+            policy: Compression policy choosing STORED or DEFLATED per entry
+                (defaults to CompressionPolicy())
+            manager: Package manager of the bundle, used for per-manager levels
+            extra_files: Additional in-memory entries (e.g. a delta manifest),
+                written after the indexed files
+            reuse: Catalog of members in already-built ZIPs; blobs found
+                there are raw-copied (compressed bytes, CRC and sizes) instead
+                of being read and compressed again
+
+        Returns:
+            CompressionStats with CPU time and bytes saved per decision
+
         Raises:
             OSError: If ZIP creation fails
             PermissionError: If lacking permissions to write ZIP
         """
+        policy = policy or CompressionPolicy()
+        stats = CompressionStats()
         zip_path.parent.mkdir(parents=True, exist_ok=True)
-        
+
         with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for rel_path, file_hash in index_data.items():
-                blob_bytes = blob_storage.read_blob(file_hash)
-                # To add bytes, use writestr
-                zf.writestr(rel_path, blob_bytes)
\ No newline at end of file
+            for rel_path, value in sorted(index_data.items()):
+                entry = parse_entry(value)
+                if not entry.is_file:
+                    ZipUtil._write_special_entry(zf, rel_path, entry.st_mode, entry.link_target)
+                    continue
+                if reuse is not None:
+                    member = reuse.lookup(entry.blob_hash, policy.reuse_key(rel_path, manager))
+                    if member is not None and ZipUtil._copy_entry(zf, rel_path, member, stats, entry.st_mode):
+                        continue
+                blob_bytes = blob_storage.read_blob(entry.blob_hash)
+                ZipUtil._write_entry(zf, rel_path, blob_bytes, policy, manager, stats, entry.st_mode)
+            for rel_path, content in sorted((extra_files or {}).items()):
+                ZipUtil._write_entry(zf, rel_path, content, policy, manager, stats)
+
+        return stats
+
+    @staticmethod
+    def _entry_info(rel_path: str, mode: int = ENTRY_MODE) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(rel_path, date_time=ENTRY_DATE_TIME)
+        info.create_system = UNIX_CREATE_SYSTEM
+        info.external_attr = mode << 16
+        return info
+
+    @staticmethod
+    def _write_special_entry(zf: zipfile.ZipFile, rel_path: str, mode: int, link_target: Optional[str]) -> None:
+        """Write a symlink (its target as content) or an empty directory entry."""
+        if link_target is None:
+            info = ZipUtil._entry_info(rel_path.rstrip("/") + "/", mode)
+            info.external_attr |= MSDOS_DIRECTORY
+            zf.writestr(info, b"", compress_type=zipfile.ZIP_STORED)
+        else:
+            info = ZipUtil._entry_info(rel_path, mode)
+            zf.writestr(info, link_target.encode("utf-8"), compress_type=zipfile.ZIP_STORED)
+
+    @staticmethod
+    def _copy_entry(
+        zf: zipfile.ZipFile,
+        rel_path: str,
+        member: ZipMember,
+        stats: CompressionStats,
+        mode: int = ENTRY_MODE
+    ) -> bool:
+        """
+        Append member's compressed bytes under rel_path without recompressing.
+
+        Mirrors what ZipFile.writestr does for a seekable file, so the result
+        is byte-identical to compressing the blob again. Returns False, with
+        the archive left as it was, if the member can no longer be read or
+        this Python's ZipFile lacks the internals the copy relies on.
+        """
+        if not _supports_raw_copy(zf):
+            return False
+        info = ZipUtil._entry_info(rel_path, mode)
+        info.compress_type = member.compress_type
+        info.CRC = member.crc
+        info.compress_size = member.compress_size
+        info.file_size = member.file_size
+        zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+
+        started = time.thread_time()
+        # ZipFile has no public API for raw copies; use the same internals
+        # as _open_to_write/_ZipWriteFile.close
+        with zf._lock:
+            zf.fp.seek(zf.start_dir)
+            info.header_offset = zf.fp.tell()
+            zf._writecheck(info)
+            zf._didModify = True
+            try:
+                zf.fp.write(info.FileHeader(zip64))
+                for chunk in member.iter_raw():
+                    zf.fp.write(chunk)
+            except OSError:
+                zf.fp.seek(info.header_offset)
+                zf.fp.truncate()
+                return False
+            zf.start_dir = zf.fp.tell()
+            zf.filelist.append(info)
+            zf.NameToInfo[info.filename] = info
+
+        stats.record_reuse(member.file_size, member.compress_size, time.thread_time() - started)
+        return True
+
+    @staticmethod
+    def _write_entry(
+        zf: zipfile.ZipFile,
+        rel_path: str,
+        content: bytes,
+        policy: CompressionPolicy,
+        manager: Optional[str],
+        stats: CompressionStats,
+        mode: int = ENTRY_MODE
+    ) -> None:
+        # The compressibility probe is part of the policy's cost
+        started = time.thread_time()
+        decision = policy.decide(rel_path, content, manager)
+
+        info = ZipUtil._entry_info(rel_path, mode)
+
+        zf.writestr(
+            info,
+            content,
+            compress_type=decision.compress_type,
+            compresslevel=decision.compress_level
+        )
+        cpu_seconds = time.thread_time() - started
+
+        written = zf.filelist[-1]
+        stats.record(decision, written.file_size, written.compress_size, cpu_seconds)
+
+
+def _supports_raw_copy(zf: zipfile.ZipFile) -> bool:
+    """Whether zf exposes the internals ZipUtil._copy_entry writes through."""
+    return (
+        all(hasattr(zf, name) for name in RAW_COPY_ZIPFILE_ATTRS)
+        and all(hasattr(zipfile.ZipInfo, name) for name in RAW_COPY_ZIPINFO_ATTRS)
+    )
@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+from domain.async_cache_repository import AsyncCacheRepository
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+
+T = TypeVar("T")
+
+# Blocking file and storage calls in flight at once, shared by all requests
+DEFAULT_IO_CONCURRENCY = 32
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class ThreadedAsyncCacheRepository(AsyncCacheRepository):
+    """
+    AsyncCacheRepository over a FileSystemCacheRepository (or a subclass).
+
+    Blocking calls run on a fixed pool of max_concurrency I/O threads
+    instead of the event loop, and streams read one chunk per call, so
+    many downloads interleave on a single worker without a thread per
+    request.
+    """
+
+    def __init__(self, repository: FileSystemCacheRepository, max_concurrency: int = DEFAULT_IO_CONCURRENCY):
+        if max_concurrency <= 0:
+            raise ValueError(f"Invalid I/O concurrency: {max_concurrency}")
+        self.repository = repository
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="repository-io")
+
+    async def get_index(self, bundle_hash: str) -> Optional[Dict[str, str]]:
+        return await self._run(self.repository.get_index, bundle_hash)
+
+    async def save_index(self, bundle_hash: str, manager: str, manager_version: str, index_data: Dict[str, str]) -> None:
+        await self._run(self.repository.save_index, bundle_hash, manager, manager_version, index_data)
+
+    async def save_alias(self, request_hash: str, content_hash: str) -> None:
+        await self._run(self.repository.save_alias, request_hash, content_hash)
+
+    async def resolve_bundle_hash(self, bundle_hash: str) -> str:
+        return await self._run(self.repository.resolve_bundle_hash, bundle_hash)
+
+    async def has_bundle(self, bundle_hash: str) -> bool:
+        return await self._run(self.repository.has_bundle, bundle_hash)
+
+    async def get_blob(self, blob_hash: str) -> Optional[bytes]:
+        return await self._run(self.repository.get_blob, blob_hash)
+
+    async def store_blob(self, blob_hash: str, content: bytes) -> None:
+        await self._run(self.repository.store_blob, blob_hash, content)
+
+    async def blob_size(self, blob_hash: str) -> Optional[int]:
+        return await self._run(self.repository.blob_storage.blob_size, blob_hash)
+
+    async def iter_blob(self, blob_hash: str) -> Optional[AsyncIterator[bytes]]:
+        blob_storage = self.repository.blob_storage
+        # blob_size first: it never creates directories for a missing hash
+        if await self.blob_size(blob_hash) is None:
+            return None
+        blob_path = await self._run(blob_storage.get_blob_path, blob_hash)
+        return await self._open(blob_path)
+
+    async def generate_bundle_zip(self, bundle_hash: str) -> Optional[Path]:
+        return await self._run(self.repository.generate_bundle_zip, bundle_hash)
+
+    async def get_bundle_zip_path(self, bundle_hash: str) -> Optional[Path]:
+        return await self._run(self.repository.get_bundle_zip_path, bundle_hash)
+
+    async def stream_bundle_zip(self, bundle_hash: str) -> Optional[AsyncIterator[bytes]]:
+        zip_path = await self.get_bundle_zip_path(bundle_hash)
+        if zip_path is None:
+            return None
+        return await self._open(zip_path)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def _open(self, path: Path) -> Optional[AsyncIterator[bytes]]:
+        # Opened before returning, so a missing file is reported as None, not mid-stream
+        try:
+            f = await self._run(open, path, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        return self._iter_open_file(f)
+
+    async def _iter_open_file(self, f) -> AsyncIterator[bytes]:
+        try:
+            while chunk := await self._run(f.read, STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await self._run(f.close)
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+
+class SyncCacheRepositoryAdapter:
+    """
+    Blocking facade over an AsyncCacheRepository, for synchronous callers
+    and tests.
+
+    Coroutines run on an event loop in a private thread; async iterators
+    are exposed as plain iterators.
+    """
+
+    def __init__(self, repository: AsyncCacheRepository):
+        self.repository = repository
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="sync-repository-adapter", daemon=True)
+        self._thread.start()
+
+    def get_index(self, bundle_hash: str) -> Optional[Dict[str, str]]:
+        return self._call(self.repository.get_index(bundle_hash))
+
+    def save_index(self, bundle_hash: str, manager: str, manager_version: str, index_data: Dict[str, str]) -> None:
+        self._call(self.repository.save_index(bundle_hash, manager, manager_version, index_data))
+
+    def save_alias(self, request_hash: str, content_hash: str) -> None:
+        self._call(self.repository.save_alias(request_hash, content_hash))
+
+    def resolve_bundle_hash(self, bundle_hash: str) -> str:
+        return self._call(self.repository.resolve_bundle_hash(bundle_hash))
+
+    def has_bundle(self, bundle_hash: str) -> bool:
+        return self._call(self.repository.has_bundle(bundle_hash))
+
+    def exists_bundle(self, bundle_hash: str) -> bool:
+        return self.has_bundle(bundle_hash)
+
+    def get_blob(self, blob_hash: str) -> Optional[bytes]:
+        return self._call(self.repository.get_blob(blob_hash))
+
+    def store_blob(self, blob_hash: str, content: bytes) -> None:
+        self._call(self.repository.store_blob(blob_hash, content))
+
+    def save_blob(self, file_hash: str, content: bytes) -> None:
+        self.store_blob(file_hash, content)
+
+    def blob_size(self, blob_hash: str) -> Optional[int]:
+        return self._call(self.repository.blob_size(blob_hash))
+
+    def iter_blob(self, blob_hash: str) -> Optional[Iterator[bytes]]:
+        chunks = self._call(self.repository.iter_blob(blob_hash))
+        return None if chunks is None else self._iterate(chunks)
+
+    def generate_bundle_zip(self, bundle_hash: str) -> Optional[Path]:
+        return self._call(self.repository.generate_bundle_zip(bundle_hash))
+
+    def get_bundle_zip_path(self, bundle_hash: str) -> Optional[Path]:
+        return self._call(self.repository.get_bundle_zip_path(bundle_hash))
+
+    def stream_bundle_zip(self, bundle_hash: str) -> Optional[Iterator[bytes]]:
+        chunks = self._call(self.repository.stream_bundle_zip(bundle_hash))
+        return None if chunks is None else self._iterate(chunks)
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _call(self, coroutine: Awaitable[T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _iterate(self, chunks: AsyncIterator[bytes]) -> Iterator[bytes]:
+        try:
+            while True:
+                try:
+                    yield self._call(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._call(chunks.aclose())
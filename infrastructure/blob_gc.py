@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+# Blobs younger than this may belong to an install still in flight
+DEFAULT_GRACE_SECONDS = 3600
+DEFAULT_GC_INTERVAL = 600
+DEFAULT_FULL_GC_INTERVAL = 24 * 3600
+# Mark-and-sweep works in batches with a pause in between, to leave disk
+# bandwidth and the index lock to request handling
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCH_PAUSE = 0.05
+
+
+@dataclass
+class GcReport:
+    """Outcome of one garbage collection pass."""
+    indexes_marked: int = 0
+    blobs_scanned: int = 0
+    blobs_removed: int = 0
+    bytes_freed: int = 0
+
+
+class BlobGarbageCollector:
+    """
+    Deletes blobs that no index references.
+
+    The regular pass removes blobs whose reference count, maintained as
+    indexes are written and removed, has dropped to zero. A periodic
+    incremental mark-and-sweep rebuilds the counts from every index on disk
+    and then deletes any blob left uncounted, which catches blobs leaked by
+    failed installs, crashes and caches that predate reference counting.
+    Blobs modified within the grace period are always kept.
+    """
+
+    def __init__(
+        self,
+        cache_repository: FileSystemCacheRepository,
+        grace_seconds: float = DEFAULT_GRACE_SECONDS,
+        interval: float = DEFAULT_GC_INTERVAL,
+        full_interval: float = DEFAULT_FULL_GC_INTERVAL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_pause: float = DEFAULT_BATCH_PAUSE,
+        metrics: Optional[MetricsRegistry] = None
+    ):
+        if batch_size <= 0:
+            raise ValueError(f"Invalid batch size: {batch_size}")
+        self.cache_repository = cache_repository
+        self.grace_seconds = grace_seconds
+        self.interval = interval
+        self.full_interval = full_interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.metrics = metrics or default_metrics
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_full_run: Optional[float] = None
+
+    def start(self) -> None:
+        """Run collection passes every interval seconds in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="blob-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Blob garbage collection failed")
+
+    def run_once(self) -> GcReport:
+        """Mark-and-sweep if the counts are incomplete or a full pass is due, else collect by count."""
+        full_due = (
+            not self.cache_repository.refcounts.is_complete
+            or self._last_full_run is None
+            or time.monotonic() - self._last_full_run >= self.full_interval
+        )
+        return self.mark_and_sweep() if full_due else self.collect()
+
+    def collect(self) -> GcReport:
+        """Delete blobs whose reference count has dropped to zero."""
+        with self._run_lock:
+            started = time.perf_counter()
+            report = GcReport()
+            cutoff = time.time() - self.grace_seconds
+            while not self._stop.is_set():
+                removed, freed = self.cache_repository.collect_unreferenced_blobs(cutoff, self.batch_size)
+                report.blobs_removed += removed
+                report.bytes_freed += freed
+                if removed < self.batch_size:
+                    break
+                self._pause()
+            self._record(report, "blob_gc.collect", started)
+            return report
+
+    def mark_and_sweep(self) -> GcReport:
+        """
+        Rebuild reference counts from all indexes, then delete uncounted blobs.
+
+        Both phases run in batches; request handling keeps writing and
+        removing indexes meanwhile, and those changes are counted too.
+        """
+        with self._run_lock:
+            started = time.perf_counter()
+            repo = self.cache_repository
+            refcounts = repo.refcounts
+            report = GcReport()
+            # Blobs written after this point may belong to indexes not marked yet
+            cutoff = time.time() - self.grace_seconds
+
+            refcounts.begin_rebuild()
+            try:
+                for index_path in repo.iter_index_files():
+                    if self._stop.is_set():
+                        refcounts.abort_rebuild()
+                        return report
+                    repo.mark_index_file(index_path)
+                    report.indexes_marked += 1
+                    if report.indexes_marked % self.batch_size == 0:
+                        self._pause()
+                refcounts.finish_rebuild()
+            except BaseException:
+                refcounts.abort_rebuild()
+                raise
+
+            for directory, _, filenames in os.walk(repo.objects_dir):
+                for blob_hash in filenames:
+                    if self._stop.is_set():
+                        return report
+                    report.blobs_scanned += 1
+                    freed = repo.remove_unreferenced_blob(blob_hash, modified_before=cutoff)
+                    if freed:
+                        report.blobs_removed += 1
+                        report.bytes_freed += freed
+                    if report.blobs_scanned % self.batch_size == 0:
+                        self._pause()
+
+            self._last_full_run = time.monotonic()
+            self._record(report, "blob_gc.mark_and_sweep", started)
+            logger.info(
+                "Mark-and-sweep counted %d indexes, scanned %d blobs and removed %d (%d bytes)",
+                report.indexes_marked, report.blobs_scanned, report.blobs_removed, report.bytes_freed
+            )
+            return report
+
+    def _pause(self) -> None:
+        if self.batch_pause:
+            self._stop.wait(self.batch_pause)
+
+    def _record(self, report: GcReport, name: str, started: float) -> None:
+        self.metrics.observe(name, time.perf_counter() - started)
+        self.metrics.increment("blob_gc.blobs_removed", report.blobs_removed)
+        self.metrics.increment("blob_gc.bytes_freed", report.bytes_freed)
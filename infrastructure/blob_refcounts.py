@@ -0,0 +1,169 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (blob TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_unreferenced ON refs (blob) WHERE count <= 0;
+CREATE TABLE IF NOT EXISTS indexes (name TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+"""
+
+_SHADOW_SCHEMA = """
+DROP TABLE IF EXISTS refs_shadow;
+DROP TABLE IF EXISTS indexes_shadow;
+CREATE TABLE refs_shadow (blob TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE indexes_shadow (name TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+
+class BlobRefCounts:
+    """
+    Persistent count of the indexes referencing each blob, in SQLite.
+
+    Counts are maintained as indexes are written and removed; a blob whose
+    count drops to zero can be deleted. Each index is counted once per
+    distinct blob and is recorded by name, so adding or removing the same
+    index twice has no further effect.
+
+    A full rebuild (mark phase of mark-and-sweep) fills shadow tables that
+    replace the live ones when it finishes; writes made while it runs are
+    applied to both, so the rebuilt counts are never stale.
+    """
+
+    def __init__(self, db_path: Path, complete_if_new: bool = True):
+        is_new = not db_path.exists()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._rebuilding = False
+        if is_new and complete_if_new:
+            self._set_meta("complete", "1")
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether every index on disk is counted (false until a first rebuild on old caches)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'complete'").fetchone()
+            return row is not None and row[0] == "1"
+
+    @property
+    def is_rebuilding(self) -> bool:
+        return self._rebuilding
+
+    def add_index(self, name: str, blobs: Iterable[str]) -> bool:
+        """Count the blobs of a newly written index; returns False if it was already counted."""
+        blobs = sorted(set(blobs))
+        with self._lock, self._transaction():
+            added = self._add(name, blobs, "indexes", "refs")
+            if self._rebuilding:
+                self._add(name, blobs, "indexes_shadow", "refs_shadow")
+            return added
+
+    def remove_index(self, name: str, blobs: Iterable[str]) -> bool:
+        """Uncount the blobs of a removed index; returns False if it was not counted."""
+        blobs = sorted(set(blobs))
+        with self._lock, self._transaction():
+            removed = self._remove(name, blobs, "indexes", "refs")
+            if self._rebuilding:
+                self._remove(name, blobs, "indexes_shadow", "refs_shadow")
+            return removed
+
+    def count(self, blob: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT count FROM refs WHERE blob = ?", (blob,)).fetchone()
+            return row[0] if row else 0
+
+    def unreferenced(self, limit: int, after: str = "") -> List[str]:
+        """Blobs whose count has dropped to zero, in hash order starting after `after`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT blob FROM refs WHERE count <= 0 AND blob > ? ORDER BY blob LIMIT ?", (after, limit)
+            ).fetchall()
+            return [row[0] for row in rows]
+
+    def forget(self, blob: str) -> None:
+        """Drop the row of a deleted, unreferenced blob."""
+        with self._lock:
+            self._conn.execute("DELETE FROM refs WHERE blob = ? AND count <= 0", (blob,))
+
+    def begin_rebuild(self) -> None:
+        """Start recounting from scratch into shadow tables."""
+        with self._lock:
+            self._conn.executescript(_SHADOW_SCHEMA)
+            self._rebuilding = True
+
+    def mark_index(self, name: str, blobs: Iterable[str]) -> None:
+        """Count an index found on disk during a rebuild."""
+        blobs = sorted(set(blobs))
+        with self._lock, self._transaction():
+            self._add(name, blobs, "indexes_shadow", "refs_shadow")
+
+    def finish_rebuild(self) -> None:
+        """Replace the live counts with the rebuilt ones."""
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM refs")
+            self._conn.execute("INSERT INTO refs SELECT blob, count FROM refs_shadow")
+            self._conn.execute("DELETE FROM indexes")
+            self._conn.execute("INSERT INTO indexes SELECT name FROM indexes_shadow")
+            self._conn.execute("DROP TABLE refs_shadow")
+            self._conn.execute("DROP TABLE indexes_shadow")
+            self._set_meta("complete", "1")
+            self._rebuilding = False
+
+    def abort_rebuild(self) -> None:
+        with self._lock:
+            self._conn.executescript("DROP TABLE IF EXISTS refs_shadow; DROP TABLE IF EXISTS indexes_shadow;")
+            self._rebuilding = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _add(self, name: str, blobs: List[str], indexes_table: str, refs_table: str) -> bool:
+        cursor = self._conn.execute(f"INSERT OR IGNORE INTO {indexes_table} (name) VALUES (?)", (name,))
+        if cursor.rowcount == 0:
+            return False
+        self._conn.executemany(
+            f"INSERT INTO {refs_table} (blob, count) VALUES (?, 1) "
+            f"ON CONFLICT (blob) DO UPDATE SET count = count + 1",
+            ((blob,) for blob in blobs)
+        )
+        return True
+
+    def _remove(self, name: str, blobs: List[str], indexes_table: str, refs_table: str) -> bool:
+        cursor = self._conn.execute(f"DELETE FROM {indexes_table} WHERE name = ?", (name,))
+        if cursor.rowcount == 0:
+            return False
+        self._conn.executemany(
+            f"UPDATE {refs_table} SET count = count - 1 WHERE blob = ?",
+            ((blob,) for blob in blobs)
+        )
+        return True
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+
+class _Transaction:
+    """BEGIN/COMMIT around a block, ROLLBACK on error (the connection is in autocommit mode)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
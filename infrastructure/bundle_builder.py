@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from domain.cache_repository import CacheRepository
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+ZIP_BUILD_MODES = ("sync", "background", "lazy")
+
+
+class BundleBuilder:
+    """
+    Builds bundle ZIPs off the request path with single-flight semantics.
+
+    Every build of a given bundle hash goes through one Future, so concurrent
+    callers (a background build and any number of downloaders) wait on the
+    same work instead of compressing the tree several times.
+    """
+
+    def __init__(
+        self,
+        cache_repository: CacheRepository,
+        max_workers: int = 2,
+        metrics: Optional[MetricsRegistry] = None
+    ):
+        self.cache_repository = cache_repository
+        self.metrics = metrics or default_metrics
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bundle-builder")
+        # Re-entrant: a future that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def schedule(self, bundle_hash: str) -> Future:
+        """Start building the bundle ZIP in the background if it is not already running."""
+        with self._lock:
+            future = self._in_flight.get(bundle_hash)
+            if future is None:
+                future = self._executor.submit(self._build, bundle_hash)
+                self._in_flight[bundle_hash] = future
+                future.add_done_callback(lambda _: self._forget(bundle_hash, future))
+            return future
+
+    def ensure_built(self, bundle_hash: str, timeout: Optional[float] = None) -> Optional[Path]:
+        """
+        Return the bundle ZIP path, building it first if needed.
+
+        Blocks until the (possibly already running) build finishes.
+
+        Returns:
+            Path to the ZIP, or None if the bundle has no index
+        """
+        zip_path = self.cache_repository.get_bundle_zip_path(bundle_hash)
+        if zip_path:
+            return zip_path
+        return self.schedule(bundle_hash).result(timeout=timeout)
+
+    def is_building(self, bundle_hash: str) -> bool:
+        with self._lock:
+            return bundle_hash in self._in_flight
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _build(self, bundle_hash: str) -> Optional[Path]:
+        # A build that finished just before we were scheduled leaves nothing to do
+        zip_path = self.cache_repository.get_bundle_zip_path(bundle_hash)
+        if zip_path:
+            return zip_path
+
+        started = time.perf_counter()
+        zip_path = self.cache_repository.generate_bundle_zip(bundle_hash)
+        elapsed = time.perf_counter() - started
+
+        self.metrics.observe("bundle_build.zip", elapsed)
+        if zip_path is None:
+            self.metrics.increment("bundle_build.failed")
+            logger.warning("Bundle build for %s produced no ZIP", bundle_hash)
+        else:
+            self.metrics.increment("bundle_build.completed")
+        return zip_path
+
+    def _forget(self, bundle_hash: str, future: Future) -> None:
+        with self._lock:
+            if self._in_flight.get(bundle_hash) is future:
+                del self._in_flight[bundle_hash]
@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Set, Tuple
+
+from domain.package_similarity import (
+    decode_signature, encode_signature, estimate_similarity, lsh_buckets, minhash_signature
+)
+
+# Below this estimated Jaccard similarity a seed saves too little to be worth materializing
+DEFAULT_MIN_SIMILARITY = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bundles (
+    bundle_hash TEXT PRIMARY KEY, manager TEXT NOT NULL, signature BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    manager TEXT NOT NULL, band INTEGER NOT NULL, bucket TEXT NOT NULL, bundle_hash TEXT NOT NULL,
+    PRIMARY KEY (manager, band, bucket, bundle_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_bundle ON buckets (bundle_hash);
+"""
+
+
+class BundleSimilarityIndex:
+    """
+    Locality-sensitive index of cached bundles by their lockfile's package set.
+
+    Each bundle is stored with the MinHash signature of its name@version
+    set, and filed under one LSH bucket per band. A lookup only compares
+    signatures of bundles sharing a bucket, so it stays cheap however many
+    bundles are cached.
+    """
+
+    def __init__(self, db_path: Path, min_similarity: float = DEFAULT_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, bundle_hash: str, manager: str, packages: Set[str]) -> None:
+        """Index a bundle by the packages of the lockfile it was installed from."""
+        if not packages:
+            return
+        signature = minhash_signature(packages)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO bundles (bundle_hash, manager, signature) VALUES (?, ?, ?)",
+                    (bundle_hash, manager, encode_signature(signature))
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO buckets (manager, band, bucket, bundle_hash) VALUES (?, ?, ?, ?)",
+                    ((manager, band, bucket, bundle_hash) for band, bucket in enumerate(lsh_buckets(signature)))
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def nearest(self, manager: str, packages: Set[str], limit: int = 3) -> List[Tuple[str, float]]:
+        """
+        The most similar indexed bundles, best first.
+
+        Returns:
+            Up to limit (bundle_hash, estimated similarity) pairs at or above min_similarity
+        """
+        if not packages:
+            return []
+        signature = minhash_signature(packages)
+        buckets = list(enumerate(lsh_buckets(signature)))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT b.bundle_hash, b.signature FROM buckets k "
+                "JOIN bundles b ON b.bundle_hash = k.bundle_hash "
+                f"WHERE k.manager = ? AND ({' OR '.join(['(k.band = ? AND k.bucket = ?)'] * len(buckets))})",
+                (manager, *(value for pair in buckets for value in pair))
+            ).fetchall()
+        scored = [(bundle_hash, estimate_similarity(signature, decode_signature(data))) for bundle_hash, data in rows]
+        scored = [pair for pair in scored if pair[1] >= self.min_similarity]
+        scored.sort(key=lambda pair: (-pair[1], pair[0]))
+        return scored[:limit]
+
+    def remove(self, bundle_hash: str) -> None:
+        """Forget a bundle, e.g. one whose index was evicted."""
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE bundle_hash = ?", (bundle_hash,))
+            self._conn.execute("DELETE FROM bundles WHERE bundle_hash = ?", (bundle_hash,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM bundles").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from infrastructure.blob_gc import DEFAULT_GRACE_SECONDS
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository, ZIP_SIDECAR_SUFFIXES
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HIGH_WATERMARK = 0.9
+DEFAULT_LOW_WATERMARK = 0.8
+DEFAULT_EVICTION_INTERVAL = 300
+EVICTION_BATCH_SIZE = 1000
+
+
+@dataclass
+class EvictionReport:
+    """Outcome of one eviction pass."""
+    usage_before: int
+    usage_after: int
+    artifacts_removed: int = 0
+    indexes_removed: int = 0
+    blobs_removed: int = 0
+
+    @property
+    def bytes_freed(self) -> int:
+        return self.usage_before - self.usage_after
+
+
+class CacheEvictor:
+    """
+    Keeps the cache directory under a byte budget.
+
+    When usage exceeds high_watermark * max_bytes, least recently used
+    entries are removed until usage drops to low_watermark * max_bytes:
+    first built archives (bundle ZIPs/tars and deltas, which are regenerated
+    from blobs on demand), then blobs whose reference count dropped to zero,
+    and finally indexes together with the blobs only they referenced. Recency
+    is the access time the repository records on every read. Blobs no count
+    covers (leaks, caches that predate reference counting) are left to the
+    mark-and-sweep of BlobGarbageCollector.
+    """
+
+    # Verb for the pass summary in the log
+    action = "Evicted"
+
+    def __init__(
+        self,
+        cache_repository: FileSystemCacheRepository,
+        max_bytes: int,
+        high_watermark: float = DEFAULT_HIGH_WATERMARK,
+        low_watermark: float = DEFAULT_LOW_WATERMARK,
+        interval: float = DEFAULT_EVICTION_INTERVAL,
+        grace_seconds: float = DEFAULT_GRACE_SECONDS,
+        metrics: Optional[MetricsRegistry] = None
+    ):
+        if max_bytes <= 0:
+            raise ValueError(f"Invalid cache size budget: {max_bytes}")
+        if not 0 < low_watermark < high_watermark <= 1:
+            raise ValueError(
+                f"Watermarks must satisfy 0 < low < high <= 1, got {low_watermark} and {high_watermark}"
+            )
+        self.cache_repository = cache_repository
+        self.max_bytes = max_bytes
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self.metrics = metrics or default_metrics
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Run eviction passes every interval seconds in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="cache-evictor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Cache eviction pass failed")
+
+    def run_once(self) -> EvictionReport:
+        """Measure usage and evict down to the low watermark if above the high one."""
+        with self._run_lock:
+            started = time.perf_counter()
+            usage = self.measure_usage()
+            report = EvictionReport(usage_before=usage, usage_after=usage)
+            if usage > self.max_bytes * self.high_watermark:
+                self._evict(report, int(self.max_bytes * self.low_watermark))
+                logger.info(
+                    "%s %d archives, %d indexes and %d blobs, freeing %d bytes",
+                    self.action, report.artifacts_removed, report.indexes_removed, report.blobs_removed, report.bytes_freed
+                )
+            self.metrics.observe("eviction.run", time.perf_counter() - started)
+            self.metrics.increment("eviction.bytes_freed", report.bytes_freed)
+            return report
+
+    def measure_usage(self) -> int:
+        """
+        Bytes held by the cache: the repository's running totals once they
+        are reconciled (sidecars and aliases are small enough to leave out),
+        a walk of the cache tree until then.
+        """
+        repo = self.cache_repository
+        if repo.cache_stats.is_reconciled:
+            return repo.get_cache_stats()["cache_size_bytes"]
+        return sum(
+            entry.stat().st_size
+            for directory in (repo.objects_dir, repo.indexes_dir, repo.bundles_dir, repo.deltas_dir, repo.aliases_dir)
+            for entry in _walk_files(directory)
+        )
+
+    def _evict(self, report: EvictionReport, target: int) -> None:
+        repo = self.cache_repository
+
+        # 1. Built archives, cheapest to regenerate
+        for _, path in self._lru(self._artifact_files()):
+            if report.usage_after <= target:
+                return
+            report.usage_after -= repo.remove_bundle_artifact(path)
+            report.artifacts_removed += 1
+            self.metrics.increment("eviction.artifacts")
+
+        # 2. Blobs no index references any more
+        cutoff = time.time() - self.grace_seconds
+        self._collect_blobs(report, target, cutoff)
+
+        # 3. Indexes, with the blobs that only they referenced
+        removed_index = False
+        try:
+            for atime, index_file in self._lru(self._index_files()):
+                if report.usage_after <= target or atime > cutoff:
+                    return
+                report.usage_after -= repo.remove_index(index_file)
+                report.indexes_removed += 1
+                removed_index = True
+                self.metrics.increment("eviction.indexes")
+                self._collect_blobs(report, target, cutoff)
+        finally:
+            if removed_index:
+                repo.remove_dangling_aliases()
+
+    def _collect_blobs(self, report: EvictionReport, target: int, cutoff: float) -> None:
+        while report.usage_after > target:
+            removed, freed = self.cache_repository.collect_unreferenced_blobs(cutoff, limit=EVICTION_BATCH_SIZE)
+            report.blobs_removed += removed
+            report.usage_after -= freed
+            self.metrics.increment("eviction.blobs", removed)
+            if removed < EVICTION_BATCH_SIZE:
+                return
+
+    def _artifact_files(self) -> Iterator[Path]:
+        repo = self.cache_repository
+        for directory in (repo.bundles_dir, repo.deltas_dir):
+            for entry in _walk_files(directory):
+                if not entry.name.endswith((".tmp", *ZIP_SIDECAR_SUFFIXES)):
+                    yield Path(entry.path)
+
+    def _index_files(self) -> Iterator[Path]:
+        for entry in _walk_files(self.cache_repository.indexes_dir):
+            if entry.name.endswith(".index"):
+                yield Path(entry.path)
+
+    @staticmethod
+    def _lru(paths) -> List[Tuple[float, Path]]:
+        """Order paths by access time, least recently used first."""
+        entries = []
+        for path in paths:
+            try:
+                entries.append((path.stat().st_atime, path))
+            except OSError:
+                continue
+        entries.sort()
+        return entries
+
+
+def _walk_files(directory: Path) -> Iterator[os.DirEntry]:
+    """Yield the regular files below directory, without following symlinks."""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_files(Path(entry.path))
+        elif entry.is_file(follow_symlinks=False):
+            yield entry
+
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Kinds of cached files, each with a count and a byte counter
+STAT_KINDS = {
+    "blobs": "blob_bytes",
+    "indexes": "index_bytes",
+    "bundles": "bundle_bytes",
+    "archives": "archive_bytes",
+}
+DEFAULT_SAVE_INTERVAL = 30
+UNKNOWN_MANAGER = "unknown"
+
+
+def _empty_counters(include_blobs: bool = True) -> Dict[str, int]:
+    counters = {}
+    for kind, bytes_key in STAT_KINDS.items():
+        if include_blobs or kind != "blobs":
+            counters[kind] = 0
+            counters[bytes_key] = 0
+    return counters
+
+
+class CacheStatsTracker:
+    """
+    Running totals of what the cache holds, updated as files are written and removed.
+
+    Counts and bytes are kept per kind (blobs, indexes, bundle ZIPs, and other
+    archives such as tars and deltas) and, except for blobs which are shared
+    between managers, per package manager. Totals are persisted to a JSON
+    file at most every save_interval seconds and on flush(), so reading them
+    never touches the cache tree. Totals loaded after an unclean shutdown
+    may miss the last writes, so they count as unreconciled until a full
+    rescan (reconcile) replaces them.
+    """
+
+    def __init__(self, path: Path, save_interval: float = DEFAULT_SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._totals = _empty_counters()
+        self._managers: Dict[str, Dict[str, int]] = {}
+        self._reconciled_at: Optional[float] = None
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.is_loaded = self._load()
+
+    def add(self, kind: str, size: int, manager: Optional[str] = None) -> None:
+        self._apply(kind, 1, size, manager)
+
+    def remove(self, kind: str, size: int, manager: Optional[str] = None) -> None:
+        self._apply(kind, -1, -size, manager)
+
+    def replace(self, totals: Dict[str, int], managers: Dict[str, Dict[str, int]]) -> None:
+        """Install totals from a full rescan."""
+        with self._lock:
+            self._totals = {**_empty_counters(), **totals}
+            self._managers = {
+                manager: {**_empty_counters(include_blobs=False), **counters}
+                for manager, counters in managers.items()
+            }
+            self._reconciled_at = time.time()
+            self._dirty = True
+        self.flush()
+
+    @property
+    def is_reconciled(self) -> bool:
+        """Whether the totals ever came from a full scan (or an empty cache)."""
+        with self._lock:
+            return self._reconciled_at is not None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._totals,
+                "managers": {manager: dict(counters) for manager, counters in sorted(self._managers.items())},
+                "reconciled_at": self._reconciled_at,
+            }
+
+    def close(self) -> None:
+        """Persist the totals and record a clean shutdown."""
+        self._save(clean=True)
+
+    def flush(self) -> None:
+        """Persist the totals now if they changed since the last save."""
+        self._save(clean=False)
+
+    def _save(self, clean: bool) -> None:
+        with self._lock:
+            if not self._dirty and not clean:
+                return
+            payload = {
+                "totals": dict(self._totals),
+                "managers": {manager: dict(counters) for manager, counters in self._managers.items()},
+                "reconciled_at": self._reconciled_at,
+                "clean": clean,
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(payload, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save cache stats to %s: %s", self.path, e)
+            with self._lock:
+                self._dirty = True
+
+    def _apply(self, kind: str, count: int, size: int, manager: Optional[str]) -> None:
+        if kind not in STAT_KINDS:
+            raise ValueError(f"Unknown stats kind: {kind}")
+        bytes_key = STAT_KINDS[kind]
+        with self._lock:
+            self._totals[kind] += count
+            self._totals[bytes_key] += size
+            if kind != "blobs":
+                counters = self._managers.setdefault(manager or UNKNOWN_MANAGER, _empty_counters(include_blobs=False))
+                counters[kind] += count
+                counters[bytes_key] += size
+            self._dirty = True
+            save_due = time.monotonic() - self._last_save >= self.save_interval
+        if save_due:
+            self.flush()
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable cache stats %s: %s", self.path, e)
+            return False
+        self._totals = {**_empty_counters(), **payload.get("totals", {})}
+        self._managers = {
+            manager: {**_empty_counters(include_blobs=False), **counters}
+            for manager, counters in payload.get("managers", {}).items()
+        }
+        # Writes after the last periodic save were lost with the process
+        self._reconciled_at = payload.get("reconciled_at") if payload.get("clean") else None
+        return True
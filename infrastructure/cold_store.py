@@ -0,0 +1,162 @@
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Optional
+
+from infrastructure.s3_client import (
+    ClientError, create_s3_client, create_transfer_config, is_not_found, parse_s3_location
+)
+
+
+class ColdStore(ABC):
+    """
+    Large, slower storage behind the local cache directory.
+
+    Objects are addressed by their path relative to the cache directory
+    (e.g. "objects/aa/bb/<hash>"), so a file keeps the same key in both tiers.
+    """
+
+    @abstractmethod
+    def upload(self, key: str, path: Path) -> None:
+        """Store the file at path under key, replacing any previous object."""
+
+    @abstractmethod
+    def download(self, key: str, dest: Path) -> bool:
+        """Write the object to dest atomically; returns False if it does not exist."""
+
+    @abstractmethod
+    def read(self, key: str) -> Optional[bytes]:
+        """Return the object's content, or None if it does not exist."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the object; missing objects are ignored."""
+
+    @abstractmethod
+    def list(self, prefix: str) -> Iterator[str]:
+        """Yield the keys starting with prefix."""
+
+
+class DirectoryColdStore(ColdStore):
+    """Cold tier in a second directory, typically on a larger, slower disk or a network mount."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def upload(self, key: str, path: Path) -> None:
+        dest = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def download(self, key: str, dest: Path) -> bool:
+        source = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(source, tmp_path)
+        except FileNotFoundError:
+            return False
+        os.replace(tmp_path, dest)
+        return True
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def list(self, prefix: str) -> Iterator[str]:
+        # Keys are paths, so only the directory holding the prefix is listed
+        directory, _, name_prefix = prefix.rpartition("/")
+        base = self.root / directory if directory else self.root
+        for current, _, filenames in os.walk(base):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                key = (Path(current) / filename).relative_to(self.root).as_posix()
+                if key.startswith(prefix):
+                    yield key
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+
+class S3ColdStore(ColdStore):
+    """Cold tier in an S3-compatible bucket (requires the optional `boto3` package)."""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None, endpoint_url: Optional[str] = None):
+        self.client = client or create_s3_client(endpoint_url)
+        self.transfer_config = create_transfer_config()
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def upload(self, key: str, path: Path) -> None:
+        # upload_file switches to parallel multipart uploads for large files
+        self.client.upload_file(str(path), self.bucket, self.prefix + key, Config=self.transfer_config)
+
+    def download(self, key: str, dest: Path) -> bool:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            self.client.download_file(self.bucket, self.prefix + key, str(tmp_path), Config=self.transfer_config)
+        except ClientError as e:
+            tmp_path.unlink(missing_ok=True)
+            if is_not_found(e):
+                return False
+            raise
+        os.replace(tmp_path, dest)
+        return True
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if is_not_found(e):
+                return None
+            raise
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if is_not_found(e):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def list(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):]
+
+
+def create_cold_store(location: str) -> ColdStore:
+    """Build a cold store from "s3://bucket[/prefix]" or a directory path."""
+    if location.startswith("s3://"):
+        bucket, prefix = parse_s3_location(location)
+        return S3ColdStore(bucket, prefix, endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+    return DirectoryColdStore(Path(location))
@@ -1,31 +1,52 @@
 import subprocess
 import json
 import logging
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List
 import tempfile
 import os
 import shlex
 import sys
+from contextlib import nullcontext
 from pathlib import Path
 
 # Add the project root to the Python path to enable imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from application.dtos import InstallationResult, FileData
+from domain.installer import collect_tree
+from infrastructure.package_manager_cache import PackageManagerCache
 
 logger = logging.getLogger(__name__)
 
+# Where the shared package manager cache is mounted inside install containers
+CONTAINER_CACHE_DIR = "/package-cache"
+
+# Environment pointing each manager at the mounted cache
+CACHE_ENVIRONMENT = {
+    "npm": {"npm_config_cache": CONTAINER_CACHE_DIR, "npm_config_prefer_offline": "true"},
+    "yarn": {"YARN_CACHE_FOLDER": CONTAINER_CACHE_DIR},
+    "composer": {"COMPOSER_CACHE_DIR": CONTAINER_CACHE_DIR},
+}
+
+
+# Environment every install of the manager runs with, matching the native installers
+INSTALL_ENVIRONMENT = {
+    "npm": {"NODE_ENV": "production"},
+}
+
 
 class DockerUtils:
     """Utilities for handling dependency installation using Docker when version mismatches occur."""
     
-    def __init__(self, use_docker: bool = False):
+    def __init__(self, use_docker: bool = False, package_cache: Optional[PackageManagerCache] = None):
         """
         Initialize Docker utilities.
         
         Args:
             use_docker: Whether to use Docker for version mismatches
+            package_cache: Download caches mounted into install containers
         """
         self.use_docker = use_docker
+        self.package_cache = package_cache
         self._docker_available = None
     
     def is_available(self) -> bool:
@@ -60,7 +81,7 @@ class DockerUtils:
         lockfile_content: bytes,
         manifest_content: Optional[bytes] = None,
         custom_args: Optional[List[str]] = None
-    ) -> List[Tuple[str, bytes]]:
+    ) -> List[FileData]:
         """
         Install dependencies using Docker with specific manager version.
         
@@ -71,7 +92,7 @@ class DockerUtils:
             manifest_content: Optional manifest file content (package.json, composer.json)
             
         Returns:
-            List of tuples (relative_path, file_content)
+            Installed files, symlinks and empty directories
             
         Raises:
             RuntimeError: If Docker installation fails
@@ -103,34 +124,65 @@ class DockerUtils:
             # Build install command
             install_cmd = self._get_install_command(manager, custom_args)
             
-            # Run Docker container
-            docker_cmd = [
-                "docker", "run", "--rm",
-                "-v", f"{temp_dir}:/app",
-                "-w", "/app",
-                image,
-                "sh", "-c", install_cmd
-            ]
-            
-            logger.info("Running Docker command: %s", ' '.join(docker_cmd))
-            
-            try:
-                result = subprocess.run(
-                    docker_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minutes timeout
-                )
+            with self._package_cache_session(manager) as cache_dir:
+                # Run Docker container
+                docker_cmd = [
+                    "docker", "run", "--rm",
+                    *self._get_user_args(),
+                    *self._get_install_env_args(manager),
+                    "-v", f"{temp_dir}:/app",
+                    *self._get_cache_args(manager, cache_dir),
+                    "-w", "/app",
+                    image,
+                    "sh", "-c", install_cmd
+                ]
+                
+                logger.info("Running Docker command: %s", ' '.join(docker_cmd))
                 
-                if result.returncode != 0:
-                    raise RuntimeError(f"Docker installation failed: {result.stderr}")
+                try:
+                    result = subprocess.run(
+                        docker_cmd,
+                        capture_output=True,
+                        text=True,
+                        timeout=300  # 5 minutes timeout
+                    )
                     
-            except subprocess.TimeoutExpired:
-                raise RuntimeError("Docker installation timed out")
+                    if result.returncode != 0:
+                        raise RuntimeError(f"Docker installation failed: {result.stderr}")
+                        
+                except subprocess.TimeoutExpired:
+                    raise RuntimeError("Docker installation timed out")
             
             # Collect installed files
             return self._collect_files(temp_dir, manager)
     
+    def _package_cache_session(self, manager: str):
+        """Hold the shared download cache of the manager for one install, if one is configured."""
+        if self.package_cache is None or manager not in CACHE_ENVIRONMENT:
+            return nullcontext(None)
+        return self.package_cache.use(manager)
+    
+    def _get_user_args(self) -> List[str]:
+        """docker run arguments running the install as the server's user, so it owns what it writes to the mounts."""
+        # HOME points somewhere writable, since the server's uid has no home in the image
+        return ["--user", f"{os.getuid()}:{os.getgid()}", "-e", "HOME=/tmp"]
+    
+    def _get_install_env_args(self, manager: str) -> List[str]:
+        """docker run arguments setting the manager's install environment."""
+        args = []
+        for name, value in INSTALL_ENVIRONMENT.get(manager, {}).items():
+            args.extend(["-e", f"{name}={value}"])
+        return args
+    
+    def _get_cache_args(self, manager: str, cache_dir: Optional[Path]) -> List[str]:
+        """docker run arguments mounting the shared download cache and pointing the manager at it."""
+        if cache_dir is None:
+            return []
+        args = ["-v", f"{cache_dir}:{CONTAINER_CACHE_DIR}"]
+        for name, value in CACHE_ENVIRONMENT[manager].items():
+            args.extend(["-e", f"{name}={value}"])
+        return args
+    
     def _get_lockfile_name(self, manager: str) -> str:
         """Get the lockfile name for a package manager."""
         lockfile_names = {
@@ -198,28 +250,11 @@ class DockerUtils:
             
         return base_cmd
     
-    def _collect_files(self, directory: str, manager: str) -> List[Tuple[str, bytes]]:
-        """Collect all installed files from a directory."""
+    def _collect_files(self, directory: str, manager: str) -> List[FileData]:
+        """Collect all installed files, symlinks and empty directories from a directory."""
         files = []
-        install_dirs = self._get_install_directories(manager)
-        
-        for install_dir in install_dirs:
-            dir_path = os.path.join(directory, install_dir)
-            if not os.path.exists(dir_path):
-                continue
-                
-            for root, _, filenames in os.walk(dir_path):
-                for filename in filenames:
-                    file_path = os.path.join(root, filename)
-                    rel_path = os.path.relpath(file_path, directory)
-                    
-                    try:
-                        with open(file_path, 'rb') as f:
-                            content = f.read()
-                        files.append((rel_path, content))
-                    except Exception as e:
-                        logger.warning(f"Failed to read file {file_path}: {e}")
-                        
+        for install_dir in self._get_install_directories(manager):
+            files.extend(collect_tree(Path(directory) / install_dir, relative_to=Path(directory)))
         return files
     
     def _get_install_directories(self, manager: str) -> List[str]:
@@ -283,13 +318,10 @@ class DockerUtils:
             version = self._get_version_for_docker(manager, versions)
             
             # Call the original docker method
-            file_tuples = self._install_with_docker_internal(
+            files = self._install_with_docker_internal(
                 manager, version, lockfile_content, manifest_content, custom_args
             )
             
-            # Convert to FileData objects
-            files = [FileData(rel_path, content) for rel_path, content in file_tuples]
-            
             return InstallationResult(
                 success=True,
                 files=files,
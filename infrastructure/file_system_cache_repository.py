@@ -1,32 +1,93 @@
 import os
 import json
+import logging
 import shutil
 import zipfile
 import hashlib
+import re
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional, List, Tuple, Any
+from typing import Dict, Iterator, Optional, List, Tuple, Any
 import threading
+import time
 from domain.cache_repository import CacheRepository
 from domain.blob_storage import BlobStorage
 from domain.dependency_set import DependencySet
 from domain.hash_constants import HASH_ALGORITHM
+from domain.index_entry import entry_blob_hash, index_blob_hashes, parse_entry
 from domain.zip_util import ZipUtil
+from domain.zip_members import ZipMemberCatalog, read_members
+from domain.compression_policy import CompressionPolicy, CompressionStats
+from domain.bundle_format import BundleFormat, ZIP
+from domain.tar_util import TarUtil, DuplicationStats
+from domain.index_diff import diff_indexes, build_delta_manifest, DELTA_MANIFEST_PATH
+from infrastructure.blob_refcounts import BlobRefCounts
+from infrastructure.cache_stats import CacheStatsTracker, STAT_KINDS, UNKNOWN_MANAGER
+
+logger = logging.getLogger(__name__)
+
+CHECKSUM_SUFFIX = ".sha256"
+# Sidecar files stored next to a bundle ZIP and removed with it
+ZIP_SIDECAR_SUFFIXES = (CHECKSUM_SUFFIX, ".members")
+# Reads within this many seconds of the recorded access time are not re-recorded
+ACCESS_TIME_RESOLUTION = 60
+# Most (base, target) pairs whose delta requests are counted; the least recently requested are forgotten
+MAX_TRACKED_DELTA_PAIRS = 10000
+# Bundles are stored under their content hash; anything else must not reach a path
+CONTENT_HASH_RE = re.compile(r"[0-9a-f]{64}")
 
 
 class FileSystemCacheRepository(CacheRepository):
-    def __init__(self, cache_dir: Path):
+    def __init__(
+        self,
+        cache_dir: Path,
+        compression_policy: Optional[CompressionPolicy] = None,
+        delta_cache_min_requests: int = 2
+    ):
         self.cache_dir = cache_dir
         self.objects_dir = cache_dir / "objects"
         self.indexes_dir = cache_dir / "indexes"
         self.bundles_dir = cache_dir / "bundles"
+        self.deltas_dir = cache_dir / "deltas"
+        self.aliases_dir = cache_dir / "aliases"
         
         self.objects_dir.mkdir(parents=True, exist_ok=True)
         self.indexes_dir.mkdir(parents=True, exist_ok=True)
         self.bundles_dir.mkdir(parents=True, exist_ok=True)
+        self.deltas_dir.mkdir(parents=True, exist_ok=True)
+        self.aliases_dir.mkdir(parents=True, exist_ok=True)
+        
+        # A (base, target) pair is persisted once it has been requested this often
+        self.delta_cache_min_requests = delta_cache_min_requests
+        self._delta_requests: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
         
         self._lock = threading.Lock()
+        # One lock per bundle being built, with the number of builds holding or waiting on it
+        self._build_locks: Dict[Path, Tuple[threading.Lock, int]] = {}
+        self._build_locks_guard = threading.Lock()
+        # Serializes creating a blob with counting it
+        self._blob_lock = threading.Lock()
+        # Serializes index writes/removals with their reference counting
+        self._index_lock = threading.Lock()
         self.blob_storage = BlobStorage(self.objects_dir)
         self.zip_util = ZipUtil()
+        self.compression_policy = compression_policy or CompressionPolicy()
+        # Compressed members of built ZIPs, raw-copied into new bundles
+        self.zip_members = ZipMemberCatalog(self.bundles_dir)
+        # A new database on a cache that already has indexes needs a full
+        # mark-and-sweep before blobs can be collected by count
+        refcounts_path = cache_dir / "refcounts.sqlite3"
+        is_empty = not any(self.iter_index_files())
+        self.refcounts = BlobRefCounts(refcounts_path, complete_if_new=refcounts_path.exists() or is_empty)
+        # Running totals served by get_cache_stats; a cache without them
+        # needs reconcile_cache_stats() before they can be trusted
+        self.cache_stats = CacheStatsTracker(cache_dir / "stats.json")
+        if not self.cache_stats.is_loaded and is_empty and not any(os.scandir(self.objects_dir)):
+            self.cache_stats.replace({}, {})
+        # Aggregated over every bundle built by this repository
+        self.compression_stats = CompressionStats()
     
     def store_dependency_set(self, dependency_set: DependencySet) -> str:
         """Store a dependency set in the cache and return bundle hash."""
@@ -35,9 +96,12 @@ class FileSystemCacheRepository(CacheRepository):
             index_data = {}
             
             for file in dependency_set.files:
+                if not file.has_blob:
+                    index_data[file.relative_path] = file.index_value()
+                    continue
                 file_hash = self._calculate_hash(file.content)
                 self.store_blob(file_hash, file.content)
-                index_data[file.relative_path] = file_hash
+                index_data[file.relative_path] = file.index_value(file_hash)
             
             # Extract manager and version info from dependency_set
             manager = dependency_set.manager
@@ -63,17 +127,56 @@ class FileSystemCacheRepository(CacheRepository):
             return "unknown"
     
     def save_index(self, bundle_hash: str, manager: str, manager_version: str, index_data: Dict[str, str]) -> None:
-        """Save index with proper naming convention."""
-        # Create index filename: <bundle_hash>.<manager>.<manager_version>.index
-        index_filename = f"{bundle_hash}.{manager}.{manager_version}.index"
-        index_path = self.indexes_dir / bundle_hash[:2] / bundle_hash[2:4] / index_filename
+        """
+        Save index with proper naming convention.
+        
+        Indexes are immutable for a given hash, so an existing index (possibly
+        written by another manager version resolving to the same tree) is kept.
+        """
+        with self._index_lock:
+            if self._find_index_file(bundle_hash):
+                return
+            
+            # Create index filename: <bundle_hash>.<manager>.<manager_version>.index
+            index_filename = f"{bundle_hash}.{manager}.{manager_version}.index"
+            index_path = self.indexes_dir / bundle_hash[:2] / bundle_hash[2:4] / index_filename
+            
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = index_path.with_name(f"{index_filename}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(index_data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, index_path)
+            self.refcounts.add_index(index_filename, index_blob_hashes(index_data))
+            self.cache_stats.add("indexes", index_path.stat().st_size, manager)
+    
+    def save_alias(self, request_hash: str, content_hash: str) -> None:
+        """
+        Point a request hash at the content hash of the bundle it resolved to.
+        
+        Every lookup by request hash (index, ZIP, tar, delta) is then served
+        from the content-addressed bundle shared by all identical trees.
+        """
+        if request_hash == content_hash:
+            return
         
-        index_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(index_path, 'w') as f:
-            json.dump(index_data, f, indent=2, sort_keys=True)
+        alias_path = self._get_alias_path(request_hash)
+        alias_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = alias_path.with_name(f"{alias_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(content_hash)
+        os.replace(tmp_path, alias_path)
+    
+    def resolve_bundle_hash(self, bundle_hash: str) -> str:
+        """Return the content hash a request hash aliases, or bundle_hash itself."""
+        try:
+            target = self._get_alias_path(bundle_hash).read_text().strip()
+        except OSError:
+            return bundle_hash
+        return target or bundle_hash
     
     def get_index(self, bundle_hash: str) -> Optional[Dict[str, str]]:
         """Retrieve the index for a given bundle hash."""
+        bundle_hash = self.resolve_bundle_hash(bundle_hash)
+        
         # Look for any index file matching the bundle hash pattern
         pattern_dir = self.indexes_dir / bundle_hash[:2] / bundle_hash[2:4]
         if not pattern_dir.exists():
@@ -84,7 +187,9 @@ class FileSystemCacheRepository(CacheRepository):
             if index_file.is_file() and index_file.suffix == ".index":
                 try:
                     with open(index_file, 'r') as f:
-                        return json.load(f)
+                        index_data = json.load(f)
+                    self._mark_accessed(index_file)
+                    return index_data
                 except (json.JSONDecodeError, OSError):
                     # Handle corrupted or unreadable index files
                     continue
@@ -101,6 +206,24 @@ class FileSystemCacheRepository(CacheRepository):
         
         return None
     
+    def get_index_manager(self, bundle_hash: str) -> Optional[str]:
+        """Return the manager encoded in the bundle's index filename, if any."""
+        index_file = self._find_index_file(self.resolve_bundle_hash(bundle_hash))
+        if index_file is None:
+            return None
+        # <bundle_hash>.<manager>.<manager_version>.index
+        return index_file.name.split(".", 2)[1]
+    
+    def _find_index_file(self, bundle_hash: str) -> Optional[Path]:
+        pattern_dir = self.indexes_dir / bundle_hash[:2] / bundle_hash[2:4]
+        if not pattern_dir.exists():
+            return None
+        
+        for index_file in pattern_dir.glob(f"{bundle_hash}.*.index"):
+            return index_file
+        
+        return None
+    
     def _get_legacy_index_path(self, bundle_hash: str) -> Path:
         """Get legacy index path for backward compatibility."""
         return self.indexes_dir / bundle_hash[:2] / bundle_hash[2:4] / f"{bundle_hash}.json"
@@ -130,7 +253,26 @@ class FileSystemCacheRepository(CacheRepository):
         blob_path = self._get_blob_path(blob_hash)
         if not blob_path.exists():
             blob_path.parent.mkdir(parents=True, exist_ok=True)
-            blob_path.write_bytes(content)
+            # Written aside and renamed, so a crash never leaves a truncated blob under its hash
+            tmp_path = blob_path.with_name(f"{blob_path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                tmp_path.write_bytes(content)
+                with self._blob_lock:
+                    # Only the store that creates the blob counts it
+                    is_new = not blob_path.exists()
+                    if is_new:
+                        os.replace(tmp_path, blob_path)
+                        self.cache_stats.add("blobs", len(content))
+            finally:
+                tmp_path.unlink(missing_ok=True)
+            if is_new:
+                return
+        # Restart the garbage collection grace period for an install
+        # that is about to reference this blob again
+        try:
+            os.utime(blob_path)
+        except OSError:
+            pass
     
     def save_blob(self, file_hash: str, content: bytes) -> None:
         """Alias for store_blob() to maintain compatibility."""
@@ -138,31 +280,319 @@ class FileSystemCacheRepository(CacheRepository):
     
     def generate_bundle_zip(self, bundle_hash: str) -> Optional[Path]:
         """Generate a ZIP file from stored blobs for a bundle."""
-        with self._lock:
-            index_data = self.get_index(bundle_hash)
-            if not index_data:
-                return None
-            
-            bundle_path = self._get_bundle_path(bundle_hash)
+        index_data = self.get_index(bundle_hash)
+        if not index_data:
+            return None
+        
+        bundle_path = self._get_bundle_path(bundle_hash)
+        # Builds of other bundles, and everything else taking the repository
+        # lock, proceed while this one compresses
+        with self._bundle_build_lock(bundle_path):
+            # Build next to the final path and rename, so readers never see a partial ZIP
+            tmp_path = bundle_path.with_name(f"{bundle_path.name}.{uuid.uuid4().hex}.tmp")
             
             try:
                 bundle_path.parent.mkdir(parents=True, exist_ok=True)
                 
                 # Use ZipUtil to create ZIP from blobs
-                self.zip_util.create_zip_from_blobs(bundle_path, index_data, self.blob_storage)
+                manager = self.get_index_manager(bundle_hash)
+                stats = self.zip_util.create_zip_from_blobs(
+                    tmp_path,
+                    index_data,
+                    self.blob_storage,
+                    policy=self.compression_policy,
+                    manager=manager,
+                    reuse=self.zip_members
+                )
+                self.compression_stats.merge(stats)
+                logger.info(
+                    "Built bundle %s: saved %d bytes in %.3fs CPU %s",
+                    bundle_hash, stats.bytes_saved, stats.cpu_seconds, stats.to_dict()
+                )
+                checksum = self._file_checksum(tmp_path)
+                with self._lock:
+                    # Checksum first: a published ZIP always has its checksum
+                    self._write_checksum(bundle_path, checksum)
+                    self._publish(tmp_path, bundle_path, manager)
+                self._record_zip_members(bundle_path, index_data, manager)
                 
                 return bundle_path
             except (OSError, PermissionError):
                 # Handle file system errors gracefully
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
                 return None
     
+    @contextmanager
+    def _bundle_build_lock(self, bundle_path: Path) -> Iterator[None]:
+        """Serialize builds of one bundle; the lock is dropped once no build waits on it."""
+        with self._build_locks_guard:
+            lock, users = self._build_locks.get(bundle_path, (None, 0))
+            lock = lock or threading.Lock()
+            self._build_locks[bundle_path] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._build_locks_guard:
+                lock, users = self._build_locks[bundle_path]
+                if users == 1:
+                    del self._build_locks[bundle_path]
+                else:
+                    self._build_locks[bundle_path] = (lock, users - 1)
+    
+    def _record_zip_members(self, bundle_path: Path, index_data: Dict[str, str], manager: Optional[str]) -> None:
+        """Register a built ZIP's members so later builds can copy them."""
+        try:
+            members = read_members(bundle_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.warning("Could not catalog members of %s: %s", bundle_path, e)
+            return
+        
+        entries = {
+            (file_hash, self.compression_policy.reuse_key(rel_path, manager)): members[rel_path]
+            for rel_path, file_hash in ((rel_path, entry_blob_hash(value)) for rel_path, value in index_data.items())
+            if file_hash is not None and rel_path in members
+        }
+        try:
+            self.zip_members.record(bundle_path, entries)
+        except OSError as e:
+            logger.warning("Could not catalog members of %s: %s", bundle_path, e)
+    
     def get_bundle_zip_path(self, bundle_hash: str) -> Optional[Path]:
         """Get the path to a bundle's ZIP file if it exists."""
         bundle_path = self._get_bundle_path(bundle_hash)
         if bundle_path.exists():
+            self._mark_accessed(bundle_path)
             return bundle_path
         return None
     
+    def get_bundle_checksum(self, bundle_hash: str) -> Optional[str]:
+        """
+        Return the SHA-256 of the bundle's ZIP, or None if it is not built.
+        
+        The checksum is stored next to the ZIP at build time; ZIPs built
+        before checksums existed are hashed once on first request.
+        """
+        bundle_path = self.get_bundle_zip_path(bundle_hash)
+        if bundle_path is None:
+            return None
+        
+        checksum_path = bundle_path.with_name(bundle_path.name + CHECKSUM_SUFFIX)
+        try:
+            return checksum_path.read_text().strip()
+        except OSError:
+            pass
+        
+        try:
+            checksum = self._file_checksum(bundle_path)
+        except OSError:
+            return None
+        self._write_checksum(bundle_path, checksum)
+        return checksum
+    
+    def _file_checksum(self, path: Path) -> str:
+        hasher = hashlib.sha256()
+        for chunk in self._iter_file(path):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+    
+    def _write_checksum(self, bundle_path: Path, checksum: str) -> None:
+        checksum_path = bundle_path.with_name(bundle_path.name + CHECKSUM_SUFFIX)
+        tmp_path = checksum_path.with_name(f"{checksum_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(checksum)
+        os.replace(tmp_path, checksum_path)
+    
+    def get_bundle_archive_path(self, bundle_hash: str, fmt: BundleFormat) -> Optional[Path]:
+        """Get the path to a bundle archive in the given format if it has been built."""
+        archive_path = self._get_bundle_path(bundle_hash, fmt.extension)
+        if archive_path.exists():
+            self._mark_accessed(archive_path)
+            return archive_path
+        return None
+    
+    def stream_bundle_archive(self, bundle_hash: str, fmt: BundleFormat) -> Optional[Iterator[bytes]]:
+        """
+        Stream a bundle archive in the given format.
+        
+        A previously built archive is streamed from disk. Otherwise tar formats
+        are generated straight from the index and blobs while a copy is written
+        to the bundles directory, so later downloads of the same format are
+        served from the cached artifact. ZIPs are only served once built.
+        """
+        archive_path = self.get_bundle_archive_path(bundle_hash, fmt)
+        if archive_path:
+            return self._iter_file(archive_path)
+        
+        if not fmt.is_tar:
+            return None
+        
+        index_data = self.get_index(bundle_hash)
+        if not index_data:
+            return None
+        
+        return self._iter_and_cache_tar(bundle_hash, fmt, index_data)
+    
+    def _iter_and_cache_tar(self, bundle_hash: str, fmt: BundleFormat, index_data: Dict[str, str]) -> Iterator[bytes]:
+        archive_path = self._get_bundle_path(bundle_hash, fmt.extension)
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name so concurrent first downloads don't clobber each other
+        tmp_path = archive_path.with_name(f"{archive_path.name}.{uuid.uuid4().hex}.tmp")
+        completed = False
+        
+        try:
+            with open(tmp_path, "wb") as out:
+                chunks = TarUtil.iter_tar_from_blobs(
+                    index_data, self.blob_storage, fmt.compression, hardlinks=fmt.hardlinks
+                )
+                for chunk in chunks:
+                    out.write(chunk)
+                    yield chunk
+            self._publish(tmp_path, archive_path, self.get_index_manager(bundle_hash))
+            completed = True
+        finally:
+            if not completed:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+    
+    def get_delta_zip_path(self, base_hash: str, target_hash: str) -> Optional[Path]:
+        """Get the path to a cached delta ZIP for (base, target) if one exists."""
+        try:
+            delta_path = self._get_delta_path(base_hash, target_hash)
+        except ValueError:
+            return None
+        if delta_path.exists():
+            self._mark_accessed(delta_path)
+            return delta_path
+        return None
+    
+    def stream_delta_zip(self, base_hash: str, target_hash: str) -> Optional[Iterator[bytes]]:
+        """
+        Stream a ZIP holding only the files added or changed between two
+        bundles, plus a manifest listing the deleted paths.
+        
+        Deltas for pairs requested at least delta_cache_min_requests times
+        are kept in cache/deltas; colder pairs are built into a temporary
+        file that is removed once streamed.
+        
+        Returns:
+            Iterator over the ZIP bytes, or None if either index is missing
+        """
+        try:
+            delta_path = self._get_delta_path(base_hash, target_hash)
+        except ValueError:
+            return None
+        
+        cached = self.get_delta_zip_path(base_hash, target_hash)
+        if cached:
+            return self._iter_file(cached)
+        
+        base_index = self.get_index(base_hash)
+        target_index = self.get_index(target_hash)
+        if base_index is None or target_index is None:
+            return None
+        
+        with self._lock:
+            key = (base_hash, target_hash)
+            self._delta_requests[key] = self._delta_requests.get(key, 0) + 1
+            self._delta_requests.move_to_end(key)
+            is_hot = self._delta_requests[key] >= self.delta_cache_min_requests
+            while len(self._delta_requests) > MAX_TRACKED_DELTA_PAIRS:
+                self._delta_requests.popitem(last=False)
+        
+        diff = diff_indexes(base_index, target_index)
+        tmp_path = delta_path.with_name(f"{delta_path.name}.{uuid.uuid4().hex}.tmp")
+        manager = self.get_index_manager(target_hash)
+        self.zip_util.create_zip_from_blobs(
+            tmp_path,
+            diff.upserts,
+            self.blob_storage,
+            policy=self.compression_policy,
+            manager=manager,
+            extra_files={DELTA_MANIFEST_PATH: build_delta_manifest(base_hash, target_hash, diff)},
+            reuse=self.zip_members
+        )
+        
+        if is_hot:
+            self._publish(tmp_path, delta_path, manager)
+            with self._lock:
+                self._delta_requests.pop((base_hash, target_hash), None)
+            return self._iter_file(delta_path)
+        
+        return self._iter_and_remove(tmp_path)
+    
+    def _publish(self, tmp_path: Path, artifact_path: Path, manager: Optional[str]) -> None:
+        """Rename a finished archive into place and count it, uncounting any file it replaces."""
+        kind = self._artifact_kind(artifact_path)
+        size = tmp_path.stat().st_size
+        try:
+            replaced = artifact_path.stat().st_size
+        except OSError:
+            replaced = None
+        os.replace(tmp_path, artifact_path)
+        if replaced is not None:
+            self.cache_stats.remove(kind, replaced, manager)
+        self.cache_stats.add(kind, size, manager)
+    
+    def _artifact_kind(self, artifact_path: Path) -> str:
+        """Bundle ZIPs count as bundles; tars and deltas as other archives."""
+        if artifact_path.suffix == ZIP.extension and self.bundles_dir in artifact_path.parents:
+            return "bundles"
+        return "archives"
+    
+    def _iter_and_remove(self, path: Path) -> Iterator[bytes]:
+        try:
+            yield from self._iter_file(path)
+        finally:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    
+    def describe_index(
+        self, bundle_hash: str
+    ) -> Optional[List[Tuple[str, Optional[str], Optional[int], int, Optional[str]]]]:
+        """
+        List a bundle's entries as (path, hash, size, mode, target) tuples, sorted by path.
+        
+        Files have their permission bits as mode (0644 or 0755) and a size
+        that is None for blobs missing from storage. Symlinks (mode 0120777,
+        with their target) and empty directories (mode 040755) have neither
+        hash nor size.
+        """
+        index_data = self.get_index(bundle_hash)
+        if index_data is None:
+            return None
+        
+        sizes: Dict[str, Optional[int]] = {}
+        entries = []
+        for rel_path, value in sorted(index_data.items()):
+            entry = parse_entry(value)
+            if not entry.is_file:
+                entries.append((rel_path, None, None, entry.st_mode, entry.link_target))
+                continue
+            if entry.blob_hash not in sizes:
+                sizes[entry.blob_hash] = self.blob_storage.blob_size(entry.blob_hash)
+            entries.append((rel_path, entry.blob_hash, sizes[entry.blob_hash], entry.mode, None))
+        return entries
+    
+    def get_duplication_stats(self, bundle_hash: str) -> Optional[DuplicationStats]:
+        """Report how much a hardlink-deduplicated archive shrinks the bundle payload."""
+        index_data = self.get_index(bundle_hash)
+        if not index_data:
+            return None
+        return TarUtil.duplication_stats(index_data, self.blob_storage)
+    
+    @staticmethod
+    def _iter_file(path: Path) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            while chunk := f.read(8192):
+                yield chunk
+    
     def get_blob_path(self, file_hash: str) -> Path:
         """Returns the absolute path to the blob given its hash."""
         return self.blob_storage.get_blob_path(file_hash)
@@ -171,42 +601,260 @@ class FileSystemCacheRepository(CacheRepository):
         """Saves (or overwrites) the generated ZIP in cache/bundles/<bundle_hash>.zip."""
         bundle_path = self._get_bundle_path(bundle_hash)
         bundle_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(zip_content_path, bundle_path)
+        tmp_path = bundle_path.with_name(f"{bundle_path.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copy2(zip_content_path, tmp_path)
+        self._publish(tmp_path, bundle_path, self.get_index_manager(bundle_hash))
     
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get statistics about the cache."""
-        total_blobs = 0
-        total_indexes = 0
-        total_bundles = 0
-        cache_size_bytes = 0
-        
-        for blob_file in self.objects_dir.rglob("*"):
-            if blob_file.is_file():
-                total_blobs += 1
-                cache_size_bytes += blob_file.stat().st_size
-        
-        for index_file in self.indexes_dir.rglob("*.index"):
-            if index_file.is_file():
-                total_indexes += 1
-                cache_size_bytes += index_file.stat().st_size
-        
-        # Also count legacy .json indexes
-        for index_file in self.indexes_dir.rglob("*.json"):
-            if index_file.is_file():
-                total_indexes += 1
-                cache_size_bytes += index_file.stat().st_size
+        """
+        Get statistics about the cache.
         
-        for bundle_file in self.bundles_dir.rglob("*.zip"):
-            if bundle_file.is_file():
-                total_bundles += 1
-                cache_size_bytes += bundle_file.stat().st_size
-        
-        return {
-            "total_blobs": total_blobs,
-            "total_indexes": total_indexes,
-            "total_bundles": total_bundles,
-            "cache_size_bytes": cache_size_bytes
-        }
+        Served from running totals, so this never scans the cache tree;
+        reconciled_at is None while they have not been checked against disk.
+        """
+        stats = self.cache_stats.snapshot()
+        stats.update(
+            total_blobs=stats["blobs"],
+            total_indexes=stats["indexes"],
+            total_bundles=stats["bundles"],
+            cache_size_bytes=sum(stats[bytes_key] for bytes_key in STAT_KINDS.values())
+        )
+        return stats
+    
+    def reconcile_cache_stats(self) -> Dict[str, Any]:
+        """
+        Recount the cache tree and replace the running totals.
+        
+        Scans every file, so it is meant for maintenance (after a crash, or
+        on caches that predate the totals); writes made while it runs may be
+        counted twice or not at all.
+        
+        Returns:
+            The reconciled statistics
+        """
+        totals = {kind: 0 for kind in STAT_KINDS}
+        totals.update({bytes_key: 0 for bytes_key in STAT_KINDS.values()})
+        managers: Dict[str, Dict[str, int]] = {}
+        
+        def count(kind: str, path: Path, manager: Optional[str] = None) -> None:
+            try:
+                size = path.stat().st_size
+            except OSError:
+                return
+            totals[kind] += 1
+            totals[STAT_KINDS[kind]] += size
+            if kind != "blobs":
+                counters = managers.setdefault(manager or UNKNOWN_MANAGER, {})
+                counters[kind] = counters.get(kind, 0) + 1
+                counters[STAT_KINDS[kind]] = counters.get(STAT_KINDS[kind], 0) + size
+        
+        for directory, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                count("blobs", Path(directory) / filename)
+        
+        index_managers: Dict[str, Optional[str]] = {}
+        for index_path in self.iter_index_files():
+            bundle_hash = index_path.name.split(".", 1)[0]
+            index_managers[bundle_hash] = self._index_file_manager(index_path)
+            count("indexes", index_path, index_managers[bundle_hash])
+        
+        for root in (self.bundles_dir, self.deltas_dir):
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    if filename.endswith((".tmp", *ZIP_SIDECAR_SUFFIXES)):
+                        continue
+                    path = Path(directory) / filename
+                    bundle_hash = filename.split(".", 1)[0]
+                    count(self._artifact_kind(path), path, index_managers.get(bundle_hash))
+        
+        self.cache_stats.replace(totals, managers)
+        return self.get_cache_stats()
+    
+    @staticmethod
+    def _index_file_manager(index_path: Path) -> Optional[str]:
+        # <bundle_hash>.<manager>.<manager_version>.index; legacy .json indexes carry none
+        if index_path.suffix != ".index":
+            return None
+        return index_path.name.split(".", 2)[1]
+    
+    def _mark_accessed(self, path: Path) -> None:
+        """
+        Record a read in the file's access time, which orders LRU eviction.
+        
+        Set explicitly so eviction also works on noatime/relatime mounts;
+        the modification time is preserved.
+        """
+        try:
+            stat = path.stat()
+            now = time.time()
+            if now - stat.st_atime > ACCESS_TIME_RESOLUTION:
+                os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            pass
+    
+    def remove_bundle_artifact(self, artifact_path: Path) -> int:
+        """
+        Remove a built archive (bundle or delta) and its sidecar files.
+        
+        Returns:
+            Number of bytes freed
+        """
+        freed = 0
+        manager = self.get_index_manager(artifact_path.name.split(".", 1)[0])
+        with self._lock:
+            for path in [artifact_path, *(artifact_path.with_name(artifact_path.name + suffix)
+                                          for suffix in ZIP_SIDECAR_SUFFIXES)]:
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    freed += size
+                except OSError:
+                    continue
+                if path == artifact_path:
+                    self.cache_stats.remove(self._artifact_kind(artifact_path), size, manager)
+            self.zip_members.forget(artifact_path)
+        return freed
+    
+    def remove_index(self, index_path: Path) -> int:
+        """
+        Remove a bundle index together with the archives built from it.
+        
+        Blobs are left in place; garbage collection reclaims those no longer
+        referenced by any index.
+        
+        Returns:
+            Number of bytes freed
+        """
+        bundle_hash = index_path.name.split(".", 1)[0]
+        artifacts = [
+            *self._get_bundle_path(bundle_hash).parent.glob(f"{bundle_hash}.*"),
+            *self.deltas_dir.joinpath(bundle_hash[:2], bundle_hash[2:4]).glob(f"{bundle_hash}.from.*.zip"),
+        ]
+        freed = 0
+        for artifact in artifacts:
+            if not artifact.name.endswith((".tmp", *ZIP_SIDECAR_SUFFIXES)):
+                freed += self.remove_bundle_artifact(artifact)
+        
+        with self._index_lock:
+            blobs = self._read_index_file(index_path)
+            try:
+                size = index_path.stat().st_size
+                index_path.unlink()
+                freed += size
+            except OSError:
+                return freed
+            self.cache_stats.remove("indexes", size, self._index_file_manager(index_path))
+            if blobs is not None:
+                self.refcounts.remove_index(index_path.name, index_blob_hashes(blobs))
+        return freed
+    
+    def iter_index_files(self) -> Iterator[Path]:
+        """Yield every index file, including legacy .json indexes."""
+        for directory, _, filenames in os.walk(self.indexes_dir):
+            for filename in filenames:
+                if filename.endswith((".index", ".json")):
+                    yield Path(directory) / filename
+    
+    def mark_index_file(self, index_path: Path) -> None:
+        """Count an index's blobs into an in-progress reference count rebuild."""
+        with self._index_lock:
+            index_data = self._read_index_file(index_path)
+            if index_data is not None:
+                self.refcounts.mark_index(index_path.name, index_blob_hashes(index_data))
+    
+    def remove_unreferenced_blob(self, blob_hash: str, modified_before: float) -> int:
+        """
+        Remove a blob if no counted index references it and it is older than
+        modified_before (the grace period protecting installs in flight).
+        
+        Returns:
+            Number of bytes freed
+        """
+        with self._index_lock:
+            if self.refcounts.count(blob_hash) > 0:
+                return 0
+            freed = self.remove_blob(blob_hash, modified_before=modified_before)
+            if freed or not self._get_blob_path(blob_hash).exists():
+                self.refcounts.forget(blob_hash)
+            return freed
+    
+    def collect_unreferenced_blobs(self, modified_before: float, limit: int = 1000) -> Tuple[int, int]:
+        """
+        Remove up to limit blobs whose reference count dropped to zero.
+        
+        Does nothing until the reference counts cover every index.
+        
+        Returns:
+            (blobs removed, bytes freed)
+        """
+        if not self.refcounts.is_complete:
+            return 0, 0
+        removed = freed = 0
+        after = ""
+        # Page through, so blobs still in their grace period don't hide older ones
+        while removed < limit:
+            candidates = self.refcounts.unreferenced(limit, after)
+            if not candidates:
+                break
+            for blob_hash in candidates:
+                blob_freed = self.remove_unreferenced_blob(blob_hash, modified_before)
+                if blob_freed:
+                    removed += 1
+                    freed += blob_freed
+                    if removed >= limit:
+                        break
+            after = candidates[-1]
+        return removed, freed
+    
+    @staticmethod
+    def _read_index_file(index_path: Path) -> Optional[Dict[str, str]]:
+        try:
+            with open(index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def remove_blob(self, blob_hash: str, modified_before: Optional[float] = None) -> int:
+        """
+        Remove a blob from storage.
+        
+        Args:
+            blob_hash: Hash of the blob
+            modified_before: Keep the blob if it was written or re-stored at or
+                after this timestamp (it may belong to an install in flight)
+        
+        Returns:
+            Number of bytes freed
+        """
+        blob_path = self._get_blob_path(blob_hash)
+        with self._lock:
+            try:
+                stat = blob_path.stat()
+                if modified_before is not None and stat.st_mtime >= modified_before:
+                    return 0
+                blob_path.unlink()
+            except OSError:
+                return 0
+            self.cache_stats.remove("blobs", stat.st_size)
+            return stat.st_size
+    
+    def remove_dangling_aliases(self) -> int:
+        """Remove aliases whose content-addressed index is gone; returns how many."""
+        removed = 0
+        for alias_path in self.aliases_dir.rglob("*"):
+            if not alias_path.is_file() or alias_path.name.endswith(".tmp"):
+                continue
+            try:
+                target = alias_path.read_text().strip()
+            except OSError:
+                continue
+            if self._find_index_file(target) is None:
+                try:
+                    alias_path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
     
     def cleanup_old_bundles(self, max_age_seconds: int) -> None:
         """Remove old bundle ZIP files to save space."""
@@ -216,12 +864,30 @@ class FileSystemCacheRepository(CacheRepository):
         for bundle_file in self.bundles_dir.rglob("*.zip"):
             if current_time - bundle_file.stat().st_mtime > max_age_seconds:
                 try:
+                    size = bundle_file.stat().st_size
                     bundle_file.unlink()
+                    self.cache_stats.remove(
+                        "bundles", size, self.get_index_manager(bundle_file.name.split(".", 1)[0])
+                    )
+                    bundle_file.with_name(bundle_file.name + CHECKSUM_SUFFIX).unlink(missing_ok=True)
+                    self.zip_members.forget(bundle_file)
                 except OSError:
                     pass
     
-    def _get_bundle_path(self, bundle_hash: str) -> Path:
-        return self.bundles_dir / bundle_hash[:2] / bundle_hash[2:4] / f"{bundle_hash}.zip"
+    def _get_bundle_path(self, bundle_hash: str, extension: str = ZIP.extension) -> Path:
+        bundle_hash = self.resolve_bundle_hash(bundle_hash)
+        return self.bundles_dir / bundle_hash[:2] / bundle_hash[2:4] / f"{bundle_hash}{extension}"
+    
+    def _get_delta_path(self, base_hash: str, target_hash: str) -> Path:
+        base_hash = self.resolve_bundle_hash(base_hash)
+        target_hash = self.resolve_bundle_hash(target_hash)
+        for bundle_hash in (base_hash, target_hash):
+            if not CONTENT_HASH_RE.fullmatch(bundle_hash):
+                raise ValueError(f"Invalid bundle hash: {bundle_hash!r}")
+        return self.deltas_dir / target_hash[:2] / target_hash[2:4] / f"{target_hash}.from.{base_hash}.zip"
+    
+    def _get_alias_path(self, request_hash: str) -> Path:
+        return self.aliases_dir / request_hash[:2] / request_hash[2:4] / request_hash
     
     def _get_blob_path(self, file_hash: str) -> Path:
         return self.objects_dir / file_hash[:2] / file_hash[2:4] / file_hash
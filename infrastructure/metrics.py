@@ -0,0 +1,66 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict
+
+
+@dataclass
+class TimingSummary:
+    """Running count/total/max of a duration metric, in seconds."""
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "avg_seconds": round(self.total / self.count, 6) if self.count else 0.0,
+            "max_seconds": round(self.max, 6),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters and timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, TimingSummary] = {}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._timings.setdefault(name, TimingSummary()).observe(seconds)
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def timing(self, name: str) -> TimingSummary:
+        with self._lock:
+            summary = self._timings.get(name, TimingSummary())
+            return TimingSummary(summary.count, summary.total, summary.max)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(sorted(self._counters.items())),
+                "timings": {name: t.to_dict() for name, t in sorted(self._timings.items())},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+# Process-wide registry served by /v1/metrics
+metrics = MetricsRegistry()
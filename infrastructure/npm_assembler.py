@@ -0,0 +1,336 @@
+import base64
+import binascii
+import hashlib
+import io
+import json
+import platform
+import posixpath
+import sys
+import tarfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from domain.dependency_set import calculate_file_hash
+from domain.index_entry import file_entry, is_executable_mode, parse_entry, symlink_entry
+from domain.npm_lockfile import (
+    CACACHE_ALGORITHMS, HIDDEN_LOCKFILE, bin_command, bin_dir, cacache_content_path, lockfile_in_sync
+)
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
+
+# Manager component of the indexes holding the files of one extracted tarball
+NPM_PACKAGE_INDEX_MANAGER = "npm-package"
+PACKAGE_INDEX_VERSION = "1"
+
+# npm writes node_modules/.package-lock.json in this format since npm 9
+MIN_NPM_MAJOR = 9
+
+# process.platform / process.arch names for this host, as used by the os and cpu fields
+NODE_PLATFORMS = {"linux": "linux", "darwin": "darwin", "win32": "win32", "cygwin": "win32"}
+NODE_ARCHES = {
+    "x86_64": "x64", "amd64": "x64", "aarch64": "arm64", "arm64": "arm64",
+    "i386": "ia32", "i686": "ia32", "x86": "ia32", "armv7l": "arm",
+    "ppc64le": "ppc64", "s390x": "s390x",
+}
+
+
+class AssemblyUnsupported(Exception):
+    """The lockfile uses something only a real npm install reproduces."""
+
+
+class MissingTarballs(AssemblyUnsupported):
+    """Packages neither extracted before nor in npm's cache; fetching just these is enough."""
+
+    def __init__(self, specs: List[str]):
+        super().__init__(f"{len(specs)} package tarballs are not cached")
+        # What `npm cache add` fetches: the locked tarball URL, else name@version
+        self.specs = specs
+
+
+class NpmTreeAssembler:
+    """
+    Builds the node_modules index of an `npm ci --ignore-scripts` install
+    straight from a v2/v3 lockfile and npm's download cache, without npm.
+
+    Without lifecycle scripts the installed tree is fully determined by the
+    lockfile `packages` map: every entry keyed node_modules/<a>/node_modules/<b>
+    is its package subtree at that path, plus the `.bin` links of the
+    entries and npm's hidden lockfile.
+
+    Package subtrees are cached once per (name, version, integrity) as
+    `npm-package` indexes, extracted from npm's cache or split off the trees
+    of real npm installs (save_package_subtrees). A bundle is then composed
+    from cached subtrees; only packages never seen before need a tarball,
+    and MissingTarballs names exactly those.
+
+    Anything else the assembler cannot reproduce exactly (workspaces, git
+    and file dependencies, bundled dependencies, ...) raises
+    AssemblyUnsupported and the caller runs npm instead.
+    """
+
+    def __init__(self, cache_repository, metrics: Optional[MetricsRegistry] = None):
+        self.cache_repository = cache_repository
+        self.metrics = metrics or default_metrics
+        self.node_platform = NODE_PLATFORMS.get(sys.platform)
+        self.node_arch = NODE_ARCHES.get(platform.machine().lower())
+
+    def assemble(self, manifest_content: bytes, lockfile_content: bytes, cache_dir: Path) -> Dict[str, str]:
+        """
+        The index (path relative to node_modules -> blob hash) npm would install.
+
+        Args:
+            manifest_content: package.json of the project
+            lockfile_content: package-lock.json of the project
+            cache_dir: npm cache directory holding the tarballs (`--cache`)
+
+        Raises:
+            AssemblyUnsupported: If the install needs npm itself
+        """
+        lockfile, packages = _load_lockfile(lockfile_content)
+        if not lockfile_in_sync(manifest_content, lockfile_content):
+            raise AssemblyUnsupported("package.json and the lockfile are out of sync, or use workspaces")
+
+        installed = {}
+        for key, package in packages.items():
+            if key and self._is_installed(key, package):
+                installed[key] = package
+
+        subtrees = {}
+        missing = []
+        for key, package in installed.items():
+            subtrees[key] = self._package_files(key, package, cache_dir)
+            if subtrees[key] is None:
+                missing.append(package.get("resolved") or f"{_package_name(key, package)}@{package.get('version')}")
+        if missing:
+            raise MissingTarballs(missing)
+
+        index: Dict[str, str] = {}
+        for key, files in subtrees.items():
+            location = key[len("node_modules/"):]
+            for relative_path, blob_hash in files.items():
+                _add(index, f"{location}/{relative_path}", blob_hash)
+        for key, package in installed.items():
+            self._add_bins(index, key, package)
+
+        hidden = {field: lockfile[field] for field in ("name", "version") if field in lockfile}
+        hidden.update(lockfileVersion=3, requires=True, packages=installed)
+        content = (json.dumps(hidden, indent=2, ensure_ascii=False) + "\n").encode()
+        blob_hash = calculate_file_hash(content)
+        self.cache_repository.store_blob(blob_hash, content)
+        _add(index, HIDDEN_LOCKFILE, blob_hash)
+        return index
+
+    def save_package_subtrees(self, lockfile_content: bytes, index_data: Dict[str, str]) -> int:
+        """
+        Cache the package subtrees of a tree installed by npm from this lockfile.
+
+        Args:
+            lockfile_content: package-lock.json the tree was installed from
+            index_data: The installed node_modules (relative path -> blob hash)
+
+        Returns:
+            Number of packages not cached before
+        """
+        try:
+            _, packages = _load_lockfile(lockfile_content)
+        except AssemblyUnsupported:
+            return 0
+
+        # Files under each package directory, minus its nested node_modules
+        subtrees: Dict[str, Dict[str, str]] = {}
+        locations = {
+            key[len("node_modules/"):]: key for key, package in packages.items()
+            if key.startswith("node_modules/") and package.get("integrity")
+            and not (package.get("link") or package.get("inBundle"))
+        }
+        for path, blob_hash in index_data.items():
+            parts = path.split("/")
+            # The package directory is the longest prefix that is a lockfile location
+            for end in range(len(parts) - 1, 0, -1):
+                location = "/".join(parts[:end])
+                if location in locations:
+                    if parts[end] != "node_modules":
+                        subtrees.setdefault(location, {})["/".join(parts[end:])] = blob_hash
+                    break
+
+        saved = 0
+        for location, files in subtrees.items():
+            key = locations[location]
+            package = packages[key]
+            index_hash = package_index_hash(_package_name(key, package), package.get("version"), package["integrity"])
+            if self.cache_repository.get_index(index_hash) is not None:
+                continue
+            self.cache_repository.save_index(index_hash, NPM_PACKAGE_INDEX_MANAGER, PACKAGE_INDEX_VERSION, files)
+            saved += 1
+        self.metrics.increment("npm_assembler.package.saved", saved)
+        return saved
+
+    def _is_installed(self, key: str, package: Dict[str, Any]) -> bool:
+        """Whether an install with NODE_ENV=production puts this lockfile entry on disk."""
+        if not key.startswith("node_modules/"):
+            raise AssemblyUnsupported(f"{key}: not under node_modules")
+        if package.get("link") or package.get("inBundle") or package.get("extraneous"):
+            raise AssemblyUnsupported(f"{key}: linked, bundled or extraneous package")
+        if package.get("dev"):
+            return False
+        if package.get("libc"):
+            raise AssemblyUnsupported(f"{key}: libc restriction")
+        if self._platform_supported(key, package):
+            return True
+        if not package.get("optional"):
+            raise AssemblyUnsupported(f"{key}: unsupported platform")
+        if package.get("dependencies") or package.get("optionalDependencies"):
+            # npm also drops the optional dependencies only it needed
+            raise AssemblyUnsupported(f"{key}: skipped optional package with dependencies")
+        return False
+
+    def _platform_supported(self, key: str, package: Dict[str, Any]) -> bool:
+        for field, current in (("os", self.node_platform), ("cpu", self.node_arch)):
+            allowed = package.get(field)
+            if not allowed:
+                continue
+            if current is None:
+                raise AssemblyUnsupported(f"{key}: unknown {field} of this host")
+            if not _platform_matches(allowed, current):
+                return False
+        return True
+
+    def _package_files(self, key: str, package: Dict[str, Any], cache_dir: Path) -> Optional[Dict[str, str]]:
+        """Files of the package subtree (path inside the package -> blob hash), None if not cached."""
+        integrity = package.get("integrity")
+        if not integrity:
+            raise AssemblyUnsupported(f"{key}: no integrity")
+        index_hash = package_index_hash(_package_name(key, package), package.get("version"), integrity)
+        files = self.cache_repository.get_index(index_hash)
+        if files is not None:
+            self.metrics.increment("npm_assembler.package.hit")
+            return files
+
+        tarball_path = cacache_content_path(cache_dir, integrity)
+        try:
+            content = tarball_path.read_bytes() if tarball_path else None
+        except OSError:
+            content = None
+        if content is None or not _matches_integrity(content, integrity):
+            return None
+
+        self.metrics.increment("npm_assembler.package.miss")
+        files = {}
+        for relative_path, file_content, executable in _extract_tarball(content):
+            blob_hash = calculate_file_hash(file_content)
+            self.cache_repository.store_blob(blob_hash, file_content)
+            files[relative_path] = file_entry(blob_hash, executable)
+        self.cache_repository.save_index(index_hash, NPM_PACKAGE_INDEX_MANAGER, PACKAGE_INDEX_VERSION, files)
+        return files
+
+    def _add_bins(self, index: Dict[str, str], key: str, package: Dict[str, Any]) -> None:
+        """Add the <parent>/node_modules/.bin symlinks npm creates for a package, and make their targets executable."""
+        bins = package.get("bin")
+        if not bins:
+            return
+        if not isinstance(bins, dict):
+            raise AssemblyUnsupported(f"{key}: unnormalized bin field")
+        location = key[len("node_modules/"):]
+        # The .bin of the node_modules directory the package sits in
+        bins_dir = bin_dir(key)
+        for name, target in bins.items():
+            # npm-normalize-package-bin: a bare command name and a target inside the package
+            command = bin_command(name)
+            target_path = posixpath.normpath("/" + str(target))[1:]
+            if not command or command in (".", ".."):
+                continue
+            target_file = f"{location}/{target_path}"
+            entry = parse_entry(index[target_file]) if target_file in index else None
+            if entry is None or not entry.is_file:
+                raise AssemblyUnsupported(f"{key}: bin {name} target {target} is missing")
+            # bin-links chmods the target and links it relative to the .bin directory
+            index[target_file] = file_entry(entry.blob_hash, executable=True)
+            _add(index, f"{bins_dir}/{command}", symlink_entry(posixpath.relpath(target_file, bins_dir)))
+
+
+def package_index_hash(name: str, version: Optional[str], integrity: str) -> str:
+    """Hash of the `npm-package` index holding the subtree of one package."""
+    return hashlib.sha256(f"{NPM_PACKAGE_INDEX_MANAGER}\0{name}\0{version}\0{integrity}".encode()).hexdigest()
+
+
+def _package_name(key: str, package: Dict[str, Any]) -> str:
+    # Aliased dependencies record the real name; otherwise it is the install location
+    return package.get("name") or key.rpartition("node_modules/")[2]
+
+
+def _load_lockfile(content: bytes) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    lockfile = _load_json(content, "package-lock.json")
+    version = lockfile.get("lockfileVersion")
+    if version not in (2, 3):
+        raise AssemblyUnsupported(f"lockfileVersion {version!r}")
+    packages = lockfile.get("packages")
+    if not isinstance(packages, dict) or not all(isinstance(p, dict) for p in packages.values()):
+        raise AssemblyUnsupported("lockfile has no packages map")
+    return lockfile, packages
+
+
+def _load_json(content: bytes, name: str) -> Dict[str, Any]:
+    try:
+        data = json.loads(content)
+    except (ValueError, UnicodeDecodeError):
+        raise AssemblyUnsupported(f"{name} is not valid JSON") from None
+    if not isinstance(data, dict):
+        raise AssemblyUnsupported(f"{name} is not a JSON object")
+    return data
+
+
+def _add(index: Dict[str, str], path: str, blob_hash: str) -> None:
+    if path in index:
+        raise AssemblyUnsupported(f"{path} is provided twice")
+    index[path] = blob_hash
+
+
+def _platform_matches(allowed: Any, current: str) -> bool:
+    """npm-install-checks: a `!name` entry excludes, any plain entry must include current."""
+    values = [allowed] if isinstance(allowed, str) else list(allowed)
+    if f"!{current}" in values:
+        return False
+    included = [value for value in values if not value.startswith("!")]
+    return not included or current in included
+
+
+def _matches_integrity(content: bytes, integrity: str) -> bool:
+    digests = {}
+    for entry in integrity.split():
+        algorithm, _, digest = entry.partition("-")
+        digests.setdefault(algorithm, digest.split("?", 1)[0])
+    for algorithm in CACACHE_ALGORITHMS:
+        if algorithm in digests:
+            try:
+                expected = base64.b64decode(digests[algorithm], validate=True)
+            except (binascii.Error, ValueError):
+                return False
+            return hashlib.new(algorithm, content).digest() == expected
+    return False
+
+
+def _extract_tarball(content: bytes) -> List[Tuple[str, bytes, bool]]:
+    """
+    Regular files of an npm tarball, as pacote extracts them, with whether each is executable.
+
+    The first path component (`package/`) is stripped, links are skipped
+    and paths escaping the package are dropped; a later duplicate wins.
+    pacote widens modes to 0666 under the umask, so execute bits come
+    from the tarball alone.
+    """
+    files: Dict[str, Tuple[bytes, bool]] = {}
+    try:
+        with tarfile.open(fileobj=io.BytesIO(content), mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                parts = member.name.replace("\\", "/").split("/")[1:]
+                if ".." in parts:
+                    continue
+                path = posixpath.normpath("/" + "/".join(parts))[1:]
+                if not path:
+                    continue
+                extracted = archive.extractfile(member)
+                files[path] = (extracted.read() if extracted else b"", is_executable_mode(member.mode))
+    except (tarfile.TarError, OSError, EOFError) as e:
+        raise AssemblyUnsupported(f"unreadable tarball: {e}") from None
+    return [(path, file_content, executable) for path, (file_content, executable) in files.items()]
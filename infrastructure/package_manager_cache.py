@@ -0,0 +1,164 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PACKAGE_CACHE_MAX_BYTES = 5 * 1024 ** 3
+DEFAULT_PACKAGE_CACHE_EVICTION_INTERVAL = 300
+PACKAGE_CACHE_LOW_WATERMARK = 0.8
+LOCK_FILE_NAME = ".lock"
+
+
+class PackageManagerCache:
+    """
+    Download caches of the package managers, shared by every install.
+
+    Each manager gets its own directory (<root>/npm, <root>/composer) that
+    is handed to the installer, so tarballs and dists fetched for one
+    request are reused by the next instead of being downloaded again.
+
+    Installs hold a shared flock on the manager's lock file for their whole
+    run, in this and any other server process on the cache. Eviction takes
+    the lock exclusively without waiting, so it only runs between installs
+    and never deletes files under a running npm or composer; it removes the
+    least recently accessed files until the cache is back under
+    PACKAGE_CACHE_LOW_WATERMARK * max_bytes.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = DEFAULT_PACKAGE_CACHE_MAX_BYTES,
+        eviction_interval: float = DEFAULT_PACKAGE_CACHE_EVICTION_INTERVAL
+    ):
+        if max_bytes <= 0:
+            raise ValueError(f"Invalid package cache size budget: {max_bytes}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.eviction_interval = eviction_interval
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._last_eviction: Optional[float] = None
+        self._eviction_lock = threading.Lock()
+
+    def cache_dir(self, manager: str) -> Path:
+        """Download cache directory of the manager."""
+        if not manager or "/" in manager or manager.startswith("."):
+            raise ValueError(f"Invalid manager name: {manager}")
+        directory = self.root / manager
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    @contextmanager
+    def use(self, manager: str) -> Iterator[Path]:
+        """
+        Hold the manager's cache for one install.
+
+        Yields the cache directory; when the install is done the cache is
+        trimmed if the eviction interval has passed.
+        """
+        directory = self.cache_dir(manager)
+        with open(directory / LOCK_FILE_NAME, "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                yield directory
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self.maybe_evict()
+
+    def maybe_evict(self) -> None:
+        """Run evict() if the last pass is more than eviction_interval seconds old."""
+        last = self._last_eviction
+        if last is not None and time.monotonic() - last < self.eviction_interval:
+            return
+        if not self._eviction_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_eviction = time.monotonic()
+            self.evict()
+        except OSError as e:
+            logger.warning("Package cache eviction failed: %s", e)
+        finally:
+            self._eviction_lock.release()
+
+    def evict(self) -> int:
+        """
+        Trim the caches of all managers that are not in use to the budget.
+
+        Returns:
+            Bytes freed
+        """
+        usage = self.usage()
+        if usage <= self.max_bytes:
+            return 0
+
+        target = int(self.max_bytes * PACKAGE_CACHE_LOW_WATERMARK)
+        freed = 0
+        # Locks are released when the stack closes the lock files
+        with ExitStack() as locks:
+            files = []
+            for directory in sorted(entry for entry in self.root.iterdir() if entry.is_dir()):
+                lock_file = locks.enter_context(open(directory / LOCK_FILE_NAME, "a+b"))
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # An install is using this cache; try again on a later pass
+                    continue
+                files.extend(self._scan(directory)[1])
+                locks.callback(self._remove_empty_dirs, directory)
+
+            # Least recently used first, across all managers
+            files.sort()
+            for _, size, path in files:
+                if usage - freed <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    # E.g. a file a container left owned by another user; skip it, evict the rest
+                    logger.warning("Could not evict %s from the package manager cache: %s", path, e)
+                    continue
+                freed += size
+
+        if freed:
+            logger.info("Evicted %d bytes from the package manager caches", freed)
+        return freed
+
+    def usage(self) -> int:
+        """Bytes used by the caches of all managers."""
+        return sum(self._scan(entry)[0] for entry in self.root.iterdir() if entry.is_dir())
+
+    @staticmethod
+    def _scan(directory: Path) -> Tuple[int, List[Tuple[float, int, str]]]:
+        """Total size and (atime, size, path) of every cached file under directory."""
+        total = 0
+        files = []
+        for current, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename == LOCK_FILE_NAME and current == str(directory):
+                    continue
+                path = os.path.join(current, filename)
+                try:
+                    stat = os.lstat(path)
+                except OSError:
+                    continue
+                total += stat.st_size
+                files.append((stat.st_atime, stat.st_size, path))
+        return total, files
+
+    @staticmethod
+    def _remove_empty_dirs(directory: Path) -> None:
+        for current, _, _ in os.walk(directory, topdown=False):
+            if current != str(directory):
+                try:
+                    os.rmdir(current)
+                except OSError:
+                    pass
+
@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from domain.dependency_set import calculate_file_hash
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NPM_UPSTREAM = "https://registry.npmjs.org"
+DEFAULT_COMPOSER_UPSTREAM = "https://repo.packagist.org"
+# Metadata changes when packages are published; tarballs and dists never do
+DEFAULT_METADATA_TTL = 300
+UPSTREAM_TIMEOUT = 60
+
+# Manager component of the indexes pinning cached tarballs
+NPM_TARBALL_INDEX_MANAGER = "npm-registry"
+TARBALL_INDEX_VERSION = "1"
+
+# The abbreviated packument is enough for installs and far smaller
+NPM_METADATA_ACCEPT = "application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8"
+
+NPM_PACKAGE_RE = re.compile(r"(@[a-z0-9][a-z0-9._~-]*/)?[a-zA-Z0-9][a-zA-Z0-9._~-]*")
+NPM_TARBALL_RE = re.compile(r"[a-zA-Z0-9][a-zA-Z0-9._~-]*\.tgz")
+COMPOSER_METADATA_RE = re.compile(r"packages\.json|p2/[a-z0-9][a-z0-9_.-]*/[a-z0-9][a-z0-9_.-]*(~dev)?\.json")
+
+# Strongest first; npm writes sha512, very old packages only have sha1
+INTEGRITY_ALGORITHMS = ("sha512", "sha384", "sha256", "sha1")
+
+
+class IntegrityError(Exception):
+    """A downloaded package does not match the hash its registry metadata declares."""
+
+
+class UpstreamError(Exception):
+    """The upstream registry could not be reached and nothing is cached."""
+
+
+class RegistryProxy:
+    """
+    Local npm registry and Composer repository in front of the public ones.
+
+    Installers are pointed at it, so the registry round-trips of a cache miss
+    are answered locally:
+
+    - Metadata (npm packuments, Composer packages.json and p2 files) is
+      passed through unchanged and cached on disk for metadata_ttl seconds;
+      a stale copy is served while the upstream is unreachable.
+    - npm tarballs are downloaded once, verified against the `integrity`
+      (or `shasum`) of their packument entry, which is what lockfiles
+      record, and stored as blobs in the cache repository. Each tarball is
+      pinned by a one-entry index, so blob GC and LRU eviction treat it like
+      any other cached bundle.
+
+    Metadata is never rewritten, so lockfiles and installed metadata keep
+    the upstream URLs and bundle contents do not depend on the proxy.
+    """
+
+    def __init__(
+        self,
+        cache_repository: FileSystemCacheRepository,
+        metadata_dir: Path,
+        npm_upstream: str = DEFAULT_NPM_UPSTREAM,
+        composer_upstream: str = DEFAULT_COMPOSER_UPSTREAM,
+        metadata_ttl: float = DEFAULT_METADATA_TTL,
+        metrics: Optional[MetricsRegistry] = None
+    ):
+        self.cache_repository = cache_repository
+        self.metadata_dir = metadata_dir
+        self.npm_upstream = npm_upstream.rstrip("/")
+        self.composer_upstream = composer_upstream.rstrip("/")
+        self.metadata_ttl = metadata_ttl
+        self.metrics = metrics or default_metrics
+        self.metadata_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_npm_metadata(self, package: str) -> Optional[bytes]:
+        """The packument of an npm package, or None if the registry does not know it."""
+        if not NPM_PACKAGE_RE.fullmatch(package):
+            raise ValueError(f"Invalid npm package name: {package}")
+        url = f"{self.npm_upstream}/{urllib.parse.quote(package, safe='@')}"
+        return self._get_metadata("npm", package, url, NPM_METADATA_ACCEPT)
+
+    def get_npm_tarball(self, package: str, filename: str) -> Optional[str]:
+        """
+        Blob hash of an npm tarball, downloading and verifying it on first use.
+
+        Returns:
+            The blob hash, or None if the package has no version with that tarball
+
+        Raises:
+            IntegrityError: If the upstream tarball does not match its packument
+        """
+        if not NPM_TARBALL_RE.fullmatch(filename):
+            raise ValueError(f"Invalid npm tarball name: {filename}")
+        key = f"{package}/-/{filename}"
+        index_hash = hashlib.sha256(f"{NPM_TARBALL_INDEX_MANAGER}\0{key}".encode()).hexdigest()
+
+        index = self.cache_repository.get_index(index_hash)
+        blob_hash = index.get(key) if index else None
+        if blob_hash and self.cache_repository.blob_storage.blob_size(blob_hash) is not None:
+            self.metrics.increment("registry_proxy.tarball.hit")
+            return blob_hash
+
+        metadata = self.get_npm_metadata(package)
+        dist = self._find_npm_dist(metadata, filename) if metadata else None
+        if dist is None:
+            return None
+
+        self.metrics.increment("registry_proxy.tarball.miss")
+        url = f"{self.npm_upstream}/{urllib.parse.quote(package, safe='@/')}/-/{filename}"
+        content = self._fetch(url)
+        if content is None:
+            return None
+        _verify(content, dist.get("integrity"), dist.get("shasum"), key)
+
+        blob_hash = calculate_file_hash(content)
+        self.cache_repository.store_blob(blob_hash, content)
+        self.cache_repository.save_index(index_hash, NPM_TARBALL_INDEX_MANAGER, TARBALL_INDEX_VERSION, {key: blob_hash})
+        return blob_hash
+
+    def get_composer_metadata(self, path: str) -> Optional[bytes]:
+        """packages.json or a p2/<vendor>/<package>.json file of the Composer repository."""
+        if not COMPOSER_METADATA_RE.fullmatch(path):
+            raise ValueError(f"Invalid Composer metadata path: {path}")
+        return self._get_metadata("composer", path, f"{self.composer_upstream}/{path}", "application/json")
+
+    @staticmethod
+    def _find_npm_dist(metadata: bytes, filename: str) -> Optional[Dict[str, str]]:
+        try:
+            versions = json.loads(metadata).get("versions", {})
+        except (ValueError, AttributeError):
+            return None
+        for version in versions.values():
+            dist = version.get("dist") or {}
+            if dist.get("tarball", "").endswith(f"/-/{filename}"):
+                return dist
+        return None
+
+    def _get_metadata(self, kind: str, name: str, url: str, accept: str) -> Optional[bytes]:
+        cache_path = self.metadata_dir / kind / f"{hashlib.sha256(name.encode()).hexdigest()}.json"
+        try:
+            if time.time() - cache_path.stat().st_mtime < self.metadata_ttl:
+                self.metrics.increment("registry_proxy.metadata.hit")
+                return cache_path.read_bytes()
+        except OSError:
+            pass
+
+        self.metrics.increment("registry_proxy.metadata.miss")
+        try:
+            content = self._fetch(url, accept)
+        except UpstreamError as e:
+            try:
+                stale = cache_path.read_bytes()
+            except OSError:
+                raise e from None
+            logger.warning("Serving stale %s metadata for %s: %s", kind, name, e)
+            return stale
+
+        if content is None:
+            cache_path.unlink(missing_ok=True)
+            return None
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, cache_path)
+        return content
+
+    def _fetch(self, url: str, accept: Optional[str] = None) -> Optional[bytes]:
+        """GET url; None on 404, UpstreamError if the upstream fails."""
+        request = urllib.request.Request(url, headers={"Accept": accept} if accept else {})
+        try:
+            with urllib.request.urlopen(request, timeout=UPSTREAM_TIMEOUT) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code in (404, 410):
+                return None
+            raise UpstreamError(f"{url}: HTTP {e.code}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise UpstreamError(f"{url}: {e}") from e
+
+
+def _verify(content: bytes, integrity: Optional[str], shasum: Optional[str], name: str) -> None:
+    """Check content against an SRI integrity string, else a hex sha1 shasum."""
+    if integrity:
+        hashes: Dict[str, str] = {}
+        for entry in integrity.split():
+            algorithm, _, digest = entry.partition("-")
+            hashes.setdefault(algorithm, digest.split("?", 1)[0])
+        for algorithm in INTEGRITY_ALGORITHMS:
+            if algorithm in hashes:
+                actual = base64.b64encode(hashlib.new(algorithm, content).digest()).decode("ascii")
+                if actual != hashes[algorithm]:
+                    raise IntegrityError(f"{name}: {algorithm} mismatch")
+                return
+    if shasum:
+        if hashlib.sha1(content).hexdigest() != shasum.lower():
+            raise IntegrityError(f"{name}: sha1 mismatch")
+        return
+    raise IntegrityError(f"{name}: no usable integrity hash in the registry metadata")
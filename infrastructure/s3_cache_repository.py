@@ -0,0 +1,427 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from domain.blob_storage import BlobStorage
+from domain.cache_repository import CacheRepository
+from domain.compression_policy import CompressionPolicy, CompressionStats
+from domain.dependency_set import DependencySet, calculate_file_hash
+from domain.index_entry import index_blob_hashes
+from domain.zip_util import ZipUtil
+from infrastructure.s3_client import (
+    ClientError, create_s3_client, create_transfer_config, is_not_found,
+    DEFAULT_MAX_POOL_CONNECTIONS, DEFAULT_TRANSFER_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRESIGN_EXPIRES = 3600
+# Local ZIP and blob copies are deleted from the scratch directory once this old
+DEFAULT_SCRATCH_MAX_AGE = 3600
+DEFAULT_SCRATCH_CLEANUP_INTERVAL = 600
+# Metadata key holding the SHA-256 of a bundle ZIP
+CHECKSUM_METADATA_KEY = "sha256"
+
+
+class S3CacheRepository(CacheRepository):
+    """
+    CacheRepository stored in an S3-compatible bucket, shared by stateless
+    server replicas.
+
+    Objects use the same layout as the cache directory (objects/aa/bb/<hash>,
+    indexes/..., bundles/..., aliases/...) under an optional key prefix.
+    Requests share one pool of keep-alive connections; blob existence checks
+    and uploads run in parallel, and large files are transferred as parallel
+    multipart uploads and ranged downloads. Bundle ZIPs are built in a local
+    scratch directory, uploaded, and served through presigned URLs.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        scratch_dir: Optional[Path] = None,
+        compression_policy: Optional[CompressionPolicy] = None,
+        client=None,
+        transfer_config=None,
+        endpoint_url: Optional[str] = None,
+        max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+        transfer_concurrency: int = DEFAULT_TRANSFER_CONCURRENCY,
+        presign_expires: int = DEFAULT_PRESIGN_EXPIRES
+    ):
+        self.client = client or create_s3_client(endpoint_url, max_pool_connections)
+        self.transfer_config = transfer_config or create_transfer_config(max_concurrency=transfer_concurrency)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.presign_expires = presign_expires
+        # Local copies of built/downloaded ZIPs and blobs handed out as paths
+        self.scratch_dir = scratch_dir or Path(tempfile.gettempdir()) / "dep_cache_proxy"
+        self.scratch_dir.mkdir(parents=True, exist_ok=True)
+        self.zip_util = ZipUtil()
+        self.compression_policy = compression_policy or CompressionPolicy()
+        self.compression_stats = CompressionStats()
+        # Parallel requests share the client's connection pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=min(max_pool_connections, 4 * transfer_concurrency), thread_name_prefix="s3-repository"
+        )
+
+    def store_dependency_set(self, dependency_set: DependencySet) -> str:
+        """Store a dependency set in the bucket and return bundle hash."""
+        bundle_hash = dependency_set.calculate_bundle_hash()
+        blobs: Dict[str, bytes] = {}
+        index_data = {}
+        for file in dependency_set.files:
+            if not file.has_blob:
+                index_data[file.relative_path] = file.index_value()
+                continue
+            file_hash = calculate_file_hash(file.content)
+            blobs[file_hash] = file.content
+            index_data[file.relative_path] = file.index_value(file_hash)
+
+        self.store_blobs(blobs)
+        manager_version = self._get_manager_version(dependency_set)
+        self.save_index(bundle_hash, dependency_set.manager, manager_version, index_data)
+        return bundle_hash
+
+    @staticmethod
+    def _get_manager_version(dependency_set: DependencySet) -> str:
+        if dependency_set.manager == "npm":
+            if dependency_set.node_version and dependency_set.npm_version:
+                return f"{dependency_set.node_version}_{dependency_set.npm_version}"
+        elif dependency_set.manager == "composer" and dependency_set.php_version:
+            return dependency_set.php_version
+        return "unknown"
+
+    def missing_blobs(self, blob_hashes: Iterable[str]) -> Set[str]:
+        """The hashes among blob_hashes not stored yet, checked in parallel."""
+        unique = sorted(set(blob_hashes))
+        exists = self._executor.map(lambda blob_hash: self._exists(self._blob_key(blob_hash)), unique)
+        return {blob_hash for blob_hash, found in zip(unique, exists) if not found}
+
+    def store_blobs(self, blobs: Dict[str, bytes], missing: Optional[Set[str]] = None) -> int:
+        """
+        Upload the blobs not stored yet, in parallel.
+
+        Args:
+            blobs: Content by blob hash
+            missing: The hashes already known to be missing (from missing_blobs),
+                to skip checking them again
+
+        Returns:
+            Number of blobs uploaded
+        """
+        if missing is None:
+            missing = self.missing_blobs(blobs)
+        list(self._executor.map(lambda blob_hash: self._put(self._blob_key(blob_hash), blobs[blob_hash]), missing))
+        return len(missing)
+
+    def get_index(self, bundle_hash: str) -> Optional[Dict[str, str]]:
+        """Retrieve the index for a given bundle hash."""
+        index_key = self._find_index_key(self.resolve_bundle_hash(bundle_hash))
+        if index_key is None:
+            return None
+        content = self._get(index_key)
+        if content is None:
+            return None
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            return None
+
+    def get_index_manager(self, bundle_hash: str) -> Optional[str]:
+        """Return the manager encoded in the bundle's index key, if any."""
+        index_key = self._find_index_key(self.resolve_bundle_hash(bundle_hash))
+        if index_key is None:
+            return None
+        return index_key.rsplit("/", 1)[1].split(".", 2)[1]
+
+    def save_index(self, bundle_hash: str, manager: str, manager_version: str, index_data: Dict[str, str]) -> None:
+        """Save the index unless one exists for the hash (indexes are immutable)."""
+        if self._find_index_key(bundle_hash):
+            return
+        index_key = f"indexes/{bundle_hash[:2]}/{bundle_hash[2:4]}/{bundle_hash}.{manager}.{manager_version}.index"
+        body = json.dumps(index_data, indent=2, sort_keys=True).encode()
+        self._put(index_key, body, ContentType="application/json")
+
+    def save_alias(self, request_hash: str, content_hash: str) -> None:
+        """Point a request hash at the content hash of the bundle it resolved to."""
+        if request_hash != content_hash:
+            self._put(self._alias_key(request_hash), content_hash.encode())
+
+    def resolve_bundle_hash(self, bundle_hash: str) -> str:
+        """Return the content hash a request hash aliases, or bundle_hash itself."""
+        content = self._get(self._alias_key(bundle_hash))
+        target = content.decode().strip() if content else ""
+        return target or bundle_hash
+
+    def has_bundle(self, bundle_hash: str) -> bool:
+        """Check if a bundle ZIP exists in the bucket."""
+        return self._exists(self._bundle_key(self.resolve_bundle_hash(bundle_hash)))
+
+    def exists_bundle(self, bundle_hash: str) -> bool:
+        """Alias for has_bundle() to maintain compatibility."""
+        return self.has_bundle(bundle_hash)
+
+    def get_blob(self, blob_hash: str) -> Optional[bytes]:
+        """Retrieve a file blob by its hash."""
+        return self._get(self._blob_key(blob_hash))
+
+    def store_blob(self, blob_hash: str, content: bytes) -> None:
+        """Store a file blob with its hash, unless already stored."""
+        if not self._exists(self._blob_key(blob_hash)):
+            self._put(self._blob_key(blob_hash), content)
+
+    def save_blob(self, file_hash: str, content: bytes) -> None:
+        """Alias for store_blob() to maintain compatibility."""
+        self.store_blob(file_hash, content)
+
+    def generate_bundle_zip(self, bundle_hash: str) -> Optional[Path]:
+        """
+        Build a bundle's ZIP from its blobs and upload it.
+
+        Blobs are fetched in parallel into a temporary directory; the ZIP is
+        uploaded with its SHA-256 in the object metadata and kept in the
+        scratch directory.
+
+        Returns:
+            Local path of the built ZIP, or None if the bundle has no index
+        """
+        bundle_hash = self.resolve_bundle_hash(bundle_hash)
+        index_data = self.get_index(bundle_hash)
+        if not index_data:
+            return None
+
+        local_path = self._scratch_bundle_path(bundle_hash)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.scratch_dir) as tmp_dir:
+            blob_storage = BlobStorage(Path(tmp_dir) / "objects")
+            list(self._executor.map(
+                lambda blob_hash: self._download(self._blob_key(blob_hash), blob_storage.get_blob_path(blob_hash)),
+                set(index_blob_hashes(index_data))
+            ))
+            zip_path = Path(tmp_dir) / f"{bundle_hash}.zip"
+            stats = self.zip_util.create_zip_from_blobs(
+                zip_path,
+                index_data,
+                blob_storage,
+                policy=self.compression_policy,
+                manager=self.get_index_manager(bundle_hash)
+            )
+            self.compression_stats.merge(stats)
+            checksum = _file_checksum(zip_path)
+            self.client.upload_file(
+                str(zip_path), self.bucket, self.prefix + self._bundle_key(bundle_hash),
+                ExtraArgs={"ContentType": "application/zip", "Metadata": {CHECKSUM_METADATA_KEY: checksum}},
+                Config=self.transfer_config
+            )
+            os.replace(zip_path, local_path)
+        return local_path
+
+    def get_bundle_zip_path(self, bundle_hash: str) -> Optional[Path]:
+        """Local copy of the bundle ZIP, downloaded with ranged requests if needed."""
+        bundle_hash = self.resolve_bundle_hash(bundle_hash)
+        local_path = self._scratch_bundle_path(bundle_hash)
+        if local_path.exists() or self._download(self._bundle_key(bundle_hash), local_path):
+            return local_path
+        return None
+
+    def get_bundle_download_url(self, bundle_hash: str) -> Optional[str]:
+        """
+        A presigned URL downloading the bundle ZIP straight from the bucket,
+        or None if it is not built.
+        """
+        bundle_hash = self.resolve_bundle_hash(bundle_hash)
+        if not self.has_bundle(bundle_hash):
+            return None
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.prefix + self._bundle_key(bundle_hash),
+                "ResponseContentDisposition": f"attachment; filename={bundle_hash}.zip",
+            },
+            ExpiresIn=self.presign_expires
+        )
+
+    def get_bundle_checksum(self, bundle_hash: str) -> Optional[str]:
+        """Return the SHA-256 of the bundle's ZIP, or None if it is not built."""
+        try:
+            response = self.client.head_object(
+                Bucket=self.bucket, Key=self.prefix + self._bundle_key(self.resolve_bundle_hash(bundle_hash))
+            )
+        except ClientError as e:
+            if is_not_found(e):
+                return None
+            raise
+        return response.get("Metadata", {}).get(CHECKSUM_METADATA_KEY)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the cache.
+
+        Lists every object in the bucket, so this is slow on large caches.
+        """
+        stats = {"total_blobs": 0, "total_indexes": 0, "total_bundles": 0, "cache_size_bytes": 0}
+        for area, stat_key, suffix in (
+            ("objects/", "total_blobs", ""),
+            ("indexes/", "total_indexes", ".index"),
+            ("bundles/", "total_bundles", ".zip"),
+        ):
+            for item in self._list(area):
+                if item["Key"].endswith(suffix):
+                    stats[stat_key] += 1
+                    stats["cache_size_bytes"] += item["Size"]
+        return stats
+
+    def get_blob_path(self, file_hash: str) -> Path:
+        """Returns the path of a local copy of the blob, downloading it if needed."""
+        blob_path = self.scratch_dir / "objects" / file_hash[:2] / file_hash[2:4] / file_hash
+        if not blob_path.exists():
+            self._download(self._blob_key(file_hash), blob_path)
+        return blob_path
+
+    def save_bundle_zip(self, bundle_hash: str, zip_content_path: Path) -> None:
+        """Uploads (or overwrites) the ZIP as the bundle's archive."""
+        self.client.upload_file(
+            str(zip_content_path), self.bucket, self.prefix + self._bundle_key(bundle_hash),
+            ExtraArgs={
+                "ContentType": "application/zip",
+                "Metadata": {CHECKSUM_METADATA_KEY: _file_checksum(zip_content_path)},
+            },
+            Config=self.transfer_config
+        )
+        self._scratch_bundle_path(bundle_hash).unlink(missing_ok=True)
+
+    def cleanup_old_bundles(self, max_age_seconds: int) -> None:
+        """Remove local copies of bundle ZIPs and blobs older than max_age_seconds."""
+        current_time = time.time()
+        # Not the temporary directories of builds in progress
+        for area in ("bundles", "objects"):
+            for path in (self.scratch_dir / area).rglob("*"):
+                try:
+                    if path.is_file() and current_time - path.stat().st_mtime > max_age_seconds:
+                        path.unlink()
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _find_index_key(self, bundle_hash: str) -> Optional[str]:
+        for item in self._list(f"indexes/{bundle_hash[:2]}/{bundle_hash[2:4]}/{bundle_hash}."):
+            if item["Key"].endswith(".index"):
+                return item["Key"]
+        return None
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if is_not_found(e):
+                return False
+            raise
+        return True
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if is_not_found(e):
+                return None
+            raise
+        return response["Body"].read()
+
+    def _put(self, key: str, body: bytes, **kwargs) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=body, **kwargs)
+
+    def _download(self, key: str, dest: Path) -> bool:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            self.client.download_file(self.bucket, self.prefix + key, str(tmp_path), Config=self.transfer_config)
+        except ClientError as e:
+            tmp_path.unlink(missing_ok=True)
+            if is_not_found(e):
+                return False
+            raise
+        os.replace(tmp_path, dest)
+        return True
+
+    def _list(self, prefix: str) -> Iterator[Dict[str, Any]]:
+        """Yield the listed objects under prefix, with keys relative to the repository prefix."""
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for item in page.get("Contents", []):
+                yield {**item, "Key": item["Key"][len(self.prefix):]}
+
+    def _scratch_bundle_path(self, bundle_hash: str) -> Path:
+        return self.scratch_dir / "bundles" / bundle_hash[:2] / bundle_hash[2:4] / f"{bundle_hash}.zip"
+
+    @staticmethod
+    def _blob_key(blob_hash: str) -> str:
+        return f"objects/{blob_hash[:2]}/{blob_hash[2:4]}/{blob_hash}"
+
+    @staticmethod
+    def _bundle_key(bundle_hash: str) -> str:
+        return f"bundles/{bundle_hash[:2]}/{bundle_hash[2:4]}/{bundle_hash}.zip"
+
+    @staticmethod
+    def _alias_key(request_hash: str) -> str:
+        return f"aliases/{request_hash[:2]}/{request_hash[2:4]}/{request_hash}"
+
+
+class ScratchCleaner:
+    """
+    Deletes old files from an S3CacheRepository's scratch directory every
+    interval seconds, so the local copies of built ZIPs and blobs do not
+    grow into a mirror of the bucket.
+    """
+
+    def __init__(
+        self,
+        repository: S3CacheRepository,
+        max_age: float = DEFAULT_SCRATCH_MAX_AGE,
+        interval: float = DEFAULT_SCRATCH_CLEANUP_INTERVAL
+    ):
+        self.repository = repository
+        self.max_age = max_age
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Run cleanup passes every interval seconds in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="s3-scratch-cleaner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.repository.cleanup_old_bundles(self.max_age)
+            except Exception:
+                logger.exception("Scratch directory cleanup failed")
+
+
+def _file_checksum(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,68 @@
+from typing import Optional, Tuple
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # Optional: only needed for S3-backed storage
+    boto3 = None
+    TransferConfig = None
+    BotoConfig = None
+
+    class ClientError(Exception):
+        """Placeholder so `except ClientError` works without botocore."""
+
+DEFAULT_MAX_POOL_CONNECTIONS = 64
+# Objects above the threshold are transferred in parallel parts/byte ranges
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+DEFAULT_TRANSFER_CONCURRENCY = 8
+
+
+def create_s3_client(endpoint_url: Optional[str] = None, max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS):
+    """
+    An S3 client whose connection pool is large enough for parallel transfers.
+
+    Connections are kept alive between requests; endpoint_url points it at an
+    S3-compatible store such as MinIO.
+    """
+    if boto3 is None:
+        raise RuntimeError("S3 storage requires the boto3 package")
+    config = BotoConfig(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        retries={"max_attempts": 5, "mode": "adaptive"},
+    )
+    return boto3.client("s3", endpoint_url=endpoint_url, config=config)
+
+
+def create_transfer_config(
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    multipart_chunksize: int = DEFAULT_MULTIPART_CHUNKSIZE,
+    max_concurrency: int = DEFAULT_TRANSFER_CONCURRENCY
+):
+    """Multipart upload and ranged download settings for upload_file/download_file."""
+    if TransferConfig is None:
+        raise RuntimeError("S3 storage requires the boto3 package")
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        use_threads=True,
+    )
+
+
+def parse_s3_location(location: str) -> Tuple[str, str]:
+    """Split "s3://bucket[/prefix]" into bucket and key prefix."""
+    if not location.startswith("s3://"):
+        raise ValueError(f"Not an S3 location: {location}")
+    bucket, _, prefix = location[len("s3://"):].partition("/")
+    if not bucket:
+        raise ValueError(f"Invalid S3 location: {location}")
+    return bucket, prefix
+
+
+def is_not_found(error: ClientError) -> bool:
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
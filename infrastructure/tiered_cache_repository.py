@@ -0,0 +1,389 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from domain.blob_storage import BlobStorage
+from domain.bundle_format import BundleFormat
+from domain.hash_constants import BLOCK_SIZE
+from domain.compression_policy import CompressionPolicy
+from domain.index_entry import index_blob_hashes
+from infrastructure.cache_evictor import CacheEvictor, EvictionReport, _walk_files
+from infrastructure.cold_store import ColdStore
+from infrastructure.file_system_cache_repository import (
+    FileSystemCacheRepository, CHECKSUM_SUFFIX, ZIP_SIDECAR_SUFFIXES
+)
+from infrastructure.metrics import MetricsRegistry, metrics as default_metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cold-tier index lookup that found nothing is trusted, and how many such misses are kept
+DEFAULT_INDEX_MISS_TTL = 60
+MAX_CACHED_INDEX_MISSES = 100000
+
+
+class TieredBlobStorage(BlobStorage):
+    """BlobStorage that fetches blobs missing locally from the cold tier before reading them."""
+
+    def __init__(self, objects_dir: Path, promote: Callable[[str], bool], exists_cold: Callable[[str], bool]):
+        super().__init__(objects_dir)
+        self._promote = promote
+        self._exists_cold = exists_cold
+
+    def get_blob_path(self, file_hash: str) -> Path:
+        path = super().get_blob_path(file_hash)
+        if not path.exists():
+            self._promote(file_hash)
+        return path
+
+    def blob_size(self, file_hash: str) -> Optional[int]:
+        self.get_blob_path(file_hash)
+        return super().blob_size(file_hash)
+
+    def iter_blob(self, file_hash: str, chunk_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+        self.get_blob_path(file_hash)
+        return super().iter_blob(file_hash, chunk_size)
+
+    def read_blob(self, file_hash: str) -> bytes:
+        try:
+            return super().read_blob(file_hash)
+        except FileNotFoundError:
+            # Demoted between the existence check and the read
+            self._promote(file_hash)
+            return super().read_blob(file_hash)
+
+    def blob_exists(self, hash_value: str) -> bool:
+        return super().get_blob_path(hash_value).exists() or self._exists_cold(hash_value)
+
+
+class TieredCacheRepository(FileSystemCacheRepository):
+    """
+    FileSystemCacheRepository whose cache directory is a bounded hot tier
+    in front of a larger cold store.
+
+    New blobs, indexes and bundle archives are written locally and copied to
+    the cold store in the background (write-back). Files are fetched back
+    into the hot tier when read (promotion); TierDemoter drops the least
+    recently used local copies, uploading any not yet copied, to keep the
+    hot tier under its budget (demotion). Removing an entry (eviction,
+    garbage collection) removes it from both tiers.
+
+    Aliases and bookkeeping (reference counts, statistics) stay local, and
+    the statistics describe the hot tier. Mark-and-sweep counts the indexes
+    of both tiers but only sweeps local blobs.
+
+    An index found in neither tier is remembered for index_miss_ttl seconds,
+    so repeated cache misses for the same request do not LIST the cold store
+    each time. Saving or demoting the index forgets the miss; an index
+    another server uploads is seen once the TTL has passed.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        cold_store: ColdStore,
+        compression_policy: Optional[CompressionPolicy] = None,
+        delta_cache_min_requests: int = 2,
+        metrics: Optional[MetricsRegistry] = None,
+        index_miss_ttl: float = DEFAULT_INDEX_MISS_TTL
+    ):
+        # Needed by iter_index_files() during the base initialization
+        self.cold_store = cold_store
+        self.metrics = metrics or default_metrics
+        self._dirty: Set[Path] = set()
+        self._dirty_lock = threading.Lock()
+        self.index_miss_ttl = index_miss_ttl
+        # bundle hash -> time.monotonic() until which it is known to have no index
+        self._index_misses: Dict[str, float] = {}
+        self._index_misses_lock = threading.Lock()
+        super().__init__(cache_dir, compression_policy, delta_cache_min_requests)
+        self.blob_storage = TieredBlobStorage(
+            self.objects_dir,
+            promote=lambda file_hash: self._promote(self._get_blob_path(file_hash)),
+            exists_cold=lambda file_hash: self.cold_store.exists(self._key(self._get_blob_path(file_hash)))
+        )
+
+    # Writes: local first, copied to the cold tier by flush_to_cold()
+
+    def store_blob(self, blob_hash: str, content: bytes) -> None:
+        blob_path = self._get_blob_path(blob_hash)
+        is_new = not blob_path.exists()
+        super().store_blob(blob_hash, content)
+        if is_new:
+            self._mark_dirty(blob_path)
+
+    def save_index(self, bundle_hash: str, manager: str, manager_version: str, index_data: Dict[str, str]) -> None:
+        super().save_index(bundle_hash, manager, manager_version, index_data)
+        self._forget_index_miss(bundle_hash)
+        index_path = self._find_index_file(bundle_hash)
+        if index_path is not None and index_path.exists():
+            self._mark_dirty(index_path)
+
+    def _publish(self, tmp_path: Path, artifact_path: Path, manager: Optional[str]) -> None:
+        super()._publish(tmp_path, artifact_path, manager)
+        # Deltas are cheap to rebuild and only dropped on demotion
+        if self.deltas_dir not in artifact_path.parents:
+            self._mark_dirty(artifact_path)
+
+    def _write_checksum(self, bundle_path: Path, checksum: str) -> None:
+        super()._write_checksum(bundle_path, checksum)
+        self._mark_dirty(bundle_path.with_name(bundle_path.name + CHECKSUM_SUFFIX))
+
+    def _mark_dirty(self, path: Path) -> None:
+        with self._dirty_lock:
+            self._dirty.add(path)
+
+    def flush_to_cold(self) -> int:
+        """
+        Copy files written since the last flush to the cold tier.
+
+        Returns:
+            Number of files uploaded
+        """
+        with self._dirty_lock:
+            pending, self._dirty = self._dirty, set()
+        uploaded = 0
+        for path in sorted(pending):
+            try:
+                if self._upload(path):
+                    uploaded += 1
+            except Exception as e:
+                logger.warning("Could not copy %s to the cold tier: %s", path, e)
+                self._mark_dirty(path)
+        return uploaded
+
+    def _upload(self, path: Path) -> bool:
+        """Copy a local file to the cold tier unless it is already there (all cached files are immutable)."""
+        key = self._key(path)
+        if not path.exists() or self.cold_store.exists(key):
+            return False
+        stat = path.stat()
+        self.cold_store.upload(key, path)
+        # Reading the file for the upload is not a use: keep its LRU position
+        os.utime(path, (stat.st_atime, stat.st_mtime))
+        self.metrics.increment("tier.uploads")
+        return True
+
+    # Reads: promote from the cold tier when missing locally
+
+    def _promote(self, path: Path) -> bool:
+        """Fetch a file from the cold tier into the hot tier; returns False if neither has it."""
+        if path.exists():
+            return True
+        if not self.cold_store.download(self._key(path), path):
+            return False
+        kind, manager = self._classify(path)
+        self.cache_stats.add(kind, path.stat().st_size, manager)
+        self.metrics.increment("tier.promotions")
+        return True
+
+    def _promote_artifact(self, artifact_path: Path) -> bool:
+        if artifact_path.exists():
+            return True
+        if not self._promote(artifact_path):
+            return False
+        checksum_path = artifact_path.with_name(artifact_path.name + CHECKSUM_SUFFIX)
+        self.cold_store.download(self._key(checksum_path), checksum_path)
+        if self._artifact_kind(artifact_path) == "bundles":
+            bundle_hash = artifact_path.name.split(".", 1)[0]
+            index_data = self.get_index(bundle_hash)
+            if index_data:
+                self._record_zip_members(artifact_path, index_data, self.get_index_manager(bundle_hash))
+        return True
+
+    def get_index(self, bundle_hash: str) -> Optional[Dict[str, str]]:
+        bundle_hash = self.resolve_bundle_hash(bundle_hash)
+        # A second attempt covers a demotion racing with the read
+        for _ in range(2):
+            index_path = self._find_index_file(bundle_hash)
+            if index_path is not None:
+                self._promote(index_path)
+            index_data = super().get_index(bundle_hash)
+            if index_data is not None or index_path is None:
+                return index_data
+        return None
+
+    def _find_index_file(self, bundle_hash: str) -> Optional[Path]:
+        """The index's local path, also when only the cold tier holds it."""
+        index_path = super()._find_index_file(bundle_hash)
+        if index_path is not None:
+            return index_path
+        now = time.monotonic()
+        with self._index_misses_lock:
+            if self._index_misses.get(bundle_hash, 0) > now:
+                return None
+        prefix = f"indexes/{bundle_hash[:2]}/{bundle_hash[2:4]}/{bundle_hash}."
+        self.metrics.increment("tier.index_lookups")
+        for key in self.cold_store.list(prefix):
+            if key.endswith(".index"):
+                return self.cache_dir / key
+        with self._index_misses_lock:
+            if len(self._index_misses) >= MAX_CACHED_INDEX_MISSES:
+                self._index_misses = {h: t for h, t in self._index_misses.items() if t > now}
+                if len(self._index_misses) >= MAX_CACHED_INDEX_MISSES:
+                    self._index_misses.clear()
+            self._index_misses[bundle_hash] = now + self.index_miss_ttl
+        return None
+
+    def _forget_index_miss(self, bundle_hash: str) -> None:
+        with self._index_misses_lock:
+            self._index_misses.pop(bundle_hash, None)
+
+    def has_bundle(self, bundle_hash: str) -> bool:
+        bundle_path = self._get_bundle_path(bundle_hash)
+        return bundle_path.exists() or self.cold_store.exists(self._key(bundle_path))
+
+    def get_bundle_zip_path(self, bundle_hash: str) -> Optional[Path]:
+        self._promote_artifact(self._get_bundle_path(bundle_hash))
+        return super().get_bundle_zip_path(bundle_hash)
+
+    def get_bundle_archive_path(self, bundle_hash: str, fmt: BundleFormat) -> Optional[Path]:
+        self._promote_artifact(self._get_bundle_path(bundle_hash, fmt.extension))
+        return super().get_bundle_archive_path(bundle_hash, fmt)
+
+    # Demotion and removal
+
+    def demote(self, path: Path) -> int:
+        """
+        Drop the local copy of a file, uploading it to the cold tier first if needed.
+
+        Cached deltas are removed instead, as they are cheap to rebuild.
+
+        Returns:
+            Number of local bytes freed
+        """
+        if self.deltas_dir in path.parents:
+            return self.remove_bundle_artifact(path)
+
+        kind, manager = self._classify(path)
+        if kind == "indexes":
+            self._forget_index_miss(path.name.split(".", 1)[0])
+        paths = [path]
+        if kind in ("bundles", "archives"):
+            paths.append(path.with_name(path.name + CHECKSUM_SUFFIX))
+
+        freed = 0
+        with self._lock:
+            try:
+                size = path.stat().st_size
+            except OSError:
+                return 0
+            for local_path in paths:
+                self._upload(local_path)
+            for local_path in paths + [path.with_name(path.name + suffix) for suffix in ZIP_SIDECAR_SUFFIXES]:
+                try:
+                    local_size = local_path.stat().st_size
+                    local_path.unlink()
+                    freed += local_size
+                except OSError:
+                    continue
+            self.zip_members.forget(path)
+        with self._dirty_lock:
+            self._dirty.difference_update(paths)
+        self.cache_stats.remove(kind, size, manager)
+        self.metrics.increment("tier.demotions")
+        return freed
+
+    def remove_blob(self, blob_hash: str, modified_before: Optional[float] = None) -> int:
+        blob_path = self._get_blob_path(blob_hash)
+        freed = super().remove_blob(blob_hash, modified_before)
+        # A blob only the cold tier holds was demoted, so it is past any grace period
+        if freed or not blob_path.exists():
+            self.cold_store.delete(self._key(blob_path))
+        return freed
+
+    def remove_bundle_artifact(self, artifact_path: Path) -> int:
+        freed = super().remove_bundle_artifact(artifact_path)
+        for path in [artifact_path, artifact_path.with_name(artifact_path.name + CHECKSUM_SUFFIX)]:
+            self.cold_store.delete(self._key(path))
+        return freed
+
+    def remove_index(self, index_path: Path) -> int:
+        freed = super().remove_index(index_path)
+        self.cold_store.delete(self._key(index_path))
+        return freed
+
+    def iter_index_files(self) -> Iterator[Path]:
+        """Yield every index of both tiers, as local paths."""
+        local_names = set()
+        for index_path in super().iter_index_files():
+            local_names.add(index_path.name)
+            yield index_path
+        for key in self.cold_store.list("indexes/"):
+            index_path = self.cache_dir / key
+            if key.endswith((".index", ".json")) and index_path.name not in local_names:
+                yield index_path
+
+    def mark_index_file(self, index_path: Path) -> None:
+        if index_path.exists():
+            super().mark_index_file(index_path)
+            return
+        # Counted without promoting, so a full pass leaves the hot tier alone
+        content = self.cold_store.read(self._key(index_path))
+        try:
+            index_data = json.loads(content) if content is not None else None
+        except json.JSONDecodeError:
+            index_data = None
+        if index_data is not None:
+            with self._index_lock:
+                self.refcounts.mark_index(index_path.name, index_blob_hashes(index_data))
+
+    def _classify(self, path: Path):
+        """Stats kind and manager of a cached file."""
+        if self.objects_dir in path.parents:
+            return "blobs", None
+        if self.indexes_dir in path.parents:
+            return "indexes", self._index_file_manager(path)
+        return self._artifact_kind(path), self.get_index_manager(path.name.split(".", 1)[0])
+
+    def _key(self, path: Path) -> str:
+        return path.relative_to(self.cache_dir).as_posix()
+
+
+class TierDemoter(CacheEvictor):
+    """
+    Keeps the hot tier of a TieredCacheRepository under a byte budget.
+
+    Each pass first copies newly written files to the cold tier, then, above
+    the high watermark, demotes least recently used files until the hot tier
+    is down to the low watermark: built archives first, then blobs and
+    indexes together. Nothing is deleted that the cold tier does not hold.
+    """
+
+    action = "Demoted"
+
+    def run_once(self) -> EvictionReport:
+        uploaded = self.cache_repository.flush_to_cold()
+        if uploaded:
+            logger.info("Copied %d files to the cold tier", uploaded)
+        return super().run_once()
+
+    def _evict(self, report: EvictionReport, target: int) -> None:
+        repo = self.cache_repository
+
+        for _, path in self._lru(self._artifact_files()):
+            if report.usage_after <= target:
+                return
+            report.usage_after -= repo.demote(path)
+            report.artifacts_removed += 1
+            self.metrics.increment("tier.demoted_artifacts")
+
+        cutoff = time.time() - self.grace_seconds
+        for atime, path in self._lru(self._entry_files()):
+            if report.usage_after <= target or atime > cutoff:
+                return
+            report.usage_after -= repo.demote(path)
+            if repo.objects_dir in path.parents:
+                report.blobs_removed += 1
+            else:
+                report.indexes_removed += 1
+
+    def _entry_files(self) -> Iterator[Path]:
+        yield from self._index_files()
+        for entry in _walk_files(self.cache_repository.objects_dir):
+            if not entry.name.endswith(".tmp"):
+                yield Path(entry.path)
+
@@ -1,21 +1,54 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Union
+import asyncio
 import os
 import io
+import re
+import hmac
 import json
+import logging
+import secrets
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends, Header, Response, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Depends, Header, Response, File, UploadFile, Form, Query
 from typing import List as TypingList
-from fastapi.responses import StreamingResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
 from application.dtos import CacheRequest, CacheResponse
 from application.handle_cache_request import HandleCacheRequest
 from infrastructure.api_key_validator import ApiKeyValidator
 from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.async_cache_repository import ThreadedAsyncCacheRepository
 from infrastructure.docker_utils import DockerUtils
+from infrastructure.bundle_builder import BundleBuilder
+from infrastructure.blob_gc import (
+    BlobGarbageCollector, DEFAULT_GC_INTERVAL, DEFAULT_FULL_GC_INTERVAL, DEFAULT_GRACE_SECONDS
+)
+from infrastructure.cache_evictor import (
+    CacheEvictor, DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK, DEFAULT_EVICTION_INTERVAL
+)
+from infrastructure.cold_store import create_cold_store
+from infrastructure.tiered_cache_repository import TieredCacheRepository, TierDemoter
+from infrastructure.s3_cache_repository import S3CacheRepository, ScratchCleaner
+from infrastructure.s3_client import parse_s3_location
+from infrastructure.metrics import metrics
+from infrastructure.package_manager_cache import PackageManagerCache, DEFAULT_PACKAGE_CACHE_MAX_BYTES
+from infrastructure.npm_assembler import NpmTreeAssembler
+from infrastructure.bundle_similarity_index import BundleSimilarityIndex
+from infrastructure.registry_proxy import (
+    RegistryProxy, IntegrityError, UpstreamError, DEFAULT_NPM_UPSTREAM, DEFAULT_COMPOSER_UPSTREAM
+)
 from domain.installer import InstallerFactory
+from domain.compression_policy import CompressionPolicy, DEFAULT_COMPRESSION_LEVEL
+from domain.bundle_format import negotiate_format, split_format_extension, available_formats
+from domain.prune_profile import PruneProfile, NO_PRUNING, load_prune_profiles
+
+logger = logging.getLogger(__name__)
 
 
 class Config:
@@ -26,7 +59,27 @@ class Config:
         use_docker_on_version_mismatch: bool = False,
         is_public: bool = False,
         api_keys: Optional[List[str]] = None,
-        base_url: str = "http://localhost:8000"
+        base_url: str = "http://localhost:8000",
+        zip_compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        zip_compression_levels: Optional[Dict[str, int]] = None,
+        zip_build_mode: str = "sync",
+        cache_max_bytes: Optional[int] = None,
+        cache_high_watermark: float = DEFAULT_HIGH_WATERMARK,
+        cache_low_watermark: float = DEFAULT_LOW_WATERMARK,
+        eviction_interval: float = DEFAULT_EVICTION_INTERVAL,
+        blob_gc_interval: float = DEFAULT_GC_INTERVAL,
+        blob_gc_full_interval: float = DEFAULT_FULL_GC_INTERVAL,
+        blob_gc_grace_seconds: float = DEFAULT_GRACE_SECONDS,
+        cold_store: Optional[str] = None,
+        storage: Optional[str] = None,
+        package_cache_max_bytes: int = DEFAULT_PACKAGE_CACHE_MAX_BYTES,
+        registry_proxy_url: Optional[str] = None,
+        npm_upstream: str = DEFAULT_NPM_UPSTREAM,
+        composer_upstream: str = DEFAULT_COMPOSER_UPSTREAM,
+        npm_assembly: bool = True,
+        prune_profiles: Optional[Dict[str, Dict[str, dict]]] = None,
+        api_key_prune_profiles: Optional[Dict[str, str]] = None,
+        install_timeouts: Optional[Dict[str, float]] = None
     ):
         self.cache_dir = cache_dir
         self.supported_versions = supported_versions
@@ -34,6 +87,28 @@ class Config:
         self.is_public = is_public
         self.api_keys = api_keys or []
         self.base_url = base_url.rstrip('/')
+        self.zip_compression_level = zip_compression_level
+        self.zip_compression_levels = zip_compression_levels or {}
+        self.zip_build_mode = zip_build_mode
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_high_watermark = cache_high_watermark
+        self.cache_low_watermark = cache_low_watermark
+        self.eviction_interval = eviction_interval
+        self.blob_gc_interval = blob_gc_interval
+        self.blob_gc_full_interval = blob_gc_full_interval
+        self.blob_gc_grace_seconds = blob_gc_grace_seconds
+        self.cold_store = cold_store
+        self.storage = storage
+        self.package_cache_max_bytes = package_cache_max_bytes
+        self.registry_proxy_url = registry_proxy_url.rstrip('/') if registry_proxy_url else None
+        self.npm_upstream = npm_upstream
+        self.composer_upstream = composer_upstream
+        self.npm_assembly = npm_assembly
+        self.prune_profiles = load_prune_profiles(prune_profiles)
+        # Profile applied when a request from this API key does not choose one
+        self.api_key_prune_profiles = api_key_prune_profiles or {}
+        # Install deadline in seconds per manager, 0 for none; unset managers use the defaults
+        self.install_timeouts = install_timeouts or {}
 
 
 class CacheResponseDTO(BaseModel):
@@ -42,22 +117,138 @@ class CacheResponseDTO(BaseModel):
     cache_hit: bool = Field(..., description="Whether the bundle was already cached")
 
 
+class BlobBatchGetRequest(BaseModel):
+    """Request body for POST /v1/blobs:batchGet."""
+    hashes: List[str] = Field(..., description="Content hashes of the blobs to fetch")
+
+
+BLOB_HASH_RE = re.compile(r"[0-9a-f]{64}")
+MAX_BLOBS_PER_BATCH = 10000
+# Cache requests handled at once; a miss holds its thread for the whole install
+CACHE_REQUEST_WORKERS = 8
+# Admits this process's own installers to the registry proxy; handed to them inside the registry URLs
+REGISTRY_TOKEN_USER = "installer"
+registry_token = secrets.token_urlsafe(32)
+
+
 config: Optional[Config] = None
-cache_repository: Optional[FileSystemCacheRepository] = None
+cache_repository: Optional[Union[FileSystemCacheRepository, S3CacheRepository]] = None
+async_cache_repository: Optional[ThreadedAsyncCacheRepository] = None
 api_key_validator: Optional[ApiKeyValidator] = None
 docker_utils: Optional[DockerUtils] = None
+bundle_builder: Optional[BundleBuilder] = None
+cache_evictor: Optional[CacheEvictor] = None
+blob_gc: Optional[BlobGarbageCollector] = None
+package_cache: Optional[PackageManagerCache] = None
+registry_proxy: Optional[RegistryProxy] = None
+similarity_index: Optional[BundleSimilarityIndex] = None
+scratch_cleaner: Optional[ScratchCleaner] = None
+cache_request_executor: Optional[ThreadPoolExecutor] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global cache_repository, docker_utils
+    global cache_repository, async_cache_repository, docker_utils, bundle_builder, cache_evictor, blob_gc, package_cache
+    global registry_proxy, similarity_index, cache_request_executor, scratch_cleaner
     if config:
-        cache_repository = FileSystemCacheRepository(Path(config.cache_dir))
-        docker_utils = DockerUtils()
+        compression_policy = CompressionPolicy(
+            default_level=config.zip_compression_level,
+            manager_levels=config.zip_compression_levels
+        )
+        if config.storage:
+            bucket, prefix = parse_s3_location(config.storage)
+            cache_repository = S3CacheRepository(
+                bucket, prefix,
+                scratch_dir=Path(config.cache_dir) / "scratch",
+                compression_policy=compression_policy,
+                endpoint_url=os.environ.get("AWS_ENDPOINT_URL")
+            )
+            scratch_cleaner = ScratchCleaner(cache_repository)
+            scratch_cleaner.start()
+        elif config.cold_store:
+            cache_repository = TieredCacheRepository(
+                Path(config.cache_dir), create_cold_store(config.cold_store), compression_policy
+            )
+        else:
+            cache_repository = FileSystemCacheRepository(Path(config.cache_dir), compression_policy)
+        package_cache = PackageManagerCache(
+            Path(config.cache_dir) / "package-managers", max_bytes=config.package_cache_max_bytes
+        )
+        docker_utils = DockerUtils(package_cache=package_cache)
+        bundle_builder = BundleBuilder(cache_repository)
+        is_local = isinstance(cache_repository, FileSystemCacheRepository)
+        if config.cache_max_bytes and is_local:
+            # With a cold tier the budget bounds the local tier, by demoting instead of deleting
+            evictor_class = TierDemoter if isinstance(cache_repository, TieredCacheRepository) else CacheEvictor
+            cache_evictor = evictor_class(
+                cache_repository,
+                max_bytes=config.cache_max_bytes,
+                high_watermark=config.cache_high_watermark,
+                low_watermark=config.cache_low_watermark,
+                interval=config.eviction_interval,
+                grace_seconds=config.blob_gc_grace_seconds
+            )
+            cache_evictor.start()
+        if config.blob_gc_interval and is_local:
+            blob_gc = BlobGarbageCollector(
+                cache_repository,
+                grace_seconds=config.blob_gc_grace_seconds,
+                interval=config.blob_gc_interval,
+                full_interval=config.blob_gc_full_interval
+            )
+            blob_gc.start()
+        if is_local:
+            # Cache misses start from the most similar cached tree
+            similarity_index = BundleSimilarityIndex(Path(config.cache_dir) / "similarity.sqlite3")
+        if config.registry_proxy_url and is_local:
+            registry_proxy = RegistryProxy(
+                cache_repository,
+                Path(config.cache_dir) / "registry",
+                npm_upstream=config.npm_upstream,
+                composer_upstream=config.composer_upstream
+            )
+        if is_local and not cache_repository.cache_stats.is_reconciled:
+            # Recount in the background; /v1/stats reports reconciled_at null until done
+            threading.Thread(
+                target=_reconcile_cache_stats, args=(cache_repository,), name="stats-reconcile", daemon=True
+            ).start()
     yield
     # Shutdown
-    pass
+    registry_proxy = None
+    if similarity_index:
+        similarity_index.close()
+        similarity_index = None
+    if cache_evictor:
+        cache_evictor.stop()
+        cache_evictor = None
+    if scratch_cleaner:
+        scratch_cleaner.stop()
+        scratch_cleaner = None
+    if blob_gc:
+        blob_gc.stop()
+        blob_gc = None
+    if bundle_builder:
+        bundle_builder.shutdown(wait=True)
+    if isinstance(cache_repository, TieredCacheRepository):
+        cache_repository.flush_to_cold()
+    if cache_request_executor:
+        cache_request_executor.shutdown(wait=True)
+        cache_request_executor = None
+    if async_cache_repository:
+        async_cache_repository.close()
+        async_cache_repository = None
+    if isinstance(cache_repository, FileSystemCacheRepository):
+        cache_repository.cache_stats.close()
+    elif isinstance(cache_repository, S3CacheRepository):
+        cache_repository.close()
+
+
+def _reconcile_cache_stats(repository: FileSystemCacheRepository) -> None:
+    try:
+        repository.reconcile_cache_stats()
+    except Exception:
+        logger.exception("Reconciling cache statistics failed")
 
 
 app = FastAPI(
@@ -68,6 +259,12 @@ app = FastAPI(
 )
 
 
+def _bearer_key(authorization: Optional[str]) -> Optional[str]:
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return authorization.split(" ", 1)[1]
+
+
 def validate_api_key(authorization: Optional[str] = Header(None)) -> None:
     """Validate API key using Bearer token format."""
     if config and not config.is_public:
@@ -87,11 +284,14 @@ def validate_api_key(authorization: Optional[str] = Header(None)) -> None:
 
 @app.post("/v1/cache", response_model=CacheResponseDTO, dependencies=[Depends(validate_api_key)])
 async def cache_dependencies(
+    http_response: Response,
     manager: str = Form(...),
     hash: str = Form(...),
     versions: str = Form(...),
     file: TypingList[UploadFile] = File(...),
-    custom_args: Optional[str] = Form(None)
+    custom_args: Optional[str] = Form(None),
+    prune: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None)
 ):
     """
     Process a cache request for dependencies.
@@ -108,6 +308,8 @@ async def cache_dependencies(
     - versions: JSON string with version information
     - file: Array of files (manifest and optionally lockfile)
     - custom_args: Optional JSON array of custom arguments for the package manager
+    - prune: Optional prune profile name ("none" for the unpruned bundle); defaults
+      to the API key's profile
     """
     if not config or not cache_repository:
         raise HTTPException(status_code=500, detail="Server not properly configured")
@@ -132,6 +334,8 @@ async def cache_dependencies(
     if manager not in ["npm", "composer", "yarn"]:
         raise HTTPException(status_code=400, detail=f"Unsupported manager: {manager}")
     
+    prune_profile = _resolve_prune_profile(manager, prune, authorization)
+    
     # Validate we have at least one file
     if not file or len(file) == 0:
         raise HTTPException(status_code=400, detail="No files provided")
@@ -187,10 +391,19 @@ async def cache_dependencies(
     # Create request handler
     handler = HandleCacheRequest(
         cache_repository=cache_repository,
-        installer_factory=InstallerFactory(),
+        installer_factory=InstallerFactory(
+            registry_urls=_registry_urls(),
+            install_timeouts=config.install_timeouts,
+            log_dir=Path(config.cache_dir) / "install-logs"
+        ),
         docker_utils=docker_utils,
         supported_versions=config.supported_versions,
-        use_docker_on_version_mismatch=config.use_docker_on_version_mismatch
+        use_docker_on_version_mismatch=config.use_docker_on_version_mismatch,
+        bundle_builder=bundle_builder,
+        zip_build_mode=config.zip_build_mode,
+        package_cache=package_cache,
+        npm_assembler=NpmTreeAssembler(cache_repository) if config.npm_assembly else None,
+        similarity_index=similarity_index
     )
     
     # Convert to application DTO
@@ -199,12 +412,21 @@ async def cache_dependencies(
         versions=versions_dict,
         lockfile_content=lockfile_content,
         manifest_content=manifest_content,
-        custom_args=custom_args_list
+        custom_args=custom_args_list,
+        prune_profile=prune_profile
     )
     
     try:
-        # Handle the request
-        response = handler.handle(cache_request)
+        # Installs, stores and ZIP builds block for minutes: keep them off the event loop,
+        # which meanwhile serves downloads and the registry proxy the install fetches from
+        response = await asyncio.get_running_loop().run_in_executor(
+            _cache_request_executor(), handler.handle, cache_request
+        )
+        
+        if response.timings:
+            http_response.headers["Server-Timing"] = ", ".join(
+                f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in response.timings.items()
+            )
         
         # Convert response to match API spec
         return CacheResponseDTO(
@@ -218,35 +440,70 @@ async def cache_dependencies(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def _resolve_prune_profile(manager: str, requested: Optional[str], authorization: Optional[str]) -> Optional[PruneProfile]:
+    """The profile a request asks for, or else its API key's default."""
+    name = requested or config.api_key_prune_profiles.get(_bearer_key(authorization) or "")
+    if not name or name == NO_PRUNING:
+        return None
+    profile = config.prune_profiles.get(manager, {}).get(name)
+    if profile is None and requested:
+        raise HTTPException(status_code=400, detail=f"Unknown prune profile for {manager}: {name}")
+    # A key default the manager has no profile for leaves its bundles unpruned
+    return profile
+
+
 @app.get("/download/{bundle_hash}.zip", dependencies=[Depends(validate_api_key)])
-async def download_bundle(bundle_hash: str):
+async def download_bundle(
+    bundle_hash: str,
+    base: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Download a cached bundle as a ZIP file.
     
     This endpoint retrieves a previously cached bundle and streams it as a ZIP file.
+    Bundle ZIPs are reproducible, so the SHA-256 of the ZIP is sent as the
+    `ETag` and `X-Checksum-SHA256`; a matching `If-None-Match` gets a 304.
+    
+    With `base=<old_hash>` only the files added or changed since the base
+    bundle are sent, plus a manifest of deleted paths, for in-place updates.
     """
     if not cache_repository:
         raise HTTPException(status_code=500, detail="Server not properly configured")
     
+    if base:
+        if not BLOB_HASH_RE.fullmatch(base):
+            raise HTTPException(status_code=400, detail="Invalid base bundle hash")
+        return await _download_delta(base, bundle_hash)
+    
+    if isinstance(cache_repository, S3CacheRepository):
+        return await _redirect_to_bundle(bundle_hash)
+    
     try:
-        # Get the ZIP file path
-        zip_path = cache_repository.get_bundle_zip_path(bundle_hash)
+        # Get the ZIP file path, building it now if only the index exists
+        zip_path = await _ensure_bundle_zip(bundle_hash)
         
         if not zip_path or not zip_path.exists():
             raise HTTPException(status_code=404, detail="Bundle not found")
         
-        # Stream the file
-        def iterfile():
-            with open(zip_path, 'rb') as f:
-                while chunk := f.read(8192):
-                    yield chunk
+        headers = {"Content-Disposition": f"attachment; filename={bundle_hash}.zip"}
+        checksum = await run_in_threadpool(cache_repository.get_bundle_checksum, bundle_hash)
+        if checksum:
+            etag = f'"{checksum}"'
+            headers["ETag"] = etag
+            headers["X-Checksum-SHA256"] = checksum
+            if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+                return Response(status_code=304, headers={"ETag": etag})
+        
+        # Stream the file without holding a threadpool worker for the whole download
+        chunks = await _async_repository().stream_bundle_zip(bundle_hash)
+        if chunks is None:
+            raise HTTPException(status_code=404, detail="Bundle not found")
         
         return StreamingResponse(
-            iterfile(),
+            chunks,
             media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename={bundle_hash}.zip"
-            }
+            headers=headers
         )
     
     except HTTPException:
@@ -255,6 +512,293 @@ async def download_bundle(bundle_hash: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving bundle: {str(e)}")
 
 
+def _async_repository() -> ThreadedAsyncCacheRepository:
+    """The non-blocking view of the local cache repository, rebuilt if the repository was replaced."""
+    global async_cache_repository
+    if async_cache_repository is None or async_cache_repository.repository is not cache_repository:
+        async_cache_repository = ThreadedAsyncCacheRepository(cache_repository)
+    return async_cache_repository
+
+
+def _cache_request_executor() -> ThreadPoolExecutor:
+    """The threads cache requests are handled on, separate from the I/O threads of downloads."""
+    global cache_request_executor
+    if cache_request_executor is None:
+        cache_request_executor = ThreadPoolExecutor(
+            max_workers=CACHE_REQUEST_WORKERS, thread_name_prefix="cache-request"
+        )
+    return cache_request_executor
+
+
+async def _ensure_bundle_zip(bundle_hash: str) -> Optional[Path]:
+    """Return the bundle ZIP path, waiting on a single shared build if it is missing."""
+    zip_path = cache_repository.get_bundle_zip_path(bundle_hash)
+    if zip_path or not bundle_builder:
+        return zip_path
+    # Unknown hashes never reach the builder, its workers or its failure count
+    if await run_in_threadpool(cache_repository.get_index, bundle_hash) is None:
+        return None
+    return await run_in_threadpool(bundle_builder.ensure_built, bundle_hash)
+
+
+async def _redirect_to_bundle(bundle_hash: str) -> RedirectResponse:
+    """Send the client to a presigned URL of the bundle ZIP, building it first if needed."""
+    try:
+        url = await run_in_threadpool(cache_repository.get_bundle_download_url, bundle_hash)
+        if url is None and await _ensure_bundle_zip(bundle_hash):
+            url = await run_in_threadpool(cache_repository.get_bundle_download_url, bundle_hash)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving bundle: {str(e)}")
+    
+    if url is None:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    return RedirectResponse(url, status_code=307)
+
+
+def _require_local_cache(feature: str) -> None:
+    """Reject features served from the cache directory when the cache lives in S3."""
+    if not isinstance(cache_repository, FileSystemCacheRepository):
+        raise HTTPException(status_code=501, detail=f"{feature} is not supported with S3 storage")
+
+
+async def _download_delta(base_hash: str, bundle_hash: str) -> StreamingResponse:
+    """Stream the delta ZIP that turns bundle base_hash into bundle_hash."""
+    _require_local_cache("Delta download")
+    try:
+        # Building a cold delta reads every changed blob; keep it off the event loop
+        chunks = await run_in_threadpool(cache_repository.stream_delta_zip, base_hash, bundle_hash)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving bundle: {str(e)}")
+    
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Bundle or base bundle not found")
+    
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={bundle_hash}.from.{base_hash}.zip",
+            "X-Delta-Base": base_hash
+        }
+    )
+
+
+@app.get("/download/{bundle_name}", dependencies=[Depends(validate_api_key)])
+async def download_bundle_negotiated(
+    bundle_name: str,
+    accept: Optional[str] = Header(None),
+    requested_format: Optional[str] = Query(None, alias="format"),
+    dedupe: bool = Query(False)
+):
+    """
+    Download a cached bundle in a negotiated archive format.
+    
+    The format is taken from the `format` query parameter, a known file
+    extension on the name (`.tar`, `.tar.gz`, `.tar.zst`), or the Accept
+    header, in that order. Tar formats are streamed straight from the index
+    and blobs on first request and cached per format afterwards.
+    
+    With `dedupe=true` (or a `.dedup.tar*` name) a tar format writes each distinct file once and emits
+    hardlink entries for the other paths with the same content; the
+    `X-Dedup-*` headers report the payload reduction.
+    """
+    if not cache_repository:
+        raise HTTPException(status_code=500, detail="Server not properly configured")
+    
+    bundle_hash, fmt = split_format_extension(bundle_name)
+    try:
+        if requested_format or not fmt:
+            fmt = negotiate_format(accept, requested_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if fmt is None:
+        supported = ", ".join(f.media_type for f in available_formats())
+        raise HTTPException(status_code=406, detail=f"No acceptable bundle format. Supported: {supported}")
+    
+    if not fmt.is_tar and isinstance(cache_repository, S3CacheRepository):
+        return await _redirect_to_bundle(bundle_hash)
+    _require_local_cache("Tar download")
+    
+    headers = {"Vary": "Accept"}
+    if dedupe and not fmt.hardlinks:
+        try:
+            fmt = fmt.deduplicated()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        if not fmt.is_tar:
+            await _ensure_bundle_zip(bundle_hash)
+        # A first request builds the tar and dedup stats stat every blob; keep both off the event loop
+        chunks = await run_in_threadpool(cache_repository.stream_bundle_archive, bundle_hash, fmt)
+        if chunks is not None and fmt.hardlinks:
+            dup_stats = await run_in_threadpool(cache_repository.get_duplication_stats, bundle_hash)
+            if dup_stats:
+                headers["X-Dedup-Total-Bytes"] = str(dup_stats.total_bytes)
+                headers["X-Dedup-Unique-Bytes"] = str(dup_stats.unique_bytes)
+                headers["X-Dedup-Reduction-Ratio"] = f"{dup_stats.reduction_ratio:.4f}"
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving bundle: {str(e)}")
+    
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    
+    headers["Content-Disposition"] = f"attachment; filename={bundle_hash}{fmt.extension}"
+    return StreamingResponse(chunks, media_type=fmt.media_type, headers=headers)
+
+
+@app.get("/v1/bundles/{bundle_hash}/index", dependencies=[Depends(validate_api_key)])
+async def get_bundle_index(bundle_hash: str):
+    """
+    Return a bundle's file list so clients can fetch only the blobs they lack.
+    
+    Each entry is `[path, hash, size, mode, target]`. Files have mode 0644 or
+    0755 and a `size` that is null for a blob missing from storage; symlinks
+    (mode 0120777, with their `target`) and empty directories (mode 040755)
+    have a null hash and size.
+    """
+    if not cache_repository:
+        raise HTTPException(status_code=500, detail="Server not properly configured")
+    
+    _require_local_cache("Bundle index listing")
+    # Sizes come from a stat of every blob; keep them off the event loop
+    entries = await run_in_threadpool(cache_repository.describe_index, bundle_hash)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    
+    return {
+        "bundle_hash": bundle_hash,
+        "fields": ["path", "hash", "size", "mode", "target"],
+        "entries": [list(entry) for entry in entries]
+    }
+
+
+@app.post("/v1/blobs:batchGet", dependencies=[Depends(validate_api_key)])
+async def batch_get_blobs(request: BlobBatchGetRequest):
+    """
+    Stream many blobs in one response.
+    
+    The body is a sequence of frames, one per requested hash in request
+    order: an ASCII header line `<hash> <size>\n` followed by exactly `size`
+    bytes of content. A missing blob is sent as `<hash> -1\n` with no content.
+    """
+    if not cache_repository:
+        raise HTTPException(status_code=500, detail="Server not properly configured")
+    
+    if len(request.hashes) > MAX_BLOBS_PER_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BLOBS_PER_BATCH} hashes per batch")
+    
+    invalid = [h for h in request.hashes if not BLOB_HASH_RE.fullmatch(h)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid blob hash: {invalid[0]}")
+    
+    _require_local_cache("Blob batch download")
+    repository = _async_repository()
+    
+    async def iterblobs():
+        for blob_hash in request.hashes:
+            size = await repository.blob_size(blob_hash)
+            chunks = await repository.iter_blob(blob_hash) if size is not None else None
+            if chunks is None:
+                yield f"{blob_hash} -1\n".encode("ascii")
+                continue
+            yield f"{blob_hash} {size}\n".encode("ascii")
+            async for chunk in chunks:
+                yield chunk
+    
+    return StreamingResponse(iterblobs(), media_type="application/octet-stream")
+
+
+def validate_registry_access(authorization: Optional[str] = Header(None)) -> None:
+    """
+    Let the server's own installers in with the per-process registry token;
+    others need an API key like on any endpoint. The peer address is never
+    trusted: behind a same-host reverse proxy every client is loopback.
+    """
+    token = _bearer_key(authorization)
+    if token and hmac.compare_digest(token.encode(), registry_token.encode()):
+        return
+    validate_api_key(authorization)
+
+
+def _registry_urls() -> Dict[str, str]:
+    """Registry URL per manager for the installers, with the registry token as its credentials."""
+    if not registry_proxy:
+        return {}
+    parts = urllib.parse.urlsplit(config.registry_proxy_url)
+    base = parts._replace(netloc=f"{REGISTRY_TOKEN_USER}:{registry_token}@{parts.netloc}").geturl()
+    return {
+        "npm": f"{base}/registry/npm",
+        "composer": f"{base}/registry/composer"
+    }
+
+
+def _require_registry_proxy() -> RegistryProxy:
+    if not registry_proxy:
+        raise HTTPException(status_code=404, detail="Registry proxy is not enabled")
+    return registry_proxy
+
+
+@app.get("/registry/npm/{path:path}", dependencies=[Depends(validate_registry_access)])
+async def npm_registry(path: str):
+    """
+    npm registry protocol: packuments at `/{package}`, tarballs at `/{package}/-/{file}.tgz`.
+    
+    Tarballs are served from the blob store after being verified once
+    against the packument's integrity hash.
+    """
+    proxy = _require_registry_proxy()
+    package, tarball_sep, filename = path.partition("/-/")
+    try:
+        if tarball_sep:
+            blob_hash = await run_in_threadpool(proxy.get_npm_tarball, package, filename)
+            chunks = await _async_repository().iter_blob(blob_hash) if blob_hash else None
+            if chunks is None:
+                raise HTTPException(status_code=404, detail="Tarball not found")
+            return StreamingResponse(chunks, media_type="application/octet-stream")
+        content = await run_in_threadpool(proxy.get_npm_metadata, package)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (IntegrityError, UpstreamError) as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    if content is None:
+        raise HTTPException(status_code=404, detail="Package not found")
+    return Response(content, media_type="application/json")
+
+
+@app.get("/registry/composer/{path:path}", dependencies=[Depends(validate_registry_access)])
+async def composer_repository(path: str):
+    """Composer repository metadata: `/packages.json` and `/p2/{vendor}/{package}.json`."""
+    proxy = _require_registry_proxy()
+    try:
+        content = await run_in_threadpool(proxy.get_composer_metadata, path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UpstreamError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    if content is None:
+        raise HTTPException(status_code=404, detail="Package not found")
+    return Response(content, media_type="application/json")
+
+
+@app.get("/v1/metrics", dependencies=[Depends(validate_api_key)])
+async def get_metrics():
+    """In-process counters and phase timings (cache hits/misses, install, store, zip)."""
+    return metrics.snapshot()
+
+
+@app.get("/v1/stats", dependencies=[Depends(validate_api_key)])
+async def get_stats():
+    """Cache counts and sizes, overall and per package manager, from running totals."""
+    if not cache_repository:
+        raise HTTPException(status_code=500, detail="Server not properly configured")
+    # Running totals locally, but a LIST of the whole bucket on S3
+    return await run_in_threadpool(cache_repository.get_cache_stats)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -267,7 +811,27 @@ def initialize_app(
     use_docker_on_version_mismatch: bool = False,
     is_public: bool = False,
     api_keys: Optional[List[str]] = None,
-    base_url: str = "http://localhost:8000"
+    base_url: str = "http://localhost:8000",
+    zip_compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+    zip_compression_levels: Optional[Dict[str, int]] = None,
+    zip_build_mode: str = "sync",
+    cache_max_bytes: Optional[int] = None,
+    cache_high_watermark: float = DEFAULT_HIGH_WATERMARK,
+    cache_low_watermark: float = DEFAULT_LOW_WATERMARK,
+    eviction_interval: float = DEFAULT_EVICTION_INTERVAL,
+    blob_gc_interval: float = DEFAULT_GC_INTERVAL,
+    blob_gc_full_interval: float = DEFAULT_FULL_GC_INTERVAL,
+    blob_gc_grace_seconds: float = DEFAULT_GRACE_SECONDS,
+    cold_store: Optional[str] = None,
+    storage: Optional[str] = None,
+    package_cache_max_bytes: int = DEFAULT_PACKAGE_CACHE_MAX_BYTES,
+    registry_proxy_url: Optional[str] = None,
+    npm_upstream: str = DEFAULT_NPM_UPSTREAM,
+    composer_upstream: str = DEFAULT_COMPOSER_UPSTREAM,
+    npm_assembly: bool = True,
+    prune_profiles: Optional[Dict[str, Dict[str, dict]]] = None,
+    api_key_prune_profiles: Optional[Dict[str, str]] = None,
+    install_timeouts: Optional[Dict[str, float]] = None
 ):
     """Initialize the FastAPI application with configuration."""
     global config, api_key_validator
@@ -278,7 +842,27 @@ def initialize_app(
         use_docker_on_version_mismatch=use_docker_on_version_mismatch,
         is_public=is_public,
         api_keys=api_keys,
-        base_url=base_url
+        base_url=base_url,
+        zip_compression_level=zip_compression_level,
+        zip_compression_levels=zip_compression_levels,
+        zip_build_mode=zip_build_mode,
+        cache_max_bytes=cache_max_bytes,
+        cache_high_watermark=cache_high_watermark,
+        cache_low_watermark=cache_low_watermark,
+        eviction_interval=eviction_interval,
+        blob_gc_interval=blob_gc_interval,
+        blob_gc_full_interval=blob_gc_full_interval,
+        blob_gc_grace_seconds=blob_gc_grace_seconds,
+        cold_store=cold_store,
+        storage=storage,
+        package_cache_max_bytes=package_cache_max_bytes,
+        registry_proxy_url=registry_proxy_url,
+        npm_upstream=npm_upstream,
+        composer_upstream=composer_upstream,
+        npm_assembly=npm_assembly,
+        prune_profiles=prune_profiles,
+        api_key_prune_profiles=api_key_prune_profiles,
+        install_timeouts=install_timeouts
     )
     
     # Initialize API key validator
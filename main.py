@@ -10,10 +10,31 @@ Usage:
         [--use-docker-on-version-mismatch] \
         [--is_public] \
         [--api-keys=<KEY1>,<KEY2>,...] \
-        [--base-url=<BASE_URL>]
+        [--base-url=<BASE_URL>] \
+        [--zip-compression-level=<0-9>] \
+        [--zip-compression-levels=<MANAGER>:<0-9>,...] \
+        [--zip-build-mode=sync|background|lazy] \
+        [--cache-max-size=<SIZE>] \
+        [--cache-high-watermark=<0-1>] \
+        [--cache-low-watermark=<0-1>] \
+        [--eviction-interval=<SECONDS>] \
+        [--blob-gc-interval=<SECONDS>] \
+        [--blob-gc-full-interval=<SECONDS>] \
+        [--blob-gc-grace=<SECONDS>] \
+        [--cold-store=<DIR>|s3://<BUCKET>[/<PREFIX>]] \
+        [--storage=s3://<BUCKET>[/<PREFIX>]] \
+        [--package-cache-max-size=<SIZE>] \
+        [--registry-proxy] \
+        [--npm-upstream=<URL>] \
+        [--composer-upstream=<URL>] \
+        [--no-npm-assembly] \
+        [--prune-profiles=<FILE>] \
+        [--api-key-prune-profiles=<KEY>:<PROFILE>,...] \
+        [--install-timeouts=<MANAGER>:<SECONDS>,...]
 """
 
 import argparse
+import json
 import sys
 import uvicorn
 from typing import Dict, List, Optional
@@ -44,6 +65,73 @@ def parse_supported_versions(version_string: str) -> List[Dict[str, str]]:
     return versions
 
 
+def parse_compression_levels(levels_string: str) -> Dict[str, int]:
+    """Parse a string like 'npm:6,composer:9' into a manager -> level dict."""
+    if not levels_string:
+        return {}
+    
+    levels = {}
+    for pair in levels_string.split(','):
+        manager, _, level = pair.strip().partition(':')
+        if not manager or not level:
+            raise ValueError(f"Invalid compression level entry: {pair!r}")
+        levels[manager] = int(level)
+    
+    return levels
+
+
+def parse_api_key_prune_profiles(profiles_string: str) -> Dict[str, str]:
+    """Parse a string like 'KEY1:slim,KEY2:docs' into an API key -> prune profile dict."""
+    if not profiles_string:
+        return {}
+    
+    profiles = {}
+    for pair in profiles_string.split(','):
+        api_key, _, profile = pair.strip().rpartition(':')
+        if not api_key or not profile:
+            raise ValueError(f"Invalid API key prune profile entry: {pair!r}")
+        profiles[api_key] = profile
+    
+    return profiles
+
+
+def parse_install_timeouts(timeouts_string: str) -> Dict[str, float]:
+    """Parse a string like 'npm:600,composer:900' into a manager -> seconds dict."""
+    if not timeouts_string:
+        return {}
+    
+    timeouts = {}
+    for pair in timeouts_string.split(','):
+        manager, _, seconds = pair.strip().partition(':')
+        if not manager or not seconds:
+            raise ValueError(f"Invalid install timeout entry: {pair!r}")
+        timeouts[manager] = float(seconds)
+    
+    return timeouts
+
+
+def load_prune_profiles_file(path: Optional[str]) -> Optional[Dict[str, Dict[str, dict]]]:
+    """Read custom prune profiles: {manager: {profile: {"remove": [...], "keep": [...]}}}."""
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(size_string: str) -> int:
+    """Parse a byte size like '500M', '20G' or '1048576' into bytes."""
+    value = size_string.strip().upper().removesuffix('B').removesuffix('I')
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ''
+    number = value[:len(value) - len(unit)]
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size: {size_string!r}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='DepCacheProxy Server - Dependency caching proxy',
@@ -76,6 +164,55 @@ def main():
                        help='Base URL for download links (default: http://localhost:8000)')
     parser.add_argument('--host', default='0.0.0.0',
                        help='Host to bind to (default: 0.0.0.0)')
+    parser.add_argument('--zip-compression-level', type=int, default=6,
+                       help='Deflate level for bundle ZIPs (0-9, default: 6)')
+    parser.add_argument('--zip-compression-levels',
+                       help='Per-manager deflate levels (format: MANAGER:LEVEL,...)')
+    parser.add_argument('--zip-build-mode', choices=['sync', 'background', 'lazy'], default='sync',
+                       help='Build bundle ZIPs before responding (sync), in the background, '
+                            'or on first download (lazy) (default: sync)')
+    
+    parser.add_argument('--cache-max-size', type=parse_size,
+                       help='Byte budget for the cache directory, e.g. 50G; enables LRU eviction')
+    parser.add_argument('--cache-high-watermark', type=float, default=0.9,
+                       help='Start evicting above this fraction of the budget (default: 0.9)')
+    parser.add_argument('--cache-low-watermark', type=float, default=0.8,
+                       help='Evict down to this fraction of the budget (default: 0.8)')
+    parser.add_argument('--eviction-interval', type=float, default=300,
+                       help='Seconds between eviction passes (default: 300)')
+    parser.add_argument('--blob-gc-interval', type=float, default=600,
+                       help='Seconds between blob garbage collection passes, 0 to disable (default: 600)')
+    parser.add_argument('--blob-gc-full-interval', type=float, default=86400,
+                       help='Seconds between full mark-and-sweep passes (default: 86400)')
+    parser.add_argument('--blob-gc-grace', type=float, default=3600,
+                       help='Never delete blobs written in the last SECONDS (default: 3600)')
+    parser.add_argument('--cold-store',
+                       help='Cold tier behind the cache directory: a directory or s3://bucket/prefix '
+                            '(requires --cache-max-size, which then bounds the local tier)')
+    parser.add_argument('--storage',
+                       help='Keep the whole cache in an S3-compatible bucket, s3://bucket/prefix, shared by '
+                            'server replicas; --cache_dir only holds scratch files')
+    parser.add_argument('--package-cache-max-size', type=parse_size, default='5G',
+                       help='Byte budget for the npm/composer download caches shared by installs (default: 5G)')
+    parser.add_argument('--registry-proxy', action='store_true',
+                       help='Serve an npm registry and Composer repository proxy under /registry and '
+                            'point native installs at it')
+    parser.add_argument('--npm-upstream', default='https://registry.npmjs.org',
+                       help='Registry proxied under /registry/npm (default: https://registry.npmjs.org)')
+    parser.add_argument('--composer-upstream', default='https://repo.packagist.org',
+                       help='Repository proxied under /registry/composer (default: https://repo.packagist.org)')
+    parser.add_argument('--no-npm-assembly', dest='npm_assembly', action='store_false',
+                       help='Always run npm, even when node_modules can be assembled from the lockfile '
+                            'and cached tarballs')
+    parser.add_argument('--prune-profiles',
+                       help='JSON file of prune profiles per manager, added to or replacing the built-in '
+                            'docs and slim profiles')
+    parser.add_argument('--api-key-prune-profiles', default='',
+                       help='Prune profile applied to requests of an API key that choose none '
+                            '(e.g. KEY1:slim,KEY2:docs)')
+    parser.add_argument('--install-timeouts', default='',
+                       help='Seconds an install may run per manager before its processes are killed, '
+                            '0 for no limit (default: npm:600,composer:900)')
     
     args = parser.parse_args()
     
@@ -107,11 +244,22 @@ def main():
         print("Error: Either --is_public must be set or --api-keys must be provided", file=sys.stderr)
         sys.exit(1)
     
+    if args.storage and args.cold_store:
+        print("Error: --storage and --cold-store cannot be combined", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.cold_store and not args.cache_max_size:
+        print("Error: --cold-store requires --cache-max-size", file=sys.stderr)
+        sys.exit(1)
+    
     # Update base URL with actual port if using default
     base_url = args.base_url
     if base_url == 'http://localhost:8000' and args.port != 8000:
         base_url = f'http://localhost:{args.port}'
     
+    # Installers run on this host, so they reach the registry proxy over loopback when possible
+    local_host = '127.0.0.1' if args.host in ('0.0.0.0', '::', '') else args.host
+    
     # Initialize the FastAPI app
     app = initialize_app(
         cache_dir=args.cache_dir,
@@ -119,7 +267,27 @@ def main():
         use_docker_on_version_mismatch=args.use_docker_on_version_mismatch,
         is_public=args.is_public,
         api_keys=api_keys,
-        base_url=base_url
+        base_url=base_url,
+        zip_compression_level=args.zip_compression_level,
+        zip_compression_levels=parse_compression_levels(args.zip_compression_levels),
+        zip_build_mode=args.zip_build_mode,
+        cache_max_bytes=args.cache_max_size,
+        cache_high_watermark=args.cache_high_watermark,
+        cache_low_watermark=args.cache_low_watermark,
+        eviction_interval=args.eviction_interval,
+        blob_gc_interval=args.blob_gc_interval,
+        blob_gc_full_interval=args.blob_gc_full_interval,
+        blob_gc_grace_seconds=args.blob_gc_grace,
+        cold_store=args.cold_store,
+        storage=args.storage,
+        package_cache_max_bytes=args.package_cache_max_size,
+        registry_proxy_url=f'http://{local_host}:{args.port}' if args.registry_proxy else None,
+        npm_upstream=args.npm_upstream,
+        composer_upstream=args.composer_upstream,
+        npm_assembly=args.npm_assembly,
+        prune_profiles=load_prune_profiles_file(args.prune_profiles),
+        api_key_prune_profiles=parse_api_key_prune_profiles(args.api_key_prune_profiles),
+        install_timeouts=parse_install_timeouts(args.install_timeouts)
     )
     
     # Run the server
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+DepCacheProxy maintenance commands, run against a cache directory while the
+server is stopped.
+
+Usage:
+    python maintenance.py reconcile-stats --cache_dir=<CACHE_DIR>
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+
+
+def reconcile_stats(cache_dir: Path) -> None:
+    """Recount the cache tree and replace the persisted statistics."""
+    repository = FileSystemCacheRepository(cache_dir)
+    stats = repository.reconcile_cache_stats()
+    repository.cache_stats.close()
+    print(json.dumps(stats, indent=2, sort_keys=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DepCacheProxy maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    reconcile = subparsers.add_parser('reconcile-stats',
+                                      help='Recount the cache and correct drifted statistics')
+    reconcile.add_argument('--cache_dir', required=True, help='Cache directory')
+
+    args = parser.parse_args()
+
+    cache_dir = Path(args.cache_dir)
+    if not cache_dir.is_dir():
+        print(f"Error: cache directory {cache_dir} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == 'reconcile-stats':
+        reconcile_stats(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import pytest
+
+from domain import bundle_format
+from domain.bundle_format import (
+    negotiate_format, split_format_extension, ZIP, TAR, TAR_GZIP, TAR_ZSTD
+)
+
+
+class TestNegotiateFormat:
+    """Test cases for bundle format negotiation."""
+
+    def test_defaults_to_zip(self):
+        assert negotiate_format() == ZIP
+        assert negotiate_format("*/*") == ZIP
+
+    def test_query_parameter_wins_over_accept(self):
+        assert negotiate_format("application/zip", "tar.gz") == TAR_GZIP
+        assert negotiate_format(None, "tar") == TAR
+
+    def test_unknown_query_format_raises(self):
+        with pytest.raises(ValueError):
+            negotiate_format(None, "rar")
+
+    def test_accept_quality_values(self):
+        accept = "application/zip;q=0.5, application/gzip;q=0.9, application/x-tar;q=0.1"
+        assert negotiate_format(accept) == TAR_GZIP
+
+    def test_explicit_type_beats_wildcard(self):
+        assert negotiate_format("*/*, application/x-tar") == TAR
+
+    def test_unacceptable_returns_none(self):
+        assert negotiate_format("text/html") is None
+        assert negotiate_format("application/zip;q=0") is None
+
+    def test_zstd_unavailable_without_package(self, monkeypatch):
+        monkeypatch.setattr(bundle_format, "zstandard", None)
+
+        assert negotiate_format(None, "tar+zstd") is None
+        assert negotiate_format("application/zstd, application/gzip;q=0.5") == TAR_GZIP
+
+    def test_zstd_available_with_package(self):
+        pytest.importorskip("zstandard")
+        assert negotiate_format("application/zstd") == TAR_ZSTD
+
+
+class TestSplitFormatExtension:
+    """Test cases for extension-based format selection."""
+
+    def test_known_extensions(self):
+        assert split_format_extension("abc.tar.gz") == ("abc", TAR_GZIP)
+        assert split_format_extension("abc.tar.zst") == ("abc", TAR_ZSTD)
+        assert split_format_extension("abc.tar") == ("abc", TAR)
+        assert split_format_extension("abc.zip") == ("abc", ZIP)
+
+    def test_dedup_extension(self):
+        bundle_hash, fmt = split_format_extension("abc.dedup.tar.gz")
+
+        assert bundle_hash == "abc"
+        assert fmt == TAR_GZIP.deduplicated()
+        assert fmt.hardlinks and fmt.extension == ".dedup.tar.gz"
+
+    def test_zip_cannot_be_deduplicated(self):
+        with pytest.raises(ValueError):
+            ZIP.deduplicated()
+
+    def test_no_extension(self):
+        assert split_format_extension("abc") == ("abc", None)
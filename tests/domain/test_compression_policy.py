@@ -0,0 +1,83 @@
+import os
+import zipfile
+import pytest
+
+from domain.compression_policy import CompressionPolicy, CompressionStats, CompressionDecision
+
+
+class TestCompressionPolicy:
+    """Test cases for per-file compression decisions."""
+
+    @pytest.fixture
+    def policy(self):
+        return CompressionPolicy(default_level=6, manager_levels={"composer": 9})
+
+    def test_compressible_text_is_deflated(self, policy):
+        content = b"module.exports = function () { return 42; };\n" * 50
+
+        decision = policy.decide("lib/index.js", content, "npm")
+
+        assert decision.compress_type == zipfile.ZIP_DEFLATED
+        assert decision.compress_level == 6
+
+    def test_already_compressed_extension_is_stored(self, policy):
+        content = b"a" * 4096
+
+        for path in ["img/logo.png", "fonts/icons.WOFF2", "dist/app.js.gz", "lib/tool.jar"]:
+            decision = policy.decide(path, content, "npm")
+            assert decision.compress_type == zipfile.ZIP_STORED
+            assert decision.reason == "extension"
+
+    def test_tiny_file_is_stored(self, policy):
+        decision = policy.decide("index.js", b"export {}\n", "npm")
+
+        assert decision.compress_type == zipfile.ZIP_STORED
+        assert decision.reason == "tiny"
+
+    def test_incompressible_content_is_stored(self, policy):
+        decision = policy.decide("data.bin", os.urandom(8192), "npm")
+
+        assert decision.compress_type == zipfile.ZIP_STORED
+        assert decision.reason == "incompressible"
+
+    def test_per_manager_level(self, policy):
+        content = b"<?php class Foo {}\n" * 100
+
+        assert policy.decide("Foo.php", content, "composer").compress_level == 9
+        assert policy.decide("Foo.php", content, "npm").compress_level == 6
+        assert policy.decide("Foo.php", content).compress_level == 6
+
+    def test_level_zero_stores_everything(self):
+        policy = CompressionPolicy(default_level=0)
+
+        decision = policy.decide("README.md", b"text " * 1000)
+
+        assert decision.compress_type == zipfile.ZIP_STORED
+
+    def test_invalid_level_rejected(self):
+        with pytest.raises(ValueError):
+            CompressionPolicy(manager_levels={"npm": 12})
+
+
+class TestCompressionStats:
+    """Test cases for compression statistics aggregation."""
+
+    def test_record_and_merge(self):
+        deflate = CompressionDecision(zipfile.ZIP_DEFLATED, 6, "deflate")
+        stored = CompressionDecision(zipfile.ZIP_STORED, None, "extension")
+
+        first = CompressionStats()
+        first.record(deflate, 1000, 300, 0.01)
+        first.record(stored, 500, 500, 0.0)
+
+        second = CompressionStats()
+        second.record(deflate, 2000, 700, 0.02)
+
+        first.merge(second)
+
+        report = first.to_dict()
+        assert report["deflate:6"]["files"] == 2
+        assert report["deflate:6"]["bytes_saved"] == 2000
+        assert report["stored:extension"]["bytes_saved"] == 0
+        assert first.bytes_saved == 2000
+        assert first.cpu_seconds == pytest.approx(0.03)
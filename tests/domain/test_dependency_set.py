@@ -1,7 +1,7 @@
 """Unit tests for dependency set and hash calculation."""
 
 import pytest
-from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash, calculate_index_hash
 
 
 class TestDependencySet:
@@ -113,6 +113,37 @@ class TestDependencySet:
         )
         
         assert dep_set1.calculate_bundle_hash() != dep_set2.calculate_bundle_hash()
+    
+    def test_calculate_bundle_hash_install_args(self):
+        """Custom arguments change the hash; no arguments keep the plain hash."""
+        files = [DependencyFile("composer.json", b'{"require": {}}')]
+        
+        plain = DependencySet(manager="composer", files=files, php_version="8.2")
+        no_args = DependencySet(manager="composer", files=files, php_version="8.2", install_args=[])
+        no_dev = DependencySet(manager="composer", files=files, php_version="8.2", install_args=["--no-dev"])
+        
+        assert plain.calculate_bundle_hash() == no_args.calculate_bundle_hash()
+        assert plain.calculate_bundle_hash() != no_dev.calculate_bundle_hash()
+
+
+class TestIndexHash:
+    """Test cases for content-addressed bundle hashes."""
+    
+    def test_calculate_index_hash_order_independent(self):
+        """Test that the index hash only depends on the (path, hash) pairs."""
+        index1 = {"a/index.js": "11" * 32, "b/index.js": "22" * 32}
+        index2 = {"b/index.js": "22" * 32, "a/index.js": "11" * 32}
+        
+        assert calculate_index_hash(index1) == calculate_index_hash(index2)
+    
+    def test_calculate_index_hash_changes_with_content_or_path(self):
+        """Test that renaming a file or changing its content changes the hash."""
+        base = calculate_index_hash({"a/index.js": "11" * 32})
+        
+        assert calculate_index_hash({"a/index.js": "22" * 32}) != base
+        assert calculate_index_hash({"a/main.js": "11" * 32}) != base
+        # Separators keep path/hash boundaries unambiguous
+        assert calculate_index_hash({"a": "bc"}) != calculate_index_hash({"ab": "c"})
 
 
 class TestFileHash:
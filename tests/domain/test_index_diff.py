@@ -0,0 +1,37 @@
+import json
+
+from domain.index_diff import diff_indexes, build_delta_manifest, IndexDiff
+
+
+class TestIndexDiff:
+    """Test cases for index diffing."""
+
+    def test_added_changed_deleted(self):
+        base = {"a.js": "h1", "b.js": "h2", "c.js": "h3"}
+        target = {"a.js": "h1", "b.js": "h2-new", "d.js": "h4"}
+
+        diff = diff_indexes(base, target)
+
+        assert diff.added == {"d.js": "h4"}
+        assert diff.changed == {"b.js": "h2-new"}
+        assert diff.deleted == ["c.js"]
+        assert diff.upserts == {"b.js": "h2-new", "d.js": "h4"}
+        assert not diff.is_empty()
+
+    def test_identical_indexes(self):
+        index = {"a.js": "h1"}
+
+        assert diff_indexes(index, dict(index)).is_empty()
+
+    def test_manifest(self):
+        diff = IndexDiff(added={"x": "1"}, changed={"y": "2"}, deleted=["z"])
+
+        manifest = json.loads(build_delta_manifest("old", "new", diff))
+
+        assert manifest == {
+            "base": "old",
+            "target": "new",
+            "added": ["x"],
+            "changed": ["y"],
+            "deleted": ["z"],
+        }
@@ -0,0 +1,43 @@
+import pytest
+
+from domain.index_entry import (
+    DIRECTORY_ENTRY, IndexEntry, file_entry, index_blob_hashes, is_executable_mode, parse_entry, symlink_entry
+)
+
+HASH = "ab" * 32
+
+
+class TestIndexEntry:
+    """Test cases for encoding files, links and directories as index values."""
+
+    @pytest.mark.parametrize("value, expected", [
+        (HASH, IndexEntry(blob_hash=HASH)),
+        (f"{HASH}:755", IndexEntry(blob_hash=HASH, executable=True)),
+        ("symlink:../a/cli.js", IndexEntry(link_target="../a/cli.js")),
+        ("symlink:odd:name", IndexEntry(link_target="odd:name")),
+        ("dir:", IndexEntry(is_directory=True)),
+    ])
+    def test_roundtrip(self, value, expected):
+        assert parse_entry(value) == expected
+        assert expected.encode() == value
+
+    def test_modes(self):
+        assert parse_entry(HASH).mode == 0o644
+        assert parse_entry(file_entry(HASH, executable=True)).st_mode == 0o100755
+        assert parse_entry(symlink_entry("x")).st_mode == 0o120777
+        assert parse_entry(DIRECTORY_ENTRY).st_mode == 0o40755
+
+    def test_executable_mode_normalized(self):
+        assert is_executable_mode(0o100744)
+        assert is_executable_mode(0o100701)
+        assert not is_executable_mode(0o100666)
+
+    def test_index_blob_hashes_skip_links_and_directories(self):
+        other = "cd" * 32
+        index = {
+            "a.js": HASH,
+            "bin/a": file_entry(other, executable=True),
+            ".bin/a": symlink_entry("../bin/a"),
+            "empty": DIRECTORY_ENTRY,
+        }
+        assert index_blob_hashes(index) == [HASH, other]
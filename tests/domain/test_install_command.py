@@ -0,0 +1,87 @@
+import time
+
+from domain import install_command
+from domain.install_command import run_install_command
+
+
+class TestRunInstallCommand:
+    """Test cases for install commands run under a deadline with logged output."""
+
+    def test_streams_output_to_logs_and_tails(self, tmp_path):
+        result = run_install_command(
+            ["sh", "-c", "echo out; echo err >&2; exit 3"], log_dir=tmp_path, log_name="npm"
+        )
+
+        assert result.returncode == 3
+        assert (result.stdout, result.stderr) == ("out\n", "err\n")
+        assert not result.timed_out and not result.killed
+        stdout_log, stderr_log = result.log_paths
+        assert stdout_log.name.startswith("npm.") and stdout_log.name.endswith(".stdout.log")
+        assert stdout_log.read_text() == "out\n"
+        assert stderr_log.read_text() == "err\n"
+
+    def test_log_and_tail_are_bounded(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(install_command, "LOG_MAX_BYTES", 1000)
+        monkeypatch.setattr(install_command, "TAIL_BYTES", 10)
+
+        result = run_install_command(
+            ["sh", "-c", "head -c 5000 /dev/zero | tr '\\0' x; printf END"], log_dir=tmp_path
+        )
+
+        assert result.stdout == "xxxxxxxEND"
+        log = result.log_paths[0].read_text()
+        assert log.startswith("x" * 1000)
+        assert log.endswith("[4003 more bytes not logged]\n")
+
+    def test_without_log_dir_keeps_only_tails(self):
+        result = run_install_command(["sh", "-c", "echo done"])
+
+        assert result.stdout == "done\n"
+        assert result.log_paths == []
+
+    def test_timeout_kills_whole_process_group(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(install_command, "KILL_GRACE_SECONDS", 0.5)
+        pid_file = tmp_path / "child.pid"
+
+        start = time.monotonic()
+        # A child that ignores SIGTERM, like a wedged lifecycle script
+        result = run_install_command(
+            ["sh", "-c", f"sh -c 'trap \"\" TERM; echo $$ > {pid_file}; sleep 60' & wait"], timeout=0.5
+        )
+
+        assert time.monotonic() - start < 10
+        assert result.timed_out
+        assert result.killed
+        assert not _running(int(pid_file.read_text()))
+
+    def test_children_outliving_the_command_are_killed(self, monkeypatch):
+        monkeypatch.setattr(install_command, "KILL_GRACE_SECONDS", 0.5)
+
+        result = run_install_command(["sh", "-c", "sleep 60 & echo started"])
+
+        assert result.returncode == 0
+        assert not result.timed_out
+        assert result.killed
+        assert result.stdout == "started\n"
+
+    def test_old_logs_are_pruned(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(install_command, "MAX_LOGGED_COMMANDS", 3)
+        for index in range(5):
+            for stream in ("stdout", "stderr"):
+                (tmp_path / f"npm.20260101T00000{index}-0000000{index}.{stream}.log").write_text("")
+
+        run_install_command(["true"], log_dir=tmp_path, log_name="composer")
+
+        runs = sorted({path.name.rsplit(".", 2)[0] for path in tmp_path.iterdir()})
+        assert len(list(tmp_path.iterdir())) == 6
+        assert runs[0].startswith("composer.")
+        assert runs[1:] == ["npm.20260101T000003-00000003", "npm.20260101T000004-00000004"]
+
+
+def _running(pid):
+    """Whether pid is alive; a killed orphan nobody reaped yet counts as gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
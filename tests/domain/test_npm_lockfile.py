@@ -0,0 +1,76 @@
+import base64
+import hashlib
+import json
+
+from domain.npm_lockfile import all_packages_cached, cacache_content_path, lockfile_in_sync, lockfile_integrities
+
+
+def _integrity(content):
+    return "sha512-" + base64.b64encode(hashlib.sha512(content).digest()).decode()
+
+
+def _lockfile(packages, version=3):
+    return json.dumps({"lockfileVersion": version, "packages": packages}).encode()
+
+
+class TestNpmLockfile:
+    """Test cases for lockfile parsing and npm cache lookups."""
+
+    def test_integrities_skip_root_links_and_bundled(self):
+        lockfile = _lockfile({
+            "": {"name": "app"},
+            "node_modules/a": {"version": "1.0.0", "integrity": "sha512-AAAA"},
+            "node_modules/a/node_modules/b": {"version": "1.0.0", "inBundle": True},
+            "node_modules/ws": {"link": True, "resolved": "packages/ws"},
+        })
+
+        assert lockfile_integrities(lockfile) == ["sha512-AAAA"]
+
+    def test_integrities_unavailable(self):
+        assert lockfile_integrities(b'{"lockfileVersion": 1, "dependencies": {}}') is None
+        assert lockfile_integrities(b'{"lockfileVersion": 2}') is None
+        assert lockfile_integrities(b'not json') is None
+        # A git dependency has no integrity to look up
+        assert lockfile_integrities(_lockfile({"node_modules/g": {"resolved": "git+ssh://x"}})) is None
+
+    def test_cacache_content_path(self, tmp_path):
+        content = b'tarball'
+        hex_digest = hashlib.sha512(content).hexdigest()
+
+        path = cacache_content_path(tmp_path, f"sha1-xyz= {_integrity(content)}")
+
+        assert path == (tmp_path / "_cacache" / "content-v2" / "sha512" /
+                        hex_digest[:2] / hex_digest[2:4] / hex_digest[4:])
+        assert cacache_content_path(tmp_path, "md5-abc") is None
+
+    def test_all_packages_cached(self, tmp_path):
+        lockfile = _lockfile({
+            "": {"name": "app"},
+            "node_modules/a": {"integrity": _integrity(b'a')},
+            "node_modules/b": {"integrity": _integrity(b'b')},
+        })
+        cached = cacache_content_path(tmp_path, _integrity(b'a'))
+        cached.parent.mkdir(parents=True)
+        cached.write_bytes(b'a')
+
+        assert not all_packages_cached(lockfile, tmp_path)
+
+        missing = cacache_content_path(tmp_path, _integrity(b'b'))
+        missing.parent.mkdir(parents=True, exist_ok=True)
+        missing.write_bytes(b'b')
+
+        assert all_packages_cached(lockfile, tmp_path)
+
+    def test_lockfile_in_sync(self):
+        manifest = json.dumps({"name": "app", "dependencies": {"a": "^1.0.0"}}).encode()
+        lockfile = json.dumps({"name": "app", "lockfileVersion": 3, "packages": {
+            "": {"name": "app", "dependencies": {"a": "^1.0.0"}},
+        }}).encode()
+
+        assert lockfile_in_sync(manifest, lockfile)
+        assert not lockfile_in_sync(b'{"name": "app", "dependencies": {"a": "^2.0.0"}}', lockfile)
+        assert not lockfile_in_sync(b'{"name": "other", "dependencies": {"a": "^1.0.0"}}', lockfile)
+        assert not lockfile_in_sync(manifest, b'{"lockfileVersion": 1, "dependencies": {}}')
+        assert not lockfile_in_sync(
+            b'{"workspaces": ["packages/*"]}', b'{"lockfileVersion": 3, "packages": {"": {"workspaces": ["packages/*"]}}}'
+        )
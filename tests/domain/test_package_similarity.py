@@ -0,0 +1,49 @@
+import json
+
+from domain.package_similarity import (
+    decode_signature, encode_signature, estimate_similarity, lockfile_packages, lsh_buckets, minhash_signature
+)
+
+
+class TestPackageSimilarity:
+    """Test cases for lockfile package sets and their MinHash signatures."""
+
+    def test_npm_lockfile_packages(self):
+        lockfile = json.dumps({"lockfileVersion": 3, "packages": {
+            "": {"name": "app"},
+            "node_modules/a": {"version": "1.0.0"},
+            "node_modules/a/node_modules/b": {"version": "2.0.0"},
+            "node_modules/alias": {"name": "c", "version": "3.0.0"},
+        }}).encode()
+
+        assert lockfile_packages("npm", lockfile) == {"a@1.0.0", "b@2.0.0", "c@3.0.0"}
+
+    def test_npm_v1_lockfile_packages(self):
+        lockfile = json.dumps({"lockfileVersion": 1, "dependencies": {
+            "a": {"version": "1.0.0", "dependencies": {"b": {"version": "2.0.0"}}},
+        }}).encode()
+
+        assert lockfile_packages("npm", lockfile) == {"a@1.0.0", "b@2.0.0"}
+
+    def test_composer_lockfile_packages(self):
+        lockfile = json.dumps({
+            "packages": [{"name": "monolog/monolog", "version": "3.5.0"}],
+            "packages-dev": [{"name": "phpunit/phpunit", "version": "10.5.0"}],
+        }).encode()
+
+        assert lockfile_packages("composer", lockfile) == {"monolog/monolog@3.5.0", "phpunit/phpunit@10.5.0"}
+        assert lockfile_packages("composer", b'not json') is None
+        assert lockfile_packages("pip", lockfile) is None
+
+    def test_signature_estimates_jaccard_similarity(self):
+        base = {f"pkg{i}@1.0.0" for i in range(500)}
+        bumped = (base - {"pkg0@1.0.0"}) | {"pkg0@1.0.1"}
+        unrelated = {f"other{i}@1.0.0" for i in range(500)}
+
+        signature = minhash_signature(base)
+
+        assert estimate_similarity(signature, minhash_signature(base)) == 1.0
+        assert estimate_similarity(signature, minhash_signature(bumped)) > 0.9
+        assert estimate_similarity(signature, minhash_signature(unrelated)) < 0.1
+        assert set(lsh_buckets(signature)) & set(lsh_buckets(minhash_signature(bumped)))
+        assert decode_signature(encode_signature(signature)) == signature
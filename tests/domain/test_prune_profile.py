@@ -0,0 +1,78 @@
+import pytest
+
+from domain.prune_profile import BUILTIN_PRUNE_PROFILES, PruneProfile, load_prune_profiles
+
+
+class TestPruneProfile:
+    """Test cases for prune profile rules and cache keys."""
+
+    @pytest.fixture
+    def profiles(self):
+        return load_prune_profiles()
+
+    def test_npm_slim_profile(self, profiles):
+        slim = profiles["npm"]["slim"]
+        index = {
+            "a/index.js": "h1",
+            "a/README.md": "h2",
+            "a/LICENSE.md": "h3",
+            "a/dist/index.js.map": "h4",
+            "a/dist/index.d.ts": "h5",
+            "a/dist/index.d.ts.map": "h6",
+            "a/src/index.ts": "h7",
+            "a/test/index.js": "h8",
+            "@s/b/lib/b.test.js": "h9",
+            "@s/b/node_modules/c/docs/api.html": "h10",
+            "@s/b/node_modules/c/package.json": "h11",
+            "test/index.js": "h12",
+            ".bin/readme.md": "h13",
+            ".package-lock.json": "h14",
+        }
+
+        assert slim.prune(index) == {
+            "a/index.js": "h1",
+            "a/LICENSE.md": "h3",
+            "a/dist/index.d.ts": "h5",
+            "@s/b/node_modules/c/package.json": "h11",
+            # The test package itself is not a test directory
+            "test/index.js": "h12",
+            ".bin/readme.md": "h13",
+            ".package-lock.json": "h14",
+        }
+
+    def test_composer_slim_profile_is_anchored(self, profiles):
+        slim = profiles["composer"]["slim"]
+
+        assert slim.removes("monolog/monolog/tests/LoggerTest.php")
+        assert slim.removes("monolog/monolog/phpunit.xml.dist")
+        assert slim.removes("monolog/monolog/README.md")
+        assert not slim.removes("monolog/monolog/src/Monolog/Tests/Helper.php")
+        assert not slim.removes("monolog/monolog/src/Monolog/Logger.php")
+        assert not slim.removes("composer/installed.json")
+        assert not slim.removes("autoload.php")
+
+    def test_variant_hash_follows_rules(self):
+        profile = PruneProfile("npm", "custom", ("*.md",))
+
+        assert profile.variant_hash("a" * 64) != profile.variant_hash("b" * 64)
+        assert profile.variant_hash("a" * 64) == PruneProfile("npm", "custom", ("*.md",)).variant_hash("a" * 64)
+        assert profile.variant_hash("a" * 64) != PruneProfile("npm", "custom", ("*.map",)).variant_hash("a" * 64)
+
+    def test_load_overrides(self):
+        profiles = load_prune_profiles({
+            "npm": {"slim": {"remove": ["*.md"]}, "maps": {"remove": ["*.map"], "keep": ["keep.map"]}},
+        })
+
+        assert profiles["npm"]["slim"].remove == ("*.md",)
+        assert profiles["npm"]["maps"].keep == ("keep.map",)
+        assert set(profiles["composer"]) == set(BUILTIN_PRUNE_PROFILES["composer"])
+
+    @pytest.mark.parametrize("overrides", [
+        {"npm": {"none": {"remove": ["*.md"]}}},
+        {"npm": {"empty": {"keep": ["*.md"]}}},
+        {"npm": {"bad": {"remove": ["/"]}}},
+        {"npm": ["slim"]},
+    ])
+    def test_load_rejects_invalid_profiles(self, overrides):
+        with pytest.raises(ValueError):
+            load_prune_profiles(overrides)
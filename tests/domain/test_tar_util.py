@@ -0,0 +1,125 @@
+import io
+import tarfile
+import tempfile
+import shutil
+from pathlib import Path
+
+import pytest
+
+from domain.blob_storage import BlobStorage
+from domain.index_entry import DIRECTORY_ENTRY, file_entry, symlink_entry
+from domain.tar_util import TarUtil
+
+
+class TestTarUtil:
+    """Test cases for streaming tar generation from blobs."""
+
+    @pytest.fixture
+    def blob_storage(self):
+        temp_dir = tempfile.mkdtemp()
+        yield BlobStorage(Path(temp_dir))
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def index_data(self, blob_storage):
+        contents = {
+            "a/index.js": b"module.exports = 1;\n" * 100,
+            "a/package.json": b'{"name": "a"}',
+            "b/файл.txt": b"unicode path",
+            "big.bin": bytes(range(256)) * 1024,
+        }
+        return {path: blob_storage.store_blob(content) for path, content in contents.items()}, contents
+
+    @pytest.mark.parametrize("compression,mode", [(None, "r:"), ("gzip", "r:gz")])
+    def test_roundtrip(self, blob_storage, index_data, compression, mode):
+        index, contents = index_data
+
+        data = b"".join(TarUtil.iter_tar_from_blobs(index, blob_storage, compression))
+
+        with tarfile.open(fileobj=io.BytesIO(data), mode=mode) as tar:
+            assert sorted(tar.getnames()) == sorted(contents)
+            for path, content in contents.items():
+                assert tar.extractfile(path).read() == content
+
+    def test_zstd_roundtrip(self, blob_storage, index_data):
+        zstandard = pytest.importorskip("zstandard")
+        index, contents = index_data
+
+        data = b"".join(TarUtil.iter_tar_from_blobs(index, blob_storage, "zstd"))
+        raw = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+
+        with tarfile.open(fileobj=io.BytesIO(raw), mode="r:") as tar:
+            assert tar.extractfile("big.bin").read() == contents["big.bin"]
+
+    def test_output_is_streamed_in_chunks(self, blob_storage, index_data):
+        index, _ = index_data
+
+        chunks = list(TarUtil.iter_tar_from_blobs(index, blob_storage))
+
+        assert len(chunks) > 1
+        assert sum(len(c) for c in chunks) % tarfile.RECORDSIZE == 0
+
+    def test_hardlinks_write_each_blob_once(self, blob_storage, tmp_path):
+        shared = b"duplicated package file\n" * 200
+        shared_hash = blob_storage.store_blob(shared)
+        index = {
+            "a/node_modules/dep/index.js": shared_hash,
+            "b/node_modules/dep/index.js": shared_hash,
+            "c/unique.js": blob_storage.store_blob(b"unique"),
+            "d/node_modules/dep/index.js": shared_hash,
+        }
+
+        plain = b"".join(TarUtil.iter_tar_from_blobs(index, blob_storage))
+        deduped = b"".join(TarUtil.iter_tar_from_blobs(index, blob_storage, hardlinks=True))
+
+        assert len(deduped) < len(plain)
+        with tarfile.open(fileobj=io.BytesIO(deduped), mode="r:") as tar:
+            members = {m.name: m for m in tar.getmembers()}
+            assert members["a/node_modules/dep/index.js"].isfile()
+            assert members["b/node_modules/dep/index.js"].islnk()
+            assert members["b/node_modules/dep/index.js"].linkname == "a/node_modules/dep/index.js"
+            assert members["d/node_modules/dep/index.js"].islnk()
+            tar.extractall(tmp_path)
+
+        assert (tmp_path / "d/node_modules/dep/index.js").read_bytes() == shared
+
+        stats = TarUtil.duplication_stats(index, blob_storage)
+        assert stats.total_files == 4
+        assert stats.unique_files == 2
+        assert stats.total_bytes == 3 * len(shared) + len(b"unique")
+        assert stats.reduction_ratio == pytest.approx(2 * len(shared) / stats.total_bytes)
+
+    def test_links_modes_and_directories(self, blob_storage, tmp_path):
+        script = b"#!/bin/sh\n"
+        script_hash = blob_storage.store_blob(script)
+        index = {
+            "a/bin/run.sh": file_entry(script_hash, executable=True),
+            "a/copy.sh": script_hash,
+            ".bin/run": symlink_entry("../a/bin/run.sh"),
+            "a/empty": DIRECTORY_ENTRY,
+        }
+
+        data = b"".join(TarUtil.iter_tar_from_blobs(index, blob_storage, hardlinks=True))
+
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:") as tar:
+            members = {m.name: m for m in tar.getmembers()}
+            # Same blob, different mode: both are written as files
+            assert members["a/copy.sh"].isfile()
+            assert members["a/bin/run.sh"].isfile()
+            assert members["a/bin/run.sh"].mode == 0o755
+            assert members[".bin/run"].issym()
+            assert members["a/empty"].isdir()
+            tar.extractall(tmp_path)
+
+        assert (tmp_path / ".bin/run").is_symlink()
+        assert (tmp_path / ".bin/run").read_bytes() == script
+        assert (tmp_path / "a/bin/run.sh").stat().st_mode & 0o111
+        assert (tmp_path / "a/empty").is_dir()
+
+        stats = TarUtil.duplication_stats(index, blob_storage)
+        assert stats.total_files == 2
+        assert stats.unique_files == 1
+
+    def test_unsupported_compression(self, blob_storage):
+        with pytest.raises(ValueError):
+            list(TarUtil.iter_tar_from_blobs({}, blob_storage, "lzma"))
@@ -0,0 +1,175 @@
+import json
+import tempfile
+import shutil
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from domain.blob_storage import BlobStorage
+from domain.compression_policy import CompressionPolicy, REUSED_LABEL
+from domain.zip_members import ZipMemberCatalog, read_members
+from domain import zip_util
+from domain.zip_util import ZipUtil
+
+
+class TestZipMemberReuse:
+    """Test cases for raw-copying compressed members between bundle ZIPs."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def blob_storage(self, temp_dir):
+        return BlobStorage(temp_dir / "objects")
+
+    def _build_and_record(self, catalog, zip_path, index, blob_storage, policy, reuse=None):
+        stats = ZipUtil.create_zip_from_blobs(zip_path, index, blob_storage, policy=policy, reuse=reuse)
+        members = read_members(zip_path)
+        catalog.record(zip_path, {
+            (file_hash, policy.reuse_key(rel_path)): members[rel_path]
+            for rel_path, file_hash in index.items()
+        })
+        return stats
+
+    def test_read_members_points_at_compressed_data(self, temp_dir):
+        zip_path = temp_dir / "a.zip"
+        content = b"hello world " * 100
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("dir/ünïcode.txt", content)
+
+        member = read_members(zip_path)["dir/ünïcode.txt"]
+
+        assert member.file_size == len(content)
+        assert zipfile.zlib.decompress(b"".join(member.iter_raw()), -15) == content
+
+    def test_reused_build_is_byte_identical(self, temp_dir, blob_storage, monkeypatch):
+        policy = CompressionPolicy()
+        catalog = ZipMemberCatalog(temp_dir / "bundles")
+        shared = {
+            "lib/index.js": blob_storage.store_blob(b"module.exports = 'lib';\n" * 200),
+            "lib/logo.png": blob_storage.store_blob(bytes(range(256)) * 8),
+        }
+        old_index = dict(shared, **{"old/index.js": blob_storage.store_blob(b"old\n" * 100)})
+        new_index = dict(shared, **{"new/index.js": blob_storage.store_blob(b"new\n" * 100),
+                                    "copy/index.js": shared["lib/index.js"]})
+
+        (temp_dir / "bundles").mkdir()
+        self._build_and_record(catalog, temp_dir / "bundles" / "old.zip", old_index, blob_storage, policy)
+
+        reused_path = temp_dir / "reused.zip"
+        read = []
+        original_read_blob = blob_storage.read_blob
+        monkeypatch.setattr(blob_storage, "read_blob", lambda h: read.append(h) or original_read_blob(h))
+        stats = ZipUtil.create_zip_from_blobs(reused_path, new_index, blob_storage, policy=policy, reuse=catalog)
+        monkeypatch.undo()
+
+        fresh_path = temp_dir / "fresh.zip"
+        ZipUtil.create_zip_from_blobs(fresh_path, new_index, blob_storage, policy=policy)
+
+        assert reused_path.read_bytes() == fresh_path.read_bytes()
+        assert read == [new_index["new/index.js"]]
+        assert stats.choices[REUSED_LABEL].files == 3
+        with zipfile.ZipFile(reused_path) as zf:
+            assert zf.testzip() is None
+
+    def test_reuse_respects_policy_key(self, temp_dir, blob_storage):
+        catalog = ZipMemberCatalog(temp_dir / "bundles")
+        (temp_dir / "bundles").mkdir()
+        index = {"a.js": blob_storage.store_blob(b"a = 1;\n" * 200)}
+        self._build_and_record(catalog, temp_dir / "bundles" / "l6.zip", index, blob_storage, CompressionPolicy(6))
+
+        stats = ZipUtil.create_zip_from_blobs(
+            temp_dir / "l9.zip", index, blob_storage, policy=CompressionPolicy(9), reuse=catalog
+        )
+
+        assert REUSED_LABEL not in stats.choices
+
+    def test_catalog_persists_and_forgets_removed_archives(self, temp_dir, blob_storage):
+        policy = CompressionPolicy()
+        bundles_dir = temp_dir / "bundles"
+        bundles_dir.mkdir()
+        index = {"a.js": blob_storage.store_blob(b"a = 1;\n" * 200)}
+        zip_path = bundles_dir / "a.zip"
+        self._build_and_record(ZipMemberCatalog(bundles_dir), zip_path, index, blob_storage, policy)
+
+        # A fresh catalog loads the sidecar written by the first one
+        catalog = ZipMemberCatalog(bundles_dir)
+        assert catalog.lookup(index["a.js"], policy.reuse_key("a.js")).archive == zip_path
+
+        zip_path.unlink()
+        assert catalog.lookup(index["a.js"], policy.reuse_key("a.js")) is None
+
+        stats = ZipUtil.create_zip_from_blobs(temp_dir / "b.zip", index, blob_storage, policy=policy, reuse=catalog)
+        assert REUSED_LABEL not in stats.choices
+        with zipfile.ZipFile(temp_dir / "b.zip") as zf:
+            assert zf.read("a.js") == b"a = 1;\n" * 200
+
+    def test_truncated_member_falls_back_to_compression(self, temp_dir, blob_storage):
+        policy = CompressionPolicy()
+        bundles_dir = temp_dir / "bundles"
+        bundles_dir.mkdir()
+        index = {"a.js": blob_storage.store_blob(b"a = 1;\n" * 200)}
+        zip_path = bundles_dir / "a.zip"
+        catalog = ZipMemberCatalog(bundles_dir)
+        self._build_and_record(catalog, zip_path, index, blob_storage, policy)
+        zip_path.write_bytes(zip_path.read_bytes()[:40])
+
+        out = temp_dir / "b.zip"
+        ZipUtil.create_zip_from_blobs(out, index, blob_storage, policy=policy, reuse=catalog)
+
+        with zipfile.ZipFile(out) as zf:
+            assert zf.namelist() == ["a.js"]
+            assert zf.read("a.js") == b"a = 1;\n" * 200
+
+    def test_raw_copy_internals_available(self, temp_dir):
+        # Reuse silently turns into recompression if a Python release drops these
+        with zipfile.ZipFile(temp_dir / "a.zip", "w") as zf:
+            assert zip_util._supports_raw_copy(zf)
+
+    def test_rewritten_archive_falls_back_to_compression(self, temp_dir, blob_storage):
+        policy = CompressionPolicy()
+        bundles_dir = temp_dir / "bundles"
+        bundles_dir.mkdir()
+        index = {"a.js": blob_storage.store_blob(b"a = 1;\n" * 200)}
+        zip_path = bundles_dir / "a.zip"
+        catalog = ZipMemberCatalog(bundles_dir)
+        self._build_and_record(catalog, zip_path, index, blob_storage, policy)
+        # Same path and size class, other content: the recorded offset now holds another member
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("a.js", b"b = 2;\n" * 200)
+
+        out = temp_dir / "b.zip"
+        stats = ZipUtil.create_zip_from_blobs(out, index, blob_storage, policy=policy, reuse=catalog)
+
+        assert REUSED_LABEL not in stats.choices
+        with zipfile.ZipFile(out) as zf:
+            assert zf.testzip() is None
+            assert zf.read("a.js") == b"a = 1;\n" * 200
+
+    def test_missing_zipfile_internals_fall_back_to_compression(self, temp_dir, blob_storage, monkeypatch):
+        policy = CompressionPolicy()
+        bundles_dir = temp_dir / "bundles"
+        bundles_dir.mkdir()
+        index = {"a.js": blob_storage.store_blob(b"a = 1;\n" * 200)}
+        catalog = ZipMemberCatalog(bundles_dir)
+        self._build_and_record(catalog, bundles_dir / "a.zip", index, blob_storage, policy)
+        monkeypatch.setattr(zip_util, "RAW_COPY_ZIPFILE_ATTRS", zip_util.RAW_COPY_ZIPFILE_ATTRS + ("_gone",))
+
+        out = temp_dir / "b.zip"
+        stats = ZipUtil.create_zip_from_blobs(out, index, blob_storage, policy=policy, reuse=catalog)
+
+        assert REUSED_LABEL not in stats.choices
+        with zipfile.ZipFile(out) as zf:
+            assert zf.read("a.js") == b"a = 1;\n" * 200
+
+    def test_sidecars_without_header_offsets_are_ignored(self, temp_dir):
+        bundles_dir = temp_dir / "bundles"
+        bundles_dir.mkdir()
+        (bundles_dir / "a.zip").write_bytes(b"")
+        (bundles_dir / "a.zip.members").write_text(json.dumps({"h:k": [30, 8, 10, 20, 1]}))
+
+        assert ZipMemberCatalog(bundles_dir).lookup("h", "k") is None
@@ -0,0 +1,111 @@
+import hashlib
+import tempfile
+import shutil
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from domain.blob_storage import BlobStorage
+from domain.index_entry import DIRECTORY_ENTRY, file_entry, symlink_entry
+from domain.zip_util import ZipUtil, ENTRY_DATE_TIME
+
+
+class TestZipUtil:
+    """Test cases for ZIP generation from blobs."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def blob_storage(self, temp_dir):
+        return BlobStorage(temp_dir / "objects")
+
+    @pytest.fixture
+    def index_data(self, blob_storage):
+        contents = {
+            "b/index.js": b"module.exports = 2;\n" * 100,
+            "a/package.json": b'{"name": "a"}',
+            "a/logo.png": bytes(range(256)) * 16,
+        }
+        return {path: blob_storage.store_blob(content) for path, content in contents.items()}, contents
+
+    def test_roundtrip(self, temp_dir, blob_storage, index_data):
+        index, contents = index_data
+        zip_path = temp_dir / "bundle.zip"
+
+        ZipUtil.create_zip_from_blobs(zip_path, index, blob_storage)
+
+        with zipfile.ZipFile(zip_path) as zf:
+            for path, content in contents.items():
+                assert zf.read(path) == content
+
+    def test_output_is_reproducible(self, temp_dir, blob_storage, index_data, monkeypatch):
+        index, _ = index_data
+        first = temp_dir / "first.zip"
+        second = temp_dir / "second.zip"
+
+        ZipUtil.create_zip_from_blobs(first, index, blob_storage)
+        # A later build, from an index with a different insertion order
+        monkeypatch.setattr(time, "time", lambda: 2_000_000_000.0)
+        ZipUtil.create_zip_from_blobs(second, dict(reversed(list(index.items()))), blob_storage)
+
+        assert hashlib.sha256(first.read_bytes()).digest() == hashlib.sha256(second.read_bytes()).digest()
+
+    def test_entries_have_canonical_metadata(self, temp_dir, blob_storage, index_data):
+        index, _ = index_data
+        zip_path = temp_dir / "bundle.zip"
+
+        ZipUtil.create_zip_from_blobs(zip_path, index, blob_storage, extra_files={"0-manifest.json": b"{}"})
+
+        with zipfile.ZipFile(zip_path) as zf:
+            infos = zf.infolist()
+        names = [info.filename for info in infos]
+        # Indexed files in sorted order, extra files after them
+        assert names == sorted(index) + ["0-manifest.json"]
+        for info in infos:
+            assert info.date_time == ENTRY_DATE_TIME
+            assert info.external_attr >> 16 == 0o100644
+
+    def test_links_modes_and_directories(self, temp_dir, blob_storage):
+        script_hash = blob_storage.store_blob(b"#!/bin/sh\n")
+        index = {
+            "a/bin/run.sh": file_entry(script_hash, executable=True),
+            ".bin/run": symlink_entry("../a/bin/run.sh"),
+            "a/empty": DIRECTORY_ENTRY,
+        }
+        zip_path = temp_dir / "bundle.zip"
+
+        ZipUtil.create_zip_from_blobs(zip_path, index, blob_storage)
+
+        with zipfile.ZipFile(zip_path) as zf:
+            infos = {info.filename: info for info in zf.infolist()}
+            assert zf.read(".bin/run") == b"../a/bin/run.sh"
+        assert sorted(infos) == [".bin/run", "a/bin/run.sh", "a/empty/"]
+        assert infos[".bin/run"].external_attr >> 16 == 0o120777
+        assert infos["a/bin/run.sh"].external_attr >> 16 == 0o100755
+        assert infos["a/empty/"].is_dir()
+        assert infos["a/empty/"].external_attr >> 16 == 0o40755
+
+    def test_cpu_time_includes_the_compression_decision(self, temp_dir, blob_storage, monkeypatch):
+        from domain.compression_policy import CompressionPolicy
+        index = {"a.js": blob_storage.store_blob(b"a = 1;\n" * 200)}
+        policy = CompressionPolicy()
+        clock = [0.0]
+        decide = policy.decide
+
+        def slow_decide(*args, **kwargs):
+            # The probe compresses a sample of the content; charge it to the clock
+            clock[0] += 5.0
+            return decide(*args, **kwargs)
+
+        monkeypatch.setattr(time, "thread_time", lambda: clock[0])
+        monkeypatch.setattr(policy, "decide", slow_decide)
+
+        stats = ZipUtil.create_zip_from_blobs(temp_dir / "a.zip", index, blob_storage, policy=policy)
+
+        assert stats.cpu_seconds == 5.0
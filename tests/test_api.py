@@ -84,6 +84,57 @@ class TestAPI:
         assert response_data['download_url'] == 'http://localhost:8000/download/abc123.zip'
         assert response_data['cache_hit'] is True
     
+    @patch('interfaces.api.HandleCacheRequest')
+    def test_cache_dependencies_reports_phase_timings(self, mock_handler_class, client):
+        """Test per-phase latency is exposed as a Server-Timing header."""
+        mock_handler = Mock()
+        mock_handler.handle.return_value = CacheResponse(
+            bundle_hash='abc123',
+            download_url='/download/abc123.zip',
+            is_cache_hit=False,
+            timings={'lookup': 0.001, 'install': 12.5, 'store': 0.25}
+        )
+        mock_handler_class.return_value = mock_handler
+        
+        files = [('file', ('package.json', BytesIO(b'{}'), 'application/json'))]
+        data = {
+            'manager': 'npm',
+            'hash': 'abc123',
+            'versions': json.dumps({'node': '14.17.0', 'npm': '6.14.13'})
+        }
+        
+        response = client.post("/v1/cache", data=data, files=files)
+        
+        assert response.status_code == 200
+        assert response.headers['server-timing'] == 'lookup;dur=1.0, install;dur=12500.0, store;dur=250.0'
+
+    @patch('interfaces.api.HandleCacheRequest')
+    def test_cache_request_does_not_block_event_loop(self, mock_handler_class, client):
+        """Test other requests are served while a cache request is being handled."""
+        import threading
+        served = threading.Event()
+
+        def handle(request):
+            # Returns only once the loop has answered another request in the meantime
+            assert served.wait(timeout=10)
+            return CacheResponse(bundle_hash='abc123', download_url='/download/abc123.zip', is_cache_hit=False)
+
+        mock_handler_class.return_value.handle.side_effect = handle
+        data = {'manager': 'npm', 'hash': 'abc123', 'versions': json.dumps({'node': '14.17.0', 'npm': '6.14.13'})}
+        responses = []
+        poster = threading.Thread(target=lambda: responses.append(client.post(
+            "/v1/cache", data=data, files=[('file', ('package.json', BytesIO(b'{}'), 'application/json'))]
+        )))
+        poster.start()
+
+        while not mock_handler_class.return_value.handle.called:
+            pass
+        assert client.get("/health").status_code == 200
+        served.set()
+        poster.join()
+
+        assert responses[0].status_code == 200
+
     def test_cache_dependencies_validation_error(self, client):
         """Test cache request with validation error."""
         # Create multipart form data with invalid manager
@@ -176,11 +227,292 @@ class TestAPI:
         assert f'filename={bundle_hash}.zip' in response.headers['content-disposition']
         assert response.content.startswith(b'PK\x03\x04')
     
+    def test_download_bundle_etag(self, client):
+        """Test bundle ZIPs carry their checksum as ETag and honor If-None-Match."""
+        import hashlib
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        dep_set = DependencySet('npm', [DependencyFile('etag.js', b'1')],
+                                node_version='14.17.0', npm_version='6.14.13')
+        bundle_hash = api_module.cache_repository.store_dependency_set(dep_set)
+        
+        response = client.get(f"/download/{bundle_hash}.zip")
+        assert response.status_code == 200
+        checksum = hashlib.sha256(response.content).hexdigest()
+        assert response.headers['etag'] == f'"{checksum}"'
+        assert response.headers['x-checksum-sha256'] == checksum
+        
+        cached = client.get(f"/download/{bundle_hash}.zip", headers={'If-None-Match': f'"{checksum}"'})
+        assert cached.status_code == 304
+        assert cached.content == b''
+        
+        stale = client.get(f"/download/{bundle_hash}.zip", headers={'If-None-Match': '"other"'})
+        assert stale.status_code == 200
+    
     def test_download_bundle_not_found(self, client):
         """Test bundle download when file doesn't exist."""
+        from interfaces import api as api_module
+        failed = api_module.bundle_builder.metrics.counter('bundle_build.failed')
+        
         response = client.get("/download/nonexistent.zip")
         assert response.status_code == 404
         assert response.json()['detail'] == 'Bundle not found'
+        # Unknown hashes are rejected before a build is attempted
+        assert api_module.bundle_builder.metrics.counter('bundle_build.failed') == failed
+    
+    def test_download_bundle_negotiates_tar_formats(self, client):
+        """Test format negotiation via Accept header, query param and extension."""
+        import io
+        import tarfile
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        dep_set = DependencySet('npm', [DependencyFile('a/index.js', b'console.log(1);')],
+                                node_version='14.17.0', npm_version='6.14.13')
+        bundle_hash = api_module.cache_repository.store_dependency_set(dep_set)
+        
+        response = client.get(f"/download/{bundle_hash}", headers={'Accept': 'application/gzip'})
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/gzip'
+        assert f'filename={bundle_hash}.tar.gz' in response.headers['content-disposition']
+        with tarfile.open(fileobj=io.BytesIO(response.content), mode='r:gz') as tar:
+            assert tar.extractfile('a/index.js').read() == b'console.log(1);'
+        
+        response = client.get(f"/download/{bundle_hash}?format=tar")
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/x-tar'
+        
+        response = client.get(f"/download/{bundle_hash}.tar")
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/x-tar'
+        
+        response = client.get(f"/download/{bundle_hash}", headers={'Accept': 'text/html'})
+        assert response.status_code == 406
+        
+        response = client.get(f"/download/{bundle_hash}?format=rar")
+        assert response.status_code == 400
+        
+        response = client.get("/download/nonexistent?format=tar")
+        assert response.status_code == 404
+    
+    def test_download_bundle_dedupe_reports_reduction(self, client):
+        """Test hardlink-deduplicated tar downloads report the reduction ratio."""
+        import io
+        import tarfile
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        content = b'module.exports = {};' * 10
+        dep_set = DependencySet('npm', [DependencyFile('a/x.js', content), DependencyFile('b/x.js', content)],
+                                node_version='14.17.0', npm_version='6.14.13')
+        bundle_hash = api_module.cache_repository.store_dependency_set(dep_set)
+        
+        response = client.get(f"/download/{bundle_hash}?format=tar&dedupe=true")
+        assert response.status_code == 200
+        assert f'filename={bundle_hash}.dedup.tar' in response.headers['content-disposition']
+        assert response.headers['x-dedup-reduction-ratio'] == '0.5000'
+        with tarfile.open(fileobj=io.BytesIO(response.content), mode='r:') as tar:
+            assert tar.getmember('b/x.js').islnk()
+        
+        response = client.get(f"/download/{bundle_hash}.dedup.tar")
+        assert response.status_code == 200
+        assert response.headers['x-dedup-total-bytes'] == str(2 * len(content))
+        
+        response = client.get(f"/download/{bundle_hash}?format=zip&dedupe=true")
+        assert response.status_code == 400
+    
+    def _assert_served_during(self, client, monkeypatch, method, url):
+        """GET url while the repository method it calls is held, and check /health is answered meanwhile."""
+        import threading
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        repo = api_module.cache_repository
+        bundle_hash = repo.store_dependency_set(DependencySet(
+            'npm', [DependencyFile('a.js', b'1')], node_version='14.17.0', npm_version='6.14.13'))
+        served = threading.Event()
+        started = threading.Event()
+        original = getattr(repo, method)
+        
+        def slow(*args):
+            started.set()
+            # Returns only once the loop has answered another request in the meantime
+            assert served.wait(timeout=10)
+            return original(*args)
+        
+        monkeypatch.setattr(repo, method, slow)
+        responses = []
+        requester = threading.Thread(target=lambda: responses.append(client.get(url.format(bundle_hash))))
+        requester.start()
+        
+        assert started.wait(timeout=10)
+        assert client.get("/health").status_code == 200
+        served.set()
+        requester.join()
+        
+        assert responses[0].status_code == 200
+    
+    def test_dedupe_download_does_not_block_event_loop(self, client, monkeypatch):
+        """Test the tar build and duplication stats of a download run off the event loop."""
+        self._assert_served_during(client, monkeypatch, 'get_duplication_stats', "/download/{}.dedup.tar")
+    
+    def test_bundle_index_does_not_block_event_loop(self, client, monkeypatch):
+        """Test listing a bundle's files, which stats every blob, runs off the event loop."""
+        self._assert_served_during(client, monkeypatch, 'describe_index', "/v1/bundles/{}/index")
+    
+    def test_download_delta_bundle(self, client):
+        """Test /download/{hash}.zip?base= streams only the changes."""
+        import io
+        import zipfile
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        repo = api_module.cache_repository
+        base_hash = repo.store_dependency_set(DependencySet(
+            'npm', [DependencyFile('a.js', b'1'), DependencyFile('b.js', b'2')],
+            node_version='14.17.0', npm_version='6.14.13'))
+        target_hash = repo.store_dependency_set(DependencySet(
+            'npm', [DependencyFile('a.js', b'1'), DependencyFile('c.js', b'3')],
+            node_version='14.17.0', npm_version='6.14.13'))
+        
+        response = client.get(f"/download/{target_hash}.zip?base={base_hash}")
+        
+        assert response.status_code == 200
+        assert response.headers['x-delta-base'] == base_hash
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            assert 'c.js' in zf.namelist()
+            assert 'a.js' not in zf.namelist()
+        
+        response = client.get(f"/download/{target_hash}.zip?base={'0' * 64}")
+        assert response.status_code == 404
+        
+        response = client.get(f"/download/{target_hash}.zip", params={'base': '../../' + base_hash})
+        assert response.status_code == 400
+    
+    def test_bundle_index_and_blob_batch_get(self, client):
+        """Test clients can list a bundle and fetch selected blobs in one call."""
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+        
+        dep_set = DependencySet('npm', [
+            DependencyFile('a.js', b'alpha'),
+            DependencyFile('b/c.js', b'gamma!', executable=True),
+            DependencyFile('d.js', b'', link_target='a.js'),
+            DependencyFile('e', b'', is_directory=True),
+        ], node_version='14.17.0', npm_version='6.14.13')
+        bundle_hash = api_module.cache_repository.store_dependency_set(dep_set)
+        
+        response = client.get(f"/v1/bundles/{bundle_hash}/index")
+        assert response.status_code == 200
+        body = response.json()
+        assert body['fields'] == ['path', 'hash', 'size', 'mode', 'target']
+        assert body['entries'] == [
+            ['a.js', calculate_file_hash(b'alpha'), 5, 0o644, None],
+            ['b/c.js', calculate_file_hash(b'gamma!'), 6, 0o755, None],
+            ['d.js', None, None, 0o120777, 'a.js'],
+            ['e', None, None, 0o40755, None],
+        ]
+        
+        missing = 'f' * 64
+        hashes = [calculate_file_hash(b'gamma!'), missing, calculate_file_hash(b'alpha')]
+        response = client.post("/v1/blobs:batchGet", json={'hashes': hashes})
+        assert response.status_code == 200
+        assert response.content == (
+            f"{hashes[0]} 6\n".encode() + b'gamma!' +
+            f"{missing} -1\n".encode() +
+            f"{hashes[2]} 5\n".encode() + b'alpha'
+        )
+        
+        response = client.post("/v1/blobs:batchGet", json={'hashes': ['../../etc/passwd']})
+        assert response.status_code == 400
+        
+        response = client.get(f"/v1/bundles/{'0' * 64}/index")
+        assert response.status_code == 404
+    
+    def test_download_builds_missing_zip_on_demand(self, client):
+        """Test a bundle with only an index is built on first download (lazy mode)."""
+        import io
+        import zipfile
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        dep_set = DependencySet('npm', [DependencyFile('lazy.js', b'1')],
+                                node_version='14.17.0', npm_version='6.14.13')
+        bundle_hash = api_module.cache_repository.store_dependency_set(dep_set)
+        assert not api_module.cache_repository.has_bundle(bundle_hash)
+        
+        response = client.get(f"/download/{bundle_hash}.zip")
+        
+        assert response.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            assert zf.read('lazy.js') == b'1'
+        assert api_module.cache_repository.has_bundle(bundle_hash)
+        
+        metrics_response = client.get("/v1/metrics")
+        assert metrics_response.status_code == 200
+        assert 'bundle_build.zip' in metrics_response.json()['timings']
+    
+    def test_stats_endpoint(self, client):
+        """Test /v1/stats serves the running totals, per manager."""
+        from interfaces import api as api_module
+        from domain.dependency_set import DependencySet, DependencyFile
+        
+        dep_set = DependencySet('npm', [DependencyFile('a.js', b'12345')],
+                                node_version='14.17.0', npm_version='6.14.13')
+        bundle_hash = api_module.cache_repository.store_dependency_set(dep_set)
+        api_module.cache_repository.generate_bundle_zip(bundle_hash)
+        
+        response = client.get("/v1/stats")
+        
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats['blobs'] == 1
+        assert stats['blob_bytes'] == 5
+        assert stats['total_indexes'] == 1
+        assert stats['managers']['npm']['bundles'] == 1
+        assert stats['reconciled_at'] is not None
+    
+    def test_registry_proxy_endpoints(self, client):
+        """Test the npm registry endpoints serve metadata and tarballs from the blob store."""
+        from interfaces import api as api_module
+        from infrastructure.registry_proxy import RegistryProxy, IntegrityError
+        from domain.dependency_set import calculate_file_hash
+        
+        assert client.get("/registry/npm/left-pad").status_code == 404
+        
+        tarball_hash = calculate_file_hash(b'tarball')
+        api_module.cache_repository.store_blob(tarball_hash, b'tarball')
+        proxy = Mock(spec=RegistryProxy)
+        proxy.get_npm_metadata.return_value = b'{"name": "@scope/pkg"}'
+        proxy.get_npm_tarball.return_value = tarball_hash
+        with patch('interfaces.api.registry_proxy', proxy):
+            metadata = client.get("/registry/npm/@scope%2fpkg")
+            tarball = client.get("/registry/npm/@scope/pkg/-/pkg-1.0.0.tgz")
+            proxy.get_npm_tarball.side_effect = IntegrityError("pkg-1.0.0.tgz: sha512 mismatch")
+            tampered = client.get("/registry/npm/@scope/pkg/-/pkg-1.0.0.tgz")
+        
+        assert metadata.status_code == 200
+        assert metadata.json() == {"name": "@scope/pkg"}
+        proxy.get_npm_metadata.assert_called_once_with('@scope/pkg')
+        assert tarball.status_code == 200
+        assert tarball.content == b'tarball'
+        proxy.get_npm_tarball.assert_any_call('@scope/pkg', 'pkg-1.0.0.tgz')
+        assert tampered.status_code == 502
+    
+    def test_s3_storage_redirects_downloads(self, client):
+        """Test ZIP downloads redirect to the bucket and cache-directory features are refused with S3 storage."""
+        from infrastructure.s3_cache_repository import S3CacheRepository
+        
+        repository = Mock(spec=S3CacheRepository)
+        repository.get_bundle_download_url.return_value = 'https://deps.example/bundle.zip?X-Amz-Signature=x'
+        with patch('interfaces.api.cache_repository', repository):
+            response = client.get("/download/abc123.zip", follow_redirects=False)
+            index_response = client.get("/v1/bundles/abc123/index")
+        
+        assert response.status_code == 307
+        assert response.headers['location'] == 'https://deps.example/bundle.zip?X-Amz-Signature=x'
+        assert index_response.status_code == 501
     
     def test_cache_request_with_real_api_version_format(self, temp_cache_dir):
         """Test cache request with actual API version format (node/npm keys)."""
@@ -326,6 +658,51 @@ class TestAPI:
                     # Should not return 401
                     assert response.status_code == 200
     
+    def test_prune_profile_from_request_or_api_key(self):
+        """A request's prune field wins over its API key's default profile."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            test_app = initialize_app(
+                cache_dir=tmpdir,
+                supported_versions={'npm': []},
+                api_keys=['slim-key', 'plain-key'],
+                prune_profiles={'npm': {'maps': {'remove': ['*.map']}}},
+                api_key_prune_profiles={'slim-key': 'slim'}
+            )
+            
+            def post(api_key, prune=None):
+                data = {
+                    'manager': 'npm',
+                    'hash': 'test_hash',
+                    'versions': json.dumps({'node': '20.19.5', 'npm': '10.8.2'})
+                }
+                if prune:
+                    data['prune'] = prune
+                files = [('file', ('package.json', BytesIO(b'{}'), 'application/json'))]
+                return client.post("/v1/cache", headers={'Authorization': f'Bearer {api_key}'},
+                                   data=data, files=files)
+            
+            with TestClient(test_app) as client, patch('interfaces.api.HandleCacheRequest') as mock_handler_class:
+                mock_handler_class.return_value.handle.return_value = CacheResponse(
+                    bundle_hash='abc123', download_url='/download/abc123.zip', is_cache_hit=True
+                )
+                
+                def profile_name():
+                    profile = mock_handler_class.return_value.handle.call_args[0][0].prune_profile
+                    return profile.name if profile else None
+                
+                assert post('slim-key').status_code == 200
+                assert profile_name() == 'slim'
+                assert post('slim-key', prune='none').status_code == 200
+                assert profile_name() is None
+                assert post('plain-key').status_code == 200
+                assert profile_name() is None
+                assert post('plain-key', prune='maps').status_code == 200
+                assert profile_name() == 'maps'
+                
+                response = post('plain-key', prune='unknown')
+                assert response.status_code == 400
+                assert 'Unknown prune profile' in response.json()['detail']
+    
     def test_config_initialization(self):
         """Test configuration initialization."""
         config = Config(
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+
+from infrastructure.async_cache_repository import (
+    STREAM_CHUNK_SIZE, SyncCacheRepositoryAdapter, ThreadedAsyncCacheRepository
+)
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+
+
+class TestThreadedAsyncCacheRepository:
+    """Test cases for the async repository, through the sync adapter."""
+
+    @pytest.fixture
+    def sync_repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path / 'cache')
+
+    @pytest.fixture
+    def async_repository(self, sync_repository):
+        repository = ThreadedAsyncCacheRepository(sync_repository, max_concurrency=4)
+        yield repository
+        repository.close()
+
+    @pytest.fixture
+    def adapter(self, async_repository):
+        adapter = SyncCacheRepositoryAdapter(async_repository)
+        yield adapter
+        adapter.close()
+
+    def _store(self, repository):
+        files = [DependencyFile('a.js', b'alpha'), DependencyFile('big.bin', b'x' * (STREAM_CHUNK_SIZE * 2 + 1))]
+        dep_set = DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+        return repository.store_dependency_set(dep_set)
+
+    def test_matches_sync_repository(self, sync_repository, adapter):
+        bundle_hash = self._store(sync_repository)
+
+        assert adapter.get_index(bundle_hash) == sync_repository.get_index(bundle_hash)
+        assert adapter.resolve_bundle_hash(bundle_hash) == bundle_hash
+        assert not adapter.has_bundle(bundle_hash)
+
+        zip_path = adapter.generate_bundle_zip(bundle_hash)
+        assert zip_path == sync_repository.get_bundle_zip_path(bundle_hash)
+        assert adapter.has_bundle(bundle_hash)
+        assert b''.join(adapter.stream_bundle_zip(bundle_hash)) == zip_path.read_bytes()
+
+    def test_blob_round_trip_and_streaming(self, sync_repository, adapter):
+        content = b'y' * (STREAM_CHUNK_SIZE + 10)
+        blob_hash = calculate_file_hash(content)
+
+        adapter.store_blob(blob_hash, content)
+
+        assert sync_repository.get_blob(blob_hash) == content
+        assert adapter.get_blob(blob_hash) == content
+        assert adapter.blob_size(blob_hash) == len(content)
+        chunks = list(adapter.iter_blob(blob_hash))
+        assert len(chunks) == 2
+        assert b''.join(chunks) == content
+
+    def test_missing_entries(self, adapter):
+        missing = 'f' * 64
+
+        assert adapter.get_index(missing) is None
+        assert adapter.get_blob(missing) is None
+        assert adapter.blob_size(missing) is None
+        assert adapter.iter_blob(missing) is None
+        assert adapter.stream_bundle_zip(missing) is None
+
+    def test_index_and_alias(self, adapter):
+        adapter.save_index('ab' * 32, 'npm', '6.0.0', {'a.js': 'cd' * 32})
+        adapter.save_alias('ef' * 32, 'ab' * 32)
+
+        assert adapter.resolve_bundle_hash('ef' * 32) == 'ab' * 32
+        assert adapter.get_index('ab' * 32) == {'a.js': 'cd' * 32}
+
+    def test_concurrent_streams_interleave(self, sync_repository, async_repository):
+        contents = [bytes([i]) * (STREAM_CHUNK_SIZE * 3) for i in range(8)]
+        hashes = [calculate_file_hash(content) for content in contents]
+        for blob_hash, content in zip(hashes, contents):
+            sync_repository.store_blob(blob_hash, content)
+
+        async def read(blob_hash):
+            return b''.join([chunk async for chunk in await async_repository.iter_blob(blob_hash)])
+
+        async def read_all():
+            return await asyncio.gather(*(read(blob_hash) for blob_hash in hashes))
+
+        assert asyncio.run(read_all()) == contents
+
+    def test_rejects_invalid_concurrency(self, sync_repository):
+        with pytest.raises(ValueError):
+            ThreadedAsyncCacheRepository(sync_repository, max_concurrency=0)
@@ -0,0 +1,136 @@
+import os
+import time
+import pytest
+from pathlib import Path
+
+from infrastructure.blob_gc import BlobGarbageCollector
+from infrastructure.blob_refcounts import BlobRefCounts
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+
+
+def _age(directory: Path, seconds: float = 7200) -> None:
+    past = time.time() - seconds
+    for path in directory.rglob('*'):
+        if path.is_file():
+            os.utime(path, (past, past))
+
+
+class TestBlobRefCounts:
+    """Test cases for persistent blob reference counts."""
+
+    def test_counts_are_idempotent_per_index(self, tmp_path):
+        refcounts = BlobRefCounts(tmp_path / 'refcounts.sqlite3')
+
+        assert refcounts.add_index('a.index', ['x', 'y', 'x'])
+        assert not refcounts.add_index('a.index', ['x', 'y'])
+        assert refcounts.add_index('b.index', ['y'])
+        assert (refcounts.count('x'), refcounts.count('y')) == (1, 2)
+
+        assert refcounts.remove_index('a.index', ['x', 'y'])
+        assert not refcounts.remove_index('a.index', ['x', 'y'])
+        assert (refcounts.count('x'), refcounts.count('y')) == (0, 1)
+        assert refcounts.unreferenced(10) == ['x']
+
+        refcounts.close()
+        reopened = BlobRefCounts(tmp_path / 'refcounts.sqlite3')
+        assert reopened.count('y') == 1
+
+    def test_writes_during_rebuild_reach_the_rebuilt_counts(self, tmp_path):
+        refcounts = BlobRefCounts(tmp_path / 'refcounts.sqlite3')
+        refcounts.add_index('stale.index', ['s'])
+
+        refcounts.begin_rebuild()
+        refcounts.mark_index('a.index', ['x'])
+        refcounts.add_index('b.index', ['x', 'y'])  # Written while marking
+        refcounts.mark_index('b.index', ['x', 'y'])  # ...and found by the walk too
+        refcounts.finish_rebuild()
+
+        assert (refcounts.count('x'), refcounts.count('y'), refcounts.count('s')) == (2, 1, 0)
+        assert refcounts.is_complete
+
+
+class TestBlobGarbageCollector:
+    """Test cases for reference-counted blob collection and mark-and-sweep."""
+
+    @pytest.fixture
+    def repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path)
+
+    def _store(self, repository, name: str, shared: bytes = b'shared') -> str:
+        dep_set = DependencySet('npm', [
+            DependencyFile(f'{name}/index.js', name.encode()),
+            DependencyFile('shared/index.js', shared),
+        ], node_version='14.0.0', npm_version='6.0.0')
+        return repository.store_dependency_set(dep_set)
+
+    def _index_path(self, repository, bundle_hash):
+        return next(repository.indexes_dir.rglob(f'{bundle_hash}.*.index'))
+
+    def _collector(self, repository, **kwargs):
+        return BlobGarbageCollector(repository, batch_pause=0, metrics=MetricsRegistry(), **kwargs)
+
+    def test_removed_index_releases_only_its_exclusive_blobs(self, repository):
+        a_hash = self._store(repository, 'a')
+        self._store(repository, 'b')
+        _age(repository.objects_dir)
+
+        repository.remove_index(self._index_path(repository, a_hash))
+        report = self._collector(repository).collect()
+
+        assert report.blobs_removed == 1
+        assert repository.get_blob(calculate_file_hash(b'a')) is None
+        assert repository.get_blob(calculate_file_hash(b'shared')) == b'shared'
+        assert repository.get_blob(calculate_file_hash(b'b')) == b'b'
+
+    def test_grace_period_protects_blobs_of_installs_in_flight(self, repository):
+        a_hash = self._store(repository, 'a')
+        _age(repository.objects_dir)
+        repository.remove_index(self._index_path(repository, a_hash))
+        # A new install stores the same blob again before writing its index
+        repository.store_blob(calculate_file_hash(b'a'), b'a')
+
+        report = self._collector(repository).collect()
+
+        assert report.blobs_removed == 1  # Only shared/index.js
+        assert repository.get_blob(calculate_file_hash(b'a')) == b'a'
+
+    def test_mark_and_sweep_adopts_caches_without_counts(self, repository, tmp_path):
+        kept_hash = self._store(repository, 'kept')
+        orphan_hash = calculate_file_hash(b'leaked by a failed install')
+        repository.store_blob(orphan_hash, b'leaked by a failed install')
+        _age(repository.objects_dir)
+        repository.refcounts.close()
+        (tmp_path / 'refcounts.sqlite3').unlink()
+
+        adopted = FileSystemCacheRepository(tmp_path)
+        collector = self._collector(adopted, batch_size=1)
+        assert not adopted.refcounts.is_complete
+        assert adopted.collect_unreferenced_blobs(time.time()) == (0, 0)
+
+        report = collector.run_once()
+
+        assert adopted.refcounts.is_complete
+        assert report.indexes_marked == 1
+        assert report.blobs_scanned == 3
+        assert report.blobs_removed == 1
+        assert adopted.get_blob(orphan_hash) is None
+        assert adopted.get_index(kept_hash) is not None
+        assert adopted.refcounts.count(calculate_file_hash(b'shared')) == 1
+        # Next pass only collects by count
+        assert collector.run_once().blobs_scanned == 0
+
+    def test_background_loop(self, repository):
+        a_hash = self._store(repository, 'a')
+        _age(repository.objects_dir)
+        repository.remove_index(self._index_path(repository, a_hash))
+        collector = self._collector(repository, interval=0.01)
+
+        collector.start()
+        deadline = time.time() + 5
+        while repository.get_blob(calculate_file_hash(b'a')) is not None and time.time() < deadline:
+            time.sleep(0.01)
+        collector.stop(timeout=5)
+
+        assert repository.get_blob(calculate_file_hash(b'a')) is None
@@ -0,0 +1,80 @@
+import threading
+import time
+import pytest
+from pathlib import Path
+from unittest.mock import Mock
+
+from infrastructure.bundle_builder import BundleBuilder
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry
+from domain.dependency_set import DependencySet, DependencyFile
+
+
+class TestBundleBuilder:
+    """Test cases for single-flight background bundle builds."""
+    
+    @pytest.fixture
+    def metrics(self):
+        return MetricsRegistry()
+    
+    def test_concurrent_callers_share_one_build(self, metrics, tmp_path):
+        """Test many downloaders of a building bundle wait on a single build."""
+        repository = Mock(spec=FileSystemCacheRepository)
+        repository.get_bundle_zip_path.return_value = None
+        release = threading.Event()
+        
+        def slow_build(bundle_hash):
+            release.wait(timeout=5)
+            return tmp_path / f"{bundle_hash}.zip"
+        
+        repository.generate_bundle_zip.side_effect = slow_build
+        builder = BundleBuilder(repository, max_workers=4, metrics=metrics)
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(builder.ensure_built("abc")))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        builder.schedule("abc")
+        time.sleep(0.05)
+        assert builder.is_building("abc")
+        release.set()
+        for t in threads:
+            t.join()
+        builder.shutdown()
+        
+        assert repository.generate_bundle_zip.call_count == 1
+        assert results == [tmp_path / "abc.zip"] * 5
+        assert not builder.is_building("abc")
+        assert metrics.counter("bundle_build.completed") == 1
+        assert metrics.timing("bundle_build.zip").count == 1
+    
+    def test_ensure_built_returns_existing_zip(self, metrics, tmp_path):
+        repository = Mock(spec=FileSystemCacheRepository)
+        repository.get_bundle_zip_path.return_value = tmp_path / "done.zip"
+        builder = BundleBuilder(repository, metrics=metrics)
+        
+        assert builder.ensure_built("done") == tmp_path / "done.zip"
+        repository.generate_bundle_zip.assert_not_called()
+        builder.shutdown()
+    
+    def test_background_build_with_real_repository(self, metrics, tmp_path):
+        repository = FileSystemCacheRepository(tmp_path)
+        dep_set = DependencySet('npm', [DependencyFile('a.js', b'a')], node_version='14.0.0', npm_version='6.0.0')
+        bundle_hash = repository.store_dependency_set(dep_set)
+        builder = BundleBuilder(repository, metrics=metrics)
+        
+        zip_path = builder.schedule(bundle_hash).result(timeout=5)
+        builder.shutdown()
+        
+        assert zip_path == repository.get_bundle_zip_path(bundle_hash)
+    
+    def test_missing_index_counts_failure(self, metrics, tmp_path):
+        builder = BundleBuilder(FileSystemCacheRepository(tmp_path), metrics=metrics)
+        
+        assert builder.ensure_built('0' * 64) is None
+        builder.shutdown()
+        
+        assert metrics.counter("bundle_build.failed") == 1
@@ -0,0 +1,46 @@
+import pytest
+
+from infrastructure.bundle_similarity_index import BundleSimilarityIndex
+
+
+def _packages(prefix, count=200):
+    return {f"{prefix}{i}@1.0.0" for i in range(count)}
+
+
+class TestBundleSimilarityIndex:
+    """Test cases for the LSH index of cached bundles."""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        index = BundleSimilarityIndex(tmp_path / 'similarity.sqlite3')
+        yield index
+        index.close()
+
+    def test_nearest_ranks_by_similarity(self, index):
+        base = _packages("pkg")
+        index.add("close", "npm", (base - {"pkg0@1.0.0"}) | {"pkg0@2.0.0"})
+        index.add("further", "npm", (base - _packages("pkg", 40)) | _packages("new", 40))
+        index.add("unrelated", "npm", _packages("other"))
+
+        nearest = index.nearest("npm", base)
+
+        assert [bundle_hash for bundle_hash, _ in nearest] == ["close", "further"]
+        assert nearest[0][1] > nearest[1][1] >= index.min_similarity
+
+    def test_managers_are_separate(self, index):
+        index.add("vendor", "composer", _packages("pkg"))
+
+        assert index.nearest("npm", _packages("pkg")) == []
+        assert index.nearest("composer", _packages("pkg"))[0][0] == "vendor"
+
+    def test_remove_and_persistence(self, index, tmp_path):
+        index.add("a", "npm", _packages("pkg"))
+        index.add("b", "npm", _packages("pkg"))
+        index.remove("a")
+
+        reopened = BundleSimilarityIndex(tmp_path / 'similarity.sqlite3')
+        try:
+            assert reopened.count() == 1
+            assert [bundle_hash for bundle_hash, _ in reopened.nearest("npm", _packages("pkg"))] == ["b"]
+        finally:
+            reopened.close()
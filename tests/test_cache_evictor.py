@@ -0,0 +1,129 @@
+import os
+import time
+import pytest
+from pathlib import Path
+
+from infrastructure.cache_evictor import CacheEvictor
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+
+
+def _set_times(path: Path, atime: float, mtime: float = None) -> None:
+    os.utime(path, (atime, mtime if mtime is not None else atime))
+
+
+class TestCacheEvictor:
+    """Test cases for size-budgeted LRU eviction."""
+
+    @pytest.fixture
+    def repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path)
+
+    def _store(self, repository, name: str, shared: bytes = b'') -> str:
+        files = [DependencyFile(f'{name}/index.js', name.encode() * 2000)]
+        if shared:
+            files.append(DependencyFile('shared/index.js', shared))
+        dep_set = DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+        return repository.store_dependency_set(dep_set)
+
+    def _age_everything(self, repository, seconds: float = 7200) -> None:
+        past = time.time() - seconds
+        for directory in (repository.objects_dir, repository.indexes_dir, repository.bundles_dir):
+            for path in directory.rglob('*'):
+                if path.is_file():
+                    _set_times(path, past)
+
+    def _evictor(self, repository, max_bytes, **kwargs):
+        return CacheEvictor(repository, max_bytes=max_bytes, metrics=MetricsRegistry(), **kwargs)
+
+    def test_under_budget_evicts_nothing(self, repository):
+        bundle_hash = self._store(repository, 'a')
+        repository.generate_bundle_zip(bundle_hash)
+        evictor = self._evictor(repository, max_bytes=10 ** 9)
+
+        report = evictor.run_once()
+
+        assert report.bytes_freed == 0
+        assert repository.has_bundle(bundle_hash)
+
+    def test_archives_are_evicted_before_indexes_in_lru_order(self, repository):
+        old_hash = self._store(repository, 'old')
+        new_hash = self._store(repository, 'new')
+        old_zip = repository.generate_bundle_zip(old_hash)
+        new_zip = repository.generate_bundle_zip(new_hash)
+        self._age_everything(repository)
+        _set_times(new_zip, time.time() - 60)
+
+        evictor = self._evictor(repository, max_bytes=1)
+        usage = evictor.measure_usage()
+        # Budget such that dropping the least recently used ZIP is enough
+        evictor.max_bytes = usage
+        evictor.high_watermark, evictor.low_watermark = 0.99, (usage - old_zip.stat().st_size) / usage
+
+        report = evictor.run_once()
+
+        assert report.artifacts_removed == 1
+        assert report.indexes_removed == 0
+        assert not repository.has_bundle(old_hash)
+        assert repository.has_bundle(new_hash)
+        assert repository.get_index(old_hash) is not None
+        assert not any(old_zip.parent.glob(f'{old_zip.name}.*'))
+
+    def test_indexes_evicted_with_their_exclusive_blobs(self, repository):
+        shared = b'shared' * 1000
+        old_hash = self._store(repository, 'old', shared)
+        new_hash = self._store(repository, 'new', shared)
+        repository.save_alias('f' * 64, old_hash)
+        orphan_hash = calculate_file_hash(b'orphan')
+        repository.store_blob(orphan_hash, b'orphan')
+        self._age_everything(repository)
+        repository.get_index(new_hash)  # Recently used
+
+        evictor = self._evictor(repository, max_bytes=10 ** 9)
+        usage = evictor.measure_usage()
+        evictor.max_bytes = usage
+        evictor.high_watermark, evictor.low_watermark = 0.99, 0.5
+
+        report = evictor.run_once()
+
+        assert report.indexes_removed == 1
+        assert report.blobs_removed == 1  # old/index.js
+        assert repository.get_index(old_hash) is None
+        assert repository.get_index(new_hash) is not None
+        assert repository.get_blob(calculate_file_hash(shared)) == shared
+        # Never counted: left to mark-and-sweep
+        assert repository.get_blob(orphan_hash) == b'orphan'
+        assert repository.resolve_bundle_hash('f' * 64) == 'f' * 64
+
+    def test_grace_period_protects_recent_blobs_and_indexes(self, repository):
+        bundle_hash = self._store(repository, 'fresh')
+        orphan_hash = calculate_file_hash(b'in-flight')
+        repository.store_blob(orphan_hash, b'in-flight')
+
+        evictor = self._evictor(repository, max_bytes=1, grace_seconds=3600)
+        report = evictor.run_once()
+
+        assert report.indexes_removed == 0
+        assert report.blobs_removed == 0
+        assert repository.get_index(bundle_hash) is not None
+        assert repository.get_blob(orphan_hash) == b'in-flight'
+
+    def test_background_loop_runs_passes(self, repository):
+        self._store(repository, 'a')
+        self._age_everything(repository)
+        evictor = self._evictor(repository, max_bytes=1, interval=0.01)
+
+        evictor.start()
+        deadline = time.time() + 5
+        while evictor.metrics.timing('eviction.run').count == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        evictor.stop(timeout=5)
+
+        assert evictor.metrics.timing('eviction.run').count >= 1
+        assert not list(repository.indexes_dir.rglob('*.index'))
+
+    @pytest.mark.parametrize('max_bytes,high,low', [(0, 0.9, 0.8), (100, 0.8, 0.9), (100, 1.5, 0.5)])
+    def test_invalid_configuration(self, repository, max_bytes, high, low):
+        with pytest.raises(ValueError):
+            CacheEvictor(repository, max_bytes=max_bytes, high_watermark=high, low_watermark=low)
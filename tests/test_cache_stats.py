@@ -0,0 +1,134 @@
+import json
+import pytest
+
+from infrastructure.cache_stats import CacheStatsTracker
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from domain.bundle_format import TAR_GZIP
+from domain.dependency_set import DependencySet, DependencyFile
+
+
+class TestCacheStatsTracker:
+    """Test cases for the persisted running totals."""
+
+    def test_add_and_remove_per_manager(self, tmp_path):
+        tracker = CacheStatsTracker(tmp_path / 'stats.json')
+        tracker.add('blobs', 10)
+        tracker.add('bundles', 100, 'npm')
+        tracker.add('indexes', 5, 'composer')
+        tracker.remove('bundles', 100, 'npm')
+
+        stats = tracker.snapshot()
+
+        assert stats['blobs'] == 1
+        assert stats['blob_bytes'] == 10
+        assert stats['bundles'] == 0
+        assert stats['managers']['composer']['indexes'] == 1
+        assert 'blobs' not in stats['managers']['npm']
+
+    def test_unknown_kind_is_rejected(self, tmp_path):
+        tracker = CacheStatsTracker(tmp_path / 'stats.json')
+        with pytest.raises(ValueError):
+            tracker.add('tarballs', 1)
+
+    def test_totals_survive_a_clean_restart(self, tmp_path):
+        path = tmp_path / 'stats.json'
+        tracker = CacheStatsTracker(path)
+        tracker.replace({}, {})
+        tracker.add('blobs', 42)
+        tracker.close()
+
+        reloaded = CacheStatsTracker(path)
+
+        assert reloaded.is_loaded
+        assert reloaded.is_reconciled
+        assert reloaded.snapshot()['blob_bytes'] == 42
+
+    def test_unclean_shutdown_needs_reconcile(self, tmp_path):
+        path = tmp_path / 'stats.json'
+        tracker = CacheStatsTracker(path, save_interval=0)
+        tracker.replace({}, {})
+        tracker.add('blobs', 42)  # Saved periodically, then the process dies
+
+        reloaded = CacheStatsTracker(path)
+
+        assert reloaded.snapshot()['blob_bytes'] == 42
+        assert not reloaded.is_reconciled
+
+    def test_saves_are_rate_limited(self, tmp_path):
+        path = tmp_path / 'stats.json'
+        tracker = CacheStatsTracker(path, save_interval=3600)
+        tracker.add('blobs', 1)
+        assert not path.exists()
+
+        tracker.flush()
+
+        assert json.loads(path.read_text())['totals']['blobs'] == 1
+
+
+class TestRepositoryCacheStats:
+    """Test cases for totals maintained by FileSystemCacheRepository."""
+
+    @pytest.fixture
+    def repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path)
+
+    def _store(self, repository, manager='npm', name='a'):
+        files = [DependencyFile(f'{name}.js', name.encode() * 100), DependencyFile('shared.js', b'shared')]
+        if manager == 'npm':
+            dep_set = DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+        else:
+            dep_set = DependencySet('composer', files, php_version='8.1')
+        return repository.store_dependency_set(dep_set)
+
+    def _without_timestamp(self, stats):
+        return {key: value for key, value in stats.items() if key != 'reconciled_at'}
+
+    def test_new_cache_starts_reconciled_at_zero(self, repository):
+        stats = repository.get_cache_stats()
+
+        assert stats['reconciled_at'] is not None
+        assert stats['cache_size_bytes'] == 0
+
+    def test_running_totals_match_a_full_recount(self, repository):
+        npm_hash = self._store(repository)
+        composer_hash = self._store(repository, 'composer', 'b')
+        repository.generate_bundle_zip(npm_hash)
+        repository.generate_bundle_zip(composer_hash)
+        b''.join(repository.stream_bundle_archive(npm_hash, TAR_GZIP))
+
+        incremental = repository.get_cache_stats()
+        reconciled = repository.reconcile_cache_stats()
+
+        assert self._without_timestamp(incremental) == self._without_timestamp(reconciled)
+        assert incremental['blobs'] == 3
+        assert incremental['managers']['npm']['archives'] == 1
+        assert incremental['managers']['composer']['bundles'] == 1
+
+    def test_removals_are_uncounted(self, repository):
+        bundle_hash = self._store(repository)
+        bundle_path = repository.generate_bundle_zip(bundle_hash)
+        index_path = next(repository.iter_index_files())
+
+        repository.remove_bundle_artifact(bundle_path)
+        repository.remove_index(index_path)
+        for blob_path in list(repository.objects_dir.rglob('*')):
+            if blob_path.is_file():
+                repository.remove_blob(blob_path.name)
+
+        stats = repository.get_cache_stats()
+        assert stats['cache_size_bytes'] == 0
+        assert stats['managers']['npm']['indexes'] == 0
+
+    def test_existing_cache_without_totals_needs_reconcile(self, tmp_path):
+        repository = FileSystemCacheRepository(tmp_path)
+        self._store(repository)
+        (tmp_path / 'stats.json').unlink(missing_ok=True)
+
+        reopened = FileSystemCacheRepository(tmp_path)
+        assert not reopened.cache_stats.is_reconciled
+
+        stats = reopened.reconcile_cache_stats()
+
+        assert reopened.cache_stats.is_reconciled
+        assert stats['total_blobs'] == 2
+        assert stats['total_indexes'] == 1
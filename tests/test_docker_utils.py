@@ -4,6 +4,7 @@ import subprocess
 import tempfile
 import os
 from pathlib import Path
+from application.dtos import FileData
 from infrastructure.docker_utils import DockerUtils
 
 
@@ -124,6 +125,29 @@ class TestDockerUtils(unittest.TestCase):
                 result = self.docker_utils._get_install_command(manager)
                 self.assertEqual(result, expected)
     
+    def test_get_cache_args(self):
+        """Test the shared package cache is mounted and the manager pointed at it."""
+        self.assertEqual(self.docker_utils._get_cache_args("npm", None), [])
+        self.assertEqual(
+            self.docker_utils._get_cache_args("composer", Path("/srv/cache/package-managers/composer")),
+            ["-v", "/srv/cache/package-managers/composer:/package-cache", "-e", "COMPOSER_CACHE_DIR=/package-cache"]
+        )
+        npm_args = self.docker_utils._get_cache_args("npm", Path("/cache/npm"))
+        self.assertIn("npm_config_cache=/package-cache", npm_args)
+        self.assertIn("npm_config_prefer_offline=true", npm_args)
+    
+    def test_get_user_args(self):
+        """Test containers run as the server's user, so eviction can delete what they cache."""
+        self.assertEqual(
+            self.docker_utils._get_user_args(),
+            ["--user", f"{os.getuid()}:{os.getgid()}", "-e", "HOME=/tmp"]
+        )
+    
+    def test_get_install_env_args(self):
+        """Test npm containers leave dev dependencies out, like native installs."""
+        self.assertEqual(self.docker_utils._get_install_env_args("npm"), ["-e", "NODE_ENV=production"])
+        self.assertEqual(self.docker_utils._get_install_env_args("composer"), [])
+    
     def test_get_install_command_unsupported(self):
         """Test install command generation for unsupported manager."""
         with self.assertRaises(RuntimeError) as context:
@@ -164,8 +188,8 @@ class TestDockerUtils(unittest.TestCase):
             # Mock the internal method
             with patch.object(self.docker_utils, '_install_with_docker_internal') as mock_internal:
                 mock_internal.return_value = [
-                    ("node_modules/package1/index.js", b"console.log('test');"),
-                    ("node_modules/package1/package.json", b'{"name": "package1"}')
+                    FileData("node_modules/package1/index.js", b"console.log('test');"),
+                    FileData("node_modules/package1/package.json", b'{"name": "package1"}')
                 ]
                 
                 # Run installation
@@ -273,13 +297,13 @@ class TestDockerUtils(unittest.TestCase):
             self.assertEqual(len(result), 2)
             
             # Sort for consistent testing
-            result.sort(key=lambda x: x[0])
+            result.sort(key=lambda x: x.relative_path)
             
-            self.assertEqual(result[0][0], "node_modules/package1/index.js")
-            self.assertEqual(result[0][1], b"console.log('test');")
+            self.assertEqual(result[0].relative_path, "node_modules/package1/index.js")
+            self.assertEqual(result[0].content, b"console.log('test');")
             
-            self.assertEqual(result[1][0], "node_modules/package1/package.json")
-            self.assertEqual(result[1][1], b'{"name": "package1"}')
+            self.assertEqual(result[1].relative_path, "node_modules/package1/package.json")
+            self.assertEqual(result[1].content, b'{"name": "package1"}')
     
     def test_collect_files_missing_directory(self):
         """Test file collection when install directory doesn't exist."""
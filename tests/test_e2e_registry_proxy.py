@@ -0,0 +1,138 @@
+"""End-to-end tests of installs fetching through the server's own registry proxy."""
+import base64
+import hashlib
+import io
+import json
+import shutil
+import socket
+import tarfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import uvicorn
+
+from infrastructure.metrics import metrics
+from interfaces.api import app, initialize_app
+
+API_KEY = "test-key"
+
+
+def _tarball(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"package/{name}")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+TINY_TARBALL = _tarball({
+    "package.json": json.dumps({"name": "tiny", "version": "1.0.0", "main": "index.js"}).encode(),
+    "index.js": b"module.exports = 42;\n",
+})
+TINY_INTEGRITY = "sha512-" + base64.b64encode(hashlib.sha512(TINY_TARBALL).digest()).decode()
+TINY_PACKUMENT = json.dumps({
+    "name": "tiny",
+    "dist-tags": {"latest": "1.0.0"},
+    "versions": {"1.0.0": {
+        "name": "tiny",
+        "version": "1.0.0",
+        # Lockfiles and packuments name the public registry; npm fetches them from --registry
+        "dist": {"tarball": "https://registry.npmjs.org/tiny/-/tiny-1.0.0.tgz", "integrity": TINY_INTEGRITY},
+    }},
+}).encode()
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    """A public registry that only knows the tiny package."""
+    routes = {"/tiny": TINY_PACKUMENT, "/tiny/-/tiny-1.0.0.tgz": TINY_TARBALL}
+
+    def do_GET(self):
+        content = self.routes.get(self.path)
+        self.send_response(200 if content else 404)
+        self.send_header("Content-Length", str(len(content or b"")))
+        self.end_headers()
+        self.wfile.write(content or b"")
+
+    def log_message(self, *args):
+        pass
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.skipif(not shutil.which("npm"), reason="npm is not installed")
+class TestE2ERegistryProxy:
+    """A cache request served by a live server whose install fetches through that same server."""
+
+    @pytest.fixture
+    def upstream(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Upstream)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+
+    @pytest.fixture
+    def base_url(self, upstream, tmp_path):
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        initialize_app(
+            cache_dir=str(tmp_path / "cache"),
+            supported_versions={},
+            api_keys=[API_KEY],
+            base_url=base_url,
+            registry_proxy_url=base_url,
+            npm_upstream=upstream,
+            install_timeouts={"npm": 60}
+        )
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            assert thread.is_alive(), "server failed to start"
+        yield base_url
+        server.should_exit = True
+        thread.join()
+
+    @pytest.mark.parametrize("with_lockfile", [True, False])
+    def test_install_fetches_through_the_proxy(self, base_url, with_lockfile):
+        manifest = {"name": "app", "version": "1.0.0", "dependencies": {"tiny": "1.0.0"}}
+        files = [("file", ("package.json", json.dumps(manifest).encode(), "application/json"))]
+        if with_lockfile:
+            lockfile = {
+                "name": "app", "version": "1.0.0", "lockfileVersion": 3, "requires": True,
+                "packages": {
+                    "": {"name": "app", "version": "1.0.0", "dependencies": {"tiny": "1.0.0"}},
+                    "node_modules/tiny": {
+                        "version": "1.0.0",
+                        "resolved": "https://registry.npmjs.org/tiny/-/tiny-1.0.0.tgz",
+                        "integrity": TINY_INTEGRITY,
+                    },
+                },
+            }
+            files.append(("file", ("package-lock.json", json.dumps(lockfile).encode(), "application/json")))
+        headers = {"Authorization": f"Bearer {API_KEY}"}
+        misses = metrics.counter("registry_proxy.tarball.miss")
+
+        response = httpx.post(
+            f"{base_url}/v1/cache", headers=headers, timeout=120, files=files,
+            data={"manager": "npm", "hash": "x", "versions": json.dumps({"node": "20", "npm": "10"})}
+        )
+
+        assert response.status_code == 200, response.text
+        bundle = httpx.get(response.json()["download_url"], headers=headers, timeout=60)
+        with zipfile.ZipFile(io.BytesIO(bundle.content)) as archive:
+            assert archive.read("tiny/index.js") == b"module.exports = 42;\n"
+        assert metrics.counter("registry_proxy.tarball.miss") == misses + 1
+
+    def test_registry_requires_a_key_or_the_installer_token(self, base_url):
+        assert httpx.get(f"{base_url}/registry/npm/tiny").status_code == 401
+        response = httpx.get(f"{base_url}/registry/npm/tiny", headers={"Authorization": f"Bearer {API_KEY}"})
+        assert response.status_code == 200
@@ -29,6 +29,7 @@ class TestFileSystemCacheRepository:
         assert (temp_cache_dir / "objects").exists()
         assert (temp_cache_dir / "indexes").exists()
         assert (temp_cache_dir / "bundles").exists()
+        assert (temp_cache_dir / "aliases").exists()
     
     def test_has_bundle_returns_false_for_nonexistent(self, repository):
         assert not repository.has_bundle("nonexistent_hash")
@@ -214,6 +215,48 @@ class TestFileSystemCacheRepository:
         retrieved = repository.get_blob(actual_hash)
         assert retrieved == content
     
+    def test_concurrent_stores_of_a_new_blob_count_it_once(self, repository, monkeypatch):
+        import threading
+        content = b"shared content"
+        blob_hash = hashlib.new(HASH_ALGORITHM, content).hexdigest()
+        # Every thread has passed the existence check before any of them writes
+        barrier = threading.Barrier(4)
+        write_bytes = Path.write_bytes
+        
+        def racing_write(path, data):
+            if repository.objects_dir in path.parents:
+                barrier.wait(timeout=10)
+            return write_bytes(path, data)
+        
+        monkeypatch.setattr(Path, 'write_bytes', racing_write)
+        threads = [threading.Thread(target=repository.store_blob, args=(blob_hash, content)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        stats = repository.get_cache_stats()
+        assert stats["total_blobs"] == 1
+        assert stats["cache_size_bytes"] == len(content)
+        assert [path.name for path in repository.objects_dir.rglob('*') if path.is_file()] == [blob_hash]
+    
+    def test_interrupted_blob_write_leaves_no_blob(self, repository, monkeypatch):
+        content = b"content"
+        blob_hash = hashlib.new(HASH_ALGORITHM, content).hexdigest()
+        
+        def crash(src, dst):
+            raise OSError(28, "No space left on device")
+        
+        monkeypatch.setattr(os, 'replace', crash)
+        with pytest.raises(OSError):
+            repository.store_blob(blob_hash, content)
+        monkeypatch.undo()
+        
+        assert repository.get_blob(blob_hash) is None
+        assert not [path for path in repository.objects_dir.rglob('*') if path.is_file()]
+        repository.store_blob(blob_hash, content)
+        assert repository.get_blob(blob_hash) == content
+    
     def test_get_cache_stats(self, repository):
         files = [
             DependencyFile("file1.txt", b"content1"),
@@ -417,6 +460,40 @@ class TestFileSystemCacheRepositoryEdgeCases:
         assert bundle_path is not None
         assert bundle_path.exists()
     
+    def test_bundle_build_does_not_hold_the_repository(self, repo, monkeypatch):
+        """Test other bundles are built and indexes saved while one bundle compresses."""
+        import threading
+        
+        def dep_set(name):
+            return DependencySet('npm', [DependencyFile(f'{name}.js', name.encode())],
+                                 node_version='14.0.0', npm_version='6.0.0')
+        
+        slow_hash = repo.store_dependency_set(dep_set('slow'))
+        fast_hash = repo.store_dependency_set(dep_set('fast'))
+        compressing = threading.Event()
+        release = threading.Event()
+        create_zip_from_blobs = repo.zip_util.create_zip_from_blobs
+        
+        def create_zip(zip_path, index_data, *args, **kwargs):
+            if 'slow.js' in index_data:
+                compressing.set()
+                assert release.wait(timeout=10)
+            return create_zip_from_blobs(zip_path, index_data, *args, **kwargs)
+        
+        monkeypatch.setattr(repo.zip_util, 'create_zip_from_blobs', create_zip)
+        slow_build = threading.Thread(target=repo.generate_bundle_zip, args=(slow_hash,))
+        slow_build.start()
+        assert compressing.wait(timeout=10)
+        
+        try:
+            assert repo.generate_bundle_zip(fast_hash) is not None
+            assert repo.store_dependency_set(dep_set('other')) is not None
+            assert not repo.has_bundle(slow_hash)
+        finally:
+            release.set()
+            slow_build.join()
+        assert repo.has_bundle(slow_hash)
+    
     def test_store_blob_with_hash_mismatch(self, repo):
         """Test storing blob with incorrect hash."""
         content = b"test content"
@@ -454,4 +531,201 @@ class TestFileSystemCacheRepositoryEdgeCases:
             assert 'large.bin' in zf.namelist()
             # Don't read the whole file to avoid memory issues in tests
             info = zf.getinfo('large.bin')
-            assert info.file_size == len(large_content)
\ No newline at end of file
+            assert info.file_size == len(large_content)
+    
+    def test_generate_bundle_zip_applies_compression_policy(self, temp_dir):
+        """Test already-compressed files are stored and text is deflated."""
+        from domain.compression_policy import CompressionPolicy
+        
+        repo = FileSystemCacheRepository(temp_dir, CompressionPolicy(manager_levels={'npm': 9}))
+        files = [
+            DependencyFile('logo.png', os.urandom(2048)),
+            DependencyFile('index.js', b'module.exports = require("./lib");\n' * 100),
+        ]
+        dep_set = DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+        bundle_hash = repo.store_dependency_set(dep_set)
+        
+        bundle_path = repo.generate_bundle_zip(bundle_hash)
+        
+        with zipfile.ZipFile(bundle_path, 'r') as zf:
+            assert zf.getinfo('logo.png').compress_type == zipfile.ZIP_STORED
+            assert zf.getinfo('index.js').compress_type == zipfile.ZIP_DEFLATED
+            assert zf.read('index.js') == files[1].content
+        
+        report = repo.compression_stats.to_dict()
+        assert report['stored:extension']['files'] == 1
+        assert report['deflate:9']['bytes_saved'] > 0
+        assert repo.get_index_manager(bundle_hash) == 'npm'
+    
+    def test_stream_bundle_archive_caches_tar_per_format(self, repo):
+        """Test tar formats are streamed from blobs and cached per format."""
+        import io
+        import tarfile
+        from domain.bundle_format import TAR, TAR_GZIP, ZIP
+        
+        files = [DependencyFile('pkg/index.js', b'module.exports = 1;')]
+        dep_set = DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+        bundle_hash = repo.store_dependency_set(dep_set)
+        
+        assert repo.get_bundle_archive_path(bundle_hash, TAR_GZIP) is None
+        data = b''.join(repo.stream_bundle_archive(bundle_hash, TAR_GZIP))
+        
+        cached = repo.get_bundle_archive_path(bundle_hash, TAR_GZIP)
+        assert cached is not None and cached.name.endswith('.tar.gz')
+        assert cached.read_bytes() == data
+        assert b''.join(repo.stream_bundle_archive(bundle_hash, TAR_GZIP)) == data
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+            assert tar.extractfile('pkg/index.js').read() == b'module.exports = 1;'
+        
+        # Other formats are independent artifacts
+        assert repo.get_bundle_archive_path(bundle_hash, TAR) is None
+        assert repo.stream_bundle_archive(bundle_hash, ZIP) is None
+        assert repo.stream_bundle_archive('f' * 64, TAR) is None
+    
+    def test_stream_delta_zip(self, temp_dir):
+        """Test delta ZIPs hold only upserts plus a deletion manifest, cached once hot."""
+        import io
+        from domain.index_diff import DELTA_MANIFEST_PATH
+        
+        repo = FileSystemCacheRepository(temp_dir, delta_cache_min_requests=2)
+        base = DependencySet('npm', [
+            DependencyFile('a/index.js', b'a1'),
+            DependencyFile('b/index.js', b'b1'),
+            DependencyFile('c/index.js', b'c1'),
+        ], node_version='14.0.0', npm_version='6.0.0')
+        target = DependencySet('npm', [
+            DependencyFile('a/index.js', b'a1'),
+            DependencyFile('b/index.js', b'b2'),
+            DependencyFile('d/index.js', b'd1'),
+        ], node_version='14.0.0', npm_version='6.0.0')
+        base_hash = repo.store_dependency_set(base)
+        target_hash = repo.store_dependency_set(target)
+        
+        data = b''.join(repo.stream_delta_zip(base_hash, target_hash))
+        
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert set(zf.namelist()) == {'b/index.js', 'd/index.js', DELTA_MANIFEST_PATH}
+            assert zf.read('b/index.js') == b'b2'
+            manifest = json.loads(zf.read(DELTA_MANIFEST_PATH))
+            assert manifest['deleted'] == ['c/index.js']
+            assert manifest['base'] == base_hash
+        
+        # First request is cold: nothing persisted, no temp files left behind
+        assert repo.get_delta_zip_path(base_hash, target_hash) is None
+        assert not any(repo.deltas_dir.rglob('*.tmp'))
+        
+        assert b''.join(repo.stream_delta_zip(base_hash, target_hash)) == data
+        assert repo.get_delta_zip_path(base_hash, target_hash) is not None
+        
+        assert repo.stream_delta_zip('0' * 64, target_hash) is None
+        # Hashes that are not content hashes never become part of a path
+        assert repo.stream_delta_zip('../../../etc', target_hash) is None
+        assert repo.get_delta_zip_path(base_hash, '../' + target_hash) is None
+        assert not any(temp_dir.parent.glob('*.from.*'))
+    
+    def test_delta_request_counts_are_bounded(self, temp_dir, monkeypatch):
+        """Test cold pairs are forgotten least recently requested first."""
+        from infrastructure import file_system_cache_repository
+        monkeypatch.setattr(file_system_cache_repository, 'MAX_TRACKED_DELTA_PAIRS', 2)
+        repo = FileSystemCacheRepository(temp_dir, delta_cache_min_requests=2)
+        target_hash = repo.store_dependency_set(DependencySet(
+            'npm', [DependencyFile('a.js', b'target')], node_version='14.0.0', npm_version='6.0.0'))
+        bases = [
+            repo.store_dependency_set(DependencySet(
+                'npm', [DependencyFile('a.js', name)], node_version='14.0.0', npm_version='6.0.0'))
+            for name in (b'one', b'two', b'three')
+        ]
+        
+        for base_hash in [bases[0], bases[1], bases[2], bases[0]]:
+            b''.join(repo.stream_delta_zip(base_hash, target_hash))
+        
+        # bases[0] was forgotten before its second request, so it counts as a first one again
+        assert repo.get_delta_zip_path(bases[0], target_hash) is None
+        assert list(repo._delta_requests) == [(bases[2], target_hash), (bases[0], target_hash)]
+        b''.join(repo.stream_delta_zip(bases[0], target_hash))
+        assert repo.get_delta_zip_path(bases[0], target_hash) is not None
+    
+    def test_alias_resolves_to_content_addressed_bundle(self, repo):
+        """Test request-hash aliases share the index, ZIP and tar of their content hash."""
+        from domain.bundle_format import TAR
+        from domain.dependency_set import calculate_index_hash
+        
+        blob_hash = hashlib.new(HASH_ALGORITHM, b'shared').hexdigest()
+        repo.store_blob(blob_hash, b'shared')
+        index = {'pkg/index.js': blob_hash}
+        content_hash = calculate_index_hash(index)
+        repo.save_index(content_hash, 'npm', '14.0.0_6.0.0', index)
+        
+        request_a, request_b = 'a' * 64, 'b' * 64
+        repo.save_alias(request_a, content_hash)
+        repo.save_alias(request_b, content_hash)
+        
+        assert repo.resolve_bundle_hash(request_a) == content_hash
+        assert repo.resolve_bundle_hash('c' * 64) == 'c' * 64
+        assert repo.get_index(request_b) == index
+        assert repo.get_index_manager(request_b) == 'npm'
+        
+        zip_path = repo.generate_bundle_zip(request_a)
+        assert repo.has_bundle(request_b)
+        assert repo.get_bundle_zip_path(request_b) == zip_path
+        assert zip_path.name == f'{content_hash}.zip'
+        
+        b''.join(repo.stream_bundle_archive(request_a, TAR))
+        assert repo.get_bundle_archive_path(request_b, TAR) is not None
+        
+        # Saving the same index again (another manager version) keeps the first
+        repo.save_index(content_hash, 'npm', '16.0.0_8.0.0', index)
+        assert len(list(repo.indexes_dir.rglob('*.index'))) == 1
+    
+    def test_bundle_checksum_is_stable_across_rebuilds(self, repo):
+        """Test rebuilding an evicted ZIP reproduces its bytes and published checksum."""
+        dep_set = DependencySet('npm', [
+            DependencyFile('pkg/index.js', b'module.exports = 1;'),
+            DependencyFile('pkg/package.json', b'{"name": "pkg"}'),
+        ], node_version='14.0.0', npm_version='6.0.0')
+        bundle_hash = repo.store_dependency_set(dep_set)
+        
+        assert repo.get_bundle_checksum(bundle_hash) is None
+        
+        zip_path = repo.generate_bundle_zip(bundle_hash)
+        checksum = repo.get_bundle_checksum(bundle_hash)
+        assert checksum == hashlib.sha256(zip_path.read_bytes()).hexdigest()
+        
+        repo.cleanup_old_bundles(max_age_seconds=-1)
+        assert not any(p.is_file() for p in repo.bundles_dir.rglob('*'))
+        
+        repo.generate_bundle_zip(bundle_hash)
+        assert repo.get_bundle_checksum(bundle_hash) == checksum
+        
+        # ZIPs without a stored checksum are hashed on demand
+        zip_path.with_name(zip_path.name + '.sha256').unlink()
+        assert repo.get_bundle_checksum(bundle_hash) == checksum
+    
+    def test_generate_bundle_zip_reuses_members_of_built_bundles(self, repo):
+        """Test blobs already compressed in another bundle ZIP are copied, not recompressed."""
+        from domain.compression_policy import REUSED_LABEL
+        
+        shared = DependencyFile('lib/index.js', b'module.exports = "lib";\n' * 100)
+        first = DependencySet('npm', [shared, DependencyFile('a.js', b'a\n' * 100)],
+                              node_version='14.0.0', npm_version='6.0.0')
+        second = DependencySet('npm', [shared, DependencyFile('b.js', b'b\n' * 100)],
+                               node_version='14.0.0', npm_version='6.0.0')
+        first_hash = repo.store_dependency_set(first)
+        second_hash = repo.store_dependency_set(second)
+        
+        first_zip = repo.generate_bundle_zip(first_hash)
+        assert REUSED_LABEL not in repo.compression_stats.choices
+        second_zip = repo.generate_bundle_zip(second_hash)
+        assert repo.compression_stats.choices[REUSED_LABEL].files == 1
+        
+        with zipfile.ZipFile(second_zip) as zf:
+            assert zf.read('lib/index.js') == shared.content
+            assert zf.testzip() is None
+        
+        # Removed bundles stop being reuse sources
+        repo.cleanup_old_bundles(max_age_seconds=-1)
+        assert not first_zip.with_name(first_zip.name + '.members').exists()
+        assert repo.zip_members.lookup(
+            hashlib.new(HASH_ALGORITHM, shared.content).hexdigest(),
+            repo.compression_policy.reuse_key('lib/index.js', 'npm')
+        ) is None
@@ -5,7 +5,7 @@ import os
 
 from application.handle_cache_request import HandleCacheRequest
 from application.dtos import CacheRequest, CacheResponse, FileData, InstallationResult
-from domain.dependency_set import DependencySet, DependencyFile
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
 from domain.installer import DependencyInstaller
 from infrastructure.file_system_cache_repository import FileSystemCacheRepository
 from infrastructure.docker_utils import DockerUtils
@@ -100,6 +100,7 @@ class TestHandleCacheRequest:
         
         expected_hash = 'abc123'
         mock_cache_repository.has_bundle.return_value = False
+        mock_cache_repository.get_index.return_value = None
         
         # Mock installer
         mock_installer = Mock(spec=DependencyInstaller)
@@ -165,6 +166,7 @@ class TestHandleCacheRequest:
         
         expected_hash = 'xyz789'
         mock_cache_repository.has_bundle.return_value = False
+        mock_cache_repository.get_index.return_value = None
         
         # Mock installer for file names
         mock_installer = Mock()
@@ -224,6 +226,7 @@ class TestHandleCacheRequest:
         )
         
         mock_cache_repository.has_bundle.return_value = False
+        mock_cache_repository.get_index.return_value = None
         
         # Mock installer for file names
         mock_installer_for_hash = Mock()
@@ -261,6 +264,7 @@ class TestHandleCacheRequest:
         )
         
         mock_cache_repository.has_bundle.return_value = False
+        mock_cache_repository.get_index.return_value = None
         
         # Mock installer factory to raise exception for unknown manager
         mock_installer_factory.create_installer.side_effect = ValueError("Unsupported manager: unknown_manager")
@@ -281,6 +285,7 @@ class TestHandleCacheRequest:
         )
         
         mock_cache_repository.has_bundle.return_value = False
+        mock_cache_repository.get_index.return_value = None
         mock_docker_utils.is_available.return_value = False
         
         # Mock installer for file names
@@ -439,6 +444,7 @@ class TestHandleCacheRequest:
         
         expected_hash = 'api-format-hash'
         mock_cache_repository.has_bundle.return_value = False
+        mock_cache_repository.get_index.return_value = None
         
         # Mock installer
         mock_installer = Mock(spec=DependencyInstaller)
@@ -499,4 +505,361 @@ class TestHandleCacheRequest:
             handler._determine_installation_method(
                 'npm', 
                 {'node': '18.0.0', 'npm': '9.0.0'}  # Unsupported in API format
-            )
\ No newline at end of file
+            )
+
+class TestHandleCacheRequestZipBuildModes:
+    """Test cases for sync, background and lazy bundle ZIP builds."""
+    
+    @pytest.fixture
+    def repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path)
+    
+    @pytest.fixture
+    def installer_factory(self):
+        installer = Mock(spec=DependencyInstaller)
+        installer.lockfile_name = 'package-lock.json'
+        installer.manifest_name = 'package.json'
+        installer.install.return_value = InstallationResult(
+            success=True,
+            files=[FileData('foo/index.js', b'console.log("foo")')]
+        )
+        factory = Mock()
+        factory.create_installer.return_value = installer
+        return factory
+    
+    @pytest.fixture
+    def request_dto(self):
+        return CacheRequest(
+            manager='npm',
+            versions={'node': '14.17.0', 'npm': '6.14.13'},
+            lockfile_content=b'{}',
+            manifest_content=b'{"name": "app"}'
+        )
+    
+    def _handler(self, repository, installer_factory, mode, builder=None):
+        from infrastructure.metrics import MetricsRegistry
+        return HandleCacheRequest(
+            cache_repository=repository,
+            installer_factory=installer_factory,
+            docker_utils=None,
+            supported_versions={},
+            bundle_builder=builder,
+            zip_build_mode=mode,
+            metrics=MetricsRegistry()
+        )
+    
+    def test_sync_mode_reports_all_phases(self, repository, installer_factory, request_dto):
+        handler = self._handler(repository, installer_factory, 'sync')
+        
+        response = handler.handle(request_dto)
+        
+        assert set(response.timings) == {'lookup', 'install', 'store', 'zip'}
+        assert repository.has_bundle(response.bundle_hash)
+        assert handler.metrics.counter('cache_request.miss') == 1
+    
+    def test_s3_miss_checks_and_uploads_blobs_in_one_batch(self, tmp_path, installer_factory, request_dto):
+        from collections import Counter
+        from infrastructure.s3_cache_repository import S3CacheRepository
+        from tests.test_s3_cache_repository import StubS3Client
+        
+        class CountingClient(StubS3Client):
+            def __init__(self):
+                super().__init__()
+                self.calls = Counter()
+            
+            def head_object(self, Bucket, Key):
+                self.calls['head', Key.split('/', 2)[1]] += 1
+                return super().head_object(Bucket, Key)
+            
+            def put_object(self, Bucket, Key, Body, **kwargs):
+                self.calls['put', Key.split('/', 2)[1]] += 1
+                super().put_object(Bucket, Key, Body, **kwargs)
+        
+        client = CountingClient()
+        repository = S3CacheRepository("deps", "cache", scratch_dir=tmp_path, client=client, transfer_config=object())
+        shared = b'module.exports = "shared";'
+        repository.store_blob(calculate_file_hash(shared), shared)
+        client.calls.clear()
+        installer_factory.create_installer.return_value.install.return_value = InstallationResult(success=True, files=[
+            FileData('a/index.js', b'a'), FileData('b/index.js', b'b'),
+            FileData('c/index.js', shared), FileData('d/index.js', shared),
+        ])
+        handler = self._handler(repository, installer_factory, 'sync')
+        
+        handler.handle(request_dto)
+        repository.close()
+        
+        # One existence check per distinct blob, one upload per missing blob
+        assert client.calls['head', 'objects'] == 3
+        assert client.calls['put', 'objects'] == 2
+    
+    def test_counts_offline_installs(self, repository, installer_factory, request_dto):
+        installer_factory.create_installer.return_value.install.return_value.install_mode = 'offline'
+        handler = self._handler(repository, installer_factory, 'sync')
+        
+        handler.handle(request_dto)
+        
+        assert handler.metrics.counter('install.npm.offline') == 1
+        assert handler.metrics.counter('install.npm.online') == 0
+
+    def test_counts_timed_out_installs(self, repository, installer_factory, request_dto):
+        installer_factory.create_installer.return_value.install.return_value = InstallationResult(
+            success=False, files=[], error_message="npm install timed out after 600s: ",
+            timed_out=True, killed=True
+        )
+        handler = self._handler(repository, installer_factory, 'sync')
+
+        with pytest.raises(RuntimeError, match="timed out"):
+            handler.handle(request_dto)
+
+        assert handler.metrics.counter('install.npm.timeout') == 1
+        assert handler.metrics.counter('install.npm.killed') == 1
+
+    def test_assembled_lockfile_skips_installer(self, repository, installer_factory, tmp_path):
+        from contextlib import nullcontext
+        from domain.dependency_set import calculate_file_hash
+        from infrastructure.metrics import MetricsRegistry
+        from infrastructure.npm_assembler import AssemblyUnsupported
+        content = b'module.exports = 1'
+        blob_hash = calculate_file_hash(content)
+        repository.store_blob(blob_hash, content)
+        assembler = Mock()
+        assembler.assemble.return_value = {'a/index.js': blob_hash}
+        package_cache = Mock()
+        package_cache.use.side_effect = lambda manager: nullcontext(tmp_path)
+        handler = HandleCacheRequest(
+            cache_repository=repository,
+            installer_factory=installer_factory,
+            docker_utils=None,
+            supported_versions={},
+            metrics=MetricsRegistry(),
+            package_cache=package_cache,
+            npm_assembler=assembler
+        )
+        versions = {'node': '20.19.5', 'npm': '10.8.2'}
+        
+        response = handler.handle(CacheRequest('npm', versions, b'{"lockfileVersion": 3}', b'{}'))
+        
+        assert repository.get_index(response.bundle_hash) == {'a/index.js': blob_hash}
+        assert repository.has_bundle(response.bundle_hash)
+        assembler.assemble.assert_called_once_with(b'{}', b'{"lockfileVersion": 3}', tmp_path)
+        installer_factory.create_installer.return_value.install.assert_not_called()
+        assert handler.metrics.counter('install.npm.assembled') == 1
+        
+        # Whatever the assembler cannot reproduce goes through npm
+        assembler.assemble.side_effect = AssemblyUnsupported('workspaces')
+        handler.handle(CacheRequest('npm', versions, b'{"lockfileVersion": 3, "name": "ws"}', b'{}'))
+        installer_factory.create_installer.return_value.install.assert_called_once()
+        assert handler.metrics.counter('install.npm.assembled') == 1
+        # The npm-installed tree is split into package subtrees for later compositions
+        assembler.save_package_subtrees.assert_called_once_with(
+            b'{"lockfileVersion": 3, "name": "ws"}', {'foo/index.js': calculate_file_hash(b'console.log("foo")')}
+        )
+    
+    def test_fetches_only_missing_packages_before_assembling(self, repository, installer_factory, tmp_path):
+        from contextlib import nullcontext
+        from infrastructure.metrics import MetricsRegistry
+        from infrastructure.npm_assembler import MissingTarballs
+        assembler = Mock()
+        assembler.assemble.side_effect = [MissingTarballs(['https://registry.npmjs.org/b/-/b-1.0.1.tgz']), {}]
+        package_cache = Mock()
+        package_cache.use.side_effect = lambda manager: nullcontext(tmp_path)
+        installer = installer_factory.create_installer.return_value
+        installer.cache_packages = Mock(return_value=True)
+        handler = HandleCacheRequest(
+            cache_repository=repository,
+            installer_factory=installer_factory,
+            docker_utils=None,
+            supported_versions={},
+            metrics=MetricsRegistry(),
+            package_cache=package_cache,
+            npm_assembler=assembler
+        )
+        
+        handler.handle(CacheRequest('npm', {'node': '20.19.5', 'npm': '10.8.2'}, b'{"lockfileVersion": 3}', b'{}'))
+        
+        installer.cache_packages.assert_called_once_with(['https://registry.npmjs.org/b/-/b-1.0.1.tgz'], str(tmp_path))
+        installer.install.assert_not_called()
+        assert assembler.assemble.call_count == 2
+        assert handler.metrics.counter('install.npm.assembled') == 1
+    
+    def test_lazy_mode_returns_before_zip_and_serves_hits(self, repository, installer_factory, request_dto):
+        builder = Mock()
+        handler = self._handler(repository, installer_factory, 'lazy', builder)
+        
+        response = handler.handle(request_dto)
+        
+        assert 'zip' not in response.timings
+        assert not repository.has_bundle(response.bundle_hash)
+        builder.schedule.assert_not_called()
+        
+        # The index alone makes the bundle ready: no second install
+        second = handler.handle(request_dto)
+        assert second.is_cache_hit is True
+        assert installer_factory.create_installer.return_value.install.call_count == 1
+    
+    def test_sync_mode_rebuilds_evicted_zip_instead_of_reinstalling(self, repository, installer_factory, request_dto):
+        handler = self._handler(repository, installer_factory, 'sync')
+        first = handler.handle(request_dto)
+        repository.get_bundle_zip_path(first.bundle_hash).unlink()
+        assert not repository.has_bundle(first.bundle_hash)
+
+        second = handler.handle(request_dto)
+
+        assert second.is_cache_hit is True
+        assert repository.has_bundle(first.bundle_hash)
+        assert installer_factory.create_installer.return_value.install.call_count == 1
+        assert handler.metrics.counter('cache_request.rebuilt') == 1
+
+    def test_background_mode_schedules_build(self, repository, installer_factory, request_dto):
+        from infrastructure.bundle_builder import BundleBuilder
+        builder = BundleBuilder(repository)
+        handler = self._handler(repository, installer_factory, 'background', builder)
+        
+        response = handler.handle(request_dto)
+        builder.ensure_built(response.bundle_hash, timeout=5)
+        builder.shutdown()
+        
+        assert repository.has_bundle(response.bundle_hash)
+    
+    def test_invalid_mode(self, repository, installer_factory):
+        with pytest.raises(ValueError):
+            self._handler(repository, installer_factory, 'eventually')
+        with pytest.raises(ValueError):
+            self._handler(repository, installer_factory, 'lazy')
+    
+    def test_identical_trees_share_index_and_zip(self, repository, installer_factory, request_dto):
+        handler = self._handler(repository, installer_factory, 'sync')
+        first = handler.handle(request_dto)
+        
+        # A different manifest resolving to the same installed tree
+        other_request = CacheRequest(
+            manager='npm',
+            versions={'node': '14.17.0', 'npm': '6.14.13'},
+            lockfile_content=b'{}',
+            manifest_content=b'{"name": "app", "description": "same deps"}'
+        )
+        second = handler.handle(other_request)
+        
+        assert second.bundle_hash != first.bundle_hash
+        assert second.is_cache_hit is False
+        assert 'zip' not in second.timings
+        assert repository.get_bundle_zip_path(second.bundle_hash) == \
+            repository.get_bundle_zip_path(first.bundle_hash)
+        assert len(list(repository.indexes_dir.rglob('*.index'))) == 1
+        assert len(list(repository.bundles_dir.rglob('*.zip'))) == 1
+    
+    def test_miss_seeded_from_most_similar_bundle(self, repository, installer_factory, tmp_path):
+        import json
+        from domain.dependency_set import calculate_file_hash
+        from infrastructure.bundle_similarity_index import BundleSimilarityIndex
+        from infrastructure.metrics import MetricsRegistry
+        installer = installer_factory.create_installer.return_value
+        installer.output_folder_name = 'node_modules'
+        installer.rewritten_paths = ('.package-lock.json',)
+        installer.install.return_value = InstallationResult(success=True, files=[
+            FileData('a/index.js', b'a'), FileData('.package-lock.json', b'{"packages": {}}'),
+            FileData('a/cli.js', b'cli', executable=True), FileData('.bin/a', b'', link_target='../a/cli.js'),
+            FileData('a/empty', b'', is_directory=True)
+        ])
+        similarity_index = BundleSimilarityIndex(tmp_path / 'similarity.sqlite3')
+        handler = HandleCacheRequest(
+            cache_repository=repository,
+            installer_factory=installer_factory,
+            docker_utils=None,
+            supported_versions={},
+            metrics=MetricsRegistry(),
+            similarity_index=similarity_index
+        )
+        
+        def request(bumped_version):
+            packages = {f"node_modules/p{i}": {"version": "1.0.0"} for i in range(20)}
+            packages["node_modules/a"] = {"version": bumped_version}
+            packages[""] = {"dependencies": {"a": "1"}}
+            lockfile = json.dumps({"lockfileVersion": 3, "packages": packages}).encode()
+            return CacheRequest('npm', {'node': '20.19.5', 'npm': '10.8.2'}, lockfile, b'{"dependencies": {"a": "1"}}')
+        
+        first = handler.handle(request('1.0.0'))
+        assert installer.install.call_args.kwargs['seeded'] is False
+        index_data = repository.get_index(first.bundle_hash)
+        assert index_data['.bin/a'] == 'symlink:../a/cli.js'
+        assert index_data['a/cli.js'] == calculate_file_hash(b'cli') + ':755'
+        assert index_data['a/empty'] == 'dir:'
+        
+        seeded_tree = {}
+        def install(work_dir, cache_dir=None, seeded=False):
+            node_modules = os.path.join(work_dir, 'node_modules')
+            for name in ('a/index.js', '.package-lock.json', 'a/cli.js'):
+                seeded_tree[name] = os.stat(os.path.join(node_modules, name))
+            seeded_tree['.bin/a'] = os.readlink(os.path.join(node_modules, '.bin/a'))
+            seeded_tree['a/empty'] = os.path.isdir(os.path.join(node_modules, 'a/empty'))
+            return installer.install.return_value
+        installer.install.side_effect = install
+        handler.handle(request('1.0.1'))
+        similarity_index.close()
+        
+        assert installer.install.call_args.kwargs['seeded'] is True
+        assert handler.metrics.counter('seed.npm') == 1
+        # Package files are hardlinked from the blob store, the rewritten hidden lockfile is a copy
+        assert seeded_tree['a/index.js'].st_ino == os.stat(repository.get_blob_path(calculate_file_hash(b'a'))).st_ino
+        assert seeded_tree['.package-lock.json'].st_ino != \
+            os.stat(repository.get_blob_path(calculate_file_hash(b'{"packages": {}}'))).st_ino
+        # Executables are copies, so the shared blob keeps its mode
+        assert seeded_tree['a/cli.js'].st_mode & 0o777 == 0o755
+        assert seeded_tree['a/cli.js'].st_ino != os.stat(repository.get_blob_path(calculate_file_hash(b'cli'))).st_ino
+        assert seeded_tree['.bin/a'] == '../a/cli.js'
+        assert seeded_tree['a/empty']
+    
+    def test_production_request_shares_the_plain_bundle(self, repository, installer_factory, request_dto):
+        from dataclasses import replace
+        installer = installer_factory.create_installer.return_value
+        installer.install.return_value = InstallationResult(success=True, files=[FileData('a/index.js', b'a')])
+        handler = self._handler(repository, installer_factory, 'sync')
+        
+        full = handler.handle(request_dto)
+        # npm installs with NODE_ENV=production, so these ask for the tree already cached
+        for args in (['--omit=dev'], ['--omit', 'dev'], ['--production']):
+            production = handler.handle(replace(request_dto, custom_args=args))
+            assert production.bundle_hash == full.bundle_hash
+            assert production.is_cache_hit
+        installer.install.assert_called_once()
+        
+        other = handler.handle(replace(request_dto, custom_args=['--omit=dev', '--legacy-peer-deps']))
+        assert other.bundle_hash != full.bundle_hash
+        assert installer.install.call_count == 2
+    
+    def test_pruned_variants_cached_under_own_keys(self, repository, installer_factory, request_dto):
+        from dataclasses import replace
+        from domain.prune_profile import load_prune_profiles
+        installer = installer_factory.create_installer.return_value
+        installer.install.return_value = InstallationResult(success=True, files=[
+            FileData('a/index.js', b'module.exports = 1'),
+            FileData('a/README.md', b'# a' * 100),
+            FileData('a/index.js.map', b'{}'),
+        ])
+        profiles = load_prune_profiles()['npm']
+        handler = self._handler(repository, installer_factory, 'sync')
+        
+        full = handler.handle(request_dto)
+        slim = handler.handle(replace(request_dto, prune_profile=profiles['slim']))
+        docs = handler.handle(replace(request_dto, prune_profile=profiles['docs']))
+        slim_again = handler.handle(replace(request_dto, prune_profile=profiles['slim']))
+        
+        # One install; both variants are pruned from the cached tree
+        installer.install.assert_called_once()
+        assert len({slim.bundle_hash, docs.bundle_hash, full.bundle_hash}) == 3
+        assert sorted(repository.get_index(slim.bundle_hash)) == ['a/index.js']
+        assert sorted(repository.get_index(docs.bundle_hash)) == ['a/index.js', 'a/index.js.map']
+        assert sorted(repository.get_index(full.bundle_hash)) == ['a/README.md', 'a/index.js', 'a/index.js.map']
+        assert not slim.is_cache_hit and slim_again.is_cache_hit
+        assert slim_again.bundle_hash == slim.bundle_hash
+        assert 'prune' in slim.timings
+        assert repository.has_bundle(slim.bundle_hash)
+        assert handler.metrics.counter('prune.npm.slim.files_removed') == 2
+        assert handler.metrics.counter('prune.npm.slim.bytes_saved') == 302
+        assert handler.metrics.counter('prune.npm.docs.bytes_saved') == 300
+        
+        # A miss installs the full tree, then prunes it
+        other = handler.handle(replace(request_dto, manifest_content=b'{"name": "other"}', prune_profile=profiles['slim']))
+        assert installer.install.call_count == 2
+        assert sorted(repository.get_index(other.bundle_hash)) == ['a/index.js']
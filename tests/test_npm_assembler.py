@@ -0,0 +1,257 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from domain.dependency_set import calculate_file_hash
+from domain.index_entry import IndexEntry, file_entry, parse_entry, symlink_entry
+from domain.installer import collect_tree
+from domain.npm_lockfile import cacache_content_path
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry
+from infrastructure.npm_assembler import AssemblyUnsupported, MissingTarballs, NpmTreeAssembler
+
+
+def _tarball(files, executables=()):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o755 if name in executables else 0o644
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def _integrity(content):
+    return "sha512-" + base64.b64encode(hashlib.sha512(content).digest()).decode()
+
+
+class TestNpmTreeAssembler:
+    """Test cases for assembling node_modules from a lockfile."""
+
+    @pytest.fixture
+    def repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path / 'cache')
+
+    @pytest.fixture
+    def assembler(self, repository):
+        return NpmTreeAssembler(repository, metrics=MetricsRegistry())
+
+    @pytest.fixture
+    def npm_cache(self, tmp_path):
+        return tmp_path / 'npm-cache'
+
+    def _package(self, npm_cache, files, executables=(), **fields):
+        """Put a tarball in the npm cache and return its lockfile entry."""
+        content = _tarball(files, executables)
+        path = cacache_content_path(npm_cache, _integrity(content))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return {"version": "1.0.0", "integrity": _integrity(content), **fields}
+
+    def _files(self, repository, index):
+        """File contents, and ("symlink", target) for links."""
+        entries = {path: parse_entry(value) for path, value in index.items()}
+        return {
+            path: repository.get_blob(entry.blob_hash) if entry.is_file else ("symlink", entry.link_target)
+            for path, entry in entries.items()
+        }
+
+    def test_assembles_nested_tree_with_bins(self, assembler, repository, npm_cache):
+        packages = {
+            "": {"name": "app", "dependencies": {"a": "^1.0.0", "@s/b": "^1.0.0"}},
+            "node_modules/a": self._package(npm_cache, {
+                "package/package.json": b'{"name": "a"}',
+                "package/cli.js": b'#!/usr/bin/env node',
+            }, bin={"a-cli": "cli.js"}),
+            "node_modules/@s/b": self._package(npm_cache, {
+                "package/index.js": b'b',
+                "package/build.sh": b'make',
+            }, executables={"package/build.sh"}),
+            "node_modules/@s/b/node_modules/c": self._package(npm_cache, {
+                "package/bin/c.js": b'c',
+                "package/../escape.js": b'x',
+            }, bin={"c": "./bin/c.js"}),
+        }
+        lockfile = {"name": "app", "lockfileVersion": 3, "requires": True, "packages": packages}
+
+        index = assembler.assemble(
+            json.dumps({"name": "app", "dependencies": {"a": "^1.0.0", "@s/b": "^1.0.0"}}).encode(),
+            json.dumps(lockfile).encode(), npm_cache
+        )
+
+        files = self._files(repository, index)
+        hidden = json.loads(files.pop(".package-lock.json"))
+        assert files == {
+            "a/package.json": b'{"name": "a"}',
+            "a/cli.js": b'#!/usr/bin/env node',
+            ".bin/a-cli": ("symlink", "../a/cli.js"),
+            "@s/b/index.js": b'b',
+            "@s/b/build.sh": b'make',
+            "@s/b/node_modules/c/bin/c.js": b'c',
+            "@s/b/node_modules/.bin/c": ("symlink", "../c/bin/c.js"),
+        }
+        executables = sorted(path for path, value in index.items() if parse_entry(value).executable)
+        assert executables == ["@s/b/build.sh", "@s/b/node_modules/c/bin/c.js", "a/cli.js"]
+        assert hidden == {"name": "app", "lockfileVersion": 3, "requires": True,
+                          "packages": {key: value for key, value in packages.items() if key}}
+
+    def test_tarballs_extracted_once(self, assembler, npm_cache):
+        lockfile = json.dumps({"lockfileVersion": 2, "packages": {
+            "": {"dependencies": {"a": "1"}},
+            "node_modules/a": self._package(npm_cache, {"package/index.js": b'a'}),
+        }}).encode()
+        manifest = b'{"dependencies": {"a": "1"}}'
+
+        first = assembler.assemble(manifest, lockfile, npm_cache)
+        shutil.rmtree(npm_cache)
+        second = assembler.assemble(manifest, lockfile, npm_cache)
+
+        assert first == second
+        assert assembler.metrics.counter('npm_assembler.package.miss') == 1
+        assert assembler.metrics.counter('npm_assembler.package.hit') == 1
+
+    def test_composes_cached_subtrees_and_names_missing_packages(self, assembler, repository, npm_cache):
+        """After a lockfile bump only the changed package needs a tarball."""
+        manifest = b'{"dependencies": {"a": "1", "b": "1"}}'
+        a = self._package(npm_cache, {"package/a.js": b'a'})
+        b1 = self._package(npm_cache, {"package/b.js": b'b1'})
+        old_lockfile = json.dumps({"lockfileVersion": 3, "packages": {
+            "": {"dependencies": {"a": "1", "b": "1"}}, "node_modules/a": a, "node_modules/b": b1,
+        }}).encode()
+        assembler.assemble(manifest, old_lockfile, npm_cache)
+        shutil.rmtree(npm_cache)
+
+        b2_tarball = _tarball({"package/b.js": b'b2'})
+        b2 = {"version": "1.0.1", "integrity": _integrity(b2_tarball),
+              "resolved": "https://registry.npmjs.org/b/-/b-1.0.1.tgz"}
+        new_lockfile = json.dumps({"lockfileVersion": 3, "packages": {
+            "": {"dependencies": {"a": "1", "b": "1"}}, "node_modules/a": a, "node_modules/b": b2,
+        }}).encode()
+        with pytest.raises(MissingTarballs) as missing:
+            assembler.assemble(manifest, new_lockfile, npm_cache)
+        assert missing.value.specs == ["https://registry.npmjs.org/b/-/b-1.0.1.tgz"]
+
+        path = cacache_content_path(npm_cache, b2["integrity"])
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b2_tarball)
+        index = assembler.assemble(manifest, new_lockfile, npm_cache)
+
+        assert self._files(repository, {k: v for k, v in index.items() if k.endswith('.js')}) == {
+            "a/a.js": b'a', "b/b.js": b'b2'
+        }
+
+    def test_saves_subtrees_of_npm_installed_trees(self, assembler, repository, npm_cache):
+        blobs = {}
+        for content in (b'a', b'c', b'bin', b'lock'):
+            blobs[content] = calculate_file_hash(content)
+            repository.store_blob(blobs[content], content)
+        packages = {
+            "": {"dependencies": {"a": "1"}},
+            "node_modules/a": {"version": "1.0.0", "integrity": _integrity(b'tgz-a')},
+            "node_modules/a/node_modules/c": {"version": "2.0.0", "integrity": _integrity(b'tgz-c'), "bin": {"c": "c.js"}},
+        }
+        lockfile = json.dumps({"lockfileVersion": 3, "packages": packages}).encode()
+        installed = {
+            "a/index.js": blobs[b'a'],
+            "a/node_modules/c/c.js": file_entry(blobs[b'c'], executable=True),
+            "a/node_modules/.bin/c": symlink_entry("../c/c.js"),
+            ".package-lock.json": blobs[b'lock'],
+        }
+
+        assert assembler.save_package_subtrees(lockfile, installed) == 2
+        assert assembler.save_package_subtrees(lockfile, installed) == 0
+
+        # Composed back without a single tarball in the npm cache
+        index = assembler.assemble(b'{"dependencies": {"a": "1"}}', lockfile, npm_cache)
+        index.pop(".package-lock.json")
+        assert index == {k: v for k, v in installed.items() if k != ".package-lock.json"}
+
+    def test_skips_dev_and_foreign_platform_packages(self, assembler, repository, npm_cache):
+        assembler.node_platform = "linux"
+        packages = {
+            "": {"dependencies": {"a": "1"}, "devDependencies": {"d": "1"}},
+            "node_modules/a": self._package(npm_cache, {"package/a.js": b'a'}, os=["!win32"]),
+            "node_modules/d": {"version": "1.0.0", "integrity": "sha512-bm90IGNhY2hlZA==", "dev": True},
+            "node_modules/mac": {"version": "1.0.0", "integrity": "sha512-bm90IGNhY2hlZA==",
+                                 "optional": True, "os": ["darwin"]},
+        }
+
+        index = assembler.assemble(
+            b'{"dependencies": {"a": "1"}, "devDependencies": {"d": "1"}}',
+            json.dumps({"lockfileVersion": 3, "packages": packages}).encode(), npm_cache
+        )
+
+        assert sorted(index) == [".package-lock.json", "a/a.js"]
+        assert list(json.loads(repository.get_blob(index[".package-lock.json"]))["packages"]) == ["node_modules/a"]
+
+    @pytest.mark.parametrize("lockfile, manifest", [
+        ({"lockfileVersion": 1, "dependencies": {}}, {}),
+        ({"lockfileVersion": 3, "packages": {"": {"dependencies": {"a": "1"}}}}, {"dependencies": {"a": "2"}}),
+        ({"lockfileVersion": 3, "packages": {"": {}, "packages/ws": {"version": "1.0.0"}}}, {}),
+        ({"lockfileVersion": 3, "packages": {"": {}, "node_modules/ws": {"link": True}}}, {}),
+        ({"lockfileVersion": 3, "packages": {"": {}, "node_modules/g": {"resolved": "git+ssh://x"}}}, {}),
+        ({"lockfileVersion": 3, "packages": {"": {}, "node_modules/u": {"integrity": "sha512-bm90IGNhY2hlZA=="}}}, {}),
+        ({"lockfileVersion": 3, "packages": {"": {}, "node_modules/w": {"integrity": "sha512-x", "os": ["win32"]}}}, {}),
+    ])
+    def test_unsupported_lockfiles(self, assembler, npm_cache, lockfile, manifest):
+        assembler.node_platform = "linux"
+        with pytest.raises(AssemblyUnsupported):
+            assembler.assemble(json.dumps(manifest).encode(), json.dumps(lockfile).encode(), npm_cache)
+
+    def test_corrupt_cached_tarball(self, assembler, npm_cache):
+        entry = self._package(npm_cache, {"package/index.js": b'a'})
+        cacache_content_path(npm_cache, entry["integrity"]).write_bytes(b'corrupt')
+        lockfile = {"lockfileVersion": 3, "packages": {"": {}, "node_modules/a": entry}}
+
+        with pytest.raises(AssemblyUnsupported):
+            assembler.assemble(b'{}', json.dumps(lockfile).encode(), npm_cache)
+
+    def test_matches_npm_ci(self, assembler, repository, tmp_path):
+        """The assembled index equals what `npm ci --ignore-scripts` installs."""
+        if not shutil.which("npm"):
+            pytest.skip("npm is not installed")
+        npm_cache = Path(subprocess.run(
+            ["npm", "config", "get", "cache"], capture_output=True, text=True
+        ).stdout.strip())
+        project = tmp_path / 'project'
+        project.mkdir()
+        (project / 'package.json').write_text(json.dumps({
+            "name": "project",
+            "dependencies": {"escodegen": "2.1.0"},
+            "devDependencies": {"debug": "4.4.3"}
+        }))
+        env = {**os.environ, "NODE_ENV": "production"}
+        lock = subprocess.run(
+            ["npm", "install", "--package-lock-only", "--offline", "--ignore-scripts", "--no-audit", "--no-fund"],
+            cwd=project, env=env, capture_output=True
+        )
+        ci = lock.returncode == 0 and subprocess.run(
+            ["npm", "ci", "--offline", "--ignore-scripts", "--no-audit", "--no-fund"],
+            cwd=project, env=env, capture_output=True
+        )
+        if not ci or ci.returncode != 0:
+            pytest.skip("packages are not in the local npm cache")
+
+        index = assembler.assemble(
+            (project / 'package.json').read_bytes(), (project / 'package-lock.json').read_bytes(), npm_cache
+        )
+
+        node_modules = project / 'node_modules'
+        installed = {
+            file.relative_path: IndexEntry(
+                calculate_file_hash(file.content) if file.link_target is None and not file.is_directory else None,
+                file.executable, file.link_target, file.is_directory
+            ).encode()
+            for file in collect_tree(node_modules)
+        }
+        assert any(parse_entry(value).is_symlink for value in installed.values())
+        assert index == installed
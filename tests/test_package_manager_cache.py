@@ -0,0 +1,90 @@
+import fcntl
+import os
+import pytest
+
+from infrastructure.package_manager_cache import LOCK_FILE_NAME, PackageManagerCache
+
+
+class TestPackageManagerCache:
+    """Test cases for the shared npm/composer download caches."""
+
+    def _write(self, directory, name, size, atime):
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * size)
+        os.utime(path, (atime, atime))
+        return path
+
+    def test_cache_dir_per_manager(self, tmp_path):
+        cache = PackageManagerCache(tmp_path / 'pm')
+
+        with cache.use('npm') as directory:
+            assert directory == tmp_path / 'pm' / 'npm'
+            assert directory.is_dir()
+        assert cache.cache_dir('composer') == tmp_path / 'pm' / 'composer'
+        with pytest.raises(ValueError):
+            cache.cache_dir('../escape')
+
+    def test_evicts_least_recently_used_files(self, tmp_path):
+        cache = PackageManagerCache(tmp_path / 'pm', max_bytes=1000)
+        npm_dir = cache.cache_dir('npm')
+        oldest = self._write(npm_dir, '_cacache/content-v2/sha512/aa/old', 400, 1000)
+        newer = self._write(npm_dir, '_cacache/content-v2/sha512/bb/newer', 400, 2000)
+        newest = self._write(cache.cache_dir('composer'), 'files/vendor/pkg.zip', 400, 3000)
+
+        freed = cache.evict()
+
+        assert freed == 400
+        assert not oldest.exists()
+        assert not oldest.parent.exists()
+        assert newer.exists() and newest.exists()
+        assert cache.usage() == 800
+        assert cache.evict() == 0
+
+    def test_unremovable_file_does_not_stop_eviction(self, tmp_path, monkeypatch):
+        cache = PackageManagerCache(tmp_path / 'pm', max_bytes=1000)
+        npm_dir = cache.cache_dir('npm')
+        stuck = self._write(npm_dir, 'root-owned', 400, 1000)
+        older = self._write(npm_dir, 'older', 400, 2000)
+        self._write(npm_dir, 'newest', 400, 3000)
+        unlink = os.unlink
+
+        def fake_unlink(path):
+            if path == str(stuck):
+                raise PermissionError(13, 'Permission denied', path)
+            unlink(path)
+
+        monkeypatch.setattr(os, 'unlink', fake_unlink)
+
+        assert cache.evict() == 400
+        assert stuck.exists()
+        assert not older.exists()
+
+    def test_skips_caches_in_use(self, tmp_path):
+        cache = PackageManagerCache(tmp_path / 'pm', max_bytes=100)
+        npm_dir = cache.cache_dir('npm')
+        blob = self._write(npm_dir, 'tarball', 400, 1000)
+
+        # A running install in another process holds the shared lock
+        with open(npm_dir / LOCK_FILE_NAME, 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            assert cache.evict() == 0
+            assert blob.exists()
+
+        assert cache.evict() == 400
+        assert not blob.exists()
+
+    def test_eviction_after_install_is_throttled(self, tmp_path):
+        cache = PackageManagerCache(tmp_path / 'pm', max_bytes=100, eviction_interval=3600)
+
+        with cache.use('npm') as directory:
+            first = self._write(directory, 'first', 400, 1000)
+        assert not first.exists()
+
+        with cache.use('npm') as directory:
+            second = self._write(directory, 'second', 400, 1000)
+        assert second.exists()
+
+    def test_rejects_invalid_budget(self, tmp_path):
+        with pytest.raises(ValueError):
+            PackageManagerCache(tmp_path / 'pm', max_bytes=0)
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from infrastructure.file_system_cache_repository import FileSystemCacheRepository
+from infrastructure.metrics import MetricsRegistry
+from infrastructure.registry_proxy import IntegrityError, RegistryProxy, UpstreamError
+
+TARBALL = b'fake tarball content'
+
+
+def _packument(name, tarball=TARBALL, integrity=None):
+    integrity = integrity or "sha512-" + base64.b64encode(hashlib.sha512(tarball).digest()).decode()
+    filename = f"{name.split('/')[-1]}-1.0.0.tgz"
+    return {
+        "name": name,
+        "versions": {
+            "1.0.0": {"dist": {"tarball": f"https://registry.npmjs.org/{name}/-/{filename}", "integrity": integrity}}
+        }
+    }
+
+
+class FakeRegistry:
+    """Serves registry files from a dict and records the requested paths."""
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                registry.requests.append(self.path)
+                content = registry.files.get(self.path)
+                if content is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestRegistryProxy:
+    """Test cases for the npm registry / Composer repository proxy."""
+
+    @pytest.fixture
+    def upstream(self):
+        registry = FakeRegistry()
+        yield registry
+        registry.close()
+
+    @pytest.fixture
+    def repository(self, tmp_path):
+        return FileSystemCacheRepository(tmp_path / 'cache')
+
+    @pytest.fixture
+    def proxy(self, tmp_path, repository, upstream):
+        return RegistryProxy(
+            repository, tmp_path / 'cache' / 'registry',
+            npm_upstream=upstream.url, composer_upstream=upstream.url, metrics=MetricsRegistry()
+        )
+
+    def test_npm_metadata_is_cached(self, proxy, upstream):
+        upstream.files['/left-pad'] = json.dumps(_packument('left-pad')).encode()
+
+        first = proxy.get_npm_metadata('left-pad')
+        second = proxy.get_npm_metadata('left-pad')
+
+        assert json.loads(first)['name'] == 'left-pad'
+        assert second == first
+        assert upstream.requests == ['/left-pad']
+        assert proxy.get_npm_metadata('missing') is None
+
+    def test_stale_metadata_served_when_upstream_fails(self, proxy, upstream):
+        upstream.files['/left-pad'] = json.dumps(_packument('left-pad')).encode()
+        cached = proxy.get_npm_metadata('left-pad')
+        proxy.metadata_ttl = 0
+        upstream.close()
+
+        assert proxy.get_npm_metadata('left-pad') == cached
+        with pytest.raises(UpstreamError):
+            proxy.get_npm_metadata('uncached')
+
+    def test_npm_tarball_verified_and_stored_as_blob(self, proxy, repository, upstream):
+        upstream.files['/@scope%2Fpkg'] = json.dumps(_packument('@scope/pkg')).encode()
+        upstream.files['/@scope/pkg/-/pkg-1.0.0.tgz'] = TARBALL
+
+        blob_hash = proxy.get_npm_tarball('@scope/pkg', 'pkg-1.0.0.tgz')
+
+        assert repository.get_blob(blob_hash) == TARBALL
+        # Pinned by an index, so GC and eviction see it as referenced
+        assert repository.refcounts.count(blob_hash) == 1
+        assert proxy.get_npm_tarball('@scope/pkg', 'pkg-1.0.0.tgz') == blob_hash
+        assert upstream.requests.count('/@scope/pkg/-/pkg-1.0.0.tgz') == 1
+        assert proxy.get_npm_tarball('@scope/pkg', 'pkg-9.9.9.tgz') is None
+
+    def test_npm_tarball_integrity_mismatch(self, proxy, repository, upstream):
+        upstream.files['/left-pad'] = json.dumps(_packument('left-pad')).encode()
+        upstream.files['/left-pad/-/left-pad-1.0.0.tgz'] = b'tampered'
+
+        with pytest.raises(IntegrityError):
+            proxy.get_npm_tarball('left-pad', 'left-pad-1.0.0.tgz')
+        assert repository.get_cache_stats()['total_blobs'] == 0
+
+    def test_npm_tarball_sha1_shasum(self, proxy, upstream):
+        packument = _packument('old')
+        dist = packument['versions']['1.0.0']['dist']
+        del dist['integrity']
+        dist['shasum'] = hashlib.sha1(TARBALL).hexdigest()
+        upstream.files['/old'] = json.dumps(packument).encode()
+        upstream.files['/old/-/old-1.0.0.tgz'] = TARBALL
+
+        assert proxy.get_npm_tarball('old', 'old-1.0.0.tgz')
+
+    def test_composer_metadata(self, proxy, upstream):
+        upstream.files['/packages.json'] = b'{"metadata-url": "/p2/%package%.json"}'
+        upstream.files['/p2/monolog/monolog.json'] = b'{"packages": {}}'
+
+        assert proxy.get_composer_metadata('packages.json') == b'{"metadata-url": "/p2/%package%.json"}'
+        assert proxy.get_composer_metadata('p2/monolog/monolog.json') == b'{"packages": {}}'
+        assert proxy.get_composer_metadata('p2/monolog/other.json') is None
+
+    def test_rejects_invalid_names(self, proxy):
+        with pytest.raises(ValueError):
+            proxy.get_npm_metadata('../etc/passwd')
+        with pytest.raises(ValueError):
+            proxy.get_npm_tarball('left-pad', '../../secret')
+        with pytest.raises(ValueError):
+            proxy.get_composer_metadata('../../secret.json')
@@ -0,0 +1,190 @@
+import io
+import os
+import time
+import zipfile
+import pytest
+
+from infrastructure.s3_cache_repository import S3CacheRepository, ScratchCleaner
+from infrastructure.s3_client import ClientError
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+
+
+class StubS3Client:
+    """In-memory stand-in for the boto3 S3 client calls the repository makes."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        body, metadata = self._object(Bucket, Key, "HeadObject")
+        return {"ContentLength": len(body), "Metadata": metadata}
+
+    def get_object(self, Bucket, Key):
+        body, metadata = self._object(Bucket, Key, "GetObject")
+        return {"Body": io.BytesIO(body), "Metadata": metadata}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = (bytes(Body), kwargs.get("Metadata", {}))
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None):
+        with open(Filename, "rb") as f:
+            self.put_object(Bucket, Key, f.read(), **(ExtraArgs or {}))
+
+    def download_file(self, Bucket, Key, Filename, Config=None):
+        body, _ = self._object(Bucket, Key, "HeadObject")
+        with open(Filename, "wb") as f:
+            f.write(body)
+
+    def list_objects_v2(self, Bucket, Prefix=""):
+        contents = [
+            {"Key": key, "Size": len(body)}
+            for (bucket, key), (body, _) in sorted(self.objects.items())
+            if bucket == Bucket and key.startswith(Prefix)
+        ]
+        return {"Contents": contents} if contents else {}
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        stub = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=""):
+                yield stub.list_objects_v2(Bucket=Bucket, Prefix=Prefix)
+
+        return Paginator()
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.s3.example/{Params['Key']}?X-Amz-Signature=stub&X-Amz-Expires={ExpiresIn}"
+
+    def _object(self, bucket, key, operation):
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            response = {"Error": {"Code": "404"}}
+            error = ClientError(response, operation)
+            error.response = response
+            raise error from None
+
+
+class TestS3CacheRepository:
+    """Test cases for S3CacheRepository, against a stub client and, when installed, moto's in-process S3."""
+
+    @pytest.fixture(params=["stub", "moto"])
+    def repository(self, request, tmp_path):
+        if request.param == "stub":
+            client = StubS3Client()
+            client.put_object(Bucket="deps", Key="unrelated", Body=b"")
+            repository = S3CacheRepository(
+                "deps", "cache", scratch_dir=tmp_path, client=client, transfer_config=object()
+            )
+            yield repository
+            repository.close()
+            return
+        boto3 = pytest.importorskip("boto3")
+        moto = pytest.importorskip("moto")
+        mock_aws = getattr(moto, "mock_aws", None) or getattr(moto, "mock_s3")
+        with mock_aws():
+            client = boto3.client("s3", region_name="us-east-1")
+            client.create_bucket(Bucket="deps")
+            client.put_object(Bucket="deps", Key="unrelated", Body=b"")
+            repository = S3CacheRepository("deps", "cache", scratch_dir=tmp_path, client=client)
+            yield repository
+            repository.close()
+
+    def _dep_set(self, name='a'):
+        files = [DependencyFile(f'{name}.js', name.encode() * 100), DependencyFile('lib/shared.js', b'shared')]
+        return DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+
+    def test_store_and_read_back(self, repository):
+        bundle_hash = repository.store_dependency_set(self._dep_set())
+
+        index = repository.get_index(bundle_hash)
+
+        assert index['lib/shared.js'] == calculate_file_hash(b'shared')
+        assert repository.get_blob(calculate_file_hash(b'shared')) == b'shared'
+        assert repository.get_index_manager(bundle_hash) == 'npm'
+        assert repository.get_index('f' * 64) is None
+        keys = [item['Key'] for item in repository.client.list_objects_v2(Bucket='deps')['Contents']]
+        assert all(key.startswith('cache/') for key in keys if key != 'unrelated')
+
+    def test_blob_dedup_uploads_only_missing_blobs(self, repository):
+        repository.store_dependency_set(self._dep_set('a'))
+
+        uploaded = repository.store_blobs({
+            calculate_file_hash(b'shared'): b'shared',
+            calculate_file_hash(b'new'): b'new',
+        })
+
+        assert uploaded == 1
+        assert repository.missing_blobs([calculate_file_hash(b'new'), 'f' * 64]) == {'f' * 64}
+
+    def test_bundle_zip_build_checksum_and_presigned_url(self, repository, tmp_path):
+        bundle_hash = repository.store_dependency_set(self._dep_set())
+        repository.save_alias('e' * 64, bundle_hash)
+        assert not repository.has_bundle('e' * 64)
+        assert repository.get_bundle_download_url('e' * 64) is None
+
+        zip_path = repository.generate_bundle_zip('e' * 64)
+
+        with zipfile.ZipFile(zip_path) as zf:
+            assert zf.read('lib/shared.js') == b'shared'
+        assert repository.has_bundle('e' * 64)
+        assert len(repository.get_bundle_checksum(bundle_hash)) == 64
+        assert repository.get_bundle_checksum('f' * 64) is None
+        url = repository.get_bundle_download_url('e' * 64)
+        assert f'cache/bundles/{bundle_hash[:2]}/{bundle_hash[2:4]}/{bundle_hash}.zip' in url
+        assert 'Signature' in url or 'X-Amz-Signature' in url
+
+    def test_get_bundle_zip_path_downloads_missing_local_copy(self, repository):
+        bundle_hash = repository.store_dependency_set(self._dep_set())
+        zip_path = repository.generate_bundle_zip(bundle_hash)
+        zip_path.unlink()
+
+        assert repository.get_bundle_zip_path(bundle_hash) == zip_path
+        assert zipfile.is_zipfile(zip_path)
+        assert repository.get_bundle_zip_path('f' * 64) is None
+
+    def test_get_blob_path_downloads_local_copy(self, repository):
+        repository.store_dependency_set(self._dep_set())
+
+        blob_path = repository.get_blob_path(calculate_file_hash(b'shared'))
+
+        assert blob_path.read_bytes() == b'shared'
+        assert repository.scratch_dir in blob_path.parents
+
+    def test_cache_stats(self, repository):
+        bundle_hash = repository.store_dependency_set(self._dep_set())
+        repository.generate_bundle_zip(bundle_hash)
+
+        stats = repository.get_cache_stats()
+
+        assert stats['total_blobs'] == 2
+        assert stats['total_indexes'] == 1
+        assert stats['total_bundles'] == 1
+
+    def test_scratch_cleanup_removes_old_local_copies(self, repository):
+        bundle_hash = repository.store_dependency_set(self._dep_set())
+        zip_path = repository.generate_bundle_zip(bundle_hash)
+        blob_path = repository.get_blob_path(calculate_file_hash(b'shared'))
+        # A build in progress keeps its temporary files, however old
+        in_progress = repository.scratch_dir / "tmpbuild" / "objects" / "blob"
+        in_progress.parent.mkdir(parents=True)
+        in_progress.write_bytes(b'x')
+        old = time.time() - 7200
+        for path in (zip_path, blob_path, in_progress):
+            os.utime(path, (old, old))
+        fresh = repository.get_blob_path(calculate_file_hash(b'a' * 100))
+
+        cleaner = ScratchCleaner(repository, max_age=3600, interval=0.01)
+        cleaner.start()
+        deadline = time.monotonic() + 5
+        while (zip_path.exists() or blob_path.exists()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cleaner.stop()
+
+        assert not zip_path.exists()
+        assert not blob_path.exists()
+        assert fresh.exists()
+        assert in_progress.exists()
+        # The bucket still has everything
+        assert repository.get_bundle_zip_path(bundle_hash) == zip_path
@@ -0,0 +1,174 @@
+import io
+import os
+import time
+import zipfile
+import pytest
+from pathlib import Path
+
+from infrastructure.blob_gc import BlobGarbageCollector
+from infrastructure.cold_store import DirectoryColdStore, create_cold_store
+from infrastructure.metrics import MetricsRegistry
+from infrastructure.tiered_cache_repository import TieredCacheRepository, TierDemoter
+from domain.dependency_set import DependencySet, DependencyFile, calculate_file_hash
+
+
+class TestDirectoryColdStore:
+    """Test cases for the directory cold tier."""
+
+    def test_round_trip_and_listing(self, tmp_path):
+        store = DirectoryColdStore(tmp_path / 'cold')
+        source = tmp_path / 'file'
+        source.write_bytes(b'data')
+
+        store.upload('indexes/ab/cd/abcd.npm.1.index', source)
+
+        assert store.exists('indexes/ab/cd/abcd.npm.1.index')
+        assert store.read('indexes/ab/cd/abcd.npm.1.index') == b'data'
+        assert list(store.list('indexes/ab/cd/abcd.')) == ['indexes/ab/cd/abcd.npm.1.index']
+        assert list(store.list('indexes/ab/cd/ffff.')) == []
+        assert store.download('indexes/ab/cd/abcd.npm.1.index', tmp_path / 'copy')
+        assert (tmp_path / 'copy').read_bytes() == b'data'
+        assert not store.download('missing', tmp_path / 'missing')
+        assert store.read('missing') is None
+
+        store.delete('indexes/ab/cd/abcd.npm.1.index')
+        store.delete('indexes/ab/cd/abcd.npm.1.index')
+        assert not store.exists('indexes/ab/cd/abcd.npm.1.index')
+
+    def test_create_cold_store_from_path(self, tmp_path):
+        assert isinstance(create_cold_store(str(tmp_path / 'cold')), DirectoryColdStore)
+        with pytest.raises(ValueError):
+            create_cold_store('s3://')
+
+
+class TestTieredCacheRepository:
+    """Test cases for the hot/cold tiered repository."""
+
+    @pytest.fixture
+    def cold_store(self, tmp_path):
+        return DirectoryColdStore(tmp_path / 'cold')
+
+    @pytest.fixture
+    def repository(self, tmp_path, cold_store):
+        return TieredCacheRepository(tmp_path / 'hot', cold_store, metrics=MetricsRegistry())
+
+    def _store(self, repository, name='a'):
+        files = [DependencyFile(f'{name}.js', name.encode() * 1000), DependencyFile('shared.js', b'shared')]
+        dep_set = DependencySet('npm', files, node_version='14.0.0', npm_version='6.0.0')
+        return repository.store_dependency_set(dep_set)
+
+    def _hot_files(self, repository):
+        return [
+            path for directory in (repository.objects_dir, repository.indexes_dir, repository.bundles_dir)
+            for path in directory.rglob('*') if path.is_file()
+        ]
+
+    def test_flush_copies_new_files_to_cold_tier(self, repository, cold_store):
+        bundle_hash = self._store(repository)
+        repository.generate_bundle_zip(bundle_hash)
+
+        uploaded = repository.flush_to_cold()
+
+        # Two blobs, the index, the ZIP and its checksum
+        assert uploaded == 5
+        assert cold_store.exists(f'bundles/{bundle_hash[:2]}/{bundle_hash[2:4]}/{bundle_hash}.zip.sha256')
+        assert repository.flush_to_cold() == 0
+
+    def test_demoted_files_are_promoted_on_access(self, repository, cold_store):
+        bundle_hash = self._store(repository)
+        repository.generate_bundle_zip(bundle_hash)
+        checksum = repository.get_bundle_checksum(bundle_hash)
+
+        for path in self._hot_files(repository):
+            if not path.name.endswith(('.sha256', '.members')):
+                repository.demote(path)
+        assert self._hot_files(repository) == []
+        assert repository.get_cache_stats()['cache_size_bytes'] == 0
+        assert repository.has_bundle(bundle_hash)
+
+        assert repository.get_index(bundle_hash) == {
+            'a.js': calculate_file_hash(b'a' * 1000), 'shared.js': calculate_file_hash(b'shared')
+        }
+        zip_path = repository.get_bundle_zip_path(bundle_hash)
+        assert zip_path is not None
+        assert repository.get_bundle_checksum(bundle_hash) == checksum
+        assert repository.get_blob(calculate_file_hash(b'shared')) == b'shared'
+        assert repository.metrics.counter('tier.promotions') == 3
+
+    def test_zip_builds_promote_demoted_blobs(self, repository):
+        bundle_hash = self._store(repository)
+        for blob_path in list(repository.objects_dir.rglob('*')):
+            if blob_path.is_file():
+                repository.demote(blob_path)
+
+        zip_path = repository.generate_bundle_zip(bundle_hash)
+
+        with zipfile.ZipFile(zip_path) as zf:
+            assert zf.read('shared.js') == b'shared'
+
+    def test_removing_an_index_removes_it_from_both_tiers(self, repository, cold_store):
+        bundle_hash = self._store(repository)
+        repository.generate_bundle_zip(bundle_hash)
+        repository.flush_to_cold()
+        index_path = next(repository.indexes_dir.rglob('*.index'))
+
+        repository.remove_index(index_path)
+
+        assert not list(cold_store.list('indexes/'))
+        assert not list(cold_store.list('bundles/'))
+        assert not repository.has_bundle(bundle_hash)
+        assert repository.get_index(bundle_hash) is None
+
+    def test_cold_index_misses_are_cached(self, repository, cold_store, tmp_path):
+        missing = 'f' * 64
+
+        assert repository.get_index(missing) is None
+        assert repository.get_index(missing) is None
+        assert repository.metrics.counter('tier.index_lookups') == 1
+
+        # Saving, or demoting, an index forgets its miss
+        bundle_hash = self._store(repository)
+        assert repository.get_index(bundle_hash) is not None
+        repository.demote(next(repository.indexes_dir.rglob('*.index')))
+        assert repository.get_index(bundle_hash) is not None
+
+        # Without a TTL an index another server uploaded is found right away
+        other = TieredCacheRepository(tmp_path / 'other', cold_store, metrics=MetricsRegistry(), index_miss_ttl=0)
+        assert other.get_index(bundle_hash) is not None
+        assert other.get_index(missing) is None
+        assert other.get_index(missing) is None
+        assert other.metrics.counter('tier.index_lookups') == 3
+
+    def test_mark_and_sweep_counts_demoted_indexes(self, repository):
+        bundle_hash = self._store(repository)
+        index_path = next(repository.indexes_dir.rglob('*.index'))
+        repository.demote(index_path)
+        gc = BlobGarbageCollector(repository, grace_seconds=0, batch_pause=0, metrics=MetricsRegistry())
+
+        report = gc.mark_and_sweep()
+
+        assert report.indexes_marked == 1
+        assert report.blobs_removed == 0
+        assert repository.get_blob(calculate_file_hash(b'shared')) == b'shared'
+        assert repository.get_index(bundle_hash) is not None
+
+    def test_demoter_keeps_hot_tier_under_budget(self, repository, cold_store):
+        old_hash = self._store(repository, 'old')
+        new_hash = self._store(repository, 'new')
+        repository.generate_bundle_zip(old_hash)
+        repository.generate_bundle_zip(new_hash)
+        past = time.time() - 7200
+        for path in self._hot_files(repository):
+            os.utime(path, (past, past))
+
+        usage = repository.get_cache_stats()['cache_size_bytes']
+        demoter = TierDemoter(repository, max_bytes=usage, high_watermark=0.5, low_watermark=0.1,
+                              metrics=MetricsRegistry())
+        report = demoter.run_once()
+
+        assert report.usage_after <= usage * 0.1
+        assert report.artifacts_removed == 2
+        # Nothing was lost: everything is served back from the cold tier
+        with zipfile.ZipFile(io.BytesIO(repository.get_bundle_zip_path(old_hash).read_bytes())) as zf:
+            assert zf.read('old.js') == b'old' * 1000
+        assert repository.get_index(new_hash) is not None